@@ -1,10 +1,61 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
-from typing import Optional
+import asyncio
+import httpx
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+# Dùng chung phần trích xuất triệu chứng và mô hình với action server (rasa/actions)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rasa'))
+from actions.diagnoser import Diagnoser
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cấu hình kết nối tới Rasa (có thể ghi đè bằng biến môi trường)
+RASA_WEBHOOK_URL = os.environ.get("RASA_WEBHOOK_URL", "http://chatbot_rasa:5005/webhooks/rest/webhook")
+RASA_TIMEOUT = float(os.environ.get("RASA_TIMEOUT", "5"))
+RASA_MAX_CONNECTIONS = int(os.environ.get("RASA_MAX_CONNECTIONS", "100"))
+RASA_MAX_KEEPALIVE = int(os.environ.get("RASA_MAX_KEEPALIVE", "20"))
+# Số request đồng thời tối đa gửi sang Rasa và thời gian chờ tối đa để có lượt
+RASA_MAX_CONCURRENCY = int(os.environ.get("RASA_MAX_CONCURRENCY", "64"))
+RASA_QUEUE_TIMEOUT = float(os.environ.get("RASA_QUEUE_TIMEOUT", "2"))
+# Chẩn đoán theo lô: thư mục mô hình và số mục tối đa mỗi request
+CHATBOT_DATA_DIR = os.environ.get("CHATBOT_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+DIAGNOSE_MAX_BATCH = int(os.environ.get("DIAGNOSE_MAX_BATCH", "10000"))
+# Số mục được chẩn đoán và gửi đi mỗi lần khi stream kết quả NDJSON
+DIAGNOSE_STREAM_CHUNK = 500
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Một AsyncClient dùng chung cho cả process: giữ connection pool keep-alive tới Rasa
+    app.state.rasa_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(RASA_TIMEOUT),
+        limits=httpx.Limits(max_connections=RASA_MAX_CONNECTIONS, max_keepalive_connections=RASA_MAX_KEEPALIVE),
+    )
+    app.state.rasa_semaphore = asyncio.Semaphore(RASA_MAX_CONCURRENCY)
+    # Thiếu mô hình thì chỉ tắt API chẩn đoán theo lô, /api/chat/ vẫn hoạt động
+    try:
+        app.state.diagnoser = Diagnoser.load(CHATBOT_DATA_DIR)
+    except Exception as e:
+        logger.error(f"Không tải được mô hình chẩn đoán từ {CHATBOT_DATA_DIR}: {str(e)}")
+        app.state.diagnoser = None
+    try:
+        yield
+    finally:
+        await app.state.rasa_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,18 +72,19 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
-import logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 @app.post("/api/chat/", response_model=ChatResponse)
 async def chat(request: ChatRequest):
+    semaphore = app.state.rasa_semaphore
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=RASA_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Too many concurrent requests to Rasa")
+        raise HTTPException(status_code=503, detail="Chatbot đang quá tải, vui lòng thử lại sau.")
     try:
         logger.info(f"Sending request to Rasa: {request}")
-        rasa_response = requests.post(
-            "http://chatbot_rasa:5005/webhooks/rest/webhook",
+        rasa_response = await app.state.rasa_client.post(
+            RASA_WEBHOOK_URL,
             json={"sender": str(request.patient_id), "message": request.message},
-            timeout=5
         )
         rasa_response.raise_for_status()
         responses = rasa_response.json()
@@ -42,6 +94,96 @@ async def chat(request: ChatRequest):
             logger.warning("No text in Rasa response")
             response_text = "Không có phản hồi từ chatbot."
         return ChatResponse(response=response_text)
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Error communicating with Rasa: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Lỗi khi giao tiếp với Rasa: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Lỗi khi giao tiếp với Rasa: {str(e)}")
+    finally:
+        semaphore.release()
+
+
+class DiagnoseItem(BaseModel):
+    id: Optional[str] = None
+    text: Optional[str] = None
+    vector: Optional[List[int]] = None
+
+class DiagnoseBatchRequest(BaseModel):
+    items: List[DiagnoseItem]
+
+def diagnose_items(diagnoser: Diagnoser, items: List[DiagnoseItem], offset: int = 0):
+    """
+    Trích xuất triệu chứng cho từng mục rồi chẩn đoán cả lô bằng một lần gọi mô hình.
+    offset là vị trí của items[0] trong request, dùng cho trường index của kết quả.
+    """
+    started = time.perf_counter()
+    results = []
+    vectors = []
+    rows = []
+    for position, item in enumerate(items):
+        result = {"index": offset + position, "id": item.id}
+        results.append(result)
+        if (item.text is None) == (item.vector is None):
+            result["error"] = "Cần đúng một trong hai trường text hoặc vector"
+            continue
+        if item.text is not None:
+            vector, detected = diagnoser.extract(item.text)
+            result["symptoms"] = detected
+        else:
+            vector = item.vector
+            if len(vector) != diagnoser.n_features or any(value not in (0, 1) for value in vector):
+                result["error"] = f"vector phải gồm {diagnoser.n_features} giá trị 0/1"
+                continue
+        if not any(vector):
+            result["error"] = "Không nhận diện được triệu chứng"
+            continue
+        vectors.append(vector)
+        rows.append(position)
+    extracted = time.perf_counter()
+
+    if vectors:
+        labels, probabilities = diagnoser.predict(vectors)
+        for position, label, probability in zip(rows, labels, probabilities):
+            results[position]["diagnosis"] = label.replace('_', ' ')
+            results[position]["probability"] = round(float(probability), 4)
+    predicted = time.perf_counter()
+
+    metrics = {
+        "batch_size": len(items),
+        "diagnosed": len(rows),
+        "errors": len(items) - len(rows),
+        "extract_ms": round((extracted - started) * 1000, 3),
+        "predict_ms": round((predicted - extracted) * 1000, 3),
+    }
+    return results, metrics
+
+@app.post("/api/diagnose/batch")
+async def diagnose_batch(request: DiagnoseBatchRequest):
+    diagnoser = app.state.diagnoser
+    if diagnoser is None:
+        raise HTTPException(status_code=503, detail="Mô hình chẩn đoán chưa sẵn sàng.")
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Danh sách items rỗng.")
+    if len(request.items) > DIAGNOSE_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Tối đa {DIAGNOSE_MAX_BATCH} mục mỗi request.")
+
+    items = request.items
+
+    async def ndjson():
+        started = time.perf_counter()
+        metrics = {"batch_size": len(items), "diagnosed": 0, "errors": 0, "extract_ms": 0.0, "predict_ms": 0.0}
+        # Mỗi đoạn DIAGNOSE_STREAM_CHUNK mục được chẩn đoán (một lần gọi mô hình) rồi gửi ngay,
+        # client nhận dòng đầu tiên sau một đoạn thay vì sau cả lô
+        for start in range(0, len(items), DIAGNOSE_STREAM_CHUNK):
+            # Trích xuất và dự đoán là CPU-bound: chạy ngoài event loop để không chặn /api/chat/
+            results, chunk_metrics = await run_in_threadpool(
+                diagnose_items, diagnoser, items[start:start + DIAGNOSE_STREAM_CHUNK], start)
+            for key in ("diagnosed", "errors", "extract_ms", "predict_ms"):
+                metrics[key] += chunk_metrics[key]
+            yield "".join(json.dumps(result, ensure_ascii=False) + "\n" for result in results)
+        metrics["extract_ms"] = round(metrics["extract_ms"], 3)
+        metrics["predict_ms"] = round(metrics["predict_ms"], 3)
+        metrics["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        logger.info(f"Diagnose batch: {metrics}")
+        # Dòng cuối là số liệu thời gian của cả lô
+        yield json.dumps({"summary": metrics}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
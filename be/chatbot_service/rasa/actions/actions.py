@@ -4,48 +4,24 @@ from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
 import json
 import os
-import pickle
 import logging
-import re
+from .diagnoser import Diagnoser
 
 logger = logging.getLogger(__name__)
 
 # Đường dẫn trong container
-MODEL_PATH = os.path.join(os.path.dirname(__file__), '../../data/model.pkl')
-TRIEU_CHUNG_PATH = os.path.join(os.path.dirname(__file__), '../../data/trieu_chung.json')
-MEDICATION_PATH = os.path.join(os.path.dirname(__file__), '../../data/medications.json')
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../data')
+MEDICATION_PATH = os.path.join(DATA_DIR, 'medications.json')
 
-# Tải mô hình và danh sách triệu chứng
+# Tải mô hình, danh sách triệu chứng và thông tin thuốc
 try:
-    with open(MODEL_PATH, 'rb') as f:
-        MODEL = pickle.load(f)
-    with open(TRIEU_CHUNG_PATH, 'r') as f:
-        TRIEU_CHUNG = json.load(f)
+    DIAGNOSER = Diagnoser.load(DATA_DIR)
     with open(MEDICATION_PATH, 'r') as f:
         MEDICATIONS = json.load(f)
 except FileNotFoundError as e:
     logger.error(f"Không tìm thấy tệp: {str(e)}")
     raise FileNotFoundError(f"Không tìm thấy tệp: {str(e)}")
 
-# Từ điển ánh xạ biến thể tiếng Việt
-TRIEU_CHUNG_VARIANTS = {
-    'sot': ['sốt', 'sốt cao', 'nóng sốt', 'sốt nhẹ', 'tăng nhiệt độ'],
-    'ho': ['ho', 'ho khan', 'ho có đờm', 'ho nhiều', 'khục khặc'],
-    'dau_dau': ['đau đầu', 'nhức đầu', 'đau nửa đầu', 'đau đầu dữ dội'],
-    'met_moi': ['mệt mỏi', 'mệt', 'kiệt sức', 'yếu sức', 'mệt lả'],
-    'dau_bung': ['đau bụng', 'đau dạ dày', 'đau vùng bụng', 'đau quặn bụng'],
-    'dau_hong': ['đau họng', 'rát họng', 'đau cổ họng', 'ngứa họng'],
-    'buon_non': ['buồn nôn', 'nôn nao', 'muốn nôn', 'cảm giác nôn'],
-    'tieu_chay': ['tiêu chảy', 'đi ngoài', 'đi lỏng', 'phân lỏng'],
-    'phat_ban': ['phát ban', 'nổi mẩn', 'mẩn đỏ', 'da nổi đỏ'],
-    'kho_tho': ['khó thở', 'thở khó', 'nghẹt thở', 'thở gấp'],
-    'dau_nguc': ['đau ngực', 'tức ngực', 'đau vùng ngực'],
-    'dau_khop': ['đau khớp', 'nhức khớp', 'đau xương khớp', 'đau cơ khớp'],
-    'chong_mat': ['chóng mặt', 'hoa mắt', 'đầu óc quay cuồng'],
-    'non_mua': ['nôn mửa', 'ói mửa', 'nôn', 'nôn ra thức ăn'],
-    'so_mui': ['sổ mũi', 'ngạt mũi', 'chảy nước mũi', 'mũi chảy']
-}
-
 # Danh sách bệnh từ medications.json
 BENH_LIST = list(MEDICATIONS.keys())
 
@@ -58,15 +34,8 @@ class ActionChanDoanBenh(Action):
         trieu_chung_text = tracker.latest_message.get('text', '').lower().strip()
         logger.info(f"Tin nhắn người dùng: {trieu_chung_text}")
 
-        # Chuyển đổi triệu chứng thành vector
-        trieu_chung_vector = [0] * len(TRIEU_CHUNG)
-        detected_symptoms = []
-        for i, tc in enumerate(TRIEU_CHUNG):
-            for variant in TRIEU_CHUNG_VARIANTS[tc]:
-                if re.search(r'\b' + re.escape(variant) + r'\b', trieu_chung_text):
-                    trieu_chung_vector[i] = 1
-                    detected_symptoms.append(variant)
-                    break
+        # Chuyển đổi triệu chứng thành vector (một lượt quét qua tin nhắn)
+        trieu_chung_vector, detected_symptoms = DIAGNOSER.extract(trieu_chung_text)
 
         logger.info(f"Triệu chứng phát hiện: {detected_symptoms}")
         logger.info(f"Vector triệu chứng: {trieu_chung_vector}")
@@ -81,7 +50,7 @@ class ActionChanDoanBenh(Action):
 
         # Dự đoán bệnh
         try:
-            benh = MODEL.predict([trieu_chung_vector])[0].replace('_', ' ')
+            benh = DIAGNOSER.predict_one(trieu_chung_vector).replace('_', ' ')
             logger.info(f"Chẩn đoán: {benh}")
             # Lưu symptoms dưới dạng chuỗi
             symptoms_str = ', '.join(detected_symptoms)
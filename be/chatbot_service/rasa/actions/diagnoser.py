@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import pickle
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .forest_model import ForestModel
+from .lookup_table import LookupTable, load_lookup_table
+from .symptom_matcher import SymptomMatcher, TRIEU_CHUNG_VARIANTS
+
+logger = logging.getLogger(__name__)
+
+
+def load_model(model_path: str, forest_path: str):
+    # Ưu tiên mô hình dạng mảng (mmap, không cần sklearn); thiếu thì dùng bản pickle
+    if os.path.exists(os.path.join(forest_path, 'meta.json')):
+        return ForestModel.load(forest_path)
+    logger.warning(f"Không tìm thấy {forest_path}, dùng mô hình pickle {model_path}")
+    with open(model_path, 'rb') as f:
+        return pickle.load(f)
+
+
+class Diagnoser:
+    """
+    Trích xuất triệu chứng và chẩn đoán bệnh, dùng chung cho ActionChanDoanBenh và API chẩn đoán theo lô.
+
+    Dự đoán đi qua bảng tra cứu 2^n khi dùng được, ngược lại gọi mô hình một lần cho cả lô.
+    """
+
+    def __init__(self, trieu_chung: Sequence[str], model, lookup_table: Optional[LookupTable] = None):
+        self.trieu_chung = list(trieu_chung)
+        self.model = model
+        self.lookup_table = lookup_table
+        # Automaton trích xuất triệu chứng, dựng một lần khi khởi tạo
+        self.matcher = SymptomMatcher(self.trieu_chung, TRIEU_CHUNG_VARIANTS)
+
+    @classmethod
+    def load(cls, data_dir: str) -> 'Diagnoser':
+        model = load_model(os.path.join(data_dir, 'model.pkl'), os.path.join(data_dir, 'model_forest'))
+        with open(os.path.join(data_dir, 'trieu_chung.json'), 'r') as f:
+            trieu_chung = json.load(f)
+        # Bảng dự đoán tính trước cho mọi tổ hợp triệu chứng; None nếu không dùng được
+        lookup_table = load_lookup_table(os.path.join(data_dir, 'model_lookup'), trieu_chung, model)
+        return cls(trieu_chung, model, lookup_table)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.trieu_chung)
+
+    def extract(self, text: str) -> Tuple[List[int], List[str]]:
+        """(vector triệu chứng 0/1, các biến thể phát hiện được) cho một tin nhắn."""
+        return self.matcher.match(text.lower().strip())
+
+    def predict(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """Chẩn đoán cả lô vector trong một lần gọi: (tên bệnh, xác suất của bệnh đó)."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features)
+        if self.lookup_table is not None:
+            mask = self.lookup_table.bitmask(X)
+            index = self.lookup_table.top_index[mask, 0]
+            return self.lookup_table.classes_[index], np.asarray(self.lookup_table.top_proba[mask, 0], dtype=np.float64)
+        proba = self.model.predict_proba(X)
+        index = np.argmax(proba, axis=1)
+        labels = np.asarray(self.model.classes_, dtype=object)[index]
+        return labels, proba[np.arange(len(index)), index]
+
+    def predict_one(self, vector: Sequence[int]) -> str:
+        if self.lookup_table is not None:
+            return self.lookup_table.predict_one(vector)
+        return self.model.predict([vector])[0]
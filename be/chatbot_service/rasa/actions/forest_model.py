@@ -0,0 +1,155 @@
+import json
+import os
+from typing import Sequence
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+ARRAY_NAMES = ('roots', 'feature', 'threshold', 'children', 'leaf_index', 'leaf_value')
+
+
+def export_forest(model, path: str, feature_names: Sequence[str]) -> None:
+    """
+    Ghi RandomForestClassifier đã huấn luyện thành các mảng node phẳng (.npy) trong thư mục path.
+
+    Tất cả cây được nối tiếp nhau trong cùng các mảng. children[2 * node] là nhánh trái,
+    children[2 * node + 1] là nhánh phải; nút lá trỏ về chính nó ở cả hai nhánh để khi suy luận
+    có thể đi đủ max_depth bước mà không cần rẽ nhánh theo từng cây.
+    Xác suất chỉ lưu cho nút lá (leaf_value), đã chuẩn hóa như DecisionTreeClassifier.predict_proba.
+    """
+    n_classes = len(model.classes_)
+    roots, features, thresholds, children, leaf_indexes, leaf_values = [], [], [], [], [], []
+    offset = 0
+    n_leaves = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.int32)
+        is_leaf = tree.children_left == -1
+
+        roots.append(offset)
+        # sklearn đánh dấu lá bằng feature = -2; đổi về 0 để phép index luôn hợp lệ
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int16))
+        thresholds.append(tree.threshold.astype(np.float64))
+        left = np.where(is_leaf, node_ids, tree.children_left)
+        right = np.where(is_leaf, node_ids, tree.children_right)
+        children.append(np.stack([left, right], axis=1).ravel().astype(np.int32) + offset)
+
+        leaf_index = np.full(tree.node_count, -1, dtype=np.int32)
+        leaf_index[is_leaf] = np.arange(is_leaf.sum(), dtype=np.int32) + n_leaves
+        leaf_indexes.append(leaf_index)
+
+        value = tree.value[is_leaf, 0, :n_classes].astype(np.float64)
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        leaf_values.append(value / normalizer)
+
+        offset += tree.node_count
+        n_leaves += int(is_leaf.sum())
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        'roots': np.asarray(roots, dtype=np.int32),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'children': np.concatenate(children),
+        'leaf_index': np.concatenate(leaf_indexes),
+        'leaf_value': np.concatenate(leaf_values),
+    }
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'feature_names': list(feature_names),
+        'classes': [str(label) for label in model.classes_],
+        'n_trees': len(model.estimators_),
+        'n_nodes': offset,
+        'n_leaves': n_leaves,
+        'max_depth': max_depth,
+    }
+    # meta.json ghi sau cùng: có meta nghĩa là các mảng đã ghi xong
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+class ForestModel:
+    """
+    Suy luận rừng cây bằng NumPy trên các mảng node phẳng do export_forest ghi ra.
+
+    Các mảng được mở bằng mmap nên khởi động gần như tức thì và nhiều process
+    (worker của action server) dùng chung page cache thay vì mỗi process giữ một bản unpickle.
+    Có cùng giao diện predict / predict_proba với RandomForestClassifier.
+    """
+
+    # Số mẫu mỗi lượt khi suy luận theo lô, giữ mảng trung gian (n_samples x n_trees) vừa cache
+    CHUNK_SIZE = 1024
+
+    def __init__(self, meta, arrays):
+        self.feature_names = meta['feature_names']
+        self.classes_ = np.asarray(meta['classes'], dtype=object)
+        self.n_trees = meta['n_trees']
+        self.max_depth = meta['max_depth']
+        # np.asarray bỏ lớp np.memmap (vẫn trỏ vào vùng mmap) để phép index không phải tạo memmap con
+        self.roots = np.asarray(arrays['roots'])
+        self.feature = np.asarray(arrays['feature'])
+        self.threshold = np.asarray(arrays['threshold'])
+        self.children = np.asarray(arrays['children'])
+        self.leaf_index = np.asarray(arrays['leaf_index'])
+        self.leaf_value = np.asarray(arrays['leaf_value'])
+
+    @classmethod
+    def load(cls, path: str, mmap_mode='r') -> 'ForestModel':
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Định dạng mô hình không hỗ trợ: {meta.get('format_version')}")
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(meta, arrays)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def _check_input(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Vector có {X.shape[1]} triệu chứng, mô hình cần {self.n_features}")
+        return X
+
+    def _apply(self, X: np.ndarray) -> np.ndarray:
+        # Đi đồng thời trên mọi cây, nodes có shape (n_trees, n_samples);
+        # nút lá tự trỏ về chính nó nên chỉ cần max_depth bước
+        flat = X.ravel()
+        offsets = np.arange(X.shape[0])[None, :] * X.shape[1]
+        nodes = np.repeat(self.roots[:, None].astype(np.intp), X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_right = flat[offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+        return self.leaf_index[nodes].T
+
+    def apply(self, X) -> np.ndarray:
+        """Trả về chỉ số lá (trong leaf_value) của mỗi mẫu trên mỗi cây, shape (n_samples, n_trees)."""
+        X = self._check_input(X)
+        return np.concatenate([self._apply(X[start:start + self.CHUNK_SIZE])
+                               for start in range(0, X.shape[0], self.CHUNK_SIZE)] or [np.empty((0, self.n_trees), dtype=np.int32)])
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._check_input(X)
+        # Lô lớn thường lặp lại cùng tổ hợp triệu chứng: chỉ duyệt cây cho các vector khác nhau
+        unique, inverse = np.unique(X, axis=0, return_inverse=True)
+        proba = np.empty((unique.shape[0], self.leaf_value.shape[1]), dtype=np.float64)
+        for start in range(0, unique.shape[0], self.CHUNK_SIZE):
+            leaves = self._apply(unique[start:start + self.CHUNK_SIZE])
+            # Tổng theo trục cây được cộng tuần tự từng cây như RandomForestClassifier,
+            # nên argmax trùng khớp cả khi hai bệnh hòa xác suất
+            proba[start:start + self.CHUNK_SIZE] = self.leaf_value[leaves].sum(axis=1)
+        proba /= self.n_trees
+        return proba[inverse.reshape(-1)]
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
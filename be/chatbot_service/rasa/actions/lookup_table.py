@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+# 2^20 dòng là giới hạn hợp lý cho bảng dày (vài chục MB); nhiều triệu chứng hơn thì dùng mô hình
+MAX_FEATURES = 20
+
+
+def symptom_domain(n_features: int) -> np.ndarray:
+    """Mọi vector triệu chứng 0/1; dòng m có triệu chứng i khi bit i của m bằng 1."""
+    return ((np.arange(2 ** n_features)[:, None] >> np.arange(n_features)) & 1).astype(np.float32)
+
+
+def build_lookup_table(model, path: str, feature_names: Sequence[str], top_k: int = 3) -> None:
+    """
+    Tính trước dự đoán của model cho toàn bộ 2^n vector triệu chứng và ghi vào thư mục path.
+
+    top_index[m] là chỉ số (trong classes) của top_k bệnh có xác suất cao nhất theo thứ tự giảm dần,
+    top_proba[m] là xác suất tương ứng; top_index[m, 0] trùng với model.predict.
+    """
+    n_features = len(feature_names)
+    if n_features > MAX_FEATURES:
+        raise ValueError(f"Bảng tra cứu chỉ hỗ trợ tối đa {MAX_FEATURES} triệu chứng, nhận {n_features}")
+    classes = [str(label) for label in model.classes_]
+    top_k = min(top_k, len(classes))
+
+    proba = model.predict_proba(symptom_domain(n_features))
+    # Sắp xếp ổn định: khi hòa, bệnh có chỉ số nhỏ hơn đứng trước, giống np.argmax trong predict
+    order = np.argsort(-proba, axis=1, kind='stable')[:, :top_k]
+    top_index = order.astype(np.uint8 if len(classes) <= 256 else np.uint16)
+    top_proba = np.take_along_axis(proba, order, axis=1).astype(np.float32)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'top_index.npy'), np.ascontiguousarray(top_index))
+    np.save(os.path.join(path, 'top_proba.npy'), np.ascontiguousarray(top_proba))
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'feature_names': list(feature_names),
+        'classes': classes,
+        'top_k': top_k,
+    }
+    # meta.json ghi sau cùng: có meta nghĩa là các mảng đã ghi xong
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+class LookupTable:
+    """
+    Bảng dự đoán tính trước cho không gian 2^n vector triệu chứng, tra cứu O(1) theo bitmask.
+
+    Bảng chỉ dùng được khi danh sách triệu chứng hiện tại trùng (cả thứ tự) với danh sách lúc dựng;
+    kiểm tra bằng matches_features trước khi dùng, nếu không thì quay về mô hình.
+    """
+
+    def __init__(self, meta, top_index, top_proba):
+        self.feature_names = meta['feature_names']
+        self.classes_ = np.asarray(meta['classes'], dtype=object)
+        self.top_k = meta['top_k']
+        self.top_index = np.asarray(top_index)
+        self.top_proba = np.asarray(top_proba)
+        self._weights = 1 << np.arange(len(self.feature_names), dtype=np.int64)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode='r') -> 'LookupTable':
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Định dạng bảng tra cứu không hỗ trợ: {meta.get('format_version')}")
+        top_index = np.load(os.path.join(path, 'top_index.npy'), mmap_mode=mmap_mode)
+        top_proba = np.load(os.path.join(path, 'top_proba.npy'), mmap_mode=mmap_mode)
+        if top_index.shape[0] != 2 ** len(meta['feature_names']):
+            raise ValueError(f"Bảng tra cứu có {top_index.shape[0]} dòng, cần {2 ** len(meta['feature_names'])}")
+        return cls(meta, top_index, top_proba)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def matches_features(self, feature_names: Sequence[str]) -> bool:
+        return list(feature_names) == list(self.feature_names)
+
+    def bitmask(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Vector có {X.shape[1]} triệu chứng, bảng tra cứu cần {self.n_features}")
+        return (X > 0).astype(np.int64) @ self._weights
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.top_index[self.bitmask(X), 0]]
+
+    def predict_one(self, vector: Sequence[int]) -> str:
+        mask = 0
+        for i, value in enumerate(vector):
+            if value:
+                mask |= 1 << i
+        return self.classes_[self.top_index[mask, 0]]
+
+    def top(self, vector: Sequence[int]) -> List[Tuple[str, float]]:
+        """top_k chẩn đoán (tên bệnh, xác suất) cho một vector."""
+        mask = int(self.bitmask(vector)[0])
+        return [(self.classes_[index], float(proba)) for index, proba in zip(self.top_index[mask], self.top_proba[mask])]
+
+    def verify(self, model, sample_size=None, seed=0) -> int:
+        """
+        So bảng với dự đoán của model; trả về số bitmask cho kết quả khác nhau.
+        sample_size=None kiểm tra toàn bộ 2^n vector, ngược lại chỉ kiểm tra một mẫu ngẫu nhiên.
+        """
+        domain = symptom_domain(self.n_features)
+        if sample_size is not None and sample_size < len(domain):
+            domain = domain[np.random.default_rng(seed).choice(len(domain), size=sample_size, replace=False)]
+        expected = np.asarray(model.predict(domain)).astype(str)
+        return int((self.predict(domain).astype(str) != expected).sum())
+
+
+def load_lookup_table(path: str, feature_names: Sequence[str], model, sample_size=256) -> Optional[LookupTable]:
+    """
+    Mở bảng tra cứu nếu dùng được, ngược lại trả về None để gọi thẳng mô hình.
+
+    Bảng bị bỏ qua khi chưa được dựng, không đọc được (sai định dạng, thiếu file, số dòng không khớp),
+    danh sách triệu chứng đã đổi (số lượng hoặc thứ tự) hoặc kiểm tra ngẫu nhiên sample_size vector
+    cho kết quả khác mô hình đang chạy. Hàm được gọi lúc import actions nên không bao giờ raise vì bảng.
+    """
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        logger.info(f"Không có bảng tra cứu tại {path}, dùng mô hình")
+        return None
+    try:
+        table = LookupTable.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        # json.JSONDecodeError là ValueError
+        logger.error(f"Không đọc được bảng tra cứu tại {path}: {e}; dùng mô hình")
+        return None
+    if not table.matches_features(feature_names):
+        logger.warning(f"Danh sách triệu chứng của bảng tra cứu ({table.n_features}) khác danh sách hiện tại "
+                       f"({len(feature_names)}): dùng mô hình")
+        return None
+    try:
+        mismatches = table.verify(model, sample_size=sample_size)
+    except (IndexError, ValueError) as e:
+        # top_index/top_proba hỏng (chỉ số lớp hoặc kích thước không khớp meta)
+        logger.error(f"Bảng tra cứu tại {path} không hợp lệ: {e}; dùng mô hình")
+        return None
+    if mismatches:
+        logger.warning(f"Bảng tra cứu khác mô hình ở {mismatches}/{sample_size} vector kiểm tra: dùng mô hình")
+        return None
+    return table
@@ -0,0 +1,114 @@
+import unicodedata
+from collections import deque
+from typing import Dict, List, Sequence, Tuple
+
+# Từ điển ánh xạ biến thể tiếng Việt
+TRIEU_CHUNG_VARIANTS = {
+    'sot': ['sốt', 'sốt cao', 'nóng sốt', 'sốt nhẹ', 'tăng nhiệt độ'],
+    'ho': ['ho', 'ho khan', 'ho có đờm', 'ho nhiều', 'khục khặc'],
+    'dau_dau': ['đau đầu', 'nhức đầu', 'đau nửa đầu', 'đau đầu dữ dội'],
+    'met_moi': ['mệt mỏi', 'mệt', 'kiệt sức', 'yếu sức', 'mệt lả'],
+    'dau_bung': ['đau bụng', 'đau dạ dày', 'đau vùng bụng', 'đau quặn bụng'],
+    'dau_hong': ['đau họng', 'rát họng', 'đau cổ họng', 'ngứa họng'],
+    'buon_non': ['buồn nôn', 'nôn nao', 'muốn nôn', 'cảm giác nôn'],
+    'tieu_chay': ['tiêu chảy', 'đi ngoài', 'đi lỏng', 'phân lỏng'],
+    'phat_ban': ['phát ban', 'nổi mẩn', 'mẩn đỏ', 'da nổi đỏ'],
+    'kho_tho': ['khó thở', 'thở khó', 'nghẹt thở', 'thở gấp'],
+    'dau_nguc': ['đau ngực', 'tức ngực', 'đau vùng ngực'],
+    'dau_khop': ['đau khớp', 'nhức khớp', 'đau xương khớp', 'đau cơ khớp'],
+    'chong_mat': ['chóng mặt', 'hoa mắt', 'đầu óc quay cuồng'],
+    'non_mua': ['nôn mửa', 'ói mửa', 'nôn', 'nôn ra thức ăn'],
+    'so_mui': ['sổ mũi', 'ngạt mũi', 'chảy nước mũi', 'mũi chảy']
+}
+
+
+def _is_word_char(char: str) -> bool:
+    # Cùng định nghĩa với \w của re cho chuỗi Unicode (chữ, số của mọi ngôn ngữ và '_')
+    return char.isalnum() or char == '_'
+
+
+def _normalize(text: str) -> str:
+    # Gõ tiếng Việt có thể sinh dấu tổ hợp (NFD); đưa về NFC để so khớp ổn định
+    return unicodedata.normalize('NFC', text)
+
+
+class SymptomMatcher:
+    """
+    Trích xuất triệu chứng bằng automaton Aho-Corasick dựng một lần khi import.
+
+    Quét tin nhắn đúng một lượt, tìm mọi biến thể (kể cả chồng lấn, ví dụ "nôn"
+    nằm trong "buồn nôn") và chỉ nhận các lần xuất hiện có ranh giới từ ở hai đầu,
+    giống hệt re.search(r'\\b' + re.escape(variant) + r'\\b', text).
+    Với mỗi triệu chứng, biến thể được ghi nhận là biến thể đứng đầu danh sách
+    trong số các biến thể khớp, như vòng lặp regex cũ.
+    """
+
+    def __init__(self, symptoms: Sequence[str], variants: Dict[str, Sequence[str]]):
+        self.symptoms = list(symptoms)
+        # Mỗi nút: bảng chuyển, liên kết fail, danh sách (độ dài, chỉ số triệu chứng, thứ tự biến thể)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, int, int]]] = [[]]
+        self._variants: List[List[str]] = []
+        for symptom_index, symptom in enumerate(self.symptoms):
+            names = [_normalize(variant) for variant in variants[symptom]]
+            self._variants.append(names)
+            for variant_index, variant in enumerate(names):
+                self._add(variant, symptom_index, variant_index)
+        self._build_fail_links()
+
+    def _add(self, pattern: str, symptom_index: int, variant_index: int) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(pattern), symptom_index, variant_index))
+
+    def _build_fail_links(self) -> None:
+        # Duyệt BFS; các nút con trực tiếp của gốc giữ liên kết fail về gốc
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # Gộp output của nút fail để không phải đi theo chuỗi fail khi quét
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def match(self, text: str) -> Tuple[List[int], List[str]]:
+        """Trả về (vector triệu chứng 0/1 theo thứ tự symptoms, danh sách biến thể phát hiện được)."""
+        text = _normalize(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        # best[i]: thứ tự nhỏ nhất của biến thể khớp cho triệu chứng i
+        best = [None] * len(self.symptoms)
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not output[node]:
+                continue
+            # Ranh giới từ \b: ký tự hai bên vị trí phải khác loại (word / non-word)
+            end_is_boundary = _is_word_char(text[end - 1]) != (end < len(text) and _is_word_char(text[end]))
+            if not end_is_boundary:
+                continue
+            for pattern_length, symptom_index, variant_index in output[node]:
+                start = end - pattern_length
+                if (start > 0 and _is_word_char(text[start - 1])) == _is_word_char(text[start]):
+                    continue
+                current = best[symptom_index]
+                if current is None or variant_index < current:
+                    best[symptom_index] = variant_index
+
+        vector = [0 if index is None else 1 for index in best]
+        detected = [self._variants[i][index] for i, index in enumerate(best) if index is not None]
+        return vector, detected
@@ -0,0 +1,146 @@
+"""
+So sánh mô hình pickle (RandomForestClassifier) với ForestModel (mảng node phẳng, mmap).
+
+- Khởi động: thời gian import + tải mô hình và bộ nhớ tối đa (max RSS) trong một process mới.
+- Độ trễ: một vector (như ActionChanDoanBenh), một lô tin nhắn 1-4 triệu chứng và cả lô 2^15 vector.
+- Tương đương: so predict trên toàn bộ 2^15 vector triệu chứng, thoát với mã 1 nếu khác.
+
+Nếu data/model.pkl chưa có (hoặc rỗng), script huấn luyện một rừng 300 cây trên
+data/symptoms_data.csv (cỡ lớn nhất trong lưới của train_model.py) để đo.
+
+Chạy từ thư mục chatbot_service:
+    python scripts/benchmark_forest_model.py
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+ACTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rasa', 'actions')
+sys.path.insert(0, ACTIONS_DIR)
+
+from forest_model import ForestModel, export_forest  # noqa: E402
+
+STARTUP_SNIPPETS = {
+    'pickle': (
+        "import pickle\n"
+        "with open({path!r}, 'rb') as f:\n"
+        "    model = pickle.load(f)\n"
+    ),
+    'forest': (
+        "import sys\n"
+        "sys.path.insert(0, {actions_dir!r})\n"
+        "from forest_model import ForestModel\n"
+        "model = ForestModel.load({path!r})\n"
+    ),
+}
+STARTUP_TEMPLATE = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "{body}"
+    "model.predict([[0] * {n_features}])\n"
+    "elapsed = time.perf_counter() - start\n"
+    # VmHWM (Linux) là RSS tối đa của riêng process này; ru_maxrss bị kế thừa qua fork/exec
+    "peak = [line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM')][0]\n"
+    "print(elapsed, peak)\n"
+)
+
+
+def load_or_train(model_path, data_path):
+    if os.path.exists(model_path) and os.path.getsize(model_path) > 0:
+        with open(model_path, 'rb') as f:
+            return pickle.load(f), model_path
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    print(f"{model_path} chưa có, huấn luyện rừng 300 cây trên {data_path}")
+    data = pd.read_csv(data_path)
+    model = RandomForestClassifier(n_estimators=300, random_state=42)
+    model.fit(data.drop('benh', axis=1), data['benh'])
+    path = os.path.join(tempfile.mkdtemp(), 'model.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+    return model, path
+
+
+def measure_startup(kind, path, n_features, runs):
+    body = STARTUP_SNIPPETS[kind].format(path=path, actions_dir=ACTIONS_DIR)
+    code = STARTUP_TEMPLATE.format(body=body, n_features=n_features)
+    times, rss = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        elapsed, max_rss = output.split()
+        times.append(float(elapsed))
+        rss.append(int(max_rss))
+    return statistics.median(times), statistics.median(rss) / 1024
+
+
+def measure_latency(predict, vectors, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(vectors)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def run(model_path, data_path, runs):
+    # ActionChanDoanBenh truyền list, không có tên cột: bỏ cảnh báo feature names của sklearn
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    model, model_path = load_or_train(model_path, data_path)
+    n_features = model.n_features_in_
+    feature_names = list(getattr(model, 'feature_names_in_', [f'f{i}' for i in range(n_features)]))
+    forest_path = os.path.join(tempfile.mkdtemp(), 'model_forest')
+    export_forest(model, forest_path, feature_names=feature_names)
+    forest = ForestModel.load(forest_path)
+
+    with open(os.path.join(forest_path, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    forest_bytes = sum(os.path.getsize(os.path.join(forest_path, name)) for name in os.listdir(forest_path))
+    print(f"Rừng: {meta['n_trees']} cây, {meta['n_nodes']} nút, {meta['n_leaves']} lá, độ sâu tối đa {meta['max_depth']}")
+    print(f"Kích thước: pickle {os.path.getsize(model_path) / 1e6:.2f} MB, mảng {forest_bytes / 1e6:.2f} MB")
+
+    # Toàn bộ không gian đầu vào: mọi tổ hợp 0/1 của n_features triệu chứng
+    domain = ((np.arange(2 ** n_features)[:, None] >> np.arange(n_features)) & 1).astype(np.float64)
+    expected = model.predict(domain)
+    actual = forest.predict(domain)
+    mismatches = int((expected != actual).sum())
+    print(f"Tương đương trên {len(domain)} vector: khác {mismatches}")
+
+    for kind, path in (('pickle', model_path), ('forest', forest_path)):
+        elapsed, max_rss = measure_startup(kind, path, n_features, runs)
+        print(f"Khởi động {kind}: {elapsed * 1000:.1f} ms, max RSS {max_rss:.1f} MB")
+
+    single = domain[:1]
+    pickle_single = measure_latency(model.predict, single, runs * 10)
+    forest_single = measure_latency(forest.predict, single, runs * 10)
+    print(f"1 vector: pickle {pickle_single * 1000:.2f} ms, forest {forest_single * 1000:.2f} ms "
+          f"(nhanh hơn {pickle_single / forest_single:.1f} lần)")
+    # Lô thực tế: mỗi tin nhắn có 1-4 triệu chứng, nhiều tổ hợp lặp lại
+    rng = np.random.default_rng(42)
+    triage = np.zeros((10000, n_features))
+    for row, count in enumerate(rng.integers(1, 5, size=len(triage))):
+        triage[row, rng.choice(n_features, size=count, replace=False)] = 1
+    for name, batch in (('lô 1-4 triệu chứng', triage), ('toàn bộ không gian', domain)):
+        pickle_batch = measure_latency(model.predict, batch, runs)
+        forest_batch = measure_latency(forest.predict, batch, runs)
+        print(f"{len(batch)} vector ({name}): pickle {pickle_batch * 1000:.1f} ms, forest {forest_batch * 1000:.1f} ms "
+              f"(tỉ lệ {pickle_batch / forest_batch:.2f})")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='data/model.pkl')
+    parser.add_argument('--data', default='data/symptoms_data.csv')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(1 if run(args.model, args.data, args.runs) else 0)
@@ -0,0 +1,104 @@
+"""
+Kiểm tra và đo bảng tra cứu 2^n (data/model_lookup) so với mô hình.
+
+- Dựng bảng từ mô hình pickle, so toàn bộ 2^n vector với cả RandomForestClassifier và ForestModel.
+- Kiểm tra đường quay về mô hình khi danh sách triệu chứng đổi số lượng hoặc thứ tự.
+- Đo độ trễ một vector và một lô 10000 vector cho bảng tra cứu và ForestModel.
+Thoát với mã 1 nếu có kiểm tra không đạt.
+
+Chạy từ thư mục chatbot_service:
+    python scripts/benchmark_lookup_table.py
+"""
+import argparse
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'rasa', 'actions'))
+
+from forest_model import ForestModel, export_forest  # noqa: E402
+from lookup_table import LookupTable, build_lookup_table, load_lookup_table  # noqa: E402
+
+
+def load_or_train(model_path, data_path):
+    if os.path.exists(model_path) and os.path.getsize(model_path) > 0:
+        with open(model_path, 'rb') as f:
+            return pickle.load(f)
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    print(f"{model_path} chưa có, huấn luyện rừng 300 cây trên {data_path}")
+    data = pd.read_csv(data_path)
+    return RandomForestClassifier(n_estimators=300, random_state=42).fit(data.drop('benh', axis=1), data['benh'])
+
+
+def measure(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def run(model_path, data_path, runs):
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    model = load_or_train(model_path, data_path)
+    feature_names = list(model.feature_names_in_)
+    work_dir = tempfile.mkdtemp()
+    export_forest(model, os.path.join(work_dir, 'model_forest'), feature_names=feature_names)
+    forest = ForestModel.load(os.path.join(work_dir, 'model_forest'))
+
+    lookup_path = os.path.join(work_dir, 'model_lookup')
+    start = time.perf_counter()
+    build_lookup_table(model, lookup_path, feature_names=feature_names)
+    print(f"Dựng bảng {2 ** len(feature_names)} dòng: {time.perf_counter() - start:.2f} s, "
+          f"{sum(os.path.getsize(os.path.join(lookup_path, name)) for name in os.listdir(lookup_path)) / 1e3:.0f} KB")
+    table = LookupTable.load(lookup_path)
+
+    failures = 0
+    for name, reference in (('RandomForestClassifier', model), ('ForestModel', forest)):
+        mismatches = table.verify(reference)
+        failures += mismatches
+        print(f"Khác {name} trên toàn bộ không gian: {mismatches}")
+
+    fallbacks = {
+        'thiếu một triệu chứng': feature_names[:-1],
+        'thêm một triệu chứng': feature_names + ['trieu_chung_moi'],
+        'đổi thứ tự': feature_names[::-1],
+    }
+    for name, names in fallbacks.items():
+        used = load_lookup_table(lookup_path, names, model) is not None
+        failures += used
+        print(f"Danh sách triệu chứng {name}: {'vẫn dùng bảng (sai)' if used else 'quay về mô hình'}")
+    if load_lookup_table(lookup_path, feature_names, forest) is None:
+        failures += 1
+        print("Danh sách triệu chứng khớp nhưng bảng không được dùng (sai)")
+
+    vector = [1, 1] + [0] * (len(feature_names) - 2)
+    print(f"Top chẩn đoán cho {feature_names[:2]}: {table.top(vector)}")
+    single_forest = measure(lambda: forest.predict([vector])[0], runs)
+    single_table = measure(lambda: table.predict_one(vector), runs)
+    print(f"1 vector: ForestModel {single_forest * 1e6:.1f} µs, bảng {single_table * 1e6:.1f} µs "
+          f"(nhanh hơn {single_forest / single_table:.0f} lần)")
+    batch = (np.random.default_rng(42).random((10000, len(feature_names))) < 0.2).astype(np.float32)
+    batch_forest = measure(lambda: forest.predict(batch), max(1, runs // 100))
+    batch_table = measure(lambda: table.predict(batch), max(1, runs // 100))
+    print(f"{len(batch)} vector: ForestModel {batch_forest * 1000:.1f} ms, bảng {batch_table * 1000:.2f} ms "
+          f"(nhanh hơn {batch_forest / batch_table:.0f} lần)")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='data/model.pkl')
+    parser.add_argument('--data', default='data/symptoms_data.csv')
+    parser.add_argument('--runs', type=int, default=500)
+    args = parser.parse_args()
+    sys.exit(1 if run(args.model, args.data, args.runs) else 0)
@@ -0,0 +1,137 @@
+"""
+Kiểm tra tương đương và đo tốc độ trích xuất triệu chứng.
+
+So sánh SymptomMatcher (Aho-Corasick, một lượt quét) với vòng lặp regex cũ trong
+ActionChanDoanBenh: với mỗi triệu chứng, duyệt các biến thể và dừng ở biến thể đầu tiên
+khớp re.search(r'\\b' + re.escape(variant) + r'\\b', text).
+
+Tập kiểm tra gồm các ví dụ chan_doan_benh trong rasa/data/nlu.yml, các câu chồng lấn
+dễ sai ("buồn nôn" / "nôn", "ho" / "hoa mắt"...) và các câu sinh ngẫu nhiên.
+Thoát với mã 1 nếu có câu cho kết quả khác nhau.
+
+Chạy từ thư mục chatbot_service:
+    python scripts/benchmark_symptom_matcher.py --messages 5000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'rasa', 'actions'))
+
+from symptom_matcher import SymptomMatcher, TRIEU_CHUNG_VARIANTS  # noqa: E402
+
+# Cùng thứ tự với scripts/generate_data.py (data/trieu_chung.json)
+TRIEU_CHUNG = [
+    'sot', 'ho', 'dau_dau', 'met_moi', 'dau_bung', 'dau_hong', 'buon_non',
+    'tieu_chay', 'phat_ban', 'kho_tho', 'dau_nguc', 'dau_khop', 'chong_mat',
+    'non_mua', 'so_mui'
+]
+NLU_PATH = os.path.join(os.path.dirname(__file__), '..', 'rasa', 'data', 'nlu.yml')
+
+TRICKY_MESSAGES = [
+    'tôi buồn nôn',
+    'tôi nôn nao và nôn mửa',
+    'hoa mắt, ho khan',
+    'họ bị sốt',
+    'khó thở_khó chịu',
+    'sốt39 độ',
+    'đau đầu dữ dội, đau đầu',
+    'mệt mỏi mệt lả',
+    'tôi bị nôn',
+    'nôn ra thức ăn và buồn nôn',
+    'ho-ho-ho',
+    'đi ngoài trời thì chóng mặt',
+    'mũi chảy, sổ mũi',
+    'không có triệu chứng gì',
+    '',
+]
+FILLER_WORDS = ['tôi', 'bị', 'và', 'thấy', 'hơi', 'rất', 'mấy ngày nay', 'kèm', 'có', 'hoặc', 'họ', 'nóng', 'khó', 'đau']
+SEPARATORS = [' ', ', ', ' và ', '. ', '-', '_', '']
+
+
+def legacy_match(text):
+    """Vòng lặp regex cũ của ActionChanDoanBenh."""
+    vector = []
+    detected = []
+    for tc in TRIEU_CHUNG:
+        found = False
+        for variant in TRIEU_CHUNG_VARIANTS[tc]:
+            if re.search(r'\b' + re.escape(variant) + r'\b', text):
+                found = True
+                detected.append(variant)
+                break
+        vector.append(1 if found else 0)
+    return vector, detected
+
+
+def load_nlu_examples():
+    examples = []
+    in_intent = False
+    with open(NLU_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith('- intent:'):
+                in_intent = stripped == '- intent: chan_doan_benh'
+            elif in_intent and stripped.startswith('- '):
+                examples.append(stripped[2:].lower())
+    return examples
+
+
+def random_message(rng):
+    variants = [variant for tc in TRIEU_CHUNG for variant in TRIEU_CHUNG_VARIANTS[tc]]
+    parts = [rng.choice(variants if rng.random() < 0.6 else FILLER_WORDS) for _ in range(rng.randint(1, 8))]
+    text = parts[0]
+    for part in parts[1:]:
+        text += rng.choice(SEPARATORS) + part
+    return text
+
+
+def time_per_message(func, messages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def run(n_messages, seed, repeat):
+    rng = random.Random(seed)
+    matcher = SymptomMatcher(TRIEU_CHUNG, TRIEU_CHUNG_VARIANTS)
+    messages = load_nlu_examples() + TRICKY_MESSAGES + [random_message(rng) for _ in range(n_messages)]
+
+    mismatches = 0
+    for message in messages:
+        expected = legacy_match(message)
+        actual = matcher.match(message)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"Khác kết quả: {message!r}\n  regex: {expected}\n  matcher: {actual}")
+    print(f"Số câu kiểm tra: {len(messages)}, khác kết quả: {mismatches}")
+
+    def legacy_cold(message):
+        # Cache của re chỉ giữ 512 pattern; mô phỏng trường hợp pattern phải biên dịch lại
+        re.purge()
+        return legacy_match(message)
+
+    legacy_us = time_per_message(legacy_match, messages, repeat)
+    cold_us = time_per_message(legacy_cold, messages[:500], 1)
+    matcher_us = time_per_message(matcher.match, messages, repeat)
+    print(f"Regex cũ (cache re còn nóng): {legacy_us:.1f} µs/câu")
+    print(f"Regex cũ (biên dịch lại pattern): {cold_us:.1f} µs/câu")
+    print(f"SymptomMatcher: {matcher_us:.1f} µs/câu (nhanh hơn {legacy_us / matcher_us:.1f} lần)")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(1 if run(args.messages, args.seed, args.repeat) else 0)
@@ -1,4 +1,21 @@
-import pandas as pd
+"""
+Sinh dữ liệu triệu chứng giả lập cho mô hình chẩn đoán.
+
+Mỗi bệnh chiếm một khối dòng liên tiếp; cả khối được rút trong một phép so sánh ma trận
+ngẫu nhiên với bảng xác suất TRIEU_CHUNG_BENH. Dữ liệu được chia thành các chunk có seed
+riêng (SeedSequence(seed).spawn), ghi lần lượt ra CSV/Parquet nên bộ nhớ không phụ thuộc
+số mẫu, và kết quả giống hệt nhau dù chạy tuần tự hay song song với --workers.
+
+Chạy từ thư mục chatbot_service:
+    python scripts/generate_data.py
+    python scripts/generate_data.py --samples 30000000 --workers 8 --output data/symptoms_data.parquet
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
 # Định nghĩa triệu chứng và bệnh
@@ -67,26 +84,135 @@ TRIEU_CHUNG_BENH = {
     }
 }
 
-# Tạo dữ liệu
-np.random.seed(42)
-n_samples = 15000
-samples_per_benh = n_samples // len(BENH)  # 1000 mẫu mỗi bệnh
-
-data = {tc: [] for tc in TRIEU_CHUNG}
-data['benh'] = []
-
-for benh in BENH:
-    for _ in range(samples_per_benh):
-        # Tạo vector triệu chứng cho bệnh
-        trieu_chung_vector = {
-            tc: 1 if np.random.rand() < TRIEU_CHUNG_BENH[benh].get(tc, 0) else 0
-            for tc in TRIEU_CHUNG
-        }
-        for tc in TRIEU_CHUNG:
-            data[tc].append(trieu_chung_vector[tc])
-        data['benh'].append(benh)
-
-# Lưu dữ liệu
-df = pd.DataFrame(data)
-df.to_csv('data/symptoms_data.csv', index=False)
-print(f"Đã tạo symptoms_data.csv với {n_samples} mẫu, mỗi bệnh {samples_per_benh} mẫu")
\ No newline at end of file
+# Ma trận xác suất (số bệnh x số triệu chứng) theo thứ tự BENH, TRIEU_CHUNG
+XAC_SUAT = np.array([[TRIEU_CHUNG_BENH[benh].get(tc, 0) for tc in TRIEU_CHUNG] for benh in BENH])
+# Dòng CSV đã mã hóa sẵn phần cuối ",<bệnh>\n" cho từng bệnh
+BENH_CSV = [f"{benh}\n".encode('utf-8') for benh in BENH]
+
+
+def generate_chunk(seed_sequence, start, stop, samples_per_benh):
+    """Sinh các dòng [start, stop) của tập dữ liệu: (ma trận triệu chứng uint8, chỉ số bệnh)."""
+    rng = np.random.default_rng(seed_sequence)
+    benh_index = np.arange(start, stop) // samples_per_benh
+    trieu_chung = (rng.random((stop - start, len(TRIEU_CHUNG)), dtype=np.float32) < XAC_SUAT[benh_index]).astype(np.uint8)
+    return trieu_chung, benh_index
+
+
+def encode_csv(trieu_chung, benh_index):
+    """Mã hóa một chunk thành bytes CSV mà không đi qua pandas."""
+    digits = trieu_chung + ord('0')
+    # "0,1,...,0," : chữ số xen kẽ dấu phẩy, dấu phẩy cuối ngăn cách với cột benh
+    cells = np.empty((len(digits), 2 * len(TRIEU_CHUNG)), dtype=np.uint8)
+    cells[:, 0::2] = digits
+    cells[:, 1::2] = ord(',')
+    parts = []
+    # Các bệnh nằm thành khối liên tiếp nên chỉ cần ghép theo từng đoạn cùng bệnh
+    boundaries = np.flatnonzero(np.diff(benh_index)) + 1
+    for segment in np.split(np.arange(len(benh_index)), boundaries):
+        if not len(segment):
+            continue
+        suffix = np.frombuffer(BENH_CSV[benh_index[segment[0]]], dtype=np.uint8)
+        rows = np.empty((len(segment), cells.shape[1] + len(suffix)), dtype=np.uint8)
+        rows[:, :cells.shape[1]] = cells[segment]
+        rows[:, cells.shape[1]:] = suffix
+        parts.append(rows.tobytes())
+    return b''.join(parts)
+
+
+def build_chunk(task):
+    seed_sequence, start, stop, samples_per_benh, output_format = task
+    trieu_chung, benh_index = generate_chunk(seed_sequence, start, stop, samples_per_benh)
+    if output_format == 'csv':
+        return encode_csv(trieu_chung, benh_index)
+    return trieu_chung, benh_index
+
+
+def bounded_map(executor, fn, tasks, window):
+    """
+    Như executor.map nhưng chỉ giữ tối đa window chunk đang sinh hoặc chờ ghi.
+
+    executor.map submit mọi task ngay từ đầu và giữ kết quả đến khi được đọc, nên khi ghi chậm
+    hơn sinh thì bộ nhớ tăng theo số mẫu. Ở đây task mới chỉ được submit sau khi chunk cũ nhất
+    đã được trả về để ghi; thứ tự chunk được giữ nguyên.
+    """
+    pending = deque()
+    for task in tasks:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, task))
+    while pending:
+        yield pending.popleft().result()
+
+
+class CsvSink:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write((','.join(TRIEU_CHUNG + ['benh']) + '\n').encode('utf-8'))
+
+    def write(self, chunk):
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Ghi Parquet cần cài pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([(tc, pa.uint8()) for tc in TRIEU_CHUNG] + [('benh', pa.dictionary(pa.int8(), pa.string()))])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.benh = pa.array(BENH, type=pa.string())
+
+    def write(self, chunk):
+        trieu_chung, benh_index = chunk
+        columns = [self.pa.array(trieu_chung[:, i]) for i in range(len(TRIEU_CHUNG))]
+        columns.append(self.pa.DictionaryArray.from_arrays(self.pa.array(benh_index.astype(np.int8)), self.benh))
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def generate(output, n_samples, chunk_size, workers, seed):
+    samples_per_benh = n_samples // len(BENH)
+    total = samples_per_benh * len(BENH)
+    output_format = 'parquet' if output.endswith('.parquet') else 'csv'
+    starts = list(range(0, total, chunk_size))
+    # Seed mỗi chunk chỉ phụ thuộc seed gốc và vị trí chunk, không phụ thuộc số worker
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(starts))
+    tasks = [(seed_sequences[i], start, min(start + chunk_size, total), samples_per_benh, output_format)
+             for i, start in enumerate(starts)]
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    sink = ParquetSink(output) if output_format == 'parquet' else CsvSink(output)
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for chunk in bounded_map(executor, build_chunk, tasks, window=2 * workers):
+                    sink.write(chunk)
+        else:
+            for task in tasks:
+                sink.write(build_chunk(task))
+    finally:
+        sink.close()
+    return total, samples_per_benh
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=15000, help="Tổng số mẫu (chia đều cho các bệnh)")
+    parser.add_argument('--output', default='data/symptoms_data.csv', help="Tệp .csv hoặc .parquet")
+    parser.add_argument('--chunk-size', type=int, default=1000000, help="Số dòng mỗi chunk")
+    parser.add_argument('--workers', type=int, default=1, help="Số process sinh dữ liệu song song")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    total, samples_per_benh = generate(args.output, args.samples, args.chunk_size, args.workers, args.seed)
+    print(f"Đã tạo {args.output} với {total} mẫu, mỗi bệnh {samples_per_benh} mẫu "
+          f"({time.perf_counter() - started:.2f}s)")
@@ -0,0 +1,80 @@
+"""
+Load test cho /api/chat/ với một Rasa giả chạy cục bộ.
+
+Rasa giả trả lời sau --delay giây và đếm số request đang xử lý đồng thời.
+Nếu proxy không chặn event loop, N request mất khoảng ceil(N / RASA_MAX_CONCURRENCY) * delay giây
+thay vì N * delay như khi xử lý tuần tự.
+
+Chạy từ thư mục chatbot_service:
+    python scripts/load_test_chat.py --requests 200 --delay 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def build_stub_rasa(delay, stats):
+    stub = FastAPI()
+
+    @stub.post("/webhooks/rest/webhook")
+    async def webhook(payload: dict):
+        stats['in_flight'] += 1
+        stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+        try:
+            await asyncio.sleep(delay)
+            return [{"recipient_id": payload.get("sender"), "text": "Bạn có thể mắc Cảm cúm."}]
+        finally:
+            stats['in_flight'] -= 1
+
+    return stub
+
+
+async def run(n_requests, delay, port):
+    stats = {'in_flight': 0, 'max_in_flight': 0}
+    server = uvicorn.Server(uvicorn.Config(build_stub_rasa(delay, stats), host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    os.environ["RASA_WEBHOOK_URL"] = f"http://127.0.0.1:{port}/webhooks/rest/webhook"
+    import main
+    main.logger.setLevel("WARNING")
+    logging.getLogger("httpx").setLevel("WARNING")
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://chatbot") as client:
+            async def one(i):
+                response = await client.post("/api/chat/", json={"patient_id": i, "message": "Tôi bị sốt và ho"})
+                return response.status_code
+
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(one(i) for i in range(n_requests)))
+            elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    await server_task
+
+    ok = sum(1 for status in statuses if status == 200)
+    print(f"Số request: {n_requests} (thành công {ok}), Rasa giả trả lời sau {delay:.3f}s")
+    print(f"Tổng thời gian: {elapsed:.3f}s, thông lượng: {n_requests / elapsed:.1f} req/s")
+    print(f"Nếu xử lý tuần tự: {n_requests * delay:.3f}s (nhanh hơn {n_requests * delay / elapsed:.1f} lần)")
+    print(f"Số request đồng thời tối đa tại Rasa giả: {stats['max_in_flight']} (giới hạn {main.RASA_MAX_CONCURRENCY})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=15005)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.delay, args.port))
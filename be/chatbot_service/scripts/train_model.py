@@ -1,63 +1,280 @@
+"""
+Huấn luyện mô hình chẩn đoán bệnh (RandomForest) với tìm kiếm tham số successive halving.
+
+- Dữ liệu đã đọc, tập train/test và cách chia fold được cache trong data/train_cache/<fingerprint>/,
+  fingerprint là SHA-256 nội dung tệp dữ liệu: chạy lại với cùng dữ liệu không phải đọc CSV lại.
+- Successive halving: mọi ứng viên trong lưới được đánh giá trên một phần nhỏ tập train với ít cây,
+  mỗi vòng chỉ giữ 1/factor ứng viên tốt nhất và tăng số mẫu (và số cây) lên factor lần,
+  vòng cuối dùng toàn bộ tập train với đúng n_estimators của ứng viên.
+- Điểm của từng (ứng viên, số mẫu) được ghi vào checkpoint ngay sau khi tính: lần chạy bị ngắt
+  sẽ tiếp tục từ chỗ dừng, lần chạy lại với cùng dữ liệu gần như không phải fit lại.
+- --compare-grid chạy thêm GridSearchCV đầy đủ như trước để so thời gian và kết quả.
+
+Chạy từ thư mục chatbot_service:
+    python scripts/train_model.py --lookup-table
+"""
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split, GridSearchCV, PredefinedSplit, StratifiedKFold, cross_val_score
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+import argparse
+import hashlib
+import itertools
+import math
 import pickle
 import json
+import os
+import sys
+import time
 import numpy as np
 
-# Đọc dữ liệu
-data = pd.read_csv('data/symptoms_data.csv')
-
-# Kiểm tra dữ liệu
-if data.isnull().values.any():
-    raise ValueError("Dữ liệu chứa giá trị null")
-if 'benh' not in data.columns:
-    raise ValueError("Dữ liệu không có cột 'benh'")
-
-X = data.drop('benh', axis=1)
-y = data['benh']
-
-# Lưu danh sách triệu chứng
-TRIEU_CHUNG = X.columns.tolist()
-with open('data/trieu_chung.json', 'w') as f:
-    json.dump(TRIEU_CHUNG, f)
-print(f"Đã lưu danh sách triệu chứng vào data/trieu_chung.json")
-
-# Chia dữ liệu
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'rasa', 'actions'))
+from forest_model import export_forest
+from lookup_table import LookupTable, build_lookup_table
 
-# Tối ưu hóa tham số bằng GridSearchCV
-param_grid = {
+PARAM_GRID = {
     'n_estimators': [100, 200, 300],
     'max_depth': [10, 20, 30, None],
     'min_samples_split': [2, 5, 10],
     'min_samples_leaf': [1, 2, 4]
 }
-rf = RandomForestClassifier(random_state=42)
-grid_search = GridSearchCV(rf, param_grid, cv=5, scoring='accuracy', n_jobs=-1)
-grid_search.fit(X_train, y_train)
-
-# Lấy mô hình tốt nhất
-model = grid_search.best_estimator_
-print(f"Tham số tốt nhất: {grid_search.best_params_}")
-
-# Đánh giá mô hình
-y_pred = model.predict(X_test)
-accuracy = accuracy_score(y_test, y_pred)
-print(f"Độ chính xác mô hình: {accuracy:.2f}")
-print("Báo cáo phân loại:")
-print(classification_report(y_test, y_pred))
-
-# Đánh giá độ nhạy và độ đặc hiệu
-cm = confusion_matrix(y_test, y_pred)
-labels = sorted(set(y_test))
-for i, label in enumerate(labels):
-    sensitivity = cm[i, i] / cm[i, :].sum() if cm[i, :].sum() > 0 else 0
-    specificity = (cm.sum() - cm[i, :].sum() - cm[:, i].sum() + cm[i, i]) / (cm.sum() - cm[i, :].sum()) if (cm.sum() - cm[i, :].sum()) > 0 else 0
-    print(f"Bệnh {label}: Độ nhạy = {sensitivity:.2f}, Độ đặc hiệu = {specificity:.2f}")
-
-# Lưu mô hình
-with open('data/model.pkl', 'wb') as f:
-    pickle.dump(model, f)
-print("Đã lưu mô hình vào data/model.pkl")
\ No newline at end of file
+CV = 5
+# Số cây tối thiểu khi đánh giá ở các vòng đầu của successive halving
+MIN_TREES = 20
+RANDOM_STATE = 42
+CACHE_DIR = 'data/train_cache'
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def save_atomic(path, write):
+    # Ghi ra tệp tạm rồi đổi tên: bị ngắt giữa chừng không để lại tệp hỏng
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def load_dataset(data_path, cache_dir):
+    """Trả về (X uint8, y mã bệnh, danh sách bệnh, danh sách triệu chứng), đọc từ cache nếu có."""
+    dataset_path = os.path.join(cache_dir, 'dataset.npz')
+    if os.path.exists(dataset_path):
+        cached = np.load(dataset_path, allow_pickle=False)
+        return cached['X'], cached['y'], cached['classes'].tolist(), cached['feature_names'].tolist()
+
+    if data_path.endswith('.parquet'):
+        data = pd.read_parquet(data_path)
+    else:
+        data = pd.read_csv(data_path)
+    # Kiểm tra dữ liệu
+    if data.isnull().values.any():
+        raise ValueError("Dữ liệu chứa giá trị null")
+    if 'benh' not in data.columns:
+        raise ValueError("Dữ liệu không có cột 'benh'")
+
+    features = data.drop('benh', axis=1)
+    X = features.to_numpy(dtype=np.uint8)
+    classes, y = np.unique(data['benh'].to_numpy(dtype=str), return_inverse=True)
+    feature_names = features.columns.tolist()
+    os.makedirs(cache_dir, exist_ok=True)
+    save_atomic(dataset_path, lambda f: np.savez(f, X=X, y=y, classes=classes, feature_names=np.asarray(feature_names)))
+    return X, y, classes.tolist(), feature_names
+
+
+def load_split(y, cache_dir):
+    """Chia train/test (giống train_test_split trước đây), gán fold CV và hoán vị dùng để lấy tập con."""
+    split_path = os.path.join(cache_dir, 'split.npz')
+    if os.path.exists(split_path):
+        cached = np.load(split_path)
+        return cached['train_index'], cached['test_index'], cached['folds'], cached['permutation']
+
+    train_index, test_index = train_test_split(np.arange(len(y)), test_size=0.2, random_state=RANDOM_STATE)
+    folds = np.empty(len(train_index), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=CV, shuffle=True, random_state=RANDOM_STATE)
+    for fold, (_, fold_index) in enumerate(splitter.split(train_index, y[train_index])):
+        folds[fold_index] = fold
+    # Tập con ở mỗi vòng halving là tiền tố của hoán vị này, nên vòng sau chứa mẫu của vòng trước
+    permutation = np.random.default_rng(RANDOM_STATE).permutation(len(train_index))
+    save_atomic(split_path, lambda f: np.savez(f, train_index=train_index, test_index=test_index,
+                                               folds=folds, permutation=permutation))
+    return train_index, test_index, folds, permutation
+
+
+class SearchCheckpoint:
+    """Điểm CV của từng (số mẫu, tham số), lưu ra JSON sau mỗi lần đánh giá."""
+
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+        self.scores = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('config') == config:
+                self.scores = saved['scores']
+
+    @staticmethod
+    def key(params, n_resources):
+        return f"{n_resources}|{json.dumps(params, sort_keys=True)}"
+
+    def get(self, params, n_resources):
+        return self.scores.get(self.key(params, n_resources))
+
+    def set(self, params, n_resources, score):
+        self.scores[self.key(params, n_resources)] = score
+        payload = json.dumps({'config': self.config, 'scores': self.scores}).encode('utf-8')
+        save_atomic(self.path, lambda f: f.write(payload))
+
+
+def evaluate(params, X, y, folds, n_jobs):
+    estimator = RandomForestClassifier(random_state=RANDOM_STATE, **params)
+    scores = cross_val_score(estimator, X, y, cv=PredefinedSplit(folds), scoring='accuracy', n_jobs=n_jobs)
+    return float(scores.mean())
+
+
+def halving_schedule(n_candidates, n_samples, factor, min_resources):
+    """Số mẫu ở mỗi vòng: vòng cuối dùng toàn bộ, vòng đầu không ít hơn min_resources."""
+    n_rounds = 1
+    while (n_rounds < math.ceil(math.log(n_candidates, factor)) + 1
+           and n_samples // factor ** n_rounds >= min_resources):
+        n_rounds += 1
+    return [n_samples // factor ** (n_rounds - 1 - i) for i in range(n_rounds)]
+
+
+def successive_halving(candidates, X, y, folds, permutation, factor, min_resources, checkpoint, n_jobs):
+    stats = {'fits': 0, 'cached': 0}
+    remaining = list(range(len(candidates)))
+    schedule = halving_schedule(len(candidates), len(y), factor, min_resources)
+    max_trees = max(params['n_estimators'] for params in candidates)
+    scores = {}
+    for round_index, n_resources in enumerate(schedule):
+        subset = permutation[:n_resources]
+        # Số cây cũng tăng theo vòng như số mẫu: vòng đầu chỉ cần phân biệt độ sâu / số mẫu tách lá.
+        # Các ứng viên chỉ khác n_estimators trùng tham số hiệu lực nên chỉ được fit một lần
+        tree_cap = max(MIN_TREES, max_trees * n_resources // len(y))
+        round_start = time.perf_counter()
+        for i in remaining:
+            params = dict(candidates[i], n_estimators=min(candidates[i]['n_estimators'], tree_cap))
+            score = checkpoint.get(params, n_resources)
+            if score is None:
+                score = evaluate(params, X[subset], y[subset], folds[subset], n_jobs)
+                checkpoint.set(params, n_resources, score)
+                stats['fits'] += CV
+            else:
+                stats['cached'] += CV
+            scores[i] = score
+        # Hòa điểm thì ưu tiên ứng viên đứng trước trong lưới, để kết quả ổn định giữa các lần chạy
+        remaining.sort(key=lambda i: (-scores[i], i))
+        print(f"Vòng {round_index + 1}/{len(schedule)}: {len(remaining)} ứng viên x {n_resources} mẫu, tối đa {tree_cap} cây, "
+              f"tốt nhất {scores[remaining[0]]:.4f} ({time.perf_counter() - round_start:.1f}s)")
+        if round_index < len(schedule) - 1:
+            remaining = remaining[:max(1, math.ceil(len(remaining) / factor))]
+    best = remaining[0]
+    return candidates[best], scores[best], stats
+
+
+def report(model, X_test, y_test):
+    # Đánh giá mô hình
+    y_pred = model.predict(X_test)
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"Độ chính xác mô hình: {accuracy:.2f}")
+    print("Báo cáo phân loại:")
+    print(classification_report(y_test, y_pred))
+
+    # Đánh giá độ nhạy và độ đặc hiệu
+    cm = confusion_matrix(y_test, y_pred)
+    labels = sorted(set(y_test))
+    for i, label in enumerate(labels):
+        sensitivity = cm[i, i] / cm[i, :].sum() if cm[i, :].sum() > 0 else 0
+        specificity = (cm.sum() - cm[i, :].sum() - cm[:, i].sum() + cm[i, i]) / (cm.sum() - cm[i, :].sum()) if (cm.sum() - cm[i, :].sum()) > 0 else 0
+        print(f"Bệnh {label}: Độ nhạy = {sensitivity:.2f}, Độ đặc hiệu = {specificity:.2f}")
+    return accuracy
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data/symptoms_data.csv', help="Tệp .csv hoặc .parquet")
+    parser.add_argument('--factor', type=int, default=3, help="Mỗi vòng giữ 1/factor ứng viên, tăng số mẫu factor lần")
+    parser.add_argument('--min-resources', type=int, default=None,
+                        help="Số mẫu tối thiểu ở vòng đầu (mặc định 30 mẫu mỗi bệnh)")
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--compare-grid', action='store_true', help="Chạy thêm GridSearchCV đầy đủ để so sánh")
+    parser.add_argument('--lookup-table', action='store_true',
+                        help="Tính trước dự đoán cho toàn bộ 2^n vector triệu chứng vào data/model_lookup")
+    parser.add_argument('--top-k', type=int, default=3, help="Số chẩn đoán lưu cho mỗi vector trong bảng tra cứu")
+    args = parser.parse_args()
+
+    # Đọc dữ liệu (hoặc lấy từ cache theo fingerprint)
+    started = time.perf_counter()
+    fingerprint = file_fingerprint(args.data)
+    cache_dir = os.path.join(CACHE_DIR, fingerprint)
+    X, y, classes, TRIEU_CHUNG = load_dataset(args.data, cache_dir)
+    train_index, test_index, folds, permutation = load_split(y, cache_dir)
+    load_time = time.perf_counter() - started
+    print(f"Dữ liệu {args.data}: {len(y)} mẫu, fingerprint {fingerprint} ({load_time:.2f}s)")
+
+    # Lưu danh sách triệu chứng
+    with open('data/trieu_chung.json', 'w') as f:
+        json.dump(TRIEU_CHUNG, f)
+    print(f"Đã lưu danh sách triệu chứng vào data/trieu_chung.json")
+
+    X_train, y_train = X[train_index], y[train_index]
+    names = np.asarray(classes, dtype=object)
+    X_test, y_test = pd.DataFrame(X[test_index], columns=TRIEU_CHUNG), names[y[test_index]]
+
+    # Tìm tham số bằng successive halving, điểm được cache theo fingerprint và cấu hình tìm kiếm
+    candidates = [dict(zip(PARAM_GRID, values)) for values in itertools.product(*PARAM_GRID.values())]
+    min_resources = args.min_resources or 30 * len(classes)
+    config = {'param_grid': PARAM_GRID, 'cv': CV, 'random_state': RANDOM_STATE, 'factor': args.factor,
+              'min_resources': min_resources}
+    config_hash = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:8]
+    checkpoint = SearchCheckpoint(os.path.join(cache_dir, f'search_{config_hash}.json'), config)
+    search_start = time.perf_counter()
+    best_params, best_score, stats = successive_halving(candidates, X_train, y_train, folds, permutation,
+                                                        args.factor, min_resources, checkpoint, args.n_jobs)
+    search_time = time.perf_counter() - search_start
+    print(f"Tham số tốt nhất: {best_params} (CV {best_score:.4f})")
+
+    # Huấn luyện lại mô hình tốt nhất trên toàn bộ tập train, giữ tên cột và tên bệnh như trước
+    model = RandomForestClassifier(random_state=RANDOM_STATE, **best_params)
+    model.fit(pd.DataFrame(X_train, columns=TRIEU_CHUNG), names[y_train])
+    accuracy = report(model, X_test, y_test)
+
+    if args.compare_grid:
+        grid_start = time.perf_counter()
+        grid_search = GridSearchCV(RandomForestClassifier(random_state=RANDOM_STATE), PARAM_GRID, cv=CV,
+                                   scoring='accuracy', n_jobs=args.n_jobs)
+        grid_search.fit(X_train, names[y_train])
+        grid_time = time.perf_counter() - grid_start
+        grid_accuracy = accuracy_score(y_test, grid_search.best_estimator_.predict(X_test.to_numpy()))
+        print("Báo cáo thời gian:")
+        print(f"  Đọc dữ liệu: {load_time:.2f}s")
+        print(f"  Successive halving: {search_time:.1f}s, {stats['fits']} lần fit, {stats['cached']} lấy từ cache, "
+              f"độ chính xác test {accuracy:.4f}, tham số {best_params}")
+        print(f"  GridSearchCV: {grid_time:.1f}s, {len(candidates) * CV} lần fit, "
+              f"độ chính xác test {grid_accuracy:.4f}, tham số {grid_search.best_params_}")
+    else:
+        print(f"Tìm kiếm tham số: {search_time:.1f}s, {stats['fits']} lần fit, {stats['cached']} lấy từ cache")
+
+    # Lưu mô hình
+    with open('data/model.pkl', 'wb') as f:
+        pickle.dump(model, f)
+    print("Đã lưu mô hình vào data/model.pkl")
+
+    # Xuất mô hình dạng mảng node phẳng (mmap) cho action server
+    export_forest(model, 'data/model_forest', feature_names=TRIEU_CHUNG)
+    print("Đã xuất mô hình dạng mảng vào data/model_forest")
+
+    # Bảng tra cứu O(1) cho toàn bộ không gian triệu chứng (tùy chọn)
+    if args.lookup_table:
+        build_lookup_table(model, 'data/model_lookup', feature_names=TRIEU_CHUNG, top_k=args.top_k)
+        mismatches = LookupTable.load('data/model_lookup').verify(model)
+        if mismatches:
+            raise ValueError(f"Bảng tra cứu khác mô hình ở {mismatches} vector")
+        print(f"Đã lưu bảng tra cứu {2 ** len(TRIEU_CHUNG)} vector vào data/model_lookup")
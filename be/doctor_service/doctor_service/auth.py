@@ -0,0 +1,140 @@
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+VALID_ROLES = frozenset(['patient', 'admin', 'doctor', 'nurse', 'pharmacist', 'lab_technician', 'insurance_provider'])
+
+
+class TokenUser:
+    """
+    User nhẹ dựng từ claims của JWT (không truy vấn database).
+    Một instance được dùng lại cho mọi request mang cùng token.
+    """
+    __slots__ = ('id', 'username', 'email', 'role', 'is_active')
+
+    is_authenticated = True
+    is_anonymous = False
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, user_id, username, email, role, is_active):
+        self.id = user_id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.username or f"User {self.id}"
+
+
+class ClaimsCache:
+    """
+    Cache LRU có TTL cho token đã xác thực, khóa là chữ ký của token.
+    Mỗi entry hết hạn ở thời điểm sớm hơn giữa (now + ttl) và claim 'exp' của token.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        signature = raw_token.rsplit(b'.', 1)[-1]
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is None:
+                return None
+            token, user, validated_token, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[signature]
+                return None
+            # Chữ ký trùng nhưng header/payload khác thì không dùng cache
+            if not hmac.compare_digest(token, raw_token):
+                return None
+            self._entries.move_to_end(signature)
+            return user, validated_token
+
+    def set(self, raw_token, user, validated_token):
+        expires_at = time.time() + self.ttl
+        exp = validated_token.get('exp')
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        signature = raw_token.rsplit(b'.', 1)[-1]
+        with self._lock:
+            self._entries[signature] = (raw_token, user, validated_token, expires_at)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+claims_cache = ClaimsCache(
+    max_size=getattr(settings, 'JWT_CLAIMS_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'JWT_CLAIMS_CACHE_TTL', 300),
+)
+
+
+class CustomJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        # Token đã xác thực trước đó: bỏ qua bước kiểm tra chữ ký
+        cached = claims_cache.get(raw_token)
+        if cached is not None:
+            return cached
+
+        try:
+            validated_token = self.get_validated_token(raw_token)
+            user = self.get_user(validated_token)
+        except AuthenticationFailed:
+            if getattr(settings, 'JWT_INVALID_TOKEN_AS_ANONYMOUS', False):
+                # Service có endpoint AllowAny: token hết hạn/không hợp lệ được xử lý như request không có token
+                logger.debug("Invalid token ignored, request is treated as anonymous")
+                return None
+            raise
+        claims_cache.set(raw_token, user, validated_token)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get('id')  # Lấy id từ token
+        username = validated_token.get('username')
+        email = validated_token.get('email')
+        role = validated_token.get('role')
+        is_active = validated_token.get('is_active')
+
+        if not user_id:
+            logger.error("No user_id found in token payload")
+            raise AuthenticationFailed('No user_id in token')
+        if not role:
+            logger.error("No role found in token payload")
+            raise AuthenticationFailed('No role in token')
+        if not is_active:
+            logger.error("User is not active")
+            raise AuthenticationFailed('User is not active')
+        if role not in VALID_ROLES:
+            raise AuthenticationFailed('Invalid user role')
+
+        logger.debug(f"Authenticated user_id {user_id} with role {role}")
+        return TokenUser(user_id=user_id, username=username, email=email, role=role, is_active=is_active)
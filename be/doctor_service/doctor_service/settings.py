@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -90,6 +91,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Cho phép frontend đọc header phân trang
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count']
+
 ROOT_URLCONF = 'doctor_service.urls'
 
 TEMPLATES = [
@@ -126,6 +130,22 @@ DATABASES = {
 }
 
 
+# Cache danh bạ bác sĩ (doctors/cache.py) trên Redis dùng chung trong docker-compose
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+        'KEY_PREFIX': 'doctor_service',
+        # Redis chậm/không kết nối được thì đọc thẳng database thay vì giữ request
+        'OPTIONS': {'socket_connect_timeout': 0.5, 'socket_timeout': 0.5},
+    }
+}
+# Thời gian sống của một entry (giây), khóa chống stampede và thời gian chờ request đang dựng entry
+DOCTOR_CACHE_TIMEOUT = 300
+DOCTOR_CACHE_LOCK_TIMEOUT = 10
+DOCTOR_CACHE_LOCK_WAIT = 2.0
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -145,10 +165,14 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],  # Bỏ tất cả lớp xác thực
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'doctor_service.auth.CustomJWTAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Cho phép tất cả yêu cầu mà không cần quyền
     ],
+    # Phân trang cursor dùng chung cho mọi endpoint list
+    'DEFAULT_PAGINATION_CLASS': 'doctor_service.pagination.KeysetCursorPagination',
 }
 
 SIMPLE_JWT = {
@@ -159,6 +183,13 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Cache claims của JWT đã xác thực (số token tối đa, thời gian sống tính bằng giây)
+JWT_CLAIMS_CACHE_SIZE = 1024
+JWT_CLAIMS_CACHE_TTL = 300
+# Token hết hạn/không hợp lệ được coi như không có token thay vì trả về 401,
+# giữ hành vi trước khi service bật xác thực JWT (mọi endpoint đều AllowAny)
+JWT_INVALID_TOKEN_AS_ANONYMOUS = True
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -184,3 +215,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 USER_SERVICE_URL = 'http://user_service:8000/api/users/'
 PATIENT_SERVICE_URL = 'http://patient_service:8000/api/'
+
+# Connection pool, timeout (connect, read), retry và circuit breaker cho lời gọi sang patient_service
+PATIENT_SERVICE_POOL_SIZE = 10
+PATIENT_SERVICE_TIMEOUT = (1.0, 3.0)
+PATIENT_SERVICE_RETRIES = 2
+PATIENT_SERVICE_BACKOFF = 0.2
+PATIENT_SERVICE_BREAKER_THRESHOLD = 5
+PATIENT_SERVICE_BREAKER_RESET = 30
+
+# Chỉ mục slot khám (doctors/schedule.py): giờ trong DoctorProfile.schedule là giờ địa phương của phòng khám
+SCHEDULE_TIME_ZONE = 'Asia/Ho_Chi_Minh'
+# Độ dài một slot khám (phút). Dùng chung với patient_service: cả hai đọc biến môi trường APPOINTMENT_SLOT_MINUTES
+# (docker-compose.yml đặt một lần cho cả hai service) và chia slot trên cùng lưới epoch UTC
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', 30))
+# Số ngày tới được sinh slot trước; lệnh refresh_slots chạy hằng ngày để đẩy khoảng này về phía trước
+SLOT_HORIZON_DAYS = 28
+# Số slot tối đa trả về cho một lần gọi /api/doctors/free_slots/
+FREE_SLOTS_MAX_RESULTS = 500
@@ -0,0 +1,149 @@
+# Cache read-through cho danh bạ bác sĩ (DoctorProfileViewSet), dùng Redis qua django.core.cache
+import hashlib
+import json
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'doctors'
+VERSION_KEY = f'{PREFIX}:version'
+STATS_KEYS = {name: f'{PREFIX}:stats:{name}' for name in ('hits', 'misses', 'lock_waits')}
+# Header của response gốc được lưu cùng entry (phân trang: trang kế tiếp và tổng số bản ghi)
+CACHED_HEADERS = ('Link', 'X-Total-Count')
+# Đổi khi cấu trúc entry thay đổi, để worker mới không đọc entry kiểu cũ còn trong Redis
+ENTRY_FORMAT = 2
+
+
+def _safe(operation, default=None):
+    # Redis lỗi thì đọc thẳng database thay vì trả lỗi cho client
+    try:
+        return operation()
+    except Exception as e:
+        logger.warning(f"Doctor cache unavailable: {str(e)}")
+        return default
+
+
+def directory_version():
+    """
+    Phiên bản hiện tại của danh bạ, là một phần của mọi cache key.
+
+    Đổi phiên bản là vô hiệu hóa toàn bộ entry cũ trong O(1) (entry cũ tự hết hạn theo TTL).
+    Giá trị ngẫu nhiên chứ không tăng dần, nên khi Redis đẩy key phiên bản ra ngoài thì
+    phiên bản mới vẫn không trùng với entry cũ.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_directory():
+    # Gọi từ signal post_save/post_delete của DoctorProfile
+    _safe(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None))
+
+
+def _count(name):
+    key = STATS_KEYS[name]
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key chưa có: add để không ghi đè giá trị do worker khác vừa tạo
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_stats():
+    values = _safe(lambda: cache.get_many(list(STATS_KEYS.values())), {})
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else None
+    return stats
+
+
+def make_etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+    return '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    # So sánh yếu (RFC 9110): bỏ tiền tố W/
+    return '*' in candidates or etag in [value[2:] if value.startswith('W/') else value for value in candidates]
+
+
+def _entry(response):
+    headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+    return make_etag(response.data), response.data, headers
+
+
+def _respond(request, entry, cache_status):
+    etag, data, headers = entry
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    else:
+        response = Response(data, headers=headers)
+    response['ETag'] = etag
+    response['X-Cache'] = cache_status
+    return response
+
+
+def _wait_for_entry(key):
+    # Worker khác đang dựng entry: chờ tối đa DOCTOR_CACHE_LOCK_WAIT giây rồi tự dựng
+    deadline = time.monotonic() + settings.DOCTOR_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cached_response(request, name, build):
+    """
+    Trả response cho một GET của danh bạ bác sĩ qua cache read-through.
+
+    - Key gồm phiên bản danh bạ, tên endpoint và URL đầy đủ (kể cả query string như cursor).
+    - Entry là (ETag, data, header phân trang); If-None-Match khớp ETag thì trả 304 không có body.
+      Header Link/X-Total-Count luôn được trả lại, kể cả với HIT và 304.
+    - Khi miss, chỉ request giữ được khóa (cache.add, tức SET NX) mới gọi build() và ghi cache;
+      các request khác cùng key chờ entry đó thay vì cùng lúc truy vấn database.
+    build() trả về Response 200; lỗi (ví dụ Http404) được để đi tiếp và không cache.
+    """
+    try:
+        url_hash = hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()
+        key = f'{PREFIX}:{directory_version()}:{ENTRY_FORMAT}:{name}:{url_hash}'
+        entry = cache.get(key)
+        if entry is not None:
+            _count('hits')
+            return _respond(request, entry, 'HIT')
+        _count('misses')
+        lock_key = f'{key}:lock'
+        locked = cache.add(lock_key, 1, timeout=settings.DOCTOR_CACHE_LOCK_TIMEOUT)
+        if not locked:
+            _count('lock_waits')
+            entry = _wait_for_entry(key)
+            if entry is not None:
+                return _respond(request, entry, 'HIT')
+    except Exception as e:
+        logger.warning(f"Doctor cache unavailable: {str(e)}")
+        return _respond(request, _entry(build()), 'BYPASS')
+
+    try:
+        entry = _entry(build())
+        _safe(lambda: cache.set(key, entry, timeout=settings.DOCTOR_CACHE_TIMEOUT))
+    finally:
+        if locked:
+            _safe(lambda: cache.delete(lock_key))
+    return _respond(request, entry, 'MISS')
@@ -0,0 +1,55 @@
+"""
+Đẩy chỉ mục slot khám về phía trước và dọn slot trống đã qua; chạy hằng ngày (cron):
+
+    python manage.py refresh_slots
+
+--reconcile đọc lại lịch hẹn của từng bác sĩ từ patient_service và áp lên chỉ mục,
+dùng để sửa các lần đồng bộ bị mất (patient_service không gọi được doctor_service):
+
+    python manage.py refresh_slots --reconcile
+"""
+import requests
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from doctors.clients import patient_client
+from doctors.models import DoctorProfile, DoctorSlot
+from doctors.schedule import apply_appointment, refresh_slots
+
+
+class Command(BaseCommand):
+    help = 'Sinh slot khám cho SLOT_HORIZON_DAYS ngày tới và xóa slot trống đã qua.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Áp lại toàn bộ lịch hẹn từ patient_service lên chỉ mục slot')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted, _ = DoctorSlot.objects.filter(end__lte=now, appointment_id__isnull=True).delete()
+        self.stdout.write(f'Đã xóa {deleted} slot trống đã qua')
+
+        created = removed = 0
+        for doctor in DoctorProfile.objects.iterator():
+            doctor_created, doctor_removed = refresh_slots(doctor, now=now)
+            created += doctor_created
+            removed += doctor_removed
+            if options['reconcile']:
+                self.reconcile(doctor)
+        self.stdout.write(f'Đã thêm {created} slot, xóa {removed} slot không còn trong lịch làm việc')
+
+    def reconcile(self, doctor):
+        try:
+            response = patient_client.get(f'appointments/by_doctorId/{doctor.user_id}/')
+        except requests.RequestException as e:
+            self.stderr.write(f'Bỏ qua bác sĩ {doctor.user_id}: {e}')
+            return
+        if response.status_code == 404:
+            # patient_service trả 404 khi bác sĩ chưa có lịch hẹn nào
+            return
+        if response.status_code != 200:
+            self.stderr.write(f'Bỏ qua bác sĩ {doctor.user_id}: patient_service trả về {response.status_code}')
+            return
+        for appointment in response.json():
+            result = apply_appointment(doctor, appointment['id'], appointment['appointment_date'], appointment['status'])
+            if result == 'conflict':
+                self.stderr.write(f"Lịch hẹn {appointment['id']} trùng slot với lịch hẹn khác của bác sĩ {doctor.user_id}")
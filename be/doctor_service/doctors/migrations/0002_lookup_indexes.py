@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction,
+    # đổi lại bảng không bị khóa ghi trong lúc tạo index trên dữ liệu lớn.
+    atomic = False
+
+    dependencies = [
+        ('doctors', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='diagnosis',
+            index=models.Index(fields=['patient_id', 'diagnosis_date'], name='diag_patient_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='diagnosis',
+            index=models.Index(fields=['-created_at', '-id'], name='diag_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='doctorprofile',
+            index=models.Index(fields=['-created_at', '-id'], name='doctor_created_idx'),
+        ),
+    ]
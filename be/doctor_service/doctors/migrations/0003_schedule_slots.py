@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0002_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_rules', to='doctors.doctorprofile')),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DoctorSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialty', models.CharField(max_length=100)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('appointment_id', models.IntegerField(blank=True, null=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='doctors.doctorprofile')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('appointment_id__isnull', True)), fields=['specialty', 'start', 'doctor'], name='slot_free_specialty_idx'), models.Index(condition=models.Q(('appointment_id__isnull', False)), fields=['appointment_id'], name='slot_appointment_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='doctorslot',
+            constraint=models.UniqueConstraint(fields=('doctor', 'start'), name='slot_doctor_start_uniq'),
+        ),
+    ]
@@ -14,6 +14,12 @@ class DoctorProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Phục vụ phân trang cursor (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='doctor_created_idx'),
+        ]
+
     def __str__(self):
         return f"Doctor {self.user_id} - {self.specialty}"
 
@@ -30,5 +36,59 @@ class Diagnosis(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # get_by_patient_id: lọc theo patient_id, sắp xếp theo ngày chẩn đoán
+            models.Index(fields=['patient_id', 'diagnosis_date'], name='diag_patient_date_idx'),
+            models.Index(fields=['-created_at', '-id'], name='diag_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Diagnosis for Patient {self.patient_id} by Doctor {self.doctor.user_id}"
+
+class ScheduleRule(models.Model):
+    # Ca làm việc lặp lại hằng tuần, phân tích từ DoctorProfile.schedule (xem doctors/schedule.py)
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='schedule_rules')
+    # Thứ trong tuần theo datetime.weekday(): 0 = thứ 2, 6 = chủ nhật
+    weekday = models.PositiveSmallIntegerField()
+    # Giờ bắt đầu/kết thúc theo giờ địa phương (settings.SCHEDULE_TIME_ZONE)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+
+    def __str__(self):
+        return f"Doctor {self.doctor.user_id} - {self.weekday} {self.start_time}-{self.end_time}"
+
+class DoctorSlot(models.Model):
+    # Slot khám tính trước từ ScheduleRule cho SLOT_HORIZON_DAYS ngày tới
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='slots')
+    # Sao chép từ DoctorProfile.specialty để tìm slot trống theo chuyên khoa không cần join
+    specialty = models.CharField(max_length=100)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    # ID lịch hẹn (patient_service) đang giữ slot; NULL nghĩa là slot còn trống
+    appointment_id = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'start'], name='slot_doctor_start_uniq'),
+        ]
+        indexes = [
+            # free_slots: slot trống theo chuyên khoa trong khoảng thời gian (chỉ index các slot trống)
+            models.Index(
+                fields=['specialty', 'start', 'doctor'],
+                name='slot_free_specialty_idx',
+                condition=models.Q(appointment_id__isnull=True),
+            ),
+            # Giải phóng slot khi lịch hẹn bị hủy hoặc đổi giờ
+            models.Index(
+                fields=['appointment_id'],
+                name='slot_appointment_idx',
+                condition=models.Q(appointment_id__isnull=False),
+            ),
+        ]
+
     def __str__(self):
-        return f"Diagnosis for Patient {self.patient_id} by Doctor {self.doctor.user_id}"
\ No newline at end of file
+        return f"Slot {self.start} of Doctor {self.doctor.user_id}"
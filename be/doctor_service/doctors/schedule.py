@@ -0,0 +1,230 @@
+# Phân tích lịch làm việc dạng text và duy trì chỉ mục slot khám của bác sĩ
+import logging
+import re
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DoctorSlot, ScheduleRule
+
+logger = logging.getLogger(__name__)
+
+# Một ca làm việc lặp lại hằng tuần; weekday theo datetime.weekday() (0 = thứ 2)
+Rule = namedtuple('Rule', ['weekday', 'start_time', 'end_time'])
+
+WEEKDAYS = {
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+    't2': 0, 't3': 1, 't4': 2, 't5': 3, 't6': 4, 't7': 5, 'cn': 6,
+}
+# Thứ viết bằng chữ tiếng Việt được đổi về dạng t2..t7/cn trước khi phân tích
+VIETNAMESE_DAYS = [
+    (re.compile(r'th[ứu]\s*(hai|ba|tư|năm|sáu|bảy)'), lambda m: 't' + str('hai ba tư năm sáu bảy'.split().index(m.group(1)) + 2)),
+    (re.compile(r'thứ\s*([2-7])'), lambda m: 't' + m.group(1)),
+    # "thu" không dấu cũng là Thursday: chỉ đổi khi số phía sau không phải giờ ("thu 2pm", "thu 2:00")
+    (re.compile(r'thu\s*([2-7])(?!\d|:\d|\s*h|\s*[ap]m)'), lambda m: 't' + m.group(1)),
+    (re.compile(r'ch[ủu]\s*nh[ậa]t'), lambda m: 'cn'),
+    (re.compile(r'daily|every\s*day|h[ằà]ng ngày|mỗi ngày'), lambda m: 'mon-sun'),
+]
+
+DAY = r'(?:mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?|t[2-7]|cn)'
+CLOCK = r'(\d{1,2})(?:[:h](\d{2})|h)?\s*([ap]m)?'
+CLOCK_PATTERN = re.compile(CLOCK)
+RANGE_SEPARATOR = r'\s*(?:-|–|to|đến)\s*'
+TOKEN = re.compile(
+    rf'(?<![a-z0-9])(?P<day_from>{DAY})(?:{RANGE_SEPARATOR}(?P<day_to>{DAY}))?(?![a-z])'
+    rf'|(?<![\d:])(?P<time_from>{CLOCK}){RANGE_SEPARATOR}(?P<time_to>{CLOCK})'
+)
+
+
+def _to_time(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem == 'am' and hour == 12:
+        hour = 0
+    elif meridiem == 'pm' and hour < 12:
+        hour += 12
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Giờ không hợp lệ: {hour}:{minute:02d}")
+    return time(hour, minute)
+
+
+def _parse_time_range(match):
+    start_hour, start_minute, start_meridiem = CLOCK_PATTERN.match(match.group('time_from')).groups()
+    end_hour, end_minute, end_meridiem = CLOCK_PATTERN.match(match.group('time_to')).groups()
+    end = _to_time(end_hour, end_minute, end_meridiem)
+    if start_meridiem is None and end_meridiem is not None:
+        # "1-5PM": giờ bắt đầu dùng chung AM/PM với giờ kết thúc, trừ khi như vậy vượt quá giờ kết thúc ("9-5PM")
+        start = _to_time(start_hour, start_minute, end_meridiem)
+        if start >= end:
+            start = _to_time(start_hour, start_minute, 'am')
+    else:
+        start = _to_time(start_hour, start_minute, start_meridiem)
+    return start, end
+
+
+def _weekday(token):
+    return WEEKDAYS[token] if token in WEEKDAYS else WEEKDAYS[token[:3]]
+
+
+def _day_range(match):
+    first = _weekday(match.group('day_from'))
+    if match.group('day_to') is None:
+        return [first]
+    last = _weekday(match.group('day_to'))
+    # Cho phép khoảng vòng qua cuối tuần, ví dụ "Sat-Mon"
+    return [(first + offset) % 7 for offset in range((last - first) % 7 + 1)]
+
+
+def parse_schedule(text):
+    """
+    Phân tích lịch làm việc dạng text thành danh sách Rule.
+
+    Hỗ trợ các dạng như "Mon-Fri, 9AM-5PM", "Mon, Wed 8:00-12:00, 13:00-17:00; Sat 8AM-11AM"
+    hoặc "Thứ 2 - Thứ 6: 8h-17h". Mỗi nhóm gồm các ngày đứng liền nhau rồi tới các khung giờ
+    áp dụng cho những ngày đó. Khung giờ qua nửa đêm và phần text không nhận ra được bị bỏ qua.
+    """
+    text = (text or '').lower()
+    for pattern, replacement in VIETNAMESE_DAYS:
+        text = pattern.sub(replacement, text)
+
+    rules = []
+    days, ranges, seen_time = [], [], False
+    for match in TOKEN.finditer(text):
+        if match.group('day_from'):
+            if seen_time:
+                # Ngày xuất hiện sau khung giờ: bắt đầu một nhóm mới
+                rules.extend(Rule(day, start, end) for day in days for start, end in ranges)
+                days, ranges, seen_time = [], [], False
+            days.extend(_day_range(match))
+            continue
+        seen_time = True
+        try:
+            start, end = _parse_time_range(match)
+        except ValueError as e:
+            logger.warning(f"Bỏ qua khung giờ '{match.group(0)}' trong lịch '{text}': {e}")
+            continue
+        if start >= end:
+            logger.warning(f"Bỏ qua khung giờ '{match.group(0)}' trong lịch '{text}': giờ kết thúc không sau giờ bắt đầu")
+            continue
+        ranges.append((start, end))
+    rules.extend(Rule(day, start, end) for day in days for start, end in ranges)
+    # Bỏ trùng nhưng giữ thứ tự xuất hiện
+    return list(dict.fromkeys(rules))
+
+
+def schedule_zone():
+    # Giờ trong lịch làm việc là giờ địa phương của phòng khám, không phải TIME_ZONE của database
+    return ZoneInfo(getattr(settings, 'SCHEDULE_TIME_ZONE', settings.TIME_ZONE))
+
+
+def generate_slots(rules, first_day, days, slot_minutes, tz):
+    """
+    Sinh (start, end) của mọi slot slot_minutes phút trong các ngày [first_day, first_day + days).
+
+    Slot nằm trên cùng lưới với patients.models.slot_start_for của patient_service (bội số của
+    slot_minutes tính từ epoch UTC): ca bắt đầu lệch lưới (ví dụ 08:15) được làm tròn lên slot kế tiếp,
+    nên mỗi slot ở đây ứng với đúng một slot_start bên patient_service.
+    """
+    by_weekday = {}
+    for rule in rules:
+        by_weekday.setdefault(rule.weekday, []).append(rule)
+    step = timedelta(minutes=slot_minutes)
+    seconds = slot_minutes * 60
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        for rule in by_weekday.get(day.weekday(), []):
+            timestamp = int(datetime.combine(day, rule.start_time, tzinfo=tz).timestamp())
+            start = datetime.fromtimestamp(-(-timestamp // seconds) * seconds, tz=dt_timezone.utc).astimezone(tz)
+            end = datetime.combine(day, rule.end_time, tzinfo=tz)
+            # Phần lẻ cuối ca ngắn hơn một slot không được mở cho đặt lịch
+            while start + step <= end:
+                yield start, start + step
+                start += step
+
+
+@transaction.atomic
+def sync_schedule_rules(doctor):
+    """Ghi lại ScheduleRule của doctor theo DoctorProfile.schedule, chỉ ghi khi kết quả phân tích thay đổi."""
+    rules = sorted(parse_schedule(doctor.schedule))
+    current = [Rule(rule.weekday, rule.start_time, rule.end_time) for rule in doctor.schedule_rules.all()]
+    if sorted(current) != rules:
+        doctor.schedule_rules.all().delete()
+        ScheduleRule.objects.bulk_create([
+            ScheduleRule(doctor=doctor, weekday=rule.weekday, start_time=rule.start_time, end_time=rule.end_time)
+            for rule in rules
+        ])
+    return rules
+
+
+@transaction.atomic
+def refresh_slots(doctor, rules=None, now=None):
+    """
+    Đồng bộ slot từ thời điểm now tới hết SLOT_HORIZON_DAYS ngày với ScheduleRule của doctor.
+
+    Chỉ thêm slot còn thiếu và xóa slot trống không còn nằm trong lịch; slot đã có lịch hẹn
+    được giữ nguyên kể cả khi lịch làm việc đổi. Trả về (số slot thêm, số slot xóa).
+    """
+    now = now or timezone.now()
+    tz = schedule_zone()
+    if rules is None:
+        rules = [Rule(rule.weekday, rule.start_time, rule.end_time) for rule in doctor.schedule_rules.all()]
+    desired = {
+        start: end
+        for start, end in generate_slots(rules, now.astimezone(tz).date(), settings.SLOT_HORIZON_DAYS,
+                                         settings.APPOINTMENT_SLOT_MINUTES, tz)
+        if start >= now
+    }
+    existing = {
+        start: (end, appointment_id)
+        for start, end, appointment_id in DoctorSlot.objects.filter(doctor=doctor, start__gte=now)
+        .values_list('start', 'end', 'appointment_id')
+    }
+    stale = {start for start, (end, appointment_id) in existing.items() if appointment_id is None and desired.get(start) != end}
+    deleted = 0
+    if stale:
+        deleted, _ = DoctorSlot.objects.filter(doctor=doctor, start__in=stale, appointment_id__isnull=True).delete()
+    created = DoctorSlot.objects.bulk_create(
+        [
+            DoctorSlot(doctor=doctor, specialty=doctor.specialty, start=start, end=end)
+            for start, end in desired.items()
+            if start not in existing or start in stale
+        ],
+        ignore_conflicts=True,
+    )
+    # Chuyên khoa đổi thì cập nhật bản sao trên các slot sắp tới
+    DoctorSlot.objects.filter(doctor=doctor, start__gte=now).exclude(specialty=doctor.specialty).update(
+        specialty=doctor.specialty)
+    return len(created), deleted
+
+
+ACTIVE_APPOINTMENT_STATUSES = ('pending', 'confirmed')
+
+
+@transaction.atomic
+def apply_appointment(doctor, appointment_id, appointment_date, status):
+    """
+    Cập nhật chỉ mục slot theo trạng thái mới nhất của một lịch hẹn trong patient_service.
+
+    Gọi lại với cùng dữ liệu cho cùng kết quả, nên patient_service có thể gửi lại khi lỗi mạng.
+    Trả về 'booked', 'released', 'conflict' (slot đã thuộc lịch hẹn khác) hoặc 'no_slot'
+    (giờ hẹn nằm ngoài lịch làm việc hoặc ngoài khoảng SLOT_HORIZON_DAYS đã sinh slot).
+    """
+    active = status in ACTIVE_APPOINTMENT_STATUSES
+    slot_filter = {'doctor': doctor, 'start__lte': appointment_date, 'end__gt': appointment_date}
+    # Giải phóng slot cũ khi lịch hẹn bị hủy hoặc đổi giờ/bác sĩ
+    held = DoctorSlot.objects.filter(appointment_id=appointment_id)
+    if active:
+        held = held.exclude(**slot_filter)
+    held.update(appointment_id=None)
+    if not active:
+        return 'released'
+    # UPDATE có điều kiện: hai lịch hẹn cùng giờ chạy song song thì chỉ một lịch giữ được slot
+    if DoctorSlot.objects.filter(appointment_id__isnull=True, **slot_filter).update(appointment_id=appointment_id):
+        return 'booked'
+    holder = DoctorSlot.objects.filter(**slot_filter).values_list('appointment_id', flat=True).first()
+    if holder is None:
+        return 'no_slot'
+    return 'booked' if holder == appointment_id else 'conflict'
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DoctorProfile, Diagnosis
+from .models import DoctorProfile, Diagnosis, DoctorSlot
 import requests
 from django.conf import settings
 import logging
@@ -29,4 +29,37 @@ class DiagnosisSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def validate_user_id(self, value):
-        return value
\ No newline at end of file
+        return value
+
+class FreeSlotQuerySerializer(serializers.Serializer):
+    # Tham số của GET /api/doctors/free_slots/
+    specialty = serializers.CharField(max_length=100)
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, value):
+        return min(value, settings.FREE_SLOTS_MAX_RESULTS)
+
+    def validate(self, data):
+        if data['end'] <= data['start']:
+            raise serializers.ValidationError("end must be after start.")
+        return data
+
+class FreeSlotSerializer(serializers.ModelSerializer):
+    # doctor_user_id là giá trị dùng làm doctor_id khi tạo lịch hẹn ở patient_service
+    doctor_user_id = serializers.IntegerField(source='doctor.user_id', read_only=True)
+    clinic = serializers.CharField(source='doctor.clinic', read_only=True)
+
+    class Meta:
+        model = DoctorSlot
+        fields = ['id', 'doctor', 'doctor_user_id', 'clinic', 'specialty', 'start', 'end']
+        read_only_fields = fields
+
+class SlotSyncSerializer(serializers.Serializer):
+    # Trạng thái mới nhất của một lịch hẹn do patient_service gửi sang
+    appointment_id = serializers.IntegerField()
+    # user_id của bác sĩ, giống Appointment.doctor_id ở patient_service
+    doctor_id = serializers.IntegerField()
+    appointment_date = serializers.DateTimeField()
+    status = serializers.CharField(max_length=20)
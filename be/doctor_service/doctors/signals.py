@@ -0,0 +1,24 @@
+# Duy trì ScheduleRule, chỉ mục slot và cache danh bạ mỗi khi hồ sơ bác sĩ thay đổi
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_directory
+from .models import DoctorProfile
+from .schedule import refresh_slots, sync_schedule_rules
+
+
+@receiver(post_save, sender=DoctorProfile)
+def rebuild_schedule_index(sender, instance, raw=False, **kwargs):
+    # Bỏ qua khi nạp fixture (loaddata): chạy lệnh refresh_slots sau đó
+    if raw:
+        return
+    rules = sync_schedule_rules(instance)
+    refresh_slots(instance, rules)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def invalidate_directory_cache(sender, instance, **kwargs):
+    # Đổi phiên bản sau khi commit: request đọc ngay sau đó không nạp lại dữ liệu cũ vào cache
+    transaction.on_commit(invalidate_directory)
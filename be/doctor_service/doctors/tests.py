@@ -1,6 +1,24 @@
 # Tệp kiểm thử cho ứng dụng doctors
-from django.test import TestCase
-from rest_framework.test import APIClient
+import threading
+import time as time_module
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, time, timedelta
+from unittest import mock
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from rest_framework.response import Response
+from .models import DoctorProfile, Diagnosis, DoctorSlot
+from .clients import CircuitBreaker, CircuitOpenError, ServiceClient
+from .schedule import Rule, apply_appointment, parse_schedule, refresh_slots, schedule_zone
+from .cache import cached_response
+from rest_framework_simplejwt.tokens import AccessToken
+from doctor_service.auth import TokenUser
 
 class DoctorProfileTests(TestCase):
     def setUp(self):
@@ -17,4 +35,390 @@ class DiagnosisTests(TestCase):
 
     def test_create_diagnosis(self):
         # Viết test cases sau
-        pass
\ No newline at end of file
+        pass
+
+class DiagnosisQueryCountTests(TestCase):
+    # Mỗi endpoint tra cứu theo ID chỉ được phép chạy đúng một truy vấn
+    def setUp(self):
+        self.client = APIClient()
+        doctor = DoctorProfile.objects.create(user_id=21, specialty='Nội khoa', clinic='Bệnh viện A')
+        for day in range(1, 4):
+            Diagnosis.objects.create(
+                patient_id=11, doctor=doctor, diagnosis_date=f'2025-06-0{day}T09:00:00Z', description='Cảm cúm'
+            )
+
+    def test_get_by_patient_id(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/diagnoses/by_patientId/11/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_get_by_patient_id_not_found(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/diagnoses/by_patientId/999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class DiagnosisAccessTests(TestCase):
+    # Mỗi vai trò chỉ thấy các chuẩn đoán được phép qua list/retrieve
+    def setUp(self):
+        self.client = APIClient()
+        doctor = DoctorProfile.objects.create(user_id=21, specialty='Nội khoa', clinic='Bệnh viện A')
+        other = DoctorProfile.objects.create(user_id=22, specialty='Nhi khoa', clinic='Bệnh viện B')
+        self.own = Diagnosis.objects.create(patient_id=11, doctor=doctor, diagnosis_date='2025-06-01T09:00:00Z',
+                                            description='Cảm cúm')
+        self.foreign = Diagnosis.objects.create(patient_id=12, doctor=other, diagnosis_date='2025-06-02T09:00:00Z',
+                                                description='Viêm họng')
+
+    def login(self, user_id, role):
+        self.client.force_authenticate(TokenUser(user_id, f'{role}{user_id}', f'{role}{user_id}@example.com', role, True))
+
+    def patient_profile(self, status_code, patient_id=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = b'{"id": %d}' % patient_id if patient_id else b'{}'
+        return mock.patch('doctors.views.patient_client.get', return_value=response)
+
+    def list_ids(self):
+        return sorted(diagnosis['id'] for diagnosis in self.client.get('/api/diagnoses/').data)
+
+    def test_patient_sees_own_diagnoses(self):
+        self.login(101, 'patient')
+        with self.patient_profile(200, patient_id=11) as get:
+            self.assertEqual(self.list_ids(), [self.own.id])
+            self.assertEqual(self.client.get(f'/api/diagnoses/{self.own.id}/').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(f'/api/diagnoses/{self.foreign.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(get.call_args.args[0], 'patients/by_userId/101/')
+
+    def test_patient_without_profile_sees_nothing(self):
+        self.login(102, 'patient')
+        with self.patient_profile(404):
+            self.assertEqual(self.list_ids(), [])
+
+    def test_patient_service_down_returns_503(self):
+        self.login(101, 'patient')
+        with mock.patch('doctors.views.patient_client.get', side_effect=CircuitOpenError):
+            response = self.client.get('/api/diagnoses/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_doctor_sees_own_and_staff_see_all(self):
+        self.login(21, 'doctor')
+        self.assertEqual(self.list_ids(), [self.own.id])
+        for role in ('admin', 'nurse'):
+            self.login(1, role)
+            self.assertEqual(self.list_ids(), [self.own.id, self.foreign.id])
+
+    def test_expired_token_is_treated_as_anonymous(self):
+        token = AccessToken()
+        token.set_exp(lifetime=-timedelta(minutes=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get('/api/diagnoses/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+class ServiceClientTests(TestCase):
+    def setUp(self):
+        self.client = ServiceClient('http://patient_service:8000/api/', failure_threshold=2, reset_timeout=30)
+
+    def fake_response(self, status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return response
+
+    def test_session_is_reused(self):
+        self.assertIs(self.client.session, self.client.session)
+        adapter = self.client.session.get_adapter('http://patient_service:8000/')
+        self.assertEqual(adapter._pool_maxsize, 10)
+        self.assertEqual(adapter.max_retries.total, 2)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        with mock.patch.object(requests.Session, 'request', side_effect=requests.ConnectionError) as send:
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    self.client.get('appointments/')
+            with self.assertRaises(CircuitOpenError):
+                self.client.get('appointments/')
+        self.assertEqual(send.call_count, 2)
+
+    def test_success_resets_failures(self):
+        responses = [requests.ConnectionError(), self.fake_response(200), requests.ConnectionError()]
+        with mock.patch.object(requests.Session, 'request', side_effect=responses):
+            with self.assertRaises(requests.ConnectionError):
+                self.client.get('appointments/')
+            self.client.get('appointments/')
+            with self.assertRaises(requests.ConnectionError):
+                self.client.get('appointments/')
+        self.assertFalse(self.client.breaker.is_open)
+
+    def test_half_open_after_reset_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        with mock.patch('doctors.clients.time.monotonic', return_value=breaker._opened_at + 31):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertFalse(breaker.is_open)
+
+    def test_slow_upstream_costs_one_read_timeout(self):
+        calls = []
+
+        class SlowHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                calls.append(self.path)
+                time_module.sleep(1.0)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = ServiceClient(f'http://127.0.0.1:{server.server_port}/api/', timeout=(1.0, 0.3), retries=2)
+        started = time_module.monotonic()
+        with self.assertRaises(requests.RequestException):
+            client.get('patients/1/')
+        # Không retry read timeout: một request, chờ một read timeout
+        self.assertEqual(len(calls), 1)
+        self.assertLess(time_module.monotonic() - started, 0.6)
+        self.assertEqual(client.breaker._failures, 1)
+
+
+class AppointmentProxyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_open_circuit_returns_503(self):
+        with mock.patch('doctors.views.patient_client.request', side_effect=CircuitOpenError):
+            response = self.client.get('/api/appointments/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class ScheduleParserTests(TestCase):
+    def test_weekday_range(self):
+        rules = parse_schedule('Mon-Fri, 9AM-5PM')
+        self.assertEqual(rules, [Rule(day, time(9), time(17)) for day in range(5)])
+
+    def test_groups_and_multiple_ranges(self):
+        rules = parse_schedule('Mon, Wed 8:00-12:00, 13:00-17:00; Sat 8AM-11AM')
+        self.assertEqual(rules, [
+            Rule(0, time(8), time(12)), Rule(0, time(13), time(17)),
+            Rule(2, time(8), time(12)), Rule(2, time(13), time(17)),
+            Rule(5, time(8), time(11)),
+        ])
+
+    def test_vietnamese_days(self):
+        self.assertEqual(parse_schedule('Thứ 2 - Thứ 6: 8h-17h'), [Rule(day, time(8), time(17)) for day in range(5)])
+        self.assertEqual(parse_schedule('Thứ bảy, Chủ nhật 7h30-11h30'), [Rule(5, time(7, 30), time(11, 30)), Rule(6, time(7, 30), time(11, 30))])
+
+    def test_wrapping_range_and_shared_meridiem(self):
+        self.assertEqual(parse_schedule('Sat-Mon 1-5PM'), [Rule(day, time(13), time(17)) for day in (5, 6, 0)])
+        self.assertEqual(parse_schedule('Tue 9-5PM'), [Rule(1, time(9), time(17))])
+
+    def test_unparseable_schedule(self):
+        self.assertEqual(parse_schedule(''), [])
+        self.assertEqual(parse_schedule('Liên hệ phòng khám'), [])
+        self.assertEqual(parse_schedule('Mon 5PM-9AM'), [])
+
+
+class SlotIndexTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Thứ 2 tuần sau theo giờ phòng khám: luôn ở tương lai và nằm trong SLOT_HORIZON_DAYS
+        today = timezone.now().astimezone(schedule_zone()).date()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.noi_khoa = DoctorProfile.objects.create(user_id=21, specialty='Nội khoa', clinic='Bệnh viện A', schedule='Mon-Fri, 9AM-10AM')
+        self.noi_khoa_2 = DoctorProfile.objects.create(user_id=22, specialty='Nội khoa', clinic='Bệnh viện B', schedule='Mon, 9AM-10AM')
+        self.nhi_khoa = DoctorProfile.objects.create(user_id=23, specialty='Nhi khoa', clinic='Bệnh viện A', schedule='Mon-Fri, 9AM-10AM')
+
+    def at(self, hour, minute=0, days=0):
+        return datetime.combine(self.monday + timedelta(days=days), time(hour, minute), tzinfo=schedule_zone())
+
+
+class SlotIndexTests(SlotIndexTestCase):
+    def test_profile_save_builds_rules_and_slots(self):
+        self.assertEqual(self.noi_khoa.schedule_rules.count(), 5)
+        slots = DoctorSlot.objects.filter(doctor=self.noi_khoa, start__gte=self.at(0), start__lt=self.at(0, days=1))
+        self.assertEqual([slot.start for slot in slots.order_by('start')], [self.at(9), self.at(9, 30)])
+
+    def test_schedule_change_keeps_booked_slots(self):
+        apply_appointment(self.noi_khoa, 7, self.at(9), 'pending')
+        self.noi_khoa.schedule = 'Sat, 8AM-9AM'
+        self.noi_khoa.save()
+        remaining = DoctorSlot.objects.filter(doctor=self.noi_khoa, start__gte=self.at(0), start__lt=self.at(0, days=7))
+        self.assertEqual(
+            sorted((slot.start, slot.appointment_id) for slot in remaining),
+            [(self.at(9), 7), (self.at(8, days=5), None), (self.at(8, 30, days=5), None)],
+        )
+
+    def test_specialty_change_updates_slots(self):
+        self.noi_khoa.specialty = 'Tim mạch'
+        self.noi_khoa.save()
+        self.assertFalse(DoctorSlot.objects.filter(doctor=self.noi_khoa, start__gte=timezone.now()).exclude(specialty='Tim mạch').exists())
+
+    def test_refresh_is_idempotent(self):
+        self.assertEqual(refresh_slots(self.noi_khoa), (0, 0))
+
+    def test_off_grid_shift_is_aligned_to_appointment_slots(self):
+        # Ca 08:15-10:00: slot bắt đầu từ 08:30, cùng lưới epoch UTC với slot_start của patient_service
+        self.noi_khoa_2.schedule = 'Mon, 8:15-10:00'
+        self.noi_khoa_2.save()
+        slots = DoctorSlot.objects.filter(doctor=self.noi_khoa_2, start__gte=self.at(0), start__lt=self.at(0, days=1))
+        starts = [slot.start for slot in slots.order_by('start')]
+        self.assertEqual(starts, [self.at(8, 30), self.at(9), self.at(9, 30)])
+        self.assertTrue(all(int(start.timestamp()) % (settings.APPOINTMENT_SLOT_MINUTES * 60) == 0 for start in starts))
+        # Hai giờ hẹn trong cùng slot (08:35 và 08:50) rơi vào cùng DoctorSlot như ở patient_service
+        self.assertEqual(apply_appointment(self.noi_khoa_2, 1, self.at(8, 35), 'pending'), 'booked')
+        self.assertEqual(apply_appointment(self.noi_khoa_2, 2, self.at(8, 50), 'pending'), 'conflict')
+
+
+class FreeSlotsTests(SlotIndexTestCase):
+    def get_free_slots(self, **params):
+        params.setdefault('specialty', 'Nội khoa')
+        params.setdefault('start', self.at(0).isoformat())
+        params.setdefault('end', self.at(0, days=1).isoformat())
+        return self.client.get('/api/doctors/free_slots/', params)
+
+    def test_free_slots_by_specialty(self):
+        response = self.get_free_slots()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot['doctor_user_id'], parse_datetime(slot['start'])) for slot in response.data],
+            [(21, self.at(9)), (22, self.at(9)), (21, self.at(9, 30)), (22, self.at(9, 30))],
+        )
+
+    def test_booked_slots_are_excluded(self):
+        apply_appointment(self.noi_khoa_2, 7, self.at(9, 10), 'confirmed')
+        response = self.get_free_slots()
+        self.assertEqual(len(response.data), 3)
+        self.assertNotIn((22, self.at(9)), [(slot['doctor_user_id'], parse_datetime(slot['start'])) for slot in response.data])
+
+    def test_single_query_and_limit(self):
+        with self.assertNumQueries(1):
+            response = self.get_free_slots(end=self.at(0, days=7).isoformat(), limit=3)
+        self.assertEqual(len(response.data), 3)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get_free_slots(end=self.at(0).isoformat()).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_free_slots(specialty='').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SlotSyncTests(SlotIndexTestCase):
+    def sync(self, appointment_id, when, appointment_status='pending', doctor_id=21):
+        return self.client.put('/api/doctors/slots/sync/', {
+            'appointment_id': appointment_id, 'doctor_id': doctor_id,
+            'appointment_date': when.isoformat(), 'status': appointment_status,
+        }, format='json')
+
+    def holder(self, when, doctor=None):
+        return DoctorSlot.objects.get(doctor=doctor or self.noi_khoa, start=when).appointment_id
+
+    def test_book_is_idempotent_and_conflicts(self):
+        self.assertEqual(self.sync(7, self.at(9)).data['result'], 'booked')
+        self.assertEqual(self.sync(7, self.at(9)).data['result'], 'booked')
+        self.assertEqual(self.sync(8, self.at(9, 15)).data['result'], 'conflict')
+        self.assertEqual(self.holder(self.at(9)), 7)
+
+    def test_cancel_releases_slot(self):
+        self.sync(7, self.at(9))
+        self.assertEqual(self.sync(7, self.at(9), 'cancelled').data['result'], 'released')
+        self.assertIsNone(self.holder(self.at(9)))
+
+    def test_reschedule_moves_slot(self):
+        self.sync(7, self.at(9))
+        self.assertEqual(self.sync(7, self.at(9, 30, days=1)).data['result'], 'booked')
+        self.assertIsNone(self.holder(self.at(9)))
+        self.assertEqual(self.holder(self.at(9, 30, days=1)), 7)
+        self.assertEqual(self.sync(7, self.at(9, 30), doctor_id=22).data['result'], 'booked')
+        self.assertEqual(DoctorSlot.objects.filter(appointment_id=7).get().doctor, self.noi_khoa_2)
+
+    def test_outside_schedule_and_unknown_doctor(self):
+        self.assertEqual(self.sync(7, self.at(12)).data['result'], 'no_slot')
+        self.assertEqual(self.sync(7, self.at(9), doctor_id=999).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DoctorCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = DoctorProfile.objects.create(user_id=21, specialty='Nội khoa', clinic='Bệnh viện A', schedule='Mon-Fri, 9AM-5PM')
+
+    def test_second_read_is_served_from_cache(self):
+        for url in ('/api/doctors/user/21/', f'/api/doctors/{self.doctor.pk}/', '/api/doctors/'):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], 'HIT')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Query string khác (ví dụ cursor, page_size) là entry khác
+        self.assertEqual(self.client.get('/api/doctors/', {'page_size': 1})['X-Cache'], 'MISS')
+
+    def test_not_found_is_not_cached(self):
+        self.assertEqual(self.client.get('/api/doctors/user/999/').status_code, status.HTTP_404_NOT_FOUND)
+        DoctorProfile.objects.create(user_id=999, specialty='Nhi khoa', clinic='Bệnh viện B')
+        self.assertEqual(self.client.get('/api/doctors/user/999/').status_code, status.HTTP_200_OK)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/doctors/user/21/')['ETag']
+        for header in (etag, f'W/{etag}', f'"other", {etag}'):
+            response = self.client.get('/api/doctors/user/21/', HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get('/api/doctors/user/21/', HTTP_IF_NONE_MATCH='"other"').status_code, status.HTTP_200_OK)
+
+    def test_pagination_headers_survive_cache(self):
+        DoctorProfile.objects.create(user_id=22, specialty='Nhi khoa', clinic='Bệnh viện B')
+        params = {'page_size': 1, 'with_count': 'true'}
+        first = self.client.get('/api/doctors/', params)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertIn('rel="next"', first['Link'])
+        hit = self.client.get('/api/doctors/', params)
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual((hit['Link'], hit['X-Total-Count']), (first['Link'], '2'))
+        not_modified = self.client.get('/api/doctors/', params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual((not_modified['Link'], not_modified['X-Total-Count']), (first['Link'], '2'))
+
+    def test_save_and_delete_invalidate(self):
+        etag = self.client.get('/api/doctors/user/21/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/doctors/user/21/', {'clinic': 'Bệnh viện C'}, format='json')
+        response = self.client.get('/api/doctors/user/21/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (status.HTTP_200_OK, 'MISS'))
+        self.assertEqual(response.data['clinic'], 'Bệnh viện C')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.delete()
+        self.assertEqual(self.client.get('/api/doctors/user/21/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stampede_lock_builds_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            threading.Event().wait(0.2)
+            return Response({'id': 1})
+
+        request = APIRequestFactory().get('/api/doctors/')
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cached_response(request, 'list', build))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.data for response in results], [{'id': 1}] * 10)
+        stats = self.client.get('/api/doctors/cache_stats/').data
+        self.assertEqual((stats['misses'], stats['lock_waits']), (10, 9))
+
+    def test_stats_endpoint(self):
+        self.client.get('/api/doctors/user/21/')
+        self.client.get('/api/doctors/user/21/')
+        stats = self.client.get('/api/doctors/cache_stats/').data
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+    def test_cache_outage_falls_back_to_database(self):
+        with mock.patch('doctors.cache.cache.get', side_effect=ConnectionError('redis down')):
+            with self.assertLogs('doctors.cache', level='WARNING'):
+                response = self.client.get('/api/doctors/user/21/')
+        self.assertEqual((response.status_code, response['X-Cache']), (status.HTTP_200_OK, 'BYPASS'))
@@ -1,12 +1,19 @@
-from rest_framework import viewsets, permissions, serializers
+from rest_framework import viewsets, permissions, serializers, status
+from rest_framework.exceptions import APIException
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import DoctorProfile, Diagnosis
-from .serializers import DoctorProfileSerializer, DiagnosisSerializer
+from .models import DoctorProfile, Diagnosis, DoctorSlot
+from .serializers import (
+    DoctorProfileSerializer, DiagnosisSerializer, FreeSlotQuerySerializer, FreeSlotSerializer, SlotSyncSerializer,
+)
+from .schedule import apply_appointment
+from .cache import cache_stats, cached_response
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 import requests
 from django.conf import settings
 import logging
+from .clients import patient_client, CircuitOpenError
 
 # Khởi tạo logger để ghi log cho ứng dụng
 logger = logging.getLogger(__name__)
@@ -29,20 +36,35 @@ class DoctorProfileViewSet(viewsets.ModelViewSet):
         # Không thực hiện thêm logic nào ngoài việc gọi save() của serializer
         serializer.save()
 
+    # list, retrieve và GET theo user_id đọc qua cache Redis (doctors/cache.py),
+    # signal post_save/post_delete của DoctorProfile vô hiệu hóa cache
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'list', lambda: super(DoctorProfileViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, 'retrieve', lambda: super(DoctorProfileViewSet, self).retrieve(request, *args, **kwargs))
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """
+        Số lần hit/miss của cache danh bạ bác sĩ (cộng dồn trên mọi worker).
+        URL: GET /api/doctors/cache_stats/
+        """
+        return Response(cache_stats())
+
     @action(detail=False, methods=['get', 'put', 'patch'], url_path='user/(?P<user_id>\d+)')
     def by_user_id(self, request, user_id=None):
         """
         Endpoint tùy chỉnh để lấy hoặc cập nhật hồ sơ bác sĩ theo user_id.
         URL: GET/PUT/PATCH /api/doctors/user/{user_id}/
         """
-        # Tìm hồ sơ bác sĩ dựa trên user_id, trả về 404 nếu không tìm thấy
-        doctor_profile = get_object_or_404(DoctorProfile, user_id=user_id)
-        
         if request.method == 'GET':
-            # Nếu là GET, serialize và trả về dữ liệu hồ sơ bác sĩ
-            serializer = self.get_serializer(doctor_profile)
-            return Response(serializer.data)
+            # Nếu là GET, serialize và trả về dữ liệu hồ sơ bác sĩ (qua cache, chỉ truy vấn khi miss)
+            return cached_response(
+                request, 'user', lambda: Response(self.get_serializer(get_object_or_404(DoctorProfile, user_id=user_id)).data))
         
+        # Tìm hồ sơ bác sĩ dựa trên user_id, trả về 404 nếu không tìm thấy
+        doctor_profile = get_object_or_404(DoctorProfile, user_id=user_id)
         # Nếu là PUT hoặc PATCH, cập nhật hồ sơ bác sĩ
         # partial=True cho PATCH để cho phép cập nhật một phần
         serializer = self.get_serializer(doctor_profile, data=request.data, partial=request.method == 'PATCH')
@@ -53,6 +75,48 @@ class DoctorProfileViewSet(viewsets.ModelViewSet):
         # Trả về lỗi nếu dữ liệu không hợp lệ
         return Response(serializer.errors, status=400)
 
+    @action(detail=False, methods=['get'])
+    def free_slots(self, request):
+        """
+        Slot còn trống của mọi bác sĩ thuộc một chuyên khoa trong khoảng thời gian [start, end).
+        URL: GET /api/doctors/free_slots/?specialty=Nội khoa&start=...&end=...&limit=100
+        Kết quả sắp theo (start, doctor), tối đa FREE_SLOTS_MAX_RESULTS slot; muốn xem tiếp thì
+        gọi lại với start là giờ của slot cuối cùng.
+        """
+        query = FreeSlotQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        # Quét theo khoảng trên index một phần slot_free_specialty_idx (specialty, start, doctor)
+        slots = (
+            DoctorSlot.objects
+            .filter(
+                specialty=params['specialty'],
+                start__gte=max(params['start'], timezone.now()),
+                start__lt=params['end'],
+                appointment_id__isnull=True,
+            )
+            .select_related('doctor')
+            .order_by('start', 'doctor')[:params.get('limit', settings.FREE_SLOTS_MAX_RESULTS)]
+        )
+        return Response(FreeSlotSerializer(slots, many=True).data)
+
+    @action(detail=False, methods=['put'], url_path='slots/sync')
+    def sync_slot(self, request):
+        """
+        Đồng bộ chỉ mục slot theo trạng thái mới nhất của một lịch hẹn (patient_service gọi sau
+        mỗi lần tạo/sửa/hủy lịch hẹn). Idempotent nên gửi lại nhiều lần vẫn an toàn.
+        URL: PUT /api/doctors/slots/sync/
+        Body: {"appointment_id": 1, "doctor_id": 21, "appointment_date": "...", "status": "pending"}
+        """
+        serializer = SlotSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        doctor = get_object_or_404(DoctorProfile, user_id=data['doctor_id'])
+        result = apply_appointment(doctor, data['appointment_id'], data['appointment_date'], data['status'])
+        if result == 'conflict':
+            logger.warning(f"Slot at {data['appointment_date']} of doctor {doctor.user_id} is held by another appointment")
+        return Response({'appointment_id': data['appointment_id'], 'result': result})
+
 class DiagnosisViewSet(viewsets.ModelViewSet):
     # Định nghĩa queryset mặc định để lấy tất cả chuẩn đoán
     queryset = Diagnosis.objects.all()
@@ -66,14 +130,19 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Lấy user từ request
         user = self.request.user
-        if user.is_authenticated and user.role == 'admin':
-            # Nếu user là admin, trả về tất cả chuẩn đoán
+        if not user.is_authenticated:
             return Diagnosis.objects.all()
-        elif user.is_authenticated:
+        if user.role == 'doctor':
             # Nếu user là bác sĩ, chỉ trả về chuẩn đoán của họ
             return Diagnosis.objects.filter(doctor__user_id=user.id)
-        else:
-            return Diagnosis.objects.all()
+        if user.role == 'patient':
+            # Nếu user là bệnh nhân, chỉ trả về chuẩn đoán của chính họ (patient_id là ID hồ sơ bên patient_service)
+            patient_id = patient_id_for_user(self.request)
+            if patient_id is None:
+                return Diagnosis.objects.none()
+            return Diagnosis.objects.filter(patient_id=patient_id)
+        # Admin và các vai trò khác (y tá, dược sĩ, ...) xem tất cả chuẩn đoán
+        return Diagnosis.objects.all()
 
     def perform_create(self, serializer):
         # Lấy doctor_id từ dữ liệu gửi lên
@@ -93,17 +162,45 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
         URL: GET /api/diagnoses/by_patientId/{patient_id}/
         """
         logger.debug(f"Fetching diagnoses for patient_id: {patient_id}")
-        # Lọc các chuẩn đoán theo patient_id
-        diagnoses = Diagnosis.objects.filter(patient_id=patient_id)
-        if not diagnoses.exists():
+        # Lọc các chuẩn đoán theo patient_id trong một truy vấn duy nhất,
+        # dùng luôn kết quả để quyết định 404 thay vì gọi thêm exists()/count()
+        diagnoses = list(Diagnosis.objects.filter(patient_id=patient_id))
+        if not diagnoses:
             # Nếu không tìm thấy chuẩn đoán, trả về lỗi 404
             logger.debug(f"No diagnoses found for patient_id: {patient_id}")
             return Response({"detail": f"No diagnoses found for patient_id {patient_id}"}, status=404)
         # Serialize danh sách chuẩn đoán và trả về
         serializer = self.get_serializer(diagnoses, many=True)
-        logger.debug(f"Successfully fetched {diagnoses.count()} diagnoses for patient_id: {patient_id}")
+        logger.debug(f"Successfully fetched {len(diagnoses)} diagnoses for patient_id: {patient_id}")
         return Response(serializer.data)
 
+def forward_auth_header(request):
+    # Chuyển tiếp nguyên header Authorization của client (không ký lại token)
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    return {'Authorization': authorization} if authorization else {}
+
+class PatientServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'patient_service is temporarily unavailable'
+    default_code = 'patient_service_unavailable'
+
+def patient_id_for_user(request):
+    """
+    ID hồ sơ bệnh nhân (bên patient_service) của user đang đăng nhập, None nếu user chưa có hồ sơ.
+    Lỗi gọi patient_service trả về 503 thay vì coi như bệnh nhân không có chuẩn đoán.
+    """
+    try:
+        response = patient_client.get(f"patients/by_userId/{request.user.id}/", headers=forward_auth_header(request))
+    except requests.RequestException as e:
+        logger.error(f"Error fetching patient profile of user {request.user.id}: {str(e)}")
+        raise PatientServiceUnavailable()
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch patient profile of user {request.user.id}: {response.status_code}")
+        raise PatientServiceUnavailable()
+    return response.json()['id']
+
 class AppointmentViewSet(viewsets.ViewSet):
     def get_permissions(self):
         # Cho phép tất cả yêu cầu
@@ -119,11 +216,10 @@ class AppointmentViewSet(viewsets.ViewSet):
         user = request.user
         try:
             # Gọi API patient_service để lấy danh sách lịch hẹn theo doctor_id
-            response = requests.get(
-                f"{settings.PATIENT_SERVICE_URL}appointments/",
+            response = patient_client.get(
+                "appointments/",
                 params={'doctor_id': user.id},
-                headers={'Authorization': f'Bearer {request.auth}'},
-                timeout=5
+                headers=forward_auth_header(request),
             )
             if response.status_code != 200:
                 # Nếu API trả về lỗi, trả về mã trạng thái tương ứng
@@ -131,6 +227,10 @@ class AppointmentViewSet(viewsets.ViewSet):
                 return Response({"detail": "Unable to fetch appointments"}, status=response.status_code)
             # Trả về dữ liệu JSON từ patient_service
             return Response(response.json())
+        except CircuitOpenError:
+            # patient_service đang lỗi liên tục, trả lỗi ngay thay vì giữ worker chờ timeout
+            logger.error("Circuit breaker open for patient_service")
+            return Response({"detail": "patient_service is temporarily unavailable"}, status=503)
         except requests.RequestException as e:
             # Xử lý lỗi kết nối với patient_service
             logger.error(f"Error communicating with patient_service: {str(e)}")
@@ -144,11 +244,10 @@ class AppointmentViewSet(viewsets.ViewSet):
         """
         try:
             # Gọi API patient_service để cập nhật trạng thái lịch hẹn
-            response = requests.put(
-                f"{settings.PATIENT_SERVICE_URL}appointments/{pk}/",
+            response = patient_client.put(
+                f"appointments/{pk}/",
                 json={'status': request.data.get('status')},
-                headers={'Authorization': f'Bearer {request.auth}'},
-                timeout=5
+                headers=forward_auth_header(request),
             )
             if response.status_code != 200:
                 # Nếu API trả về lỗi, trả về mã trạng thái tương ứng
@@ -156,6 +255,10 @@ class AppointmentViewSet(viewsets.ViewSet):
                 return Response({"detail": "Unable to update appointment"}, status=response.status_code)
             # Trả về dữ liệu JSON từ patient_service
             return Response(response.json())
+        except CircuitOpenError:
+            # patient_service đang lỗi liên tục, trả lỗi ngay thay vì giữ worker chờ timeout
+            logger.error("Circuit breaker open for patient_service")
+            return Response({"detail": "patient_service is temporarily unavailable"}, status=503)
         except requests.RequestException as e:
             # Xử lý lỗi kết nối với patient_service
             logger.error(f"Error communicating with patient_service: {str(e)}")
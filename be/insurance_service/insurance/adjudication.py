@@ -0,0 +1,157 @@
+# Xét duyệt tự động yêu cầu bồi thường theo điều khoản hợp đồng, xử lý theo lô và song song theo khoảng hợp đồng
+import logging
+import multiprocessing
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from .models import InsuranceClaim, InsuranceContract
+
+logger = logging.getLogger(__name__)
+
+# Kết quả xét duyệt của một yêu cầu bồi thường
+Decision = namedtuple('Decision', ['status', 'reason'])
+
+# Thống kê của một worker (hoặc tổng của cả lần chạy)
+Stats = namedtuple('Stats', ['approved', 'rejected', 'chunks', 'seconds'])
+
+
+def evaluate(claims, contracts, approved_totals):
+    """
+    Xét duyệt một lô claim (đã sắp theo contract, claim_date, id) theo điều khoản hợp đồng.
+
+    Quy tắc theo thứ tự: số tiền phải dương; claim_date nằm trong thời hạn hợp đồng; không vượt
+    per_claim_limit; tổng đã duyệt của hợp đồng cộng claim này không vượt coverage_limit.
+    approved_totals là tổng đã duyệt của mỗi hợp đồng trước lô này và được cộng dồn khi duyệt,
+    nên các claim sau trong cùng lô thấy hạn mức còn lại. Không truy vấn database.
+    """
+    decisions = []
+    for claim in claims:
+        contract = contracts[claim.contract_id]
+        claim_day = timezone.localtime(claim.claim_date).date()
+        used = approved_totals.get(claim.contract_id, Decimal('0'))
+        if claim.amount <= 0:
+            decision = Decision('rejected', 'Amount must be positive')
+        elif not contract.start_date <= claim_day <= contract.end_date:
+            decision = Decision('rejected', f'Claim date {claim_day} is outside the coverage window')
+        elif contract.per_claim_limit is not None and claim.amount > contract.per_claim_limit:
+            decision = Decision('rejected', f'Amount exceeds the per-claim limit of {contract.per_claim_limit}')
+        elif contract.coverage_limit is not None and used + claim.amount > contract.coverage_limit:
+            decision = Decision('rejected', f'Amount exceeds the remaining coverage of {contract.coverage_limit - used}')
+        else:
+            decision = Decision('approved', 'Within contract terms')
+            approved_totals[claim.contract_id] = used + claim.amount
+        decisions.append(decision)
+    return decisions
+
+
+def adjudicate_chunk(first_contract, last_contract, chunk_size):
+    """
+    Xét duyệt tối đa chunk_size claim pending của các hợp đồng có id trong [first_contract, last_contract].
+
+    Một transaction, bốn truy vấn cố định: đọc và khóa claim (quét claim_pending_idx), khóa hợp đồng,
+    tổng đã duyệt của các hợp đồng bằng một truy vấn aggregate, rồi ghi quyết định bằng bulk_update.
+
+    Claim được khóa bằng FOR UPDATE thường (không SKIP LOCKED): claim đang bị request khác giữ thì chờ
+    thay vì bỏ qua, để claim sau của cùng hợp đồng không được duyệt trước claim cũ hơn. Thứ tự khóa
+    (claim rồi hợp đồng theo id) giống InsuranceClaimViewSet.update, nên hai bên không deadlock, và
+    lần duyệt tay đang chạy phải commit xong thì lô này mới tính tổng đã duyệt.
+    Trả về (số duyệt, số từ chối).
+    """
+    with transaction.atomic():
+        claims = list(
+            InsuranceClaim.objects.select_for_update()
+            .filter(status='pending', contract_id__gte=first_contract, contract_id__lte=last_contract)
+            .order_by('contract_id', 'claim_date', 'id')[:chunk_size]
+        )
+        if not claims:
+            return 0, 0
+        contract_ids = {claim.contract_id for claim in claims}
+        contracts = {
+            contract.pk: contract
+            for contract in InsuranceContract.objects.select_for_update().filter(pk__in=contract_ids).order_by('pk')
+        }
+        approved_totals = dict(
+            InsuranceClaim.objects.filter(contract_id__in=contract_ids, status='approved')
+            .values('contract_id').annotate(total=Sum('amount')).values_list('contract_id', 'total')
+        )
+        now = timezone.now()
+        for claim, decision in zip(claims, evaluate(claims, contracts, approved_totals)):
+            claim.status = decision.status
+            claim.decision_reason = decision.reason
+            claim.adjudicated_at = now
+            claim.updated_at = now
+        InsuranceClaim.objects.bulk_update(
+            claims, ['status', 'decision_reason', 'adjudicated_at', 'updated_at'],
+            batch_size=settings.ADJUDICATION_CHUNK_SIZE)
+    approved = sum(1 for claim in claims if claim.status == 'approved')
+    return approved, len(claims) - approved
+
+
+def adjudicate_range(first_contract, last_contract, chunk_size=None):
+    """Xét duyệt mọi claim pending của khoảng hợp đồng, từng lô một; trả về Stats của worker."""
+    chunk_size = chunk_size or settings.ADJUDICATION_CHUNK_SIZE
+    started = time.monotonic()
+    approved = rejected = chunks = 0
+    while True:
+        chunk_approved, chunk_rejected = adjudicate_chunk(first_contract, last_contract, chunk_size)
+        if not chunk_approved + chunk_rejected:
+            break
+        approved += chunk_approved
+        rejected += chunk_rejected
+        chunks += 1
+    return Stats(approved, rejected, chunks, time.monotonic() - started)
+
+
+def _adjudicate_range(args):
+    # Chạy trong process con của Pool: đóng kết nối riêng của process trước khi trả kết quả
+    try:
+        return adjudicate_range(*args)
+    finally:
+        connections.close_all()
+
+
+def contract_ranges(workers):
+    """
+    Chia các hợp đồng có claim pending thành tối đa workers khoảng id liên tiếp, không giao nhau.
+
+    Mọi claim của một hợp đồng thuộc về đúng một worker, nên hạn mức của hợp đồng không bị hai
+    worker cùng tính.
+    """
+    bounds = InsuranceClaim.objects.filter(status='pending').aggregate(first=Min('contract_id'), last=Max('contract_id'))
+    if bounds['first'] is None:
+        return []
+    first, last = bounds['first'], bounds['last']
+    step = max(1, -(-(last - first + 1) // workers))
+    return [(start, min(start + step - 1, last)) for start in range(first, last + 1, step)]
+
+
+def run_adjudication(workers=1, chunk_size=None):
+    """
+    Xét duyệt toàn bộ claim pending bằng workers process song song; trả về (Stats tổng, Stats mỗi worker).
+
+    seconds của Stats tổng là thời gian thực của cả lần chạy.
+    """
+    started = time.monotonic()
+    ranges = contract_ranges(workers)
+    jobs = [(first, last, chunk_size) for first, last in ranges]
+    if len(jobs) <= 1:
+        results = [adjudicate_range(*job) for job in jobs]
+    else:
+        # Process con không được dùng chung kết nối database với process cha
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+            results = pool.map(_adjudicate_range, jobs)
+    total = Stats(
+        approved=sum(stats.approved for stats in results),
+        rejected=sum(stats.rejected for stats in results),
+        chunks=sum(stats.chunks for stats in results),
+        seconds=time.monotonic() - started,
+    )
+    logger.info(f"Adjudicated {total.approved + total.rejected} claims in {total.seconds:.2f}s")
+    return total, list(zip(ranges, results))
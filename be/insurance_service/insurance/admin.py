@@ -1,6 +1,6 @@
 # Cấu hình giao diện Django Admin cho các model
 from django.contrib import admin
-from .models import InsuranceContract, InsuranceClaim
+from .models import ClaimFlag, InsuranceContract, InsuranceClaim
 
 @admin.register(InsuranceContract)
 class InsuranceContractAdmin(admin.ModelAdmin):
@@ -11,4 +11,10 @@ class InsuranceContractAdmin(admin.ModelAdmin):
 class InsuranceClaimAdmin(admin.ModelAdmin):
     list_display = ['id', 'contract', 'amount', 'status']  # Hiển thị các trường trong danh sách
     search_fields = ['contract__patient_id']  # Cho phép tìm kiếm theo patient_id
-    list_filter = ['status']  # Lọc theo trạng thái
\ No newline at end of file
+    list_filter = ['status']  # Lọc theo trạng thái
+
+@admin.register(ClaimFlag)
+class ClaimFlagAdmin(admin.ModelAdmin):
+    list_display = ['id', 'claim', 'kind', 'score', 'created_at']  # Hiển thị các trường trong danh sách
+    list_filter = ['kind']  # Lọc theo loại bất thường
+    raw_id_fields = ['claim', 'related_claim']
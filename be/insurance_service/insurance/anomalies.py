@@ -0,0 +1,130 @@
+# Phát hiện yêu cầu bồi thường bất thường (gần trùng, số tiền lệch) bằng window function trong database
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ClaimFlag, InsuranceClaim, InsuranceContract
+
+logger = logging.getLogger(__name__)
+
+# Số claim bị phát hiện theo từng loại của một lần chạy (kể cả claim đã được đánh dấu từ lần trước)
+Report = namedtuple('Report', ['near_duplicates', 'outliers', 'since'])
+
+CLAIMS = InsuranceClaim._meta.db_table
+CONTRACTS = InsuranceContract._meta.db_table
+
+# Mỗi claim được so với claim liền trước và liền sau của cùng hợp đồng (theo claim_date)
+NEAR_DUPLICATES_SQL = f"""
+SELECT id, neighbour_id, gap_seconds FROM (
+    SELECT id, created_at, amount,
+           LAG(id) OVER w AS prev_id, LAG(amount) OVER w AS prev_amount,
+           EXTRACT(EPOCH FROM claim_date - LAG(claim_date) OVER w) AS prev_gap,
+           LEAD(id) OVER w AS next_id, LEAD(amount) OVER w AS next_amount,
+           EXTRACT(EPOCH FROM LEAD(claim_date) OVER w - claim_date) AS next_gap
+    FROM {CLAIMS}
+    WHERE claim_date >= %(lookback)s AND status <> 'rejected'
+    WINDOW w AS (PARTITION BY contract_id ORDER BY claim_date, id)
+) AS neighbours
+CROSS JOIN LATERAL (VALUES (prev_id, prev_amount, prev_gap), (next_id, next_amount, next_gap))
+    AS pair (neighbour_id, neighbour_amount, gap_seconds)
+WHERE created_at >= %(since)s
+  AND neighbour_id IS NOT NULL
+  AND gap_seconds <= %(window)s
+  AND ABS(amount - neighbour_amount) <= %(tolerance)s * GREATEST(ABS(amount), ABS(neighbour_amount))
+ORDER BY id, gap_seconds
+"""
+
+# z-score của số tiền so với mọi claim cùng nhà cung cấp trong khoảng lookback
+OUTLIERS_SQL = f"""
+SELECT id, amount, mean, (amount - mean) / stddev AS z_score FROM (
+    SELECT c.id, c.created_at, c.amount,
+           AVG(c.amount) OVER p AS mean,
+           STDDEV_SAMP(c.amount) OVER p AS stddev,
+           COUNT(*) OVER p AS samples
+    FROM {CLAIMS} c JOIN {CONTRACTS} k ON k.id = c.contract_id
+    WHERE c.claim_date >= %(lookback)s
+    WINDOW p AS (PARTITION BY LOWER(k.provider))
+) AS stats
+WHERE created_at >= %(since)s
+  AND samples >= %(min_samples)s
+  AND stddev > 0
+  AND ABS(amount - mean) / stddev >= %(z_score)s
+ORDER BY id
+"""
+
+
+def _stream(sql, params, batch_size):
+    # Cursor phía server: database chạy window function trong một lượt, kết quả được đọc từng batch
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def _save_flags(flags):
+    # Claim đã bị đánh dấu cùng loại ở lần chạy trước được bỏ qua (claim_flag_uniq)
+    ClaimFlag.objects.bulk_create(flags, ignore_conflicts=True)
+    return len(flags)
+
+
+def flag_near_duplicates(since, lookback, batch_size):
+    """Đánh dấu các claim tạo từ since có claim kề bên cùng hợp đồng gần cùng ngày và gần cùng số tiền."""
+    params = {
+        'since': since,
+        'lookback': lookback,
+        'window': settings.CLAIM_DUPLICATE_WINDOW_HOURS * 3600,
+        'tolerance': settings.CLAIM_DUPLICATE_AMOUNT_TOLERANCE,
+    }
+    flagged = 0
+    for rows in _stream(NEAR_DUPLICATES_SQL, params, batch_size):
+        flags = {}
+        for claim_id, neighbour_id, gap_seconds in rows:
+            # Mỗi claim chỉ giữ claim kề gần nhất (kết quả đã sắp theo khoảng cách)
+            flags.setdefault(claim_id, ClaimFlag(
+                claim_id=claim_id, kind='near_duplicate', related_claim_id=neighbour_id,
+                score=float(gap_seconds) / 3600, detail=f'Similar to claim {neighbour_id}'))
+        flagged += _save_flags(list(flags.values()))
+    return flagged
+
+
+def flag_outliers(since, lookback, batch_size):
+    """Đánh dấu các claim tạo từ since có số tiền lệch quá CLAIM_OUTLIER_Z_SCORE độ lệch chuẩn theo nhà cung cấp."""
+    params = {
+        'since': since,
+        'lookback': lookback,
+        'min_samples': settings.CLAIM_OUTLIER_MIN_CLAIMS,
+        'z_score': settings.CLAIM_OUTLIER_Z_SCORE,
+    }
+    flagged = 0
+    for rows in _stream(OUTLIERS_SQL, params, batch_size):
+        flagged += _save_flags([
+            ClaimFlag(claim_id=claim_id, kind='outlier_amount', score=float(z_score),
+                      detail=f'Amount {amount} vs provider mean {mean:.2f}')
+            for claim_id, amount, mean, z_score in rows
+        ])
+    return flagged
+
+
+@transaction.atomic
+def detect_anomalies(since=None, batch_size=1000):
+    """
+    Đánh dấu các claim bất thường được tạo từ since (mặc định 24 giờ trước); trả về Report.
+
+    Chỉ chạy trên PostgreSQL. Các claim cũ tới CLAIM_ANOMALY_LOOKBACK_DAYS ngày vẫn được dùng làm
+    claim kề bên và để tính thống kê của nhà cung cấp, nhưng chỉ claim mới bị đánh dấu. Không
+    nạp claim vào bộ nhớ: database tính window function, Python chỉ nhận các dòng bị đánh dấu.
+    """
+    now = timezone.now()
+    since = since or now - timedelta(days=1)
+    lookback = min(since, now - timedelta(days=settings.CLAIM_ANOMALY_LOOKBACK_DAYS))
+    near_duplicates = flag_near_duplicates(since, lookback, batch_size)
+    outliers = flag_outliers(since, lookback, batch_size)
+    logger.info(f"Flagged {near_duplicates} near-duplicate and {outliers} outlier claims since {since}")
+    return Report(near_duplicates, outliers, since)
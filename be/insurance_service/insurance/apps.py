@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InsuranceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'insurance'
+
+    def ready(self):
+        # Đăng ký signal vô hiệu hóa cache kiểm tra hiệu lực bảo hiểm
+        from . import signals  # noqa: F401
@@ -0,0 +1,128 @@
+# Kiểm tra hiệu lực bảo hiểm: hợp đồng còn hiệu lực của bệnh nhân vào một ngày, có cache theo (bệnh nhân, ngày)
+import logging
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import InsuranceContract
+from .serializers import InsuranceContractSerializer
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'eligibility'
+
+
+def active_contracts(patient_id, on_date):
+    # Quét theo khoảng trên contract_coverage_idx (patient_id, start_date, end_date)
+    return InsuranceContract.objects.filter(
+        patient_id=patient_id, start_date__lte=on_date, end_date__gte=on_date).order_by('start_date', 'id')
+
+
+def _serialize(patient_id, on_date):
+    return [dict(row) for row in InsuranceContractSerializer(active_contracts(patient_id, on_date), many=True).data]
+
+
+def _version_key(patient_id):
+    return f'{PREFIX}:{patient_id}:version'
+
+
+def invalidate_patient(patient_id):
+    """
+    Bỏ mọi entry cache của bệnh nhân bằng cách đổi phiên bản (entry cũ tự hết hạn theo TTL).
+
+    Gọi từ signal khi hợp đồng của bệnh nhân được tạo/sửa/xóa.
+    """
+    try:
+        cache.set(_version_key(patient_id), uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.warning(f"Eligibility cache unavailable: {str(e)}")
+
+
+def _cache_key(patient_id, on_date):
+    version = cache.get(_version_key(patient_id))
+    if version is None:
+        cache.add(_version_key(patient_id), uuid.uuid4().hex, timeout=None)
+        version = cache.get(_version_key(patient_id))
+    return f'{PREFIX}:{patient_id}:{version}:{on_date.isoformat()}'
+
+
+def patient_contracts_on(patient_id, on_date):
+    """
+    Dữ liệu (đã serialize) các hợp đồng còn hiệu lực của bệnh nhân vào on_date, đọc qua cache.
+
+    Mỗi entry chứa hợp đồng của mọi nhà cung cấp; lọc theo nhà cung cấp làm sau khi đọc cache.
+    Redis lỗi thì đọc thẳng database. Trả về (dữ liệu, có lấy từ cache hay không).
+    """
+    try:
+        key = _cache_key(patient_id, on_date)
+        data = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Eligibility cache unavailable: {str(e)}")
+        return _serialize(patient_id, on_date), False
+    if data is not None:
+        return data, True
+    data = _serialize(patient_id, on_date)
+    try:
+        cache.set(key, data, timeout=settings.ELIGIBILITY_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Eligibility cache unavailable: {str(e)}")
+    return data, False
+
+
+def filter_provider(contracts, provider):
+    if not provider:
+        return list(contracts)
+    provider = provider.casefold()
+    return [contract for contract in contracts if contract['provider'].casefold() == provider]
+
+
+def check_eligibility(patient_id, on_date, provider=None):
+    contracts, cached = patient_contracts_on(patient_id, on_date)
+    contracts = filter_provider(contracts, provider)
+    return {
+        'patient_id': patient_id,
+        'date': on_date,
+        'provider': provider or None,
+        'eligible': bool(contracts),
+        'contracts': contracts,
+    }, cached
+
+
+def check_eligibility_batch(checks):
+    """
+    Kiểm tra nhiều cặp (bệnh nhân, ngày[, nhà cung cấp]) bằng một truy vấn.
+
+    Truy vấn lấy mọi hợp đồng của các bệnh nhân trong lô có giao với khoảng [ngày nhỏ nhất,
+    ngày lớn nhất] của lô (vẫn là quét theo patient_id trên contract_coverage_idx), rồi ghép
+    từng cặp trong bộ nhớ. Kết quả theo đúng thứ tự checks, chỉ kèm ID hợp đồng.
+    """
+    if not checks:
+        return []
+    patient_ids = {check['patient_id'] for check in checks}
+    first_date = min(check['date'] for check in checks)
+    last_date = max(check['date'] for check in checks)
+    by_patient = defaultdict(list)
+    rows = InsuranceContract.objects.filter(
+        patient_id__in=patient_ids, start_date__lte=last_date, end_date__gte=first_date,
+    ).order_by('start_date', 'id').values_list('id', 'patient_id', 'provider', 'start_date', 'end_date')
+    for contract_id, patient_id, provider, start_date, end_date in rows.iterator():
+        by_patient[patient_id].append((contract_id, provider.casefold(), start_date, end_date))
+
+    results = []
+    for check in checks:
+        provider = (check.get('provider') or '').casefold()
+        contract_ids = [
+            contract_id
+            for contract_id, contract_provider, start_date, end_date in by_patient[check['patient_id']]
+            if start_date <= check['date'] <= end_date and (not provider or contract_provider == provider)
+        ]
+        results.append({
+            'patient_id': check['patient_id'],
+            'date': check['date'],
+            'provider': check.get('provider') or None,
+            'eligible': bool(contract_ids),
+            'contracts': contract_ids,
+        })
+    return results
@@ -0,0 +1,272 @@
+# Nhập hàng loạt hợp đồng và yêu cầu bồi thường từ file của đối tác (CSV/NDJSON), đọc dạng stream theo lô
+import csv
+import io
+import json
+import logging
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .eligibility import invalidate_patient
+from .models import InsuranceClaim, InsuranceContract, claim_fingerprint
+from .serializers import ClaimImportSerializer, ContractImportSerializer
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+KINDS = ('contracts', 'claims')
+
+# Kết quả một lần nhập: số dòng đọc được, số dòng tạo mới/cập nhật, số dòng lỗi
+ImportReport = namedtuple('ImportReport', ['rows', 'created', 'updated', 'errors', 'seconds'])
+
+CONTRACTS = InsuranceContract._meta.db_table
+CLAIMS = InsuranceClaim._meta.db_table
+CONTRACT_COLUMNS = ['patient_id', 'policy_number', 'provider', 'start_date', 'end_date', 'details',
+                    'coverage_limit', 'per_claim_limit']
+CLAIM_COLUMNS = ['contract_id', 'amount', 'claim_date', 'description', 'status', 'fingerprint']
+
+# Bảng staging tạm thời của phiên kết nối; mỗi lô xóa sạch rồi COPY vào
+CONTRACT_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS contract_import_staging (
+    line integer NOT NULL,
+    patient_id integer NOT NULL,
+    policy_number varchar(50) NOT NULL,
+    provider varchar(100) NOT NULL,
+    start_date date NOT NULL,
+    end_date date NOT NULL,
+    details text,
+    coverage_limit numeric(12, 2),
+    per_claim_limit numeric(10, 2)
+)
+"""
+CLAIM_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS claim_import_staging (
+    line integer NOT NULL,
+    contract_id bigint NOT NULL,
+    amount numeric(10, 2) NOT NULL,
+    claim_date timestamptz NOT NULL,
+    description text NOT NULL,
+    status varchar(20) NOT NULL,
+    fingerprint varchar(64) NOT NULL
+)
+"""
+
+# Một policy_number xuất hiện nhiều lần trong lô thì dòng sau cùng thắng
+UPSERT_CONTRACTS_SQL = f"""
+INSERT INTO {CONTRACTS} ({', '.join(CONTRACT_COLUMNS)}, created_at, updated_at)
+SELECT DISTINCT ON (policy_number) {', '.join(CONTRACT_COLUMNS[:5])}, COALESCE(details, ''),
+       coverage_limit, per_claim_limit, %(now)s, %(now)s
+FROM contract_import_staging
+ORDER BY policy_number, line DESC
+ON CONFLICT (policy_number) DO UPDATE SET
+    {', '.join(f'{column} = EXCLUDED.{column}' for column in CONTRACT_COLUMNS if column != 'policy_number')},
+    updated_at = EXCLUDED.updated_at
+RETURNING patient_id, (xmax = 0) AS inserted
+"""
+
+# Claim trùng dấu vân tay với một claim chưa bị từ chối (claim_fingerprint_uniq) bị bỏ qua
+INSERT_CLAIMS_SQL = f"""
+INSERT INTO {CLAIMS} ({', '.join(CLAIM_COLUMNS)}, decision_reason, created_at, updated_at)
+SELECT {', '.join(CLAIM_COLUMNS)}, '', %(now)s, %(now)s
+FROM claim_import_staging
+ORDER BY line
+ON CONFLICT (fingerprint) WHERE status <> 'rejected' DO NOTHING
+RETURNING fingerprint
+"""
+
+
+def iter_records(stream, fmt):
+    """
+    Đọc từng dòng của file (mở ở chế độ nhị phân) mà không nạp cả file; sinh (số dòng, dict hoặc thông báo lỗi).
+
+    CSV phải có dòng tiêu đề; số dòng tính cả dòng tiêu đề như khi mở file bằng trình soạn thảo.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, 'Too many columns'
+            else:
+                yield reader.line_num, {key: value for key, value in record.items() if value != ''}
+        return
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, 'Expected a JSON object'
+        else:
+            yield line_number, record
+
+
+class ErrorWriter:
+    """Ghi lỗi của từng dòng ra file CSV bên cạnh (line, errors); chỉ tạo file khi có lỗi đầu tiên."""
+
+    def __init__(self, path, preview=0):
+        self.path = path
+        self.count = 0
+        self.preview = []
+        self.preview_size = preview
+        self._file = self._writer = None
+
+    def add(self, line, errors):
+        if self._writer is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['line', 'errors'])
+        message = errors if isinstance(errors, str) else json.dumps(errors, ensure_ascii=False)
+        self._writer.writerow([line, message])
+        self.count += 1
+        if len(self.preview) < self.preview_size:
+            self.preview.append({'line': line, 'errors': errors})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _validate(records, serializer, errors):
+    """
+    Kiểm tra một lô bằng serializer, không truy vấn database; dòng lỗi được ghi ra file lỗi.
+
+    Dùng lại một serializer cho mọi dòng (run_validation) thay vì tạo serializer mới mỗi dòng:
+    khởi tạo serializer phải deepcopy toàn bộ field và chiếm phần lớn thời gian nhập.
+    """
+    valid = []
+    for line, record in records:
+        if isinstance(record, str):
+            errors.add(line, record)
+            continue
+        try:
+            valid.append((line, serializer.run_validation(record)))
+        except ValidationError as exc:
+            errors.add(line, as_serializer_error(exc))
+    return valid
+
+
+def _copy(cursor, table, columns, rows):
+    # COPY FROM STDIN của một lô: bộ đệm chỉ chứa lô hiện tại
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.execute(f'TRUNCATE {table}')
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+@transaction.atomic
+def import_contract_chunk(rows):
+    """
+    Upsert một lô hợp đồng theo policy_number: COPY vào staging rồi một INSERT ... ON CONFLICT DO UPDATE.
+
+    Trả về (số tạo mới, số cập nhật). Cache kiểm tra hiệu lực của các bệnh nhân liên quan (cả
+    bệnh nhân cũ nếu hợp đồng đổi chủ) bị vô hiệu hóa sau khi commit, như signal của model.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(CONTRACT_STAGING_SQL)
+        _copy(cursor, 'contract_import_staging', ['line', *CONTRACT_COLUMNS], (
+            [line, *(data.get(column) for column in CONTRACT_COLUMNS)] for line, data in rows))
+        cursor.execute(
+            f'SELECT DISTINCT c.patient_id FROM {CONTRACTS} c '
+            f'JOIN contract_import_staging s ON s.policy_number = c.policy_number')
+        patient_ids = {patient_id for patient_id, in cursor.fetchall()}
+        cursor.execute(UPSERT_CONTRACTS_SQL, {'now': timezone.now()})
+        created = updated = 0
+        for patient_id, inserted in cursor.fetchall():
+            patient_ids.add(patient_id)
+            if inserted:
+                created += 1
+            else:
+                updated += 1
+    for patient_id in patient_ids:
+        transaction.on_commit(lambda patient_id=patient_id: invalidate_patient(patient_id))
+    return created, updated
+
+
+@transaction.atomic
+def import_claim_chunk(rows, errors):
+    """
+    Gắn một lô yêu cầu bồi thường vào hợp đồng theo policy_number: COPY vào staging rồi một INSERT ... ON CONFLICT.
+
+    Hợp đồng của cả lô được tra bằng một truy vấn. Dòng không tìm thấy hợp đồng hoặc trùng với
+    một claim đã có/một dòng trước đó (cùng dấu vân tay) được ghi vào file lỗi. Trả về số claim tạo mới.
+    """
+    contracts = dict(InsuranceContract.objects.filter(
+        policy_number__in={data['policy_number'] for _, data in rows}).values_list('policy_number', 'id'))
+    staged = []
+    lines_by_fingerprint = {}
+    for line, data in rows:
+        contract_id = contracts.get(data['policy_number'])
+        if contract_id is None:
+            errors.add(line, {'policy_number': [f"Contract {data['policy_number']} not found."]})
+            continue
+        fingerprint = claim_fingerprint(contract_id, data['amount'], data['claim_date'], data['description'])
+        if data['status'] != 'rejected':
+            if fingerprint in lines_by_fingerprint:
+                errors.add(line, f'Duplicate of line {lines_by_fingerprint[fingerprint]}')
+                continue
+            lines_by_fingerprint[fingerprint] = line
+        staged.append([line, contract_id, data['amount'], data['claim_date'].isoformat(), data['description'],
+                       data['status'], fingerprint])
+    if not staged:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CLAIM_STAGING_SQL)
+        _copy(cursor, 'claim_import_staging', ['line', *CLAIM_COLUMNS], staged)
+        cursor.execute(INSERT_CLAIMS_SQL, {'now': timezone.now()})
+        inserted = cursor.fetchall()
+    fingerprints = {fingerprint for fingerprint, in inserted}
+    for fingerprint, line in lines_by_fingerprint.items():
+        if fingerprint not in fingerprints:
+            errors.add(line, 'Duplicate of an existing claim')
+    return len(inserted)
+
+
+def import_file(stream, kind, fmt, errors_path, chunk_size=None, preview=0):
+    """
+    Nhập file hợp đồng hoặc yêu cầu bồi thường; trả về (ImportReport, ErrorWriter).
+
+    Chỉ chạy trên PostgreSQL. File được đọc dạng stream, mỗi lô chunk_size dòng được kiểm tra,
+    COPY vào staging và ghi vào bảng chính trong một transaction riêng: bộ nhớ dùng không phụ
+    thuộc kích thước file, và lô lỗi không làm mất các lô đã nhập trước đó.
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    serializer = ContractImportSerializer() if kind == 'contracts' else ClaimImportSerializer()
+    errors = ErrorWriter(errors_path, preview)
+    started = time.monotonic()
+    rows = created = updated = 0
+    records = iter_records(stream, fmt)
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            rows += len(chunk)
+            valid = _validate(chunk, serializer, errors)
+            if not valid:
+                continue
+            if kind == 'contracts':
+                chunk_created, chunk_updated = import_contract_chunk(valid)
+                updated += chunk_updated
+            else:
+                chunk_created = import_claim_chunk(valid, errors)
+            created += chunk_created
+    finally:
+        errors.close()
+    report = ImportReport(rows, created, updated, errors.count, time.monotonic() - started)
+    logger.info(f"Imported {kind}: {report.rows} rows, {report.created} created, {report.updated} updated, "
+                f"{report.errors} errors in {report.seconds:.2f}s")
+    return report, errors
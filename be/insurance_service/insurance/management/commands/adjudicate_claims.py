@@ -0,0 +1,34 @@
+"""
+Xét duyệt tự động các yêu cầu bồi thường đang chờ theo điều khoản hợp đồng (thời hạn, hạn mức
+mỗi claim, hạn mức cả hợp đồng) rồi in báo cáo thông lượng. Chạy định kỳ (cron), ví dụ:
+
+    python manage.py adjudicate_claims --workers 4 --chunk-size 1000
+
+Mỗi worker là một process xử lý một khoảng id hợp đồng riêng, từng lô một transaction.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from insurance.adjudication import run_adjudication
+
+
+class Command(BaseCommand):
+    help = 'Xét duyệt các yêu cầu bồi thường pending theo điều khoản hợp đồng.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Số process chạy song song')
+        parser.add_argument('--chunk-size', type=int, default=settings.ADJUDICATION_CHUNK_SIZE,
+                            help='Số yêu cầu bồi thường mỗi lô')
+
+    def handle(self, *args, **options):
+        total, per_worker = run_adjudication(max(1, options['workers']), options['chunk_size'])
+        for (first, last), stats in per_worker:
+            processed = stats.approved + stats.rejected
+            rate = processed / stats.seconds if stats.seconds else 0
+            self.stdout.write(
+                f'  Hợp đồng {first}-{last}: {processed} claim ({stats.approved} duyệt, {stats.rejected} từ chối), '
+                f'{stats.chunks} lô, {stats.seconds:.2f}s, {rate:.0f} claim/s')
+        processed = total.approved + total.rejected
+        rate = processed / total.seconds if total.seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã xét duyệt {processed} claim ({total.approved} duyệt, {total.rejected} từ chối) '
+            f'trong {total.seconds:.2f}s với {len(per_worker)} worker: {rate:.0f} claim/s'))
@@ -0,0 +1,33 @@
+"""
+Đánh dấu các yêu cầu bồi thường bất thường được tạo gần đây. Chạy hằng đêm (cron), ví dụ:
+
+    python manage.py detect_claim_anomalies --hours 24
+
+- Gần trùng: claim kề bên (theo claim_date) của cùng hợp đồng cách nhau không quá
+  CLAIM_DUPLICATE_WINDOW_HOURS giờ và lệch số tiền không quá CLAIM_DUPLICATE_AMOUNT_TOLERANCE.
+- Số tiền lệch: |z-score| của số tiền so với các claim cùng nhà cung cấp từ CLAIM_OUTLIER_Z_SCORE trở lên.
+
+Kết quả được ghi vào ClaimFlag (xem GET /api/claims/flags/); chạy lại không tạo đánh dấu trùng.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from insurance.anomalies import detect_anomalies
+
+
+class Command(BaseCommand):
+    help = 'Đánh dấu các yêu cầu bồi thường gần trùng hoặc có số tiền bất thường (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Xét các claim được tạo trong số giờ gần nhất')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số dòng đọc từ cursor mỗi lần')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('detect_claim_anomalies chỉ hỗ trợ PostgreSQL.')
+        report = detect_anomalies(timezone.now() - timedelta(hours=options['hours']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã đánh dấu {report.near_duplicates} claim gần trùng và {report.outliers} claim có số tiền bất thường '
+            f'(tạo từ {report.since:%Y-%m-%d %H:%M})'))
@@ -0,0 +1,114 @@
+"""
+Seed dữ liệu lớn rồi so sánh query plan của các truy vấn tra cứu khi có và không có index.
+
+Mọi thao tác (seed, ANALYZE, DROP INDEX) chạy trong một transaction và bị rollback ở cuối,
+nên database không bị thay đổi. DROP INDEX giữ khóa độc quyền trên bảng cho tới khi rollback,
+vì vậy chỉ chạy trên database dev/staging:
+
+    python manage.py explain_indexes --rows 1000000
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from insurance.models import InsuranceContract, InsuranceClaim
+
+
+class Command(BaseCommand):
+    help = 'So sánh query plan của các truy vấn hợp đồng/bồi thường trước/sau khi có index (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Số yêu cầu bồi thường được seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_indexes chỉ hỗ trợ PostgreSQL.')
+        rows = options['rows']
+
+        with transaction.atomic():
+            self.seed(rows)
+            cases = self.cases()
+            self.report('Có index', cases)
+            with connection.cursor() as cursor:
+                for index_name in {name for _, _, names in cases for name in names}:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(index_name)}')
+            self.report('Không có index', cases)
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        contracts = max(rows // 10, 1)
+        self.stdout.write(f'Seed {contracts} hợp đồng và {rows} yêu cầu bồi thường...')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {InsuranceContract._meta.db_table}
+                    (patient_id, policy_number, provider, start_date, end_date, details, created_at, updated_at)
+                SELECT g %% 50000,
+                       'SEED-' || g,
+                       'Bảo Việt',
+                       DATE '2020-01-01' + (g %% 1500),
+                       DATE '2021-01-01' + (g %% 1500),
+                       '',
+                       now() - g * interval '1 second',
+                       now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [contracts],
+            )
+            cursor.execute(
+                f"SELECT min(id) FROM {InsuranceContract._meta.db_table} WHERE policy_number LIKE 'SEED-%%'"
+            )
+            first_contract = cursor.fetchone()[0]
+            cursor.execute(
+                f"""
+                INSERT INTO {InsuranceClaim._meta.db_table}
+                    (contract_id, amount, claim_date, description, status, created_at, updated_at)
+                SELECT %s + g %% %s,
+                       (g %% 10000) / 10.0,
+                       now() - (g %% 525600) * interval '1 minute',
+                       '',
+                       CASE WHEN g %% 20 = 0 THEN 'pending' ELSE 'approved' END,
+                       now() - g * interval '1 second',
+                       now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [first_contract, contracts, rows],
+            )
+            cursor.execute(f'ANALYZE {InsuranceContract._meta.db_table}')
+            cursor.execute(f'ANALYZE {InsuranceClaim._meta.db_table}')
+
+    def cases(self):
+        # (tên truy vấn, queryset giống endpoint, các index phục vụ truy vấn đó)
+        return [
+            (
+                'filter_by_patient',
+                InsuranceContract.objects.filter(patient_id=4242).order_by('start_date'),
+                ['contract_coverage_idx'],
+            ),
+            (
+                'eligibility',
+                InsuranceContract.objects.filter(patient_id=4242, start_date__lte='2025-06-01', end_date__gte='2025-06-01'),
+                ['contract_coverage_idx'],
+            ),
+            (
+                'claim pending theo hợp đồng',
+                InsuranceClaim.objects.filter(contract__patient_id=4242, status='pending'),
+                ['claim_pending_idx', 'contract_coverage_idx'],
+            ),
+            (
+                'list (trang đầu)',
+                InsuranceClaim.objects.order_by('-created_at', '-id')[:51],
+                ['claim_created_idx'],
+            ),
+        ]
+
+    def report(self, title, cases):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        with connection.cursor() as cursor:
+            for label, queryset, _ in cases:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+                plan = [line for (line,) in cursor.fetchall()]
+                scans = [line.strip().lstrip('-> ').split('  (')[0] for line in plan if 'Scan' in line]
+                timing = next((line for line in plan if line.startswith('Execution Time')), '')
+                self.stdout.write(f'  {label}: {timing}')
+                for scan in scans:
+                    self.stdout.write(f'      {scan}')
@@ -0,0 +1,44 @@
+"""
+Nhập file hợp đồng hoặc yêu cầu bồi thường của đối tác (CSV có dòng tiêu đề hoặc NDJSON), ví dụ:
+
+    python manage.py import_partner_file contracts.csv --kind contracts
+    python manage.py import_partner_file claims.ndjson --kind claims --errors claims.errors.csv
+
+Hợp đồng được upsert theo policy_number; yêu cầu bồi thường tham chiếu hợp đồng bằng policy_number.
+File được đọc dạng stream, mỗi lô IMPORT_CHUNK_SIZE dòng là một transaction (COPY vào bảng staging
+rồi INSERT ... ON CONFLICT). Dòng lỗi được ghi vào file lỗi (mặc định <file>.errors.csv).
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from insurance.imports import FORMATS, KINDS, import_file
+
+
+class Command(BaseCommand):
+    help = 'Nhập hợp đồng/yêu cầu bồi thường từ file CSV hoặc NDJSON của đối tác (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File CSV/NDJSON cần nhập')
+        parser.add_argument('--kind', choices=KINDS, default='contracts', help='Loại dữ liệu trong file')
+        parser.add_argument('--format', choices=FORMATS, help='Định dạng file (mặc định theo phần mở rộng)')
+        parser.add_argument('--errors', help='File ghi lỗi của từng dòng (mặc định <file>.errors.csv)')
+        parser.add_argument('--chunk-size', type=int, default=settings.IMPORT_CHUNK_SIZE, help='Số dòng mỗi lô')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_partner_file chỉ hỗ trợ PostgreSQL.')
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Không tìm thấy file {path}.')
+        fmt = options['format'] or ('ndjson' if path.suffix.lower() in ('.ndjson', '.jsonl') else 'csv')
+        errors_path = options['errors'] or f'{path}.errors.csv'
+        with path.open('rb') as stream:
+            report, errors = import_file(stream, options['kind'], fmt, errors_path, options['chunk_size'])
+        rate = report.rows / report.seconds if report.seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã đọc {report.rows} dòng: {report.created} tạo mới, {report.updated} cập nhật, {report.errors} lỗi '
+            f'trong {report.seconds:.2f}s ({rate:.0f} dòng/s)'))
+        if report.errors:
+            self.stdout.write(self.style.WARNING(f'Lỗi từng dòng được ghi vào {errors.path}'))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction,
+    # đổi lại bảng không bị khóa ghi trong lúc tạo index trên dữ liệu lớn.
+    atomic = False
+
+    dependencies = [
+        ('insurance', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='insuranceclaim',
+            index=models.Index(fields=['-created_at', '-id'], name='claim_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='insuranceclaim',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['contract', 'claim_date'], name='claim_pending_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='insurancecontract',
+            index=models.Index(fields=['patient_id', 'start_date'], name='contract_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='insurancecontract',
+            index=models.Index(fields=['-created_at', '-id'], name='contract_created_idx'),
+        ),
+    ]
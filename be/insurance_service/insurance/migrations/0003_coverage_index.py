@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY không chạy được trong transaction.
+    # Tạo index mới trước rồi mới bỏ contract_patient_idx (là tiền tố của index mới).
+    atomic = False
+
+    dependencies = [
+        ('insurance', '0002_lookup_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='insurancecontract',
+            index=models.Index(fields=['patient_id', 'start_date', 'end_date'], name='contract_coverage_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='insurancecontract',
+            name='contract_patient_idx',
+        ),
+    ]
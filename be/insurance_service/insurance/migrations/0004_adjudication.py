@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance', '0003_coverage_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceclaim',
+            name='adjudicated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='insuranceclaim',
+            name='decision_reason',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='insurancecontract',
+            name='coverage_limit',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='insurancecontract',
+            name='per_claim_limit',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
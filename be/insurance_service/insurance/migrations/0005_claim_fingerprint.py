@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:24
+
+import hashlib
+import re
+import unicodedata
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+# Bản sao của insurance.models.normalize_description/claim_fingerprint tại thời điểm tạo migration:
+# migration phải cho cùng kết quả kể cả khi các hàm trong models đổi sau này
+def normalize_description(description):
+    text = unicodedata.normalize('NFKD', description or '').replace('đ', 'd').replace('Đ', 'D')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def claim_fingerprint(contract_id, amount, claim_date, description):
+    if timezone.is_naive(claim_date):
+        claim_date = timezone.make_aware(claim_date)
+    amount = Decimal(amount).quantize(Decimal('0.01'))
+    day = timezone.localtime(claim_date).date()
+    key = f'{contract_id}|{amount}|{day.isoformat()}|{normalize_description(description)}'
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    # Tính dấu vân tay cho các yêu cầu đã có. Nếu dữ liệu cũ đã có bản trùng (chưa bị từ chối)
+    # thì chỉ bản có id nhỏ nhất giữ dấu vân tay, các bản sau để NULL cho lệnh detect_claim_anomalies đánh dấu
+    InsuranceClaim = apps.get_model('insurance', 'InsuranceClaim')
+    # Dấu vân tay chứa contract_id nên chỉ cần nhớ các dấu vân tay của hợp đồng đang duyệt
+    current_contract, seen = None, set()
+    batch = []
+    rows = InsuranceClaim.objects.order_by('contract_id', 'id').values_list('id', 'contract_id', 'amount', 'claim_date', 'description', 'status')
+    for claim_id, contract_id, amount, claim_date, description, status in rows.iterator(chunk_size=2000):
+        if contract_id != current_contract:
+            current_contract, seen = contract_id, set()
+        fingerprint = claim_fingerprint(contract_id, amount, claim_date, description)
+        if status != 'rejected':
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+        batch.append(InsuranceClaim(id=claim_id, fingerprint=fingerprint))
+        if len(batch) >= 1000:
+            InsuranceClaim.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    InsuranceClaim.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance', '0004_adjudication'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('near_duplicate', 'Near duplicate'), ('outlier_amount', 'Outlier amount')], max_length=20)),
+                ('score', models.FloatField()),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='insuranceclaim',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='insuranceclaim',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'rejected'), _negated=True), fields=('fingerprint',), name='claim_fingerprint_uniq'),
+        ),
+        migrations.AddField(
+            model_name='claimflag',
+            name='claim',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flags', to='insurance.insuranceclaim'),
+        ),
+        migrations.AddField(
+            model_name='claimflag',
+            name='related_claim',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='insurance.insuranceclaim'),
+        ),
+        migrations.AddIndex(
+            model_name='claimflag',
+            index=models.Index(fields=['-created_at', '-id'], name='claim_flag_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='claimflag',
+            constraint=models.UniqueConstraint(fields=('claim', 'kind'), name='claim_flag_uniq'),
+        ),
+    ]
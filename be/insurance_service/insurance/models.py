@@ -1,5 +1,33 @@
 # Định nghĩa các model cho insurance_service
+import hashlib
+import re
+import unicodedata
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
+
+
+def normalize_description(description):
+    """Mô tả đã chuẩn hóa để so trùng: bỏ dấu, chữ thường, chỉ giữ chữ/số, gộp khoảng trắng."""
+    text = unicodedata.normalize('NFKD', description or '').replace('đ', 'd').replace('Đ', 'D')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def claim_fingerprint(contract_id, amount, claim_date, description):
+    """
+    Dấu vân tay của yêu cầu bồi thường: sha256 của (hợp đồng, số tiền, ngày của claim_date, mô tả đã chuẩn hóa).
+
+    Hai yêu cầu cùng hợp đồng, cùng số tiền, cùng ngày và cùng mô tả (khác hoa thường, dấu, dấu
+    câu) có cùng dấu vân tay.
+    """
+    if timezone.is_naive(claim_date):
+        claim_date = timezone.make_aware(claim_date)
+    amount = Decimal(amount).quantize(Decimal('0.01'))
+    day = timezone.localtime(claim_date).date()
+    key = f'{contract_id}|{amount}|{day.isoformat()}|{normalize_description(description)}'
+    return hashlib.sha256(key.encode()).hexdigest()
 
 class InsuranceContract(models.Model):
     # ID bệnh nhân (lưu trực tiếp, không kiểm tra)
@@ -14,10 +42,21 @@ class InsuranceContract(models.Model):
     end_date = models.DateField()
     # Chi tiết hợp đồng
     details = models.TextField(blank=True)
+    # Hạn mức chi trả của cả hợp đồng và của mỗi yêu cầu bồi thường (NULL: không giới hạn)
+    coverage_limit = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    per_claim_limit = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     # Thời gian tạo và cập nhật
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # filter_by_patient (tiền tố patient_id) và kiểm tra hiệu lực bảo hiểm:
+            # patient_id = P AND start_date <= D AND end_date >= D đọc được cả hai ngày ngay trên index
+            models.Index(fields=['patient_id', 'start_date', 'end_date'], name='contract_coverage_idx'),
+            models.Index(fields=['-created_at', '-id'], name='contract_created_idx'),
+        ]
+
     def __str__(self):
         return f"Contract {self.policy_number} for Patient {self.patient_id}"
 
@@ -38,9 +77,69 @@ class InsuranceClaim(models.Model):
     description = models.TextField()
     # Trạng thái yêu cầu
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Lý do duyệt/từ chối và thời điểm xét duyệt tự động (lệnh adjudicate_claims)
+    decision_reason = models.CharField(max_length=255, blank=True)
+    adjudicated_at = models.DateTimeField(null=True, blank=True)
+    # Dấu vân tay để chặn nộp trùng (tính khi save; NULL với các dòng tạo bằng bulk_create)
+    fingerprint = models.CharField(max_length=64, null=True, blank=True, editable=False)
     # Thời gian tạo và cập nhật
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # Kiểm tra trùng lúc insert bằng một lần tra unique index; yêu cầu đã bị từ chối được nộp lại
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                name='claim_fingerprint_uniq',
+                condition=~models.Q(status='rejected'),
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='claim_created_idx'),
+            # Các yêu cầu bồi thường chờ duyệt theo hợp đồng (chỉ index các dòng pending)
+            models.Index(
+                fields=['contract', 'claim_date'],
+                name='claim_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        claim_date = self._meta.get_field('claim_date').to_python(self.claim_date)
+        self.fingerprint = claim_fingerprint(self.contract_id, self.amount, claim_date, self.description)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'contract', 'amount', 'claim_date', 'description'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'fingerprint'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Claim for Contract {self.contract.policy_number}"
+
+class ClaimFlag(models.Model):
+    # Loại bất thường do lệnh detect_claim_anomalies phát hiện
+    KIND_CHOICES = (
+        ('near_duplicate', 'Near duplicate'),
+        ('outlier_amount', 'Outlier amount'),
+    )
+    # Yêu cầu bồi thường bị đánh dấu
+    claim = models.ForeignKey(InsuranceClaim, on_delete=models.CASCADE, related_name='flags')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Yêu cầu gần trùng với claim (chỉ với near_duplicate)
+    related_claim = models.ForeignKey(InsuranceClaim, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # near_duplicate: số giờ giữa hai claim; outlier_amount: z-score của số tiền theo nhà cung cấp
+    score = models.FloatField()
+    detail = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Chạy lại lệnh không đánh dấu một claim hai lần cho cùng một loại
+            models.UniqueConstraint(fields=['claim', 'kind'], name='claim_flag_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='claim_flag_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Claim for Contract {self.contract.policy_number}"
\ No newline at end of file
+        return f"{self.kind} flag on Claim {self.claim_id}"
\ No newline at end of file
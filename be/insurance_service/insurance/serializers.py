@@ -1,15 +1,73 @@
 # Định nghĩa serializers để xử lý dữ liệu API
+from django.conf import settings
 from rest_framework import serializers
-from .models import InsuranceContract, InsuranceClaim
+from .models import ClaimFlag, InsuranceContract, InsuranceClaim
 
 class InsuranceContractSerializer(serializers.ModelSerializer):
     class Meta:
         model = InsuranceContract
-        fields = ['id', 'patient_id', 'policy_number', 'provider', 'start_date', 'end_date', 'details', 'created_at', 'updated_at']
+        fields = ['id', 'patient_id', 'policy_number', 'provider', 'start_date', 'end_date', 'details',
+                  'coverage_limit', 'per_claim_limit', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 class InsuranceClaimSerializer(serializers.ModelSerializer):
     class Meta:
         model = InsuranceClaim
-        fields = ['id', 'contract', 'amount', 'claim_date', 'description', 'status', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'contract', 'amount', 'claim_date', 'description', 'status',
+                  'decision_reason', 'adjudicated_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'decision_reason', 'adjudicated_at', 'created_at', 'updated_at']
+
+class ClaimFlagSerializer(serializers.ModelSerializer):
+    class Meta:
+        # Đánh dấu bất thường chỉ đọc qua API
+        model = ClaimFlag
+        fields = ['id', 'claim', 'kind', 'related_claim', 'score', 'detail', 'created_at']
+        read_only_fields = fields
+
+class EligibilityQuerySerializer(serializers.Serializer):
+    # Query string của GET /api/insurance_contracts/eligibility/; không gửi date thì lấy ngày hôm nay
+    patient_id = serializers.IntegerField()
+    date = serializers.DateField(required=False)
+    provider = serializers.CharField(max_length=100, required=False, allow_blank=True)
+
+
+class EligibilityBatchSerializer(serializers.Serializer):
+    # Body của POST /api/insurance_contracts/eligibility/batch/: {"checks": [{"patient_id", "date", "provider"}]}
+    checks = EligibilityQuerySerializer(many=True, allow_empty=False)
+
+    def validate_checks(self, value):
+        if len(value) > settings.ELIGIBILITY_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {settings.ELIGIBILITY_BATCH_MAX_ITEMS} checks per request.")
+        return value
+
+
+class ContractImportSerializer(serializers.Serializer):
+    # Một dòng của file nhập hợp đồng; không kiểm tra policy_number trùng (nhập là upsert theo policy_number)
+    patient_id = serializers.IntegerField()
+    policy_number = serializers.CharField(max_length=50)
+    provider = serializers.CharField(max_length=100)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    details = serializers.CharField(required=False, allow_blank=True, default='')
+    coverage_limit = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, allow_null=True)
+    per_claim_limit = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError({'end_date': 'Must not be before start_date.'})
+        return data
+
+
+class ClaimImportSerializer(serializers.Serializer):
+    # Một dòng của file nhập yêu cầu bồi thường; hợp đồng được tham chiếu bằng policy_number
+    policy_number = serializers.CharField(max_length=50)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    claim_date = serializers.DateTimeField()
+    description = serializers.CharField()
+    status = serializers.ChoiceField(choices=InsuranceClaim.STATUS_CHOICES, default='pending')
+
+
+class ImportQuerySerializer(serializers.Serializer):
+    # Query string của POST /api/insurance_contracts/import/
+    kind = serializers.ChoiceField(choices=['contracts', 'claims'], default='contracts')
+    format = serializers.ChoiceField(choices=['csv', 'ndjson'], required=False)
@@ -0,0 +1,25 @@
+# Vô hiệu hóa cache kiểm tra hiệu lực bảo hiểm mỗi khi hợp đồng thay đổi
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .eligibility import invalidate_patient
+from .models import InsuranceContract
+
+
+@receiver(pre_save, sender=InsuranceContract)
+def remember_patient(sender, instance, raw=False, **kwargs):
+    # Hợp đồng chuyển sang bệnh nhân khác thì cache của bệnh nhân cũ cũng phải bỏ
+    instance._previous_patient_id = None
+    if instance.pk and not raw:
+        instance._previous_patient_id = (
+            InsuranceContract.objects.filter(pk=instance.pk).values_list('patient_id', flat=True).first())
+
+
+@receiver(post_save, sender=InsuranceContract)
+@receiver(post_delete, sender=InsuranceContract)
+def invalidate_eligibility(sender, instance, **kwargs):
+    patient_ids = {instance.patient_id, getattr(instance, '_previous_patient_id', None)} - {None}
+    # Đổi phiên bản sau khi commit: request đọc ngay sau đó không nạp lại dữ liệu cũ vào cache
+    for patient_id in patient_ids:
+        transaction.on_commit(lambda patient_id=patient_id: invalidate_patient(patient_id))
@@ -1,7 +1,25 @@
 # Tệp kiểm thử cho ứng dụng insurance
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import json
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIClient
 
+from .adjudication import adjudicate_chunk, contract_ranges, run_adjudication
+from .anomalies import detect_anomalies
+from .models import ClaimFlag, InsuranceClaim, InsuranceContract, claim_fingerprint
+
 class InsuranceContractTests(TestCase):
     def setUp(self):
         # Khởi tạo client để gửi yêu cầu API
@@ -17,4 +35,331 @@ class InsuranceClaimTests(TestCase):
 
     def test_create_insurance_claim(self):
         # Viết test cases sau
-        pass
\ No newline at end of file
+        pass
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EligibilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.bhyt = self.create_contract(1, 'BHYT-1', 'BHYT', '2025-01-01', '2025-12-31')
+        self.create_contract(1, 'BV-1', 'Bảo Việt', '2025-06-01', '2025-06-30')
+        self.create_contract(2, 'BHYT-2', 'BHYT', '2024-01-01', '2024-12-31')
+
+    def create_contract(self, patient_id, policy_number, provider, start_date, end_date):
+        with self.captureOnCommitCallbacks(execute=True):
+            return InsuranceContract.objects.create(
+                patient_id=patient_id, policy_number=policy_number, provider=provider,
+                start_date=start_date, end_date=end_date)
+
+    def eligibility(self, **params):
+        return self.client.get('/api/insurance_contracts/eligibility/', params)
+
+    def test_active_contracts_on_date(self):
+        response = self.eligibility(patient_id=1, date='2025-06-15')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['eligible'])
+        self.assertEqual([contract['policy_number'] for contract in response.data['contracts']], ['BHYT-1', 'BV-1'])
+        # Ngày bắt đầu và ngày hết hạn đều tính là còn hiệu lực
+        self.assertTrue(self.eligibility(patient_id=1, date='2025-12-31').data['eligible'])
+        self.assertFalse(self.eligibility(patient_id=1, date='2026-01-01').data['eligible'])
+        self.assertFalse(self.eligibility(patient_id=2, date='2025-06-15').data['eligible'])
+        self.assertEqual(self.eligibility(date='2025-06-15').status_code, 400)
+
+    def test_provider_filter_and_cache(self):
+        self.assertEqual(self.eligibility(patient_id=1, date='2025-06-15')['X-Cache'], 'MISS')
+        # Nhà cung cấp khác nhau dùng chung entry của (bệnh nhân, ngày)
+        with self.assertNumQueries(0):
+            response = self.eligibility(patient_id=1, date='2025-06-15', provider='bhyt')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual([contract['policy_number'] for contract in response.data['contracts']], ['BHYT-1'])
+        self.assertFalse(self.eligibility(patient_id=1, date='2025-07-15', provider='Bảo Việt').data['eligible'])
+
+    def test_contract_writes_invalidate_cache(self):
+        self.assertTrue(self.eligibility(patient_id=1, date='2025-03-01').data['eligible'])
+        self.assertFalse(self.eligibility(patient_id=2, date='2025-03-01').data['eligible'])
+        # Chuyển hợp đồng sang bệnh nhân khác: cache của cả hai bệnh nhân đều được bỏ
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/insurance_contracts/{self.bhyt.id}/', {'patient_id': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.eligibility(patient_id=1, date='2025-03-01').data['eligible'])
+        self.assertTrue(self.eligibility(patient_id=2, date='2025-03-01').data['eligible'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/insurance_contracts/{self.bhyt.id}/')
+        self.assertFalse(self.eligibility(patient_id=2, date='2025-03-01').data['eligible'])
+
+    def test_batch_uses_one_query(self):
+        checks = [{'patient_id': patient_id, 'date': f'2025-{month:02d}-15'}
+                  for patient_id in range(1, 500) for month in (1, 6)]
+        checks.append({'patient_id': 1, 'date': '2025-06-15', 'provider': 'Bảo Việt'})
+        checks.append({'patient_id': 2, 'date': '2024-05-01'})
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/insurance_contracts/eligibility/batch/', {'checks': checks}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(checks))
+        self.assertEqual(response.data[0]['contracts'], [self.bhyt.id])
+        self.assertEqual(len(response.data[1]['contracts']), 2)
+        self.assertFalse(response.data[2]['eligible'])
+        self.assertEqual(len(response.data[-2]['contracts']), 1)
+        self.assertTrue(response.data[-1]['eligible'])
+
+    @override_settings(ELIGIBILITY_BATCH_MAX_ITEMS=2)
+    def test_batch_size_is_limited(self):
+        checks = [{'patient_id': 1, 'date': '2025-06-15'}] * 3
+        response = self.client.post('/api/insurance_contracts/eligibility/batch/', {'checks': checks}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+def claim_at(contract, amount, day, month=6):
+    return InsuranceClaim(contract=contract, amount=Decimal(amount), description='Khám bệnh',
+                          claim_date=datetime(2025, month, day, 9, tzinfo=dt_timezone.utc))
+
+
+class AdjudicationTests(TestCase):
+    def setUp(self):
+        self.contract = InsuranceContract.objects.create(
+            patient_id=1, policy_number='CAP-1', provider='BHYT', start_date='2025-01-01', end_date='2025-12-31',
+            coverage_limit=Decimal('1000.00'), per_claim_limit=Decimal('600.00'))
+        self.unlimited = InsuranceContract.objects.create(
+            patient_id=2, policy_number='FREE-1', provider='BHYT', start_date='2025-01-01', end_date='2025-06-30')
+
+    def decisions(self):
+        return list(InsuranceClaim.objects.order_by('id').values_list('status', flat=True))
+
+    def test_rules_and_cumulative_cap(self):
+        InsuranceClaim.objects.create(contract=self.contract, amount=Decimal('300.00'), description='Đã duyệt',
+                                      claim_date=datetime(2025, 2, 1, tzinfo=dt_timezone.utc), status='approved')
+        InsuranceClaim.objects.bulk_create([
+            claim_at(self.contract, '400.00', 1),  # 700 / 1000
+            claim_at(self.contract, '700.00', 2),  # vượt hạn mức mỗi claim
+            claim_at(self.contract, '400.00', 3),  # 1100 > 1000
+            claim_at(self.contract, '300.00', 4),  # 1000 / 1000
+            claim_at(self.contract, '0.00', 5),
+            claim_at(self.unlimited, '5000.00', 1),
+            claim_at(self.unlimited, '10.00', 1, month=7),  # ngoài thời hạn
+        ])
+        total, per_worker = run_adjudication(workers=1, chunk_size=3)
+        self.assertEqual((total.approved, total.rejected), (3, 4))
+        self.assertEqual(self.decisions(), ['approved', 'approved', 'rejected', 'rejected', 'approved', 'rejected',
+                                            'approved', 'rejected'])
+        reasons = list(InsuranceClaim.objects.filter(status='rejected').order_by('id').values_list('decision_reason', flat=True))
+        self.assertIn('per-claim limit', reasons[0])
+        self.assertIn('remaining coverage of 300.00', reasons[1])
+        self.assertIn('outside the coverage window', reasons[3])
+        self.assertFalse(InsuranceClaim.objects.filter(adjudicated_at__isnull=True).exclude(description='Đã duyệt').exists())
+        # Không còn claim pending: chạy lại không làm gì
+        self.assertEqual(run_adjudication()[0].chunks, 0)
+
+    def test_chunks_use_constant_queries(self):
+        InsuranceClaim.objects.bulk_create([claim_at(self.unlimited, '10.00', day % 28 + 1) for day in range(200)])
+        # Chia khoảng; lô đầy: đọc claim, hợp đồng, tổng đã duyệt, bulk_update (cộng savepoint); lô rỗng cuối
+        with self.assertNumQueries(1 + 6 + 3):
+            total, _ = run_adjudication(chunk_size=500)
+        self.assertEqual(total.approved, 200)
+
+    def test_contract_ranges_are_disjoint(self):
+        InsuranceClaim.objects.bulk_create([claim_at(self.contract, '1.00', 1), claim_at(self.unlimited, '1.00', 1)])
+        ranges = contract_ranges(4)
+        self.assertEqual(ranges, [(self.contract.id, self.contract.id), (self.unlimited.id, self.unlimited.id)])
+
+    def test_command_prints_throughput(self):
+        InsuranceClaim.objects.bulk_create([claim_at(self.unlimited, '10.00', 1)])
+        out = StringIO()
+        call_command('adjudicate_claims', stdout=out)
+        self.assertIn('Đã xét duyệt 1 claim', out.getvalue())
+        self.assertIn('claim/s', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Cần PostgreSQL để chạy nhiều worker song song')
+class ParallelAdjudicationTests(TransactionTestCase):
+    def test_workers_split_contracts_without_overspending(self):
+        contracts = InsuranceContract.objects.bulk_create([
+            InsuranceContract(patient_id=n, policy_number=f'P-{n}', provider='BHYT', start_date='2025-01-01',
+                              end_date='2025-12-31', coverage_limit=Decimal('100.00'))
+            for n in range(40)
+        ])
+        InsuranceClaim.objects.bulk_create([
+            claim_at(contract, '30.00', day) for contract in contracts for day in range(1, 11)
+        ])
+        total, per_worker = run_adjudication(workers=4, chunk_size=50)
+        self.assertEqual(len(per_worker), 4)
+        self.assertEqual((total.approved, total.rejected), (40 * 3, 40 * 7))
+        self.assertFalse(InsuranceClaim.objects.filter(status='pending').exists())
+
+    def test_chunk_waits_for_manual_update_of_the_contract(self):
+        contract = InsuranceContract.objects.create(
+            patient_id=1, policy_number='LOCK-1', provider='BHYT', start_date='2025-01-01', end_date='2025-12-31',
+            coverage_limit=Decimal('100.00'))
+        older, manual, newer = InsuranceClaim.objects.bulk_create([
+            claim_at(contract, '60.00', 1), claim_at(contract, '60.00', 2), claim_at(contract, '30.00', 3)])
+        locked, release = threading.Event(), threading.Event()
+
+        def approve_by_hand():
+            # Giữ khóa như InsuranceClaimViewSet.update: claim cũ nhất đang bị khóa, hợp đồng bị khóa
+            try:
+                with transaction.atomic():
+                    InsuranceClaim.objects.select_for_update().get(pk=older.pk)
+                    InsuranceContract.objects.select_for_update().get(pk=contract.pk)
+                    InsuranceClaim.objects.filter(pk=manual.pk).update(status='approved')
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=approve_by_hand)
+        thread.start()
+        locked.wait(5)
+        threading.Timer(0.2, release.set).start()
+        # Lô chờ claim cũ nhất thay vì bỏ qua nó, và thấy claim vừa được duyệt tay khi tính hạn mức
+        self.assertEqual(adjudicate_chunk(contract.pk, contract.pk, 10), (1, 1))
+        thread.join()
+        statuses = dict(InsuranceClaim.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[older.pk], statuses[manual.pk], statuses[newer.pk]], ['rejected', 'approved', 'approved'])
+
+
+class ClaimFingerprintTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.contract = InsuranceContract.objects.create(
+            patient_id=1, policy_number='FP-1', provider='BHYT', start_date='2025-01-01', end_date='2025-12-31')
+        self.body = {'contract': self.contract.id, 'amount': '500.00', 'claim_date': '2025-06-01T09:00:00Z',
+                     'description': 'Khám bệnh, nội trú'}
+
+    def test_fingerprint_normalizes_description_and_day(self):
+        morning = datetime(2025, 6, 1, 9, tzinfo=dt_timezone.utc)
+        fingerprint = claim_fingerprint(1, Decimal('500'), morning, 'Khám bệnh, nội trú')
+        self.assertEqual(fingerprint, claim_fingerprint(1, '500.00', morning + timedelta(hours=8), '  KHAM benh noi-tru '))
+        self.assertNotEqual(fingerprint, claim_fingerprint(1, '500.00', morning + timedelta(days=1), 'Khám bệnh, nội trú'))
+        self.assertNotEqual(fingerprint, claim_fingerprint(2, '500.00', morning, 'Khám bệnh, nội trú'))
+
+    def test_duplicate_submission_is_rejected(self):
+        first = self.client.post('/api/claims/', self.body, format='json')
+        self.assertEqual(first.status_code, 201)
+        duplicate = self.client.post('/api/claims/', {**self.body, 'description': 'KHÁM BỆNH nội trú'}, format='json')
+        self.assertEqual(duplicate.status_code, 409)
+        self.assertIn(str(first.data['id']), duplicate.data['detail'])
+        self.assertEqual(InsuranceClaim.objects.count(), 1)
+        # Khác số tiền thì không phải bản trùng
+        self.assertEqual(self.client.post('/api/claims/', {**self.body, 'amount': '501.00'}, format='json').status_code, 201)
+
+    def test_rejected_claim_can_be_resubmitted(self):
+        first = self.client.post('/api/claims/', self.body, format='json')
+        self.client.put(f"/api/claims/{first.data['id']}/", {'status': 'rejected'}, format='json')
+        second = self.client.post('/api/claims/', self.body, format='json')
+        self.assertEqual(second.status_code, 201)
+        # Mở lại claim đã từ chối khi bản nộp lại còn hiệu lực thì bị chặn
+        reopened = self.client.put(f"/api/claims/{first.data['id']}/", {'status': 'pending'}, format='json')
+        self.assertEqual(reopened.status_code, 409)
+        self.assertEqual(InsuranceClaim.objects.get(pk=first.data['id']).status, 'rejected')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Phát hiện bất thường dùng window function của PostgreSQL')
+@override_settings(CLAIM_ANOMALY_LOOKBACK_DAYS=3650, CLAIM_OUTLIER_MIN_CLAIMS=10)
+class AnomalyDetectionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.history = InsuranceContract.objects.create(
+            patient_id=1, policy_number='AN-1', provider='BHYT', start_date='2025-01-01', end_date='2025-12-31')
+        self.recent = InsuranceContract.objects.create(
+            patient_id=2, policy_number='AN-2', provider='bhyt', start_date='2025-01-01', end_date='2025-12-31')
+        # Lịch sử của nhà cung cấp: claim cách nhau 5 ngày, số tiền lệch nhau 2%
+        start = datetime(2025, 1, 1, 9, tzinfo=dt_timezone.utc)
+        InsuranceClaim.objects.bulk_create([
+            InsuranceClaim(contract=self.history, amount=Decimal(100 + 2 * n), description='Khám bệnh',
+                           claim_date=start + timedelta(days=5 * n))
+            for n in range(30)
+        ])
+        InsuranceClaim.objects.update(created_at=timezone.now() - timedelta(days=10))
+        self.near = InsuranceClaim.objects.create(contract=self.recent, amount=Decimal('130.00'), description='Nội trú',
+                                                  claim_date=datetime(2025, 7, 1, 9, tzinfo=dt_timezone.utc))
+        self.near_again = InsuranceClaim.objects.create(
+            contract=self.recent, amount=Decimal('130.50'), description='Nội trú (bổ sung)',
+            claim_date=datetime(2025, 7, 2, 9, tzinfo=dt_timezone.utc))
+        self.outlier = InsuranceClaim.objects.create(contract=self.recent, amount=Decimal('5000.00'), description='Phẫu thuật',
+                                                     claim_date=datetime(2025, 8, 1, 9, tzinfo=dt_timezone.utc))
+
+    def flags(self):
+        return set(ClaimFlag.objects.values_list('claim_id', 'kind', 'related_claim_id'))
+
+    def test_flags_recent_near_duplicates_and_outliers(self):
+        report = detect_anomalies(since=timezone.now() - timedelta(hours=1))
+        self.assertEqual((report.near_duplicates, report.outliers), (2, 1))
+        self.assertEqual(self.flags(), {
+            (self.near.id, 'near_duplicate', self.near_again.id),
+            (self.near_again.id, 'near_duplicate', self.near.id),
+            (self.outlier.id, 'outlier_amount', None),
+        })
+        self.assertGreater(ClaimFlag.objects.get(kind='outlier_amount').score, 3)
+        # Chạy lại không tạo đánh dấu trùng
+        detect_anomalies(since=timezone.now() - timedelta(hours=1))
+        self.assertEqual(ClaimFlag.objects.count(), 3)
+
+    def test_command_and_flags_endpoint(self):
+        out = StringIO()
+        call_command('detect_claim_anomalies', '--hours', '1', '--batch-size', '1', stdout=out)
+        self.assertIn('2 claim gần trùng và 1 claim', out.getvalue())
+        response = self.client.get('/api/claims/flags/', {'kind': 'outlier_amount'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([flag['claim'] for flag in response.data], [self.outlier.id])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Nhập file dùng COPY và ON CONFLICT của PostgreSQL')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PartnerImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.existing = InsuranceContract.objects.create(
+            patient_id=7, policy_number='IMP-1', provider='Old', start_date='2025-01-01', end_date='2025-12-31')
+
+    def test_command_upserts_contracts_in_chunks(self):
+        path = Path(self.tmp.name) / 'contracts.csv'
+        path.write_text(
+            'policy_number,patient_id,provider,start_date,end_date,coverage_limit\n'
+            'IMP-1,8,BHYT,2025-01-01,2025-12-31,1000.00\n'
+            'IMP-2,9,BHYT,2025-01-01,2025-12-31,\n'
+            'IMP-3,10,BHYT,2025-12-31,2025-01-01,\n'
+            'IMP-2,9,Bảo Việt,2025-02-01,2025-12-31,\n'
+            'IMP-4,abc,BHYT,2025-01-01,2025-12-31,\n', encoding='utf-8')
+        version = cache.get('eligibility:7:version')
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_partner_file', str(path), '--chunk-size', '2', stdout=out)
+        self.assertIn('Đã đọc 5 dòng: 1 tạo mới, 2 cập nhật, 2 lỗi', out.getvalue())
+        contracts = {contract.policy_number: contract for contract in InsuranceContract.objects.all()}
+        self.assertEqual(sorted(contracts), ['IMP-1', 'IMP-2'])
+        self.assertEqual((contracts['IMP-1'].id, contracts['IMP-1'].patient_id), (self.existing.id, 8))
+        self.assertEqual(contracts['IMP-1'].coverage_limit, Decimal('1000.00'))
+        self.assertEqual((contracts['IMP-2'].provider, contracts['IMP-2'].details), ('Bảo Việt', ''))
+        # Hợp đồng đổi chủ: cache của bệnh nhân cũ bị vô hiệu hóa
+        self.assertNotEqual(cache.get('eligibility:7:version'), version)
+        errors = Path(f'{path}.errors.csv').read_text(encoding='utf-8').splitlines()
+        self.assertEqual([line.split(',')[0] for line in errors], ['line', '4', '6'])
+
+    def test_endpoint_attaches_claims_and_reports_errors(self):
+        InsuranceClaim.objects.create(contract=self.existing, amount=Decimal('100.00'), description='Khám bệnh',
+                                      claim_date=datetime(2025, 6, 1, 9, tzinfo=dt_timezone.utc))
+        rows = [
+            {'policy_number': 'IMP-1', 'amount': '200.00', 'claim_date': '2025-06-02T09:00:00Z', 'description': 'Nội trú'},
+            {'policy_number': 'IMP-9', 'amount': '200.00', 'claim_date': '2025-06-02T09:00:00Z', 'description': 'Nội trú'},
+            {'policy_number': 'IMP-1', 'amount': '100.00', 'claim_date': '2025-06-01T15:00:00Z', 'description': 'khám bệnh'},
+            {'policy_number': 'IMP-1', 'amount': '200.00', 'claim_date': '2025-06-02T10:00:00Z', 'description': 'NỘI TRÚ'},
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\n{not json}\n'
+        upload = SimpleUploadedFile('claims.ndjson', body.encode(), content_type='application/x-ndjson')
+        with self.settings(IMPORT_ERRORS_DIR=self.tmp.name):
+            response = self.client.post('/api/insurance_contracts/import/?kind=claims', {'file': upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.data['rows'], response.data['created'], response.data['errors']), (5, 1, 4))
+            self.assertEqual(sorted(error['line'] for error in response.data['error_preview']), [2, 3, 4, 5])
+            download = self.client.get('/api/insurance_contracts/import/errors/', {'file': response.data['errors_file']})
+            self.assertEqual(download.status_code, 200)
+            self.assertIn(b'Duplicate of line 1', b''.join(download.streaming_content))
+            self.assertEqual(self.client.get('/api/insurance_contracts/import/errors/',
+                                             {'file': '../settings.py'}).status_code, 404)
+        claim = InsuranceClaim.objects.get(description='Nội trú')
+        self.assertEqual((claim.contract_id, claim.status, claim.amount), (self.existing.id, 'pending', Decimal('200.00')))
+        self.assertIsNotNone(claim.fingerprint)
@@ -1,8 +1,48 @@
-from rest_framework import viewsets
+import re
+import uuid
+from pathlib import Path
+
+from rest_framework import status as http_status, viewsets
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import InsuranceContract, InsuranceClaim
-from .serializers import InsuranceContractSerializer, InsuranceClaimSerializer
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import FileResponse
+from django.utils import timezone
+from .eligibility import check_eligibility, check_eligibility_batch
+from .imports import import_file
+from .models import ClaimFlag, InsuranceContract, InsuranceClaim
+from .serializers import (
+    InsuranceContractSerializer, InsuranceClaimSerializer, ClaimFlagSerializer, EligibilityQuerySerializer,
+    EligibilityBatchSerializer, ImportQuerySerializer,
+)
+
+# Tên file lỗi do endpoint nhập file tạo ra; chỉ các tên khớp mẫu này mới được tải về
+ERRORS_FILE_RE = re.compile(r'^(contracts|claims)-[0-9a-f]{32}\.errors\.csv$')
+
+class DuplicateClaim(APIException):
+    status_code = http_status.HTTP_409_CONFLICT
+    default_detail = 'A claim with the same contract, amount, date and description already exists.'
+    default_code = 'duplicate_claim'
+
+def save_claim(claim):
+    """
+    Lưu claim; báo DuplicateClaim (409) nếu đã có claim chưa bị từ chối cùng dấu vân tay.
+
+    Không truy vấn trước: unique index claim_fingerprint_uniq kiểm tra trùng ngay khi insert/update,
+    kể cả khi hai request trùng nhau chạy song song. Chỉ khi bị trùng mới tra id của claim đã có.
+    """
+    try:
+        with transaction.atomic():
+            claim.save()
+    except IntegrityError:
+        existing = (InsuranceClaim.objects.filter(fingerprint=claim.fingerprint).exclude(status='rejected')
+                    .exclude(pk=claim.pk).values_list('id', flat=True).first())
+        if existing is None:
+            raise
+        raise DuplicateClaim(f"Duplicate of claim {existing}.")
+    return claim
 
 class InsuranceContractViewSet(viewsets.ModelViewSet):
     # Truy vấn tất cả hợp đồng bảo hiểm
@@ -23,18 +63,90 @@ class InsuranceContractViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    # Hợp đồng còn hiệu lực của bệnh nhân vào một ngày (mặc định hôm nay), lọc theo nhà cung cấp nếu có
+    @action(detail=False, methods=['get'], url_path='eligibility')
+    def eligibility(self, request):
+        serializer = EligibilityQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result, cached = check_eligibility(data['patient_id'], data.get('date') or timezone.localdate(), data.get('provider'))
+        response = Response(result)
+        response['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response
+
+    # Kiểm tra hiệu lực cho nhiều cặp (bệnh nhân, ngày) trong một truy vấn
+    @action(detail=False, methods=['post'], url_path='eligibility/batch')
+    def eligibility_batch(self, request):
+        serializer = EligibilityBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        today = timezone.localdate()
+        checks = [{**check, 'date': check.get('date') or today} for check in serializer.validated_data['checks']]
+        return Response(check_eligibility_batch(checks))
+
+    # Nhập file hợp đồng/yêu cầu bồi thường của đối tác (multipart, trường "file")
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_partner_file(self, request):
+        query = ImportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'This field is required.'})
+        kind = query.validated_data['kind']
+        fmt = query.validated_data.get('format') or (
+            'ndjson' if upload.name.lower().endswith(('.ndjson', '.jsonl')) else 'csv')
+        errors_dir = Path(settings.IMPORT_ERRORS_DIR)
+        errors_dir.mkdir(parents=True, exist_ok=True)
+        errors_file = f'{kind}-{uuid.uuid4().hex}.errors.csv'
+        # File upload lớn được Django lưu ra file tạm trên đĩa, nên đọc stream không nạp cả file vào bộ nhớ
+        with upload.open('rb') as stream:
+            report, errors = import_file(stream, kind, fmt, errors_dir / errors_file,
+                                         preview=settings.IMPORT_ERRORS_PREVIEW)
+        return Response({
+            **report._asdict(),
+            'errors_file': errors_file if report.errors else None,
+            'error_preview': errors.preview,
+        })
+
+    # Tải file lỗi của một lần nhập: ?file=<errors_file>
+    @action(detail=False, methods=['get'], url_path='import/errors')
+    def import_errors(self, request):
+        name = request.query_params.get('file', '')
+        path = Path(settings.IMPORT_ERRORS_DIR) / name
+        if not ERRORS_FILE_RE.match(name) or not path.is_file():
+            raise NotFound('Errors file not found.')
+        return FileResponse(path.open('rb'), as_attachment=True, filename=name, content_type='text/csv')
+
 class InsuranceClaimViewSet(viewsets.ModelViewSet):
     # Truy vấn tất cả yêu cầu bồi thường
     queryset = InsuranceClaim.objects.all()
     serializer_class = InsuranceClaimSerializer
 
+    def perform_create(self, serializer):
+        serializer.instance = save_claim(InsuranceClaim(**serializer.validated_data))
+
     def update(self, request, *args, **kwargs):
         # Chỉ cho phép cập nhật trạng thái yêu cầu bồi thường
         instance = self.get_object()
         status = request.data.get('status')
         if status not in ['pending', 'approved', 'rejected']:
             return Response({"detail": "Invalid status"}, status=400)
-        instance.status = status
-        instance.save()
+        with transaction.atomic():
+            # Khóa claim rồi khóa hợp đồng (cùng thứ tự với adjudicate_chunk): lô xét duyệt tự động
+            # của hợp đồng này chờ lần đổi trạng thái commit xong rồi mới tính tổng đã duyệt
+            instance = InsuranceClaim.objects.select_for_update().get(pk=instance.pk)
+            InsuranceContract.objects.select_for_update().get(pk=instance.contract_id)
+            instance.status = status
+            # Mở lại một claim đã bị từ chối cũng bị chặn nếu đã có bản trùng đang chờ/đã duyệt
+            save_claim(instance)
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    # Các claim bị lệnh detect_claim_anomalies đánh dấu, mới nhất trước; lọc theo loại nếu có
+    @action(detail=False, methods=['get'], url_path='flags')
+    def flags(self, request):
+        queryset = ClaimFlag.objects.all()
+        kind = request.query_params.get('kind')
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(ClaimFlagSerializer(page, many=True).data)
\ No newline at end of file
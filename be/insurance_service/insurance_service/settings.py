@@ -82,6 +82,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Cho phép frontend đọc header phân trang
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count']
+
 ROOT_URLCONF = 'insurance_service.urls'
 
 TEMPLATES = [
@@ -137,10 +140,14 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],  # Bỏ tất cả lớp xác thực
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'insurance_service.auth.CustomJWTAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Cho phép tất cả yêu cầu mà không cần quyền
     ],
+    # Phân trang cursor dùng chung cho mọi endpoint list
+    'DEFAULT_PAGINATION_CLASS': 'insurance_service.pagination.KeysetCursorPagination',
 }
 
 SIMPLE_JWT = {
@@ -151,6 +158,28 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Cache claims của JWT đã xác thực (số token tối đa, thời gian sống tính bằng giây)
+JWT_CLAIMS_CACHE_SIZE = 1024
+JWT_CLAIMS_CACHE_TTL = 300
+# Token hết hạn/không hợp lệ được coi như không có token thay vì trả về 401,
+# giữ hành vi trước khi service bật xác thực JWT (mọi endpoint đều AllowAny)
+JWT_INVALID_TOKEN_AS_ANONYMOUS = True
+
+
+# Cache dùng chung (Redis): kết quả kiểm tra hiệu lực bảo hiểm theo (bệnh nhân, ngày)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/2',
+        'KEY_PREFIX': 'insurance_service',
+        # Redis chậm/không kết nối được thì đọc thẳng database thay vì giữ request
+        'OPTIONS': {'socket_connect_timeout': 0.5, 'socket_timeout': 0.5},
+    }
+}
+# Thời gian sống (giây) của một entry kiểm tra hiệu lực và số cặp tối đa trong một lần kiểm tra theo lô
+ELIGIBILITY_CACHE_TIMEOUT = 300
+ELIGIBILITY_BATCH_MAX_ITEMS = 5000
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -177,3 +206,23 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # URL của các dịch vụ khác để gọi API
 
+
+# Số yêu cầu bồi thường mỗi lô của lệnh adjudicate_claims (một transaction mỗi lô)
+ADJUDICATION_CHUNK_SIZE = 1000
+
+# Phát hiện claim bất thường (lệnh detect_claim_anomalies, chạy hằng đêm):
+# gần trùng là hai claim kề nhau của cùng hợp đồng cách nhau không quá CLAIM_DUPLICATE_WINDOW_HOURS giờ
+# và lệch số tiền không quá CLAIM_DUPLICATE_AMOUNT_TOLERANCE (tỉ lệ); số tiền lệch là |z-score| theo nhà
+# cung cấp từ CLAIM_OUTLIER_Z_SCORE trở lên, khi nhà cung cấp có ít nhất CLAIM_OUTLIER_MIN_CLAIMS claim
+CLAIM_DUPLICATE_WINDOW_HOURS = 72
+CLAIM_DUPLICATE_AMOUNT_TOLERANCE = 0.01
+CLAIM_OUTLIER_Z_SCORE = 3.0
+CLAIM_OUTLIER_MIN_CLAIMS = 30
+# Số ngày claim cũ dùng làm claim kề bên và để tính thống kê của nhà cung cấp
+CLAIM_ANOMALY_LOOKBACK_DAYS = 365
+
+# Nhập file hợp đồng/yêu cầu bồi thường của đối tác (lệnh import_partner_file, POST /api/insurance_contracts/import/):
+# số dòng mỗi lô (một transaction), thư mục chứa file lỗi và số lỗi trả kèm response của endpoint
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_ERRORS_DIR = BASE_DIR / 'import_errors'
+IMPORT_ERRORS_PREVIEW = 100
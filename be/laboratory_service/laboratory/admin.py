@@ -1,6 +1,6 @@
 # Cấu hình giao diện Django Admin cho các model
 from django.contrib import admin
-from .models import LabRequest, LabResult
+from .models import IdempotencyKey, LabRequest, LabResult, LabResultValue
 
 @admin.register(LabRequest)
 class LabRequestAdmin(admin.ModelAdmin):
@@ -11,4 +11,17 @@ class LabRequestAdmin(admin.ModelAdmin):
 @admin.register(LabResult)
 class LabResultAdmin(admin.ModelAdmin):
     list_display = ['lab_request', 'result_date']  # Hiển thị các trường trong danh sách
-    search_fields = ['lab_request__id']  # Cho phép tìm kiếm theo lab_request
\ No newline at end of file
+    search_fields = ['lab_request__id']  # Cho phép tìm kiếm theo lab_request
+
+@admin.register(LabResultValue)
+class LabResultValueAdmin(admin.ModelAdmin):
+    list_display = ['patient_id', 'analyte', 'value', 'unit', 'result_date']  # Hiển thị các trường trong danh sách
+    search_fields = ['patient_id', 'analyte']  # Cho phép tìm kiếm theo patient_id, analyte
+    list_filter = ['analyte']  # Lọc theo chỉ số
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'endpoint', 'status_code', 'created_at']  # Hiển thị các trường trong danh sách
+    search_fields = ['key']  # Cho phép tìm kiếm theo key
+    list_filter = ['endpoint']  # Lọc theo endpoint
@@ -0,0 +1,167 @@
+# Xử lý các endpoint bulk: đọc lô, kiểm tra một lượt, ghi bằng bulk_create/UPDATE trong một transaction
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.response import Response
+
+from .models import IdempotencyKey, LabRequest, LabResult, LabResultValue
+from .parsers import InvalidLine
+from .serializers import LabRequestSerializer, LabRequestStatusSerializer, LabResultBulkSerializer, value_rows
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Too many items in one batch.'
+    default_code = 'payload_too_large'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key was already used with a different payload.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_items(request):
+    """Danh sách item từ body: mảng JSON, {"items": [...]} hoặc NDJSON (application/x-ndjson)."""
+    items = request.data
+    if isinstance(items, dict) and 'items' in items:
+        items = items['items']
+    if not isinstance(items, list):
+        raise serializers.ValidationError({'detail': 'Expected a JSON array or an NDJSON stream of objects.'})
+    if len(items) > settings.LAB_BULK_MAX_ITEMS:
+        raise PayloadTooLarge(f'At most {settings.LAB_BULK_MAX_ITEMS} items are allowed per batch.')
+    return items
+
+
+def validate_items(items, make_serializer):
+    """Kiểm tra từng item; trả về (các (index, validated_data) hợp lệ, các lỗi theo index)."""
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        if isinstance(item, InvalidLine):
+            errors.append({'index': index, 'errors': {'non_field_errors': [str(item)]}})
+            continue
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'errors': {'non_field_errors': ['Expected an object.']}})
+            continue
+        serializer = make_serializer(item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+    return valid, errors
+
+
+def batch_status(done, errors, success_status=status.HTTP_201_CREATED):
+    # Toàn bộ thành công: 201/200; một phần: 207 Multi-Status; không item nào thành công: 400
+    if not errors:
+        return success_status
+    return status.HTTP_207_MULTI_STATUS if done else status.HTTP_400_BAD_REQUEST
+
+
+def create_lab_requests(items, all_or_none=False):
+    valid, errors = validate_items(items, lambda item: LabRequestSerializer(data=item))
+    if errors and all_or_none:
+        valid = []
+    created = LabRequest.objects.bulk_create(
+        [LabRequest(**data) for _, data in valid], batch_size=settings.LAB_BULK_BATCH_SIZE)
+    results = [{'index': index, 'id': lab_request.id} for (index, _), lab_request in zip(valid, created)]
+    body = {'created': len(results), 'failed': len(errors), 'results': results, 'errors': errors}
+    return batch_status(results, errors), body
+
+
+def create_lab_results(items, all_or_none=False):
+    # Kiểm tra lab_request của cả lô bằng một truy vấn thay vì một truy vấn cho mỗi item
+    requested_ids = {item.get('lab_request') for item in items if isinstance(item, dict)}
+    requested_ids = {value for value in requested_ids if isinstance(value, int) and not isinstance(value, bool)}
+    patient_ids = dict(LabRequest.objects.filter(id__in=requested_ids).values_list('id', 'patient_id'))
+    context = {'lab_request_ids': patient_ids}
+    valid, errors = validate_items(items, lambda item: LabResultBulkSerializer(data=item, context=context))
+    if errors and all_or_none:
+        valid = []
+    values = [data.pop('values', []) for _, data in valid]
+    created = LabResult.objects.bulk_create(
+        [LabResult(lab_request_id=data.pop('lab_request'), **data) for _, data in valid],
+        batch_size=settings.LAB_BULK_BATCH_SIZE,
+    )
+    # Chỉ số của cả lô cũng ghi bằng bulk_create (id của LabResult đã có sau bulk_create trên PostgreSQL)
+    LabResultValue.objects.bulk_create(
+        [row for lab_result, result_values in zip(created, values)
+         for row in value_rows(lab_result, result_values, patient_ids[lab_result.lab_request_id])],
+        batch_size=settings.LAB_BULK_BATCH_SIZE,
+    )
+    results = [{'index': index, 'id': lab_result.id} for (index, _), lab_result in zip(valid, created)]
+    body = {'created': len(results), 'failed': len(errors), 'results': results, 'errors': errors}
+    return batch_status(results, errors), body
+
+
+def update_lab_request_status(items, all_or_none=False):
+    valid, errors = validate_items(items, lambda item: LabRequestStatusSerializer(data=item))
+    existing = set(LabRequest.objects.filter(id__in=[data['id'] for _, data in valid]).values_list('id', flat=True))
+    found = []
+    for index, data in valid:
+        if data['id'] in existing:
+            found.append((index, data))
+        else:
+            errors.append({'index': index, 'errors': {'id': [f"Lab request {data['id']} does not exist."]}})
+    errors.sort(key=lambda error: error['index'])
+    if errors and all_or_none:
+        found = []
+    # Mỗi trạng thái đích một câu UPDATE (tối đa 3 câu cho cả lô), item sau cùng thắng khi trùng id
+    targets = {data['id']: data['status'] for _, data in found}
+    by_status = {}
+    for lab_request_id, new_status in targets.items():
+        by_status.setdefault(new_status, []).append(lab_request_id)
+    now = timezone.now()
+    for new_status, ids in by_status.items():
+        LabRequest.objects.filter(id__in=ids).update(
+            status=new_status, claimed_by=None, lease_expires_at=None, updated_at=now)
+    body = {'updated': len(targets), 'failed': len(errors), 'errors': errors}
+    return batch_status(found, errors, status.HTTP_200_OK), body
+
+
+def run_bulk(request, endpoint, handler):
+    """
+    Chạy handler(items, all_or_none) cho một request bulk trong một transaction.
+
+    ?all_or_none=true: có item lỗi thì không ghi item nào. Header Idempotency-Key: lần gửi đầu
+    lưu lại response; gửi lại cùng key và cùng payload nhận đúng response đó (kèm header
+    Idempotent-Replayed) mà không ghi lại; cùng key nhưng payload khác bị từ chối (422).
+    Key được tính riêng cho từng user (id trong JWT) và từng endpoint; request có Idempotency-Key mà không
+    có token bị từ chối (401), vì các client ẩn danh không có gì để phân biệt với nhau.
+    """
+    key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+    if key and not (request.user and request.user.is_authenticated):
+        raise NotAuthenticated('Idempotency-Key requires an authenticated caller.')
+    items = get_items(request)
+    all_or_none = request.query_params.get('all_or_none', '').lower() in ('1', 'true', 'yes')
+    if not key:
+        with transaction.atomic():
+            status_code, body = handler(items, all_or_none)
+        return Response(body, status=status_code)
+
+    payload = json.dumps([items, all_or_none], sort_keys=True, default=str)
+    request_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    user_id = request.user.id
+    with transaction.atomic():
+        try:
+            # Unique (user_id, key, endpoint): lần gửi lại song song sẽ chờ ở đây tới khi lần đầu commit
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user_id=user_id, key=key, endpoint=endpoint, request_hash=request_hash)
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user_id=user_id, key=key, endpoint=endpoint)
+            if record.request_hash != request_hash:
+                raise IdempotencyKeyReused()
+            response = Response(record.response, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        status_code, body = handler(items, all_or_none)
+        record.status_code = status_code
+        record.response = body
+        record.save(update_fields=['status_code', 'response'])
+    return Response(body, status=status_code)
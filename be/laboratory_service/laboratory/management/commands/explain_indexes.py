@@ -0,0 +1,97 @@
+"""
+Seed dữ liệu lớn rồi so sánh query plan của các truy vấn tra cứu khi có và không có index.
+
+Mọi thao tác (seed, ANALYZE, DROP INDEX) chạy trong một transaction và bị rollback ở cuối,
+nên database không bị thay đổi. DROP INDEX giữ khóa độc quyền trên bảng cho tới khi rollback,
+vì vậy chỉ chạy trên database dev/staging:
+
+    python manage.py explain_indexes --rows 1000000
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from laboratory.models import LabRequest
+
+
+class Command(BaseCommand):
+    help = 'So sánh query plan của các truy vấn yêu cầu xét nghiệm trước/sau khi có index (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Số yêu cầu xét nghiệm được seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_indexes chỉ hỗ trợ PostgreSQL.')
+        rows = options['rows']
+
+        with transaction.atomic():
+            self.seed(rows)
+            cases = self.cases()
+            self.report('Có index', cases)
+            with connection.cursor() as cursor:
+                for index_name in {name for _, _, names in cases for name in names}:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(index_name)}')
+            self.report('Không có index', cases)
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        self.stdout.write(f'Seed {rows} yêu cầu xét nghiệm...')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {LabRequest._meta.db_table}
+                    (patient_id, doctor_id, test_type, description, status, created_at, updated_at)
+                SELECT g %% 100000,
+                       g %% 1000,
+                       (ARRAY['máu', 'nước tiểu', 'sinh hóa', 'X-quang'])[1 + g %% 4],
+                       '',
+                       CASE WHEN g %% 50 = 0 THEN 'pending' ELSE 'completed' END,
+                       now() - g * interval '1 second',
+                       now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [rows],
+            )
+            cursor.execute(f'ANALYZE {LabRequest._meta.db_table}')
+
+    def cases(self):
+        # (tên truy vấn, queryset giống endpoint, các index phục vụ truy vấn đó)
+        return [
+            (
+                'filter theo doctor_id',
+                LabRequest.objects.filter(doctor_id=42),
+                ['labreq_doctor_patient_idx'],
+            ),
+            (
+                'filter theo doctor_id và patient_id',
+                LabRequest.objects.filter(doctor_id=42, patient_id=4042),
+                ['labreq_doctor_patient_idx', 'labreq_patient_idx'],
+            ),
+            (
+                'filter theo patient_id',
+                LabRequest.objects.filter(patient_id=4042),
+                ['labreq_patient_idx'],
+            ),
+            (
+                'pending theo test_type',
+                LabRequest.objects.filter(status='pending', test_type='máu').order_by('created_at')[:50],
+                ['labreq_pending_idx'],
+            ),
+            (
+                'list (trang đầu)',
+                LabRequest.objects.order_by('-created_at', '-id')[:51],
+                ['labreq_created_idx'],
+            ),
+        ]
+
+    def report(self, title, cases):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        with connection.cursor() as cursor:
+            for label, queryset, _ in cases:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+                plan = [line for (line,) in cursor.fetchall()]
+                scans = [line.strip().lstrip('-> ').split('  (')[0] for line in plan if 'Scan' in line]
+                timing = next((line for line in plan if line.startswith('Execution Time')), '')
+                self.stdout.write(f'  {label}: {timing}')
+                for scan in scans:
+                    self.stdout.write(f'      {scan}')
@@ -0,0 +1,25 @@
+"""
+Xóa các Idempotency-Key của request bulk cũ hơn IDEMPOTENCY_KEY_TTL_DAYS ngày. Sau khi bị xóa,
+gửi lại lô với key đó được xử lý như một request mới; chạy định kỳ (cron):
+
+    python manage.py purge_idempotency_keys
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from laboratory.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Xóa các Idempotency-Key đã quá hạn lưu.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.IDEMPOTENCY_KEY_TTL_DAYS,
+                            help='Xóa key cũ hơn số ngày này')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f'Đã xóa {deleted} Idempotency-Key cũ')
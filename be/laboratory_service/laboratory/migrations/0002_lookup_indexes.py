@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction,
+    # đổi lại bảng không bị khóa ghi trong lúc tạo index trên dữ liệu lớn.
+    atomic = False
+
+    dependencies = [
+        ('laboratory', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='labrequest',
+            index=models.Index(fields=['doctor_id', 'patient_id'], name='labreq_doctor_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labrequest',
+            index=models.Index(fields=['patient_id', 'created_at'], name='labreq_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labrequest',
+            index=models.Index(fields=['-created_at', '-id'], name='labreq_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['test_type', 'created_at'], name='labreq_pending_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='labresult',
+            index=models.Index(fields=['-created_at', '-id'], name='labres_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0003_bulk_idempotency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labrequest',
+            name='claimed_by',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='labrequest',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0004_worklist_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabResultValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patient_id', models.IntegerField()),
+                ('result_date', models.DateTimeField()),
+                ('analyte', models.CharField(max_length=50)),
+                ('value', models.FloatField()),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('reference_low', models.FloatField(blank=True, null=True)),
+                ('reference_high', models.FloatField(blank=True, null=True)),
+                ('lab_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='values', to='laboratory.labresult')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient_id', 'analyte', 'result_date'], name='labval_series_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratory', '0005_result_values'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='idempotencykey',
+            name='idem_key_endpoint_uniq',
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='user_id',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('user_id', 'key', 'endpoint'), name='idem_user_key_endpoint_uniq'),
+        ),
+    ]
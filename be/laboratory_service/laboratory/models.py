@@ -18,10 +18,28 @@ class LabRequest(models.Model):
     description = models.TextField(blank=True)
     # Trạng thái yêu cầu
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Kỹ thuật viên đang nhận yêu cầu từ worklist và hạn lease; hết hạn thì yêu cầu tự quay lại hàng đợi
+    claimed_by = models.IntegerField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
     # Thời gian tạo và cập nhật
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # filter_by_doctor_and_patient: doctor_id (kèm hoặc không kèm patient_id)
+            models.Index(fields=['doctor_id', 'patient_id'], name='labreq_doctor_patient_idx'),
+            # filter_by_doctor_and_patient: chỉ patient_id
+            models.Index(fields=['patient_id', 'created_at'], name='labreq_patient_idx'),
+            models.Index(fields=['-created_at', '-id'], name='labreq_created_idx'),
+            # Các yêu cầu đang chờ theo loại xét nghiệm (chỉ index các dòng pending), dùng cho worklist.claim_next
+            models.Index(
+                fields=['test_type', 'created_at'],
+                name='labreq_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
     def __str__(self):
         return f"Lab Request {self.id} for Patient {self.patient_id}"
 
@@ -36,5 +54,61 @@ class LabResult(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Phục vụ phân trang cursor (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='labres_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Lab Result for Request {self.lab_request.id}"
+
+class LabResultValue(models.Model):
+    # Một chỉ số đo được trong kết quả xét nghiệm (ví dụ HbA1c = 6.1 %), lưu dạng số để truy vấn theo thời gian
+    lab_result = models.ForeignKey(LabResult, on_delete=models.CASCADE, related_name='values')
+    # Bản sao từ lab_request và lab_result, để truy vấn chuỗi thời gian không cần join
+    patient_id = models.IntegerField()
+    result_date = models.DateTimeField()
+    # Mã chỉ số (ví dụ HBA1C, GLUCOSE), luôn viết hoa
+    analyte = models.CharField(max_length=50)
+    value = models.FloatField()
+    unit = models.CharField(max_length=20, blank=True)
+    # Khoảng tham chiếu (có thể chỉ có một đầu)
+    reference_low = models.FloatField(null=True, blank=True)
+    reference_high = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Chuỗi thời gian của một chỉ số cho một bệnh nhân (endpoint series): quét theo khoảng trên index
+            models.Index(fields=['patient_id', 'analyte', 'result_date'], name='labval_series_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.analyte} = {self.value} {self.unit}".strip()
+
+class IdempotencyKey(models.Model):
+    # Kết quả của một request bulk theo header Idempotency-Key, để client gửi lại lô không bị ghi trùng
+    key = models.CharField(max_length=255)
+    # User gửi request (id trong JWT; Idempotency-Key bắt buộc phải có token); key của mỗi người gọi
+    # là riêng, để hai client trùng key không nhận response của nhau
+    user_id = models.IntegerField()
+    # Endpoint nhận key (cùng một key dùng cho hai endpoint khác nhau là hai bản ghi)
+    endpoint = models.CharField(max_length=100)
+    # SHA-256 của payload; gửi lại cùng key với payload khác bị từ chối
+    request_hash = models.CharField(max_length=64)
+    # Response đã trả lần đầu; NULL khi request đầu tiên còn đang xử lý
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'key', 'endpoint'], name='idem_user_key_endpoint_uniq'),
+        ]
+        indexes = [
+            # Dọn key cũ (lệnh purge_idempotency_keys)
+            models.Index(fields=['created_at'], name='idem_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Lab Result for Request {self.lab_request.id}"
\ No newline at end of file
+        return f"Idempotency key {self.key} for {self.endpoint} (user {self.user_id})"
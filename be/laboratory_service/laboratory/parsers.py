@@ -0,0 +1,34 @@
+# Parser NDJSON cho các endpoint bulk: mỗi dòng là một object JSON
+import json
+
+from rest_framework.parsers import BaseParser
+
+
+class InvalidLine:
+    """Dòng NDJSON không đọc được; được báo như lỗi của riêng item đó thay vì làm hỏng cả lô."""
+
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        self.message = message
+
+    def __str__(self):
+        return f"Line {self.line_number}: {self.message}"
+
+
+class NDJSONParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        # Đọc từng dòng từ stream, không dựng toàn bộ body thành một chuỗi JSON lớn
+        items = []
+        if stream is None:
+            return items
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(InvalidLine(line_number, str(e)))
+        return items
@@ -1,15 +1,125 @@
 # Định nghĩa serializers để xử lý dữ liệu API
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import LabRequest, LabResult
+from .models import LabRequest, LabResult, LabResultValue
 
 class LabRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = LabRequest
-        fields = ['id', 'patient_id', 'doctor_id', 'test_type', 'description', 'status', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'patient_id', 'doctor_id', 'test_type', 'description', 'status',
+                  'claimed_by', 'lease_expires_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'claimed_by', 'lease_expires_at', 'created_at', 'updated_at']
+
+class LabResultValueSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LabResultValue
+        fields = ['analyte', 'value', 'unit', 'reference_low', 'reference_high']
+
+    def validate_analyte(self, value):
+        return value.strip().upper()
+
+    def validate(self, data):
+        low, high = data.get('reference_low'), data.get('reference_high')
+        if low is not None and high is not None and low > high:
+            raise serializers.ValidationError({'reference_low': 'Must not be greater than reference_high.'})
+        return data
+
+def value_rows(lab_result, values, patient_id):
+    # Dòng LabResultValue của một kết quả, kèm bản sao patient_id/result_date cho truy vấn chuỗi thời gian
+    return [
+        LabResultValue(lab_result=lab_result, patient_id=patient_id, result_date=lab_result.result_date, **value)
+        for value in values
+    ]
 
 class LabResultSerializer(serializers.ModelSerializer):
+    # Các chỉ số dạng số đi kèm nội dung text (không bắt buộc)
+    values = LabResultValueSerializer(many=True, required=False)
+
     class Meta:
         model = LabResult
-        fields = ['id', 'lab_request', 'result_date', 'details', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'lab_request', 'result_date', 'details', 'values', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    @transaction.atomic
+    def create(self, validated_data):
+        values = validated_data.pop('values', [])
+        lab_result = super().create(validated_data)
+        LabResultValue.objects.bulk_create(value_rows(lab_result, values, lab_result.lab_request.patient_id))
+        return lab_result
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        values = validated_data.pop('values', None)
+        lab_result = super().update(instance, validated_data)
+        patient_id = lab_result.lab_request.patient_id
+        if values is not None:
+            # Gửi values là thay toàn bộ danh sách chỉ số
+            lab_result.values.all().delete()
+            LabResultValue.objects.bulk_create(value_rows(lab_result, values, patient_id))
+        elif 'result_date' in validated_data or 'lab_request' in validated_data:
+            lab_result.values.update(result_date=lab_result.result_date, patient_id=patient_id)
+        return lab_result
+
+class LabResultBulkSerializer(LabResultSerializer):
+    # Lab request của cả lô được kiểm tra trước bằng một truy vấn (context['lab_request_ids']: id -> patient_id)
+    lab_request = serializers.IntegerField()
+
+    def validate_lab_request(self, value):
+        if value not in self.context['lab_request_ids']:
+            raise serializers.ValidationError(f"Lab request {value} does not exist.")
+        return value
+
+
+class LabRequestStatusSerializer(serializers.Serializer):
+    # Một item của PATCH /api/lab_requests/bulk_status/
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=LabRequest.STATUS_CHOICES)
+
+
+class WorklistClaimSerializer(serializers.Serializer):
+    # Body của POST /api/lab_requests/claim/
+    test_type = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, default=1)
+    # Mặc định là user đang đăng nhập; chỉ role trong LAB_TECHNICIAN_OVERRIDE_ROLES được chọn người khác
+    technician_id = serializers.IntegerField(required=False)
+    lease_seconds = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, value):
+        return min(value, settings.LAB_CLAIM_MAX_ITEMS)
+
+    def validate_lease_seconds(self, value):
+        return min(value, settings.LAB_LEASE_MAX_SECONDS)
+
+
+class LeaseSerializer(serializers.Serializer):
+    # Body của PUT/DELETE /api/lab_requests/{id}/lease/
+    technician_id = serializers.IntegerField(required=False)
+    lease_seconds = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_lease_seconds(self, value):
+        return min(value, settings.LAB_LEASE_MAX_SECONDS)
+
+
+class ResultSeriesQuerySerializer(serializers.Serializer):
+    # Query string của GET /api/lab_results/series/
+    BUCKETS = ('raw', 'day', 'week', 'month', 'quarter', 'year')
+
+    patient_id = serializers.IntegerField()
+    analyte = serializers.CharField(max_length=50)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    # Không gửi bucket: tự chọn bucket nhỏ nhất cho không quá points điểm
+    bucket = serializers.ChoiceField(choices=BUCKETS, required=False)
+    points = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_analyte(self, value):
+        return value.strip().upper()
+
+    def validate_points(self, value):
+        return min(value, settings.LAB_SERIES_MAX_POINTS)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] >= data['end']:
+            raise serializers.ValidationError({'end': 'Must be after start.'})
+        return data
@@ -0,0 +1,58 @@
+# Chuỗi thời gian của một chỉ số xét nghiệm, gộp theo bucket ngay trong database
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+
+from .models import LabResultValue
+
+# Bucket theo thứ tự tăng dần và số ngày ngắn nhất của mỗi bucket
+BUCKET_DAYS = [('day', 1), ('week', 7), ('month', 28), ('quarter', 90), ('year', 365)]
+
+
+def pick_bucket(first, last, points):
+    """Bucket nhỏ nhất để khoảng [first, last] chia ra không quá points điểm."""
+    span_days = (last - first).total_seconds() / 86400
+    for bucket, days in BUCKET_DAYS:
+        # Hai bucket ở hai đầu có thể chỉ chứa một phần khoảng
+        if span_days / days + 2 <= points:
+            return bucket
+    return BUCKET_DAYS[-1][0]
+
+
+def result_series(patient_id, analyte, start=None, end=None, bucket=None, points=None):
+    """
+    Chuỗi giá trị của analyte cho một bệnh nhân, sắp theo thời gian.
+
+    Mọi truy vấn đều là quét theo khoảng trên index labval_series_idx (patient_id, analyte,
+    result_date). bucket='raw' trả từng giá trị (tối đa points); bucket khác trả avg/min/max/count
+    của mỗi bucket do database tính. Không chỉ định bucket thì trả raw nếu số giá trị không quá
+    points, ngược lại chọn bucket nhỏ nhất cho không quá points điểm.
+    """
+    points = points or settings.LAB_SERIES_POINTS
+    queryset = LabResultValue.objects.filter(patient_id=patient_id, analyte=analyte)
+    if start:
+        queryset = queryset.filter(result_date__gte=start)
+    if end:
+        queryset = queryset.filter(result_date__lt=end)
+
+    if bucket is None:
+        summary = queryset.aggregate(count=Count('*'), first=Min('result_date'), last=Max('result_date'))
+        if summary['count'] <= points:
+            bucket = 'raw'
+        else:
+            bucket = pick_bucket(summary['first'], summary['last'], points)
+
+    if bucket == 'raw':
+        data = [
+            {'date': result_date, 'value': value, 'unit': unit, 'lab_result': lab_result_id}
+            for result_date, value, unit, lab_result_id in queryset.order_by('result_date', 'id')
+            .values_list('result_date', 'value', 'unit', 'lab_result_id')[:points]
+        ]
+    else:
+        data = [
+            {'date': row['bucket'], 'count': row['count'], 'avg': row['avg'], 'min': row['min'], 'max': row['max']}
+            for row in queryset.annotate(bucket=Trunc('result_date', bucket)).values('bucket')
+            .annotate(count=Count('*'), avg=Avg('value'), min=Min('value'), max=Max('value'))
+            .order_by('bucket')
+        ]
+    return {'patient_id': patient_id, 'analyte': analyte, 'bucket': bucket, 'points': data}
@@ -1,7 +1,21 @@
 # Tệp kiểm thử cho ứng dụng laboratory
-from django.test import TestCase
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIClient
 
+from laboratory_service.auth import TokenUser
+
+from .models import IdempotencyKey, LabRequest, LabResult, LabResultValue
+from .worklist import claim_next
+
 class LabRequestTests(TestCase):
     def setUp(self):
         # Khởi tạo client để gửi yêu cầu API
@@ -17,4 +31,334 @@ class LabResultTests(TestCase):
 
     def test_create_lab_result(self):
         # Viết test cases sau
-        pass
\ No newline at end of file
+        pass
+
+class LabBulkTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def lab_request_item(self, patient_id=1, **extra):
+        return {'patient_id': patient_id, 'doctor_id': 7, 'test_type': 'blood', **extra}
+
+    def test_bulk_create_lab_requests_uses_constant_queries(self):
+        items = [self.lab_request_item(patient_id) for patient_id in range(200)]
+        # Ghi cả lô bằng bulk_create, số truy vấn không tăng theo số item
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/lab_requests/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 200)
+        self.assertEqual(LabRequest.objects.count(), 200)
+        self.assertEqual([result['index'] for result in response.data['results']], list(range(200)))
+
+    def test_bulk_create_accepts_items_object_and_ndjson(self):
+        response = self.client.post('/api/lab_requests/bulk/', {'items': [self.lab_request_item()]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        body = '\n'.join(json.dumps(self.lab_request_item(patient_id)) for patient_id in (2, 3)) + '\n{broken\n'
+        response = self.client.post('/api/lab_requests/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        self.assertEqual(LabRequest.objects.count(), 3)
+
+    def test_partial_failure_reports_errors_per_item(self):
+        items = [self.lab_request_item(), {'patient_id': 'x', 'doctor_id': 7}, self.lab_request_item(status='done')]
+        response = self.client.post('/api/lab_requests/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('test_type', response.data['errors'][0]['errors'])
+
+        response = self.client.post('/api/lab_requests/bulk/', items[1:], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_all_or_none_writes_nothing_when_an_item_fails(self):
+        items = [self.lab_request_item(), {'doctor_id': 7}]
+        response = self.client.post('/api/lab_requests/bulk/?all_or_none=true', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        self.assertFalse(LabRequest.objects.exists())
+
+    @override_settings(LAB_BULK_MAX_ITEMS=2)
+    def test_rejects_oversized_and_non_list_payloads(self):
+        response = self.client.post('/api/lab_requests/bulk/', [self.lab_request_item()] * 3, format='json')
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post('/api/lab_requests/bulk/', self.lab_request_item(), format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_create_lab_results_checks_lab_requests_in_one_query(self):
+        lab_requests = LabRequest.objects.bulk_create([LabRequest(**self.lab_request_item(n)) for n in range(50)])
+        items = [{'lab_request': lab_request.id, 'result_date': '2025-05-21T21:42:00Z', 'details': 'Normal'}
+                 for lab_request in lab_requests]
+        items.append({'lab_request': 999999, 'result_date': '2025-05-21T21:42:00Z', 'details': 'Normal'})
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/lab_results/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 50)
+        self.assertEqual(response.data['errors'][0]['index'], 50)
+        self.assertEqual(LabResult.objects.filter(lab_request__in=lab_requests).count(), 50)
+
+    def test_bulk_status_groups_updates_by_status(self):
+        lab_requests = LabRequest.objects.bulk_create([LabRequest(**self.lab_request_item(n)) for n in range(6)])
+        items = [{'id': lab_request.id, 'status': 'completed' if n % 2 else 'cancelled'}
+                 for n, lab_request in enumerate(lab_requests)]
+        items.append({'id': 999999, 'status': 'completed'})
+        # Một truy vấn kiểm tra id và một UPDATE cho mỗi trạng thái đích
+        with self.assertNumQueries(5):
+            response = self.client.patch('/api/lab_requests/bulk_status/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['updated'], 6)
+        self.assertEqual(response.data['errors'][0]['index'], 6)
+        self.assertEqual(LabRequest.objects.filter(status='completed').count(), 3)
+        self.assertEqual(LabRequest.objects.filter(status='cancelled').count(), 3)
+
+    def test_idempotency_key_replays_first_response(self):
+        items = [self.lab_request_item(), self.lab_request_item(2)]
+        self.client.force_authenticate(TokenUser(1, 'tech1', '', 'lab_technician', True))
+        first = self.client.post('/api/lab_requests/bulk/', items, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual(first.status_code, 201)
+        retry = self.client.post('/api/lab_requests/bulk/', items, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(LabRequest.objects.count(), 2)
+
+        # Cùng key nhưng payload khác
+        response = self.client.post('/api/lab_requests/bulk/', items[:1], format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual(response.status_code, 422)
+        # Key được tính riêng cho từng endpoint
+        response = self.client.post('/api/lab_results/bulk/', [], format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.filter(key='batch-1').count(), 2)
+
+    def test_idempotency_key_is_scoped_per_user(self):
+        items = [self.lab_request_item()]
+        self.client.force_authenticate(TokenUser(1, 'tech1', '', 'lab_technician', True))
+        first = self.client.post('/api/lab_requests/bulk/', items, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        # User khác dùng trùng key: request được xử lý riêng, không nhận response của user 1
+        self.client.force_authenticate(TokenUser(2, 'tech2', '', 'lab_technician', True))
+        other = self.client.post('/api/lab_requests/bulk/', [self.lab_request_item(2)], format='json',
+                                 HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual(other.status_code, 201)
+        self.assertFalse(other.has_header('Idempotent-Replayed'))
+        self.assertNotEqual(other.data, first.data)
+        self.client.force_authenticate(TokenUser(1, 'tech1', '', 'lab_technician', True))
+        retry = self.client.post('/api/lab_requests/bulk/', items, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual((retry['Idempotent-Replayed'], retry.data), ('true', first.data))
+        self.assertEqual(LabRequest.objects.count(), 2)
+        self.assertEqual(sorted(IdempotencyKey.objects.values_list('user_id', flat=True)), [1, 2])
+
+    def test_idempotency_key_requires_authentication(self):
+        # Các client ẩn danh không phân biệt được với nhau nên không được dùng Idempotency-Key
+        response = self.client.post('/api/lab_requests/bulk/', [self.lab_request_item()], format='json',
+                                    HTTP_IDEMPOTENCY_KEY='batch-1')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(LabRequest.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        # Không gửi key thì request ẩn danh vẫn được xử lý như trước
+        self.assertEqual(self.client.post('/api/lab_requests/bulk/', [self.lab_request_item()], format='json').status_code, 201)
+
+
+class WorklistTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.lab_requests = LabRequest.objects.bulk_create([
+            LabRequest(patient_id=n, doctor_id=7, test_type='blood') for n in range(5)
+        ])
+        LabRequest.objects.create(patient_id=9, doctor_id=7, test_type='urine')
+
+    def login(self, user_id, role='lab_technician'):
+        self.client.force_authenticate(TokenUser(user_id, f'user{user_id}', '', role, True))
+
+    def claim(self, technician_id, limit=2, **extra):
+        self.login(technician_id)
+        response = self.client.post('/api/lab_requests/claim/', {
+            'test_type': 'blood', 'limit': limit, **extra}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data]
+
+    def test_claims_oldest_pending_without_overlap(self):
+        first = self.claim(1)
+        second = self.claim(2)
+        self.assertEqual(first, [lab_request.id for lab_request in self.lab_requests[:2]])
+        self.assertEqual(second, [lab_request.id for lab_request in self.lab_requests[2:4]])
+        self.assertEqual(self.claim(3, limit=10), [self.lab_requests[4].id])
+        self.assertEqual(self.claim(4), [])
+        self.assertEqual(LabRequest.objects.get(pk=first[0]).claimed_by, 1)
+
+    def test_expired_lease_is_requeued(self):
+        self.claim(1, limit=5)
+        LabRequest.objects.filter(pk=self.lab_requests[0].pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.claim(2), [self.lab_requests[0].id])
+        # Kỹ thuật viên cũ không gia hạn được lease đã mất
+        self.login(1)
+        response = self.client.put(f'/api/lab_requests/{self.lab_requests[0].id}/lease/', {}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_renew_and_release_lease(self):
+        lab_request_id = self.claim(1, limit=1, lease_seconds=60)[0]
+        url = f'/api/lab_requests/{lab_request_id}/lease/'
+        response = self.client.put(url, {'lease_seconds': 600}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(LabRequest.objects.get(pk=lab_request_id).lease_expires_at, timezone.now() + timedelta(seconds=500))
+        self.login(2)
+        self.assertEqual(self.client.delete(url, format='json').status_code, 404)
+        self.login(1)
+        self.assertEqual(self.client.delete(url, format='json').status_code, 204)
+        self.assertEqual(self.claim(2, limit=1), [lab_request_id])
+
+    def test_completing_clears_lease(self):
+        lab_request_id = self.claim(1, limit=1)[0]
+        response = self.client.patch(f'/api/lab_requests/{lab_request_id}/', {'status': 'completed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['claimed_by'])
+        self.assertNotIn(lab_request_id, self.claim(2, limit=10))
+
+    def test_claim_requires_technician(self):
+        response = self.client.post('/api/lab_requests/claim/', {'test_type': 'blood'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_only_admin_can_act_for_another_technician(self):
+        lab_request_id = self.claim(1, limit=1)[0]
+        url = f'/api/lab_requests/{lab_request_id}/lease/'
+        # Kỹ thuật viên khác không được dùng technician_id của người giữ lease
+        self.login(2)
+        self.assertEqual(self.client.delete(url, {'technician_id': 1}, format='json').status_code, 403)
+        self.assertEqual(self.client.post('/api/lab_requests/claim/', {'test_type': 'blood', 'technician_id': 1},
+                                          format='json').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.delete(url, {'technician_id': 1}, format='json').status_code, 401)
+        self.login(99, role='admin')
+        self.assertEqual(self.client.delete(url, {'technician_id': 1}, format='json').status_code, 204)
+
+
+class LabResultValueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.lab_request = LabRequest.objects.create(patient_id=42, doctor_id=7, test_type='blood')
+
+    def add_result(self, result_date, value, analyte='hba1c'):
+        response = self.client.post('/api/lab_results/', {
+            'lab_request': self.lab_request.id, 'result_date': result_date, 'details': f'HbA1c {value}%',
+            'values': [{'analyte': analyte, 'value': value, 'unit': '%', 'reference_low': 4.0, 'reference_high': 5.6}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def series(self, **params):
+        response = self.client.get('/api/lab_results/series/', {'patient_id': 42, 'analyte': 'HbA1c', **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_values_are_stored_with_patient_and_date(self):
+        response = self.add_result('2024-01-10T08:00:00Z', 6.1)
+        self.assertEqual(response.data['values'][0]['analyte'], 'HBA1C')
+        value = LabResultValue.objects.get()
+        self.assertEqual((value.patient_id, value.result_date.isoformat()), (42, '2024-01-10T08:00:00+00:00'))
+
+        # Đổi ngày kết quả thì bản sao trên chỉ số cũng đổi
+        self.client.patch(f"/api/lab_results/{response.data['id']}/", {'result_date': '2024-02-01T08:00:00Z'}, format='json')
+        self.assertEqual(LabResultValue.objects.get().result_date.isoformat(), '2024-02-01T08:00:00+00:00')
+        # Gửi values là thay toàn bộ danh sách
+        self.client.patch(f"/api/lab_results/{response.data['id']}/", {'values': [
+            {'analyte': 'glucose', 'value': 5.2, 'unit': 'mmol/L'}, {'analyte': 'hba1c', 'value': 6.0}]}, format='json')
+        self.assertEqual(sorted(LabResultValue.objects.values_list('analyte', flat=True)), ['GLUCOSE', 'HBA1C'])
+
+    def test_rejects_inverted_reference_range(self):
+        response = self.client.post('/api/lab_results/', {
+            'lab_request': self.lab_request.id, 'result_date': '2024-01-10T08:00:00Z', 'details': 'x',
+            'values': [{'analyte': 'HBA1C', 'value': 6.1, 'reference_low': 7, 'reference_high': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_series_returns_raw_values_in_range(self):
+        for month, value in ((1, 6.1), (4, 6.4), (7, 5.9)):
+            self.add_result(f'2024-{month:02d}-15T08:00:00Z', value)
+        self.add_result('2024-02-15T08:00:00Z', 5.0, analyte='glucose')
+        data = self.series(start='2024-02-01T00:00:00Z')
+        self.assertEqual(data['bucket'], 'raw')
+        self.assertEqual([point['value'] for point in data['points']], [6.4, 5.9])
+
+    def test_series_downsamples_in_database(self):
+        lab_result = LabResult.objects.create(lab_request=self.lab_request, result_date=timezone.now(), details='')
+        first = timezone.datetime(2020, 1, 1, tzinfo=timezone.utc)
+        LabResultValue.objects.bulk_create([
+            LabResultValue(lab_result=lab_result, patient_id=42, analyte='HBA1C', value=5 + day % 3,
+                           result_date=first + timedelta(days=day))
+            for day in range(365 * 5)
+        ])
+        # Tự chọn bucket: 5 năm theo tuần là hơn 200 điểm, theo tháng là 60 điểm
+        with self.assertNumQueries(2):
+            data = self.series()
+        self.assertEqual(data['bucket'], 'month')
+        self.assertEqual(len(data['points']), 60)
+        self.assertEqual(data['points'][0]['count'], 31)
+        self.assertEqual((data['points'][0]['min'], data['points'][0]['max']), (5, 7))
+
+        data = self.series(bucket='year')
+        self.assertEqual([point['count'] for point in data['points']], [366, 365, 365, 365, 364])
+        self.assertEqual(len(self.series(bucket='raw', points=10)['points']), 10)
+
+    def test_bulk_results_store_values(self):
+        items = [{'lab_request': self.lab_request.id, 'result_date': f'2024-0{month}-01T08:00:00Z', 'details': 'HbA1c',
+                  'values': [{'analyte': 'HBA1C', 'value': 6 + month / 10}]} for month in (1, 2, 3)]
+        response = self.client.post('/api/lab_results/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([point['value'] for point in self.series()['points']], [6.1, 6.2, 6.3])
+
+    def test_series_requires_patient_and_analyte(self):
+        self.assertEqual(self.client.get('/api/lab_results/series/', {'analyte': 'HBA1C'}).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Cần PostgreSQL để kiểm tra SKIP LOCKED')
+class WorklistConcurrencyTests(TransactionTestCase):
+    REQUESTS = 200
+    WORKERS = 20
+
+    def setUp(self):
+        LabRequest.objects.bulk_create([
+            LabRequest(patient_id=n, doctor_id=7, test_type='blood') for n in range(self.REQUESTS)
+        ])
+
+    def claim_until_empty(self, technician_id):
+        claimed = []
+        try:
+            while True:
+                batch = claim_next('blood', technician_id, limit=3)
+                if not batch:
+                    return claimed
+                claimed.extend(lab_request.id for lab_request in batch)
+        finally:
+            connection.close()
+
+    def test_parallel_technicians_never_claim_the_same_request(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            results = list(executor.map(self.claim_until_empty, range(1, self.WORKERS + 1)))
+        claimed = [lab_request_id for batch in results for lab_request_id in batch]
+        self.assertEqual(len(claimed), self.REQUESTS)
+        self.assertEqual(len(set(claimed)), self.REQUESTS)
+        self.assertFalse(LabRequest.objects.filter(claimed_by__isnull=True).exists())
+
+    def test_locked_rows_are_skipped_not_waited_on(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def claim_and_wait():
+            # Nhận 2 yêu cầu nhưng chưa commit cho tới khi được báo
+            try:
+                with transaction.atomic():
+                    claim_next('blood', 1, limit=2)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        oldest = list(LabRequest.objects.order_by('created_at', 'id').values_list('id', flat=True)[:3])
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            holder = executor.submit(claim_and_wait)
+            self.assertTrue(locked.wait(10))
+            started = time.monotonic()
+            claimed = executor.submit(claim_next, 'blood', 2, 1).result()
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertEqual([lab_request.id for lab_request in claimed], oldest[2:])
+            release.set()
+            holder.result()
@@ -1,8 +1,17 @@
+from django.conf import settings
 from rest_framework import viewsets
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from .bulk import create_lab_requests, create_lab_results, run_bulk, update_lab_request_status
 from .models import LabRequest, LabResult
-from .serializers import LabRequestSerializer, LabResultSerializer
+from .parsers import NDJSONParser
+from .serializers import (
+    LabRequestSerializer, LabResultSerializer, LeaseSerializer, ResultSeriesQuerySerializer, WorklistClaimSerializer,
+)
+from .series import result_series
+from .worklist import claim_next, release_lease, renew_lease
 
 class LabRequestViewSet(viewsets.ModelViewSet):
     queryset = LabRequest.objects.all()
@@ -14,6 +23,9 @@ class LabRequestViewSet(viewsets.ModelViewSet):
         if status not in ['pending', 'completed', 'cancelled']:
             return Response({"detail": "Invalid status"}, status=400)
         instance.status = status
+        # Hoàn tất/hủy (hoặc đưa lại về pending) thì bỏ lease của worklist
+        instance.claimed_by = None
+        instance.lease_expires_at = None
         instance.save()
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -38,6 +50,64 @@ class LabRequestViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    # Tạo nhiều yêu cầu xét nghiệm trong một request (mảng JSON hoặc NDJSON)
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk_create(self, request):
+        return run_bulk(request, 'lab_requests.bulk', create_lab_requests)
+
+    # Đổi trạng thái nhiều yêu cầu xét nghiệm: [{"id": 1, "status": "completed"}, ...]
+    @action(detail=False, methods=['patch'], url_path='bulk_status', parser_classes=[JSONParser, NDJSONParser])
+    def bulk_status(self, request):
+        return run_bulk(request, 'lab_requests.bulk_status', update_lab_request_status)
+
+    def get_technician_id(self, request, data):
+        # Kỹ thuật viên là user đang đăng nhập; technician_id trong body chỉ được dùng
+        # khi role của user nằm trong LAB_TECHNICIAN_OVERRIDE_ROLES
+        if not (request.user and request.user.is_authenticated):
+            raise NotAuthenticated()
+        technician_id = data.get('technician_id')
+        if technician_id is None or technician_id == request.user.id:
+            return request.user.id
+        if getattr(request.user, 'role', None) not in settings.LAB_TECHNICIAN_OVERRIDE_ROLES:
+            raise PermissionDenied('technician_id can only be set by an admin or instrument account.')
+        return technician_id
+
+    # Nhận N yêu cầu pending cũ nhất của một loại xét nghiệm; các kỹ thuật viên nhận song song không trùng nhau
+    @action(detail=False, methods=['post'], url_path='claim')
+    def claim(self, request):
+        serializer = WorklistClaimSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        technician_id = self.get_technician_id(request, data)
+        claimed = claim_next(data['test_type'], technician_id, data['limit'], data.get('lease_seconds'))
+        return Response(self.get_serializer(claimed, many=True).data)
+
+    # PUT: gia hạn lease đang giữ; DELETE: trả yêu cầu về hàng đợi
+    @action(detail=True, methods=['put', 'delete'], url_path='lease')
+    def lease(self, request, pk=None):
+        instance = self.get_object()
+        serializer = LeaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        technician_id = self.get_technician_id(request, serializer.validated_data)
+        if request.method == 'DELETE':
+            if not release_lease(instance, technician_id):
+                return Response({"detail": "No lease held on this lab request"}, status=404)
+            return Response(status=204)
+        renew_lease(instance, technician_id, serializer.validated_data.get('lease_seconds'))
+        return Response(self.get_serializer(instance).data)
+
 class LabResultViewSet(viewsets.ModelViewSet):
-    queryset = LabResult.objects.all()
-    serializer_class = LabResultSerializer
\ No newline at end of file
+    queryset = LabResult.objects.prefetch_related('values')
+    serializer_class = LabResultSerializer
+
+    # Chuỗi thời gian của một chỉ số cho một bệnh nhân, ví dụ ?patient_id=1&analyte=HBA1C&bucket=month
+    @action(detail=False, methods=['get'], url_path='series')
+    def series(self, request):
+        serializer = ResultSeriesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(result_series(**serializer.validated_data))
+
+    # Tạo nhiều kết quả xét nghiệm trong một request (mảng JSON hoặc NDJSON)
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk_create(self, request):
+        return run_bulk(request, 'lab_results.bulk', create_lab_results)
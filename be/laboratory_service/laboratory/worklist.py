@@ -0,0 +1,70 @@
+# Worklist của kỹ thuật viên: nhận yêu cầu xét nghiệm đang chờ bằng SELECT ... FOR UPDATE SKIP LOCKED kèm lease
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import LabRequest
+
+
+class LeaseLost(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The lease on this lab request has expired or is held by another technician.'
+    default_code = 'lease_lost'
+
+
+def available(test_type, now):
+    # Yêu cầu pending chưa ai nhận hoặc lease đã hết hạn (tự quay lại hàng đợi, không cần job dọn)
+    return LabRequest.objects.filter(status='pending', test_type=test_type).filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now))
+
+
+def claim_next(test_type, technician_id, limit=1, lease_seconds=None, now=None):
+    """
+    Nhận tối đa limit yêu cầu pending cũ nhất của test_type cho technician_id.
+
+    Dòng đang bị transaction khác khóa (kỹ thuật viên khác đang nhận) được bỏ qua thay vì chờ,
+    nên các máy/kỹ thuật viên nhận song song không chặn nhau và không nhận trùng. Lease hết hạn
+    sau lease_seconds (mặc định LAB_LEASE_SECONDS); hoàn tất hoặc gia hạn trước thời điểm đó.
+    """
+    now = now or timezone.now()
+    lease_expires_at = now + timedelta(seconds=lease_seconds or settings.LAB_LEASE_SECONDS)
+    with transaction.atomic():
+        # Duyệt theo index labreq_pending_idx (test_type, created_at) WHERE status = 'pending'
+        ids = list(
+            available(test_type, now)
+            .select_for_update(skip_locked=True)
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            LabRequest.objects.filter(id__in=ids).update(
+                claimed_by=technician_id, lease_expires_at=lease_expires_at, updated_at=now)
+    return list(LabRequest.objects.filter(id__in=ids).order_by('created_at', 'id'))
+
+
+def renew_lease(lab_request, technician_id, lease_seconds=None, now=None):
+    """Gia hạn lease của technician_id; lease đã hết hạn hoặc thuộc người khác thì báo LeaseLost (409)."""
+    now = now or timezone.now()
+    lease_expires_at = now + timedelta(seconds=lease_seconds or settings.LAB_LEASE_SECONDS)
+    # UPDATE có điều kiện: lease hết hạn rồi có thể đã được người khác nhận lại
+    updated = LabRequest.objects.filter(
+        pk=lab_request.pk, status='pending', claimed_by=technician_id, lease_expires_at__gt=now,
+    ).update(lease_expires_at=lease_expires_at, updated_at=now)
+    if not updated:
+        raise LeaseLost()
+    lab_request.lease_expires_at = lease_expires_at
+    lab_request.updated_at = now
+    return lab_request
+
+
+def release_lease(lab_request, technician_id, now=None):
+    """Trả yêu cầu về hàng đợi; trả về False nếu technician_id không giữ lease."""
+    now = now or timezone.now()
+    updated = LabRequest.objects.filter(pk=lab_request.pk, status='pending', claimed_by=technician_id).update(
+        claimed_by=None, lease_expires_at=None, updated_at=now)
+    return bool(updated)
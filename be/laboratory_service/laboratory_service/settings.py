@@ -82,6 +82,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Cho phép frontend đọc header phân trang
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count']
+
 ROOT_URLCONF = 'laboratory_service.urls'
 
 TEMPLATES = [
@@ -137,10 +140,14 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],  # Bỏ tất cả lớp xác thực
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'laboratory_service.auth.CustomJWTAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Cho phép tất cả yêu cầu mà không cần quyền
     ],
+    # Phân trang cursor dùng chung cho mọi endpoint list
+    'DEFAULT_PAGINATION_CLASS': 'laboratory_service.pagination.KeysetCursorPagination',
 }
 
 SIMPLE_JWT = {
@@ -151,6 +158,13 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Cache claims của JWT đã xác thực (số token tối đa, thời gian sống tính bằng giây)
+JWT_CLAIMS_CACHE_SIZE = 1024
+JWT_CLAIMS_CACHE_TTL = 300
+# Token hết hạn/không hợp lệ được coi như không có token thay vì trả về 401,
+# giữ hành vi trước khi service bật xác thực JWT (mọi endpoint đều AllowAny)
+JWT_INVALID_TOKEN_AS_ANONYMOUS = True
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -177,3 +191,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # URL của các dịch vụ khác để gọi API
 
+
+# Số item tối đa trong một request bulk và số dòng mỗi câu INSERT của bulk_create
+LAB_BULK_MAX_ITEMS = 1000
+LAB_BULK_BATCH_SIZE = 500
+# Số ngày giữ Idempotency-Key của các request bulk (lệnh purge_idempotency_keys)
+IDEMPOTENCY_KEY_TTL_DAYS = 7
+
+# Worklist của kỹ thuật viên: thời hạn lease mặc định/tối đa (giây) và số yêu cầu tối đa mỗi lần nhận
+LAB_LEASE_SECONDS = 900
+LAB_LEASE_MAX_SECONDS = 3600
+LAB_CLAIM_MAX_ITEMS = 50
+# Role được nhận/gia hạn/trả yêu cầu thay cho kỹ thuật viên khác qua technician_id trong body
+# (admin, tài khoản dịch vụ của máy xét nghiệm); role khác luôn dùng id của chính mình
+LAB_TECHNICIAN_OVERRIDE_ROLES = ['admin']
+
+# Số điểm mặc định/tối đa của một chuỗi thời gian chỉ số xét nghiệm (GET /api/lab_results/series/)
+LAB_SERIES_POINTS = 200
+LAB_SERIES_MAX_POINTS = 1000
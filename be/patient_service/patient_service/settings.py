@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -91,6 +92,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Cho phép frontend đọc header phân trang
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count']
+
 ROOT_URLCONF = 'patient_service.urls'
 
 TEMPLATES = [
@@ -152,6 +156,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Phân trang cursor dùng chung cho mọi endpoint list
+    'DEFAULT_PAGINATION_CLASS': 'patient_service.pagination.KeysetCursorPagination',
 }
 
 SIMPLE_JWT = {
@@ -162,6 +168,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Cache claims của JWT đã xác thực (số token tối đa, thời gian sống tính bằng giây)
+JWT_CLAIMS_CACHE_SIZE = 1024
+JWT_CLAIMS_CACHE_TTL = 300
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -187,3 +197,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # USER_SERVICE_URL = 'http://172.18.0.15:8000/api/users/'
 USER_SERVICE_URL = 'http://user_service:8000/api/users/'
+DOCTOR_SERVICE_URL = 'http://doctor_service:8000/api/'
+
+# Connection pool, timeout (connect, read), retry và circuit breaker cho lời gọi sang doctor_service
+DOCTOR_SERVICE_POOL_SIZE = 10
+DOCTOR_SERVICE_TIMEOUT = (1.0, 3.0)
+DOCTOR_SERVICE_RETRIES = 2
+DOCTOR_SERVICE_BACKOFF = 0.2
+DOCTOR_SERVICE_BREAKER_THRESHOLD = 5
+DOCTOR_SERVICE_BREAKER_RESET = 30
+
+# Độ dài một slot khám (phút). Dùng chung với doctor_service: cả hai đọc biến môi trường APPOINTMENT_SLOT_MINUTES
+# (docker-compose.yml đặt một lần cho cả hai service) và chia slot trên cùng lưới epoch UTC
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', 30))
+# Thời gian giữ chỗ một slot (POST /api/appointments/hold/) trước khi người khác được đặt
+SLOT_HOLD_SECONDS = 300
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PatientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'patients'
+
+    def ready(self):
+        # Đăng ký signal đồng bộ lịch hẹn sang chỉ mục slot của doctor_service
+        from . import signals  # noqa: F401
@@ -0,0 +1,117 @@
+# Đặt lịch hẹn không trùng slot: giữ chỗ tạm thời, ràng buộc unique và chuyển trạng thái có điều kiện
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Appointment, SlotHold, slot_start_for
+from .signals import schedule_slot_sync
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái đích hợp lệ từ mỗi trạng thái; lịch đã hủy muốn khám lại thì đặt lịch mới
+ALLOWED_TRANSITIONS = {
+    'pending': ('confirmed', 'cancelled'),
+    'confirmed': ('cancelled',),
+    'cancelled': (),
+}
+
+
+class SlotUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This slot is already booked or held by another patient.'
+    default_code = 'slot_unavailable'
+
+
+class StatusConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Appointment status was changed by another request.'
+    default_code = 'status_conflict'
+
+
+def _claim_slot(doctor_id, slot_start, user_id, now):
+    """
+    Giữ slot cho user_id tới now + SLOT_HOLD_SECONDS; slot đang được người khác giữ thì báo SlotUnavailable.
+
+    Phải gọi trong transaction. Unique (doctor_id, slot_start) của SlotHold quyết định ai thắng:
+    request sau chỉ chờ khi cùng slot, các slot và bác sĩ khác không bị khóa.
+    """
+    expires_at = now + timedelta(seconds=settings.SLOT_HOLD_SECONDS)
+    # Giữ chỗ đã hết hạn không còn hiệu lực, xóa để nhường slot
+    SlotHold.objects.filter(doctor_id=doctor_id, slot_start=slot_start, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            return SlotHold.objects.create(doctor_id=doctor_id, slot_start=slot_start, user_id=user_id, expires_at=expires_at)
+    except IntegrityError:
+        pass
+    # Slot đã có người giữ: chỉ gia hạn khi đó là chính user_id
+    if not SlotHold.objects.filter(doctor_id=doctor_id, slot_start=slot_start, user_id=user_id).update(expires_at=expires_at):
+        raise SlotUnavailable()
+    return SlotHold.objects.get(doctor_id=doctor_id, slot_start=slot_start)
+
+
+@transaction.atomic
+def hold_slot(doctor_id, appointment_date, user_id):
+    """Giữ chỗ slot chứa appointment_date cho user_id; gọi lại khi đang giữ thì được gia hạn."""
+    slot_start = slot_start_for(appointment_date)
+    if Appointment.objects.filter(doctor_id=doctor_id, slot_start=slot_start, status__in=Appointment.ACTIVE_STATUSES).exists():
+        raise SlotUnavailable()
+    return _claim_slot(doctor_id, slot_start, user_id, timezone.now())
+
+
+def release_hold(doctor_id, appointment_date, user_id):
+    """Trả slot đang giữ; trả về False nếu user_id không giữ slot đó."""
+    deleted, _ = SlotHold.objects.filter(
+        doctor_id=doctor_id, slot_start=slot_start_for(appointment_date), user_id=user_id).delete()
+    return bool(deleted)
+
+
+@transaction.atomic
+def book_appointment(serializer, user_id, **save_kwargs):
+    """
+    Lưu lịch hẹn từ serializer (tạo mới hoặc đổi giờ/bác sĩ) sau khi giành được slot.
+
+    Cùng một transaction: giữ slot (hoặc dùng giữ chỗ sẵn có của user_id), ghi lịch hẹn rồi bỏ
+    giữ chỗ. Ràng buộc appt_active_slot_uniq là chốt chặn cuối: slot đã có lịch hẹn thì
+    IntegrityError được đổi thành SlotUnavailable (409).
+    """
+    instance = serializer.instance
+    doctor_id = serializer.validated_data.get('doctor_id', getattr(instance, 'doctor_id', None))
+    appointment_date = serializer.validated_data.get('appointment_date', getattr(instance, 'appointment_date', None))
+    slot_start = slot_start_for(appointment_date)
+    _claim_slot(doctor_id, slot_start, user_id, timezone.now())
+    try:
+        with transaction.atomic():
+            appointment = serializer.save(**save_kwargs)
+    except IntegrityError:
+        logger.info(f"Slot {slot_start} of doctor {doctor_id} is already booked")
+        raise SlotUnavailable()
+    SlotHold.objects.filter(doctor_id=doctor_id, slot_start=slot_start, user_id=user_id).delete()
+    return appointment
+
+
+def change_status(appointment, new_status, expected_status=None):
+    """
+    Chuyển trạng thái bằng UPDATE ... WHERE status = <trạng thái cũ>, không đọc-sửa-ghi.
+
+    expected_status là trạng thái client đã thấy (mặc định: trạng thái vừa đọc). Nếu request
+    khác đã đổi trạng thái trước thì UPDATE không khớp dòng nào và báo StatusConflict (409).
+    """
+    old_status = expected_status or appointment.status
+    if new_status == old_status:
+        return appointment
+    if new_status not in ALLOWED_TRANSITIONS[old_status]:
+        raise StatusConflict(f"Cannot change status from '{old_status}' to '{new_status}'.")
+    now = timezone.now()
+    updated = Appointment.objects.filter(pk=appointment.pk, status=old_status).update(status=new_status, updated_at=now)
+    if not updated:
+        raise StatusConflict()
+    appointment.status = new_status
+    appointment.updated_at = now
+    # update() không phát post_save, tự báo doctor_service như signal
+    schedule_slot_sync(appointment, new_status)
+    return appointment
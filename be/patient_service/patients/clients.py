@@ -0,0 +1,143 @@
+# HTTP client dùng chung cho các lời gọi từ patient_service sang doctor_service
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Circuit breaker đang mở: tạm thời không gọi sang service đích."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker đơn giản theo số lỗi liên tiếp.
+
+    - closed: gọi bình thường, đếm lỗi liên tiếp (lỗi kết nối, timeout, 5xx).
+    - open: sau failure_threshold lỗi liên tiếp, từ chối ngay trong reset_timeout giây.
+    - half-open: hết reset_timeout thì cho một request thử; thành công thì đóng lại,
+      thất bại thì mở tiếp thêm reset_timeout giây.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Cho một request thử đi qua, các request khác vẫn bị chặn
+                self._opened_at = time.monotonic()
+                return
+            raise CircuitOpenError('Circuit breaker is open')
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.error(f"Circuit breaker opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+
+
+class ServiceClient:
+    """
+    Client HTTP giữ kết nối (keep-alive) tới một service khác.
+
+    Mỗi process có một requests.Session riêng với connection pool giới hạn bởi
+    pool_size, retry có backoff cho các method idempotent (chỉ lỗi kết nối và 502/503/504,
+    nên một lời gọi chờ tối đa một read timeout) và một circuit breaker.
+    """
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+    def __init__(self, base_url, pool_size=10, timeout=(1.0, 3.0), retries=2, backoff_factor=0.2,
+                 failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Session không được chia sẻ qua fork (gunicorn worker), tạo lại theo pid
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _build_session(self):
+        # Chỉ retry lỗi kết nối và 502/503/504. Không retry read timeout: request có thể đã được xử lý,
+        # và mỗi lần retry giữ worker thêm một read timeout nữa
+        retry = Retry(
+            total=self.retries,
+            read=0,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=self.IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, path, **kwargs):
+        self.breaker.before_call()
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+
+# Client dùng chung trong process cho doctor_service
+doctor_client = ServiceClient(
+    base_url=settings.DOCTOR_SERVICE_URL,
+    pool_size=getattr(settings, 'DOCTOR_SERVICE_POOL_SIZE', 10),
+    timeout=getattr(settings, 'DOCTOR_SERVICE_TIMEOUT', (1.0, 3.0)),
+    retries=getattr(settings, 'DOCTOR_SERVICE_RETRIES', 2),
+    backoff_factor=getattr(settings, 'DOCTOR_SERVICE_BACKOFF', 0.2),
+    failure_threshold=getattr(settings, 'DOCTOR_SERVICE_BREAKER_THRESHOLD', 5),
+    reset_timeout=getattr(settings, 'DOCTOR_SERVICE_BREAKER_RESET', 30),
+)
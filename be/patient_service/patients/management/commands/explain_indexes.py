@@ -0,0 +1,111 @@
+"""
+Seed dữ liệu lớn rồi so sánh query plan của các truy vấn tra cứu khi có và không có index.
+
+Mọi thao tác (seed, ANALYZE, DROP INDEX) chạy trong một transaction và bị rollback ở cuối,
+nên database không bị thay đổi. DROP INDEX giữ khóa độc quyền trên bảng cho tới khi rollback,
+vì vậy chỉ chạy trên database dev/staging:
+
+    python manage.py explain_indexes --rows 1000000
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from patients.models import PatientProfile, Appointment
+
+# user_id giả cho dữ liệu seed, tránh đụng dữ liệu thật
+SEED_USER_ID_BASE = 900_000_000
+
+
+class Command(BaseCommand):
+    help = 'So sánh query plan của các truy vấn lịch hẹn trước/sau khi có index (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Số lịch hẹn được seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_indexes chỉ hỗ trợ PostgreSQL.')
+        rows = options['rows']
+
+        with transaction.atomic():
+            self.seed(rows)
+            cases = self.cases()
+            self.report('Có index', cases)
+            with connection.cursor() as cursor:
+                for index_name in {name for _, _, names in cases for name in names}:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(index_name)}')
+            self.report('Không có index', cases)
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        patients = max(rows // 100, 1)
+        self.stdout.write(f'Seed {patients} hồ sơ bệnh nhân và {rows} lịch hẹn...')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {PatientProfile._meta.db_table}
+                    (user_id, date_of_birth, address, medical_history, created_at, updated_at)
+                SELECT %s + g, DATE '1990-01-01', '', '', now(), now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [SEED_USER_ID_BASE, patients],
+            )
+            cursor.execute(
+                f'SELECT min(id) FROM {PatientProfile._meta.db_table} WHERE user_id > %s',
+                [SEED_USER_ID_BASE],
+            )
+            first_patient = cursor.fetchone()[0]
+            cursor.execute(
+                f"""
+                INSERT INTO {Appointment._meta.db_table}
+                    (patient_id, doctor_id, appointment_date, reason, status, created_at, updated_at)
+                SELECT %s + g %% %s,
+                       g %% 1000,
+                       now() + (g %% 525600) * interval '1 minute',
+                       '',
+                       (ARRAY['pending', 'confirmed', 'cancelled'])[1 + g %% 3],
+                       now() - g * interval '1 second',
+                       now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [first_patient, patients, rows],
+            )
+            cursor.execute(f'ANALYZE {PatientProfile._meta.db_table}')
+            cursor.execute(f'ANALYZE {Appointment._meta.db_table}')
+
+    def cases(self):
+        # (tên truy vấn, queryset giống endpoint, các index phục vụ truy vấn đó)
+        return [
+            (
+                'get_by_doctor_id',
+                Appointment.objects.filter(doctor_id=42).order_by('appointment_date'),
+                ['appt_doctor_date_idx', 'appt_pending_doctor_idx'],
+            ),
+            (
+                'pending theo doctor_id',
+                Appointment.objects.filter(doctor_id=42, status='pending').order_by('appointment_date'),
+                ['appt_doctor_date_idx', 'appt_pending_doctor_idx'],
+            ),
+            (
+                'get_by_patient_id',
+                Appointment.objects.filter(patient__user_id=SEED_USER_ID_BASE + 7).order_by('appointment_date'),
+                ['appt_patient_date_idx'],
+            ),
+            (
+                'list (trang đầu)',
+                Appointment.objects.order_by('-created_at', '-id')[:51],
+                ['appt_created_idx'],
+            ),
+        ]
+
+    def report(self, title, cases):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        with connection.cursor() as cursor:
+            for label, queryset, _ in cases:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+                plan = [line for (line,) in cursor.fetchall()]
+                scans = [line.strip().lstrip('-> ').split('  (')[0] for line in plan if 'Scan' in line]
+                timing = next((line for line in plan if line.startswith('Execution Time')), '')
+                self.stdout.write(f'  {label}: {timing}')
+                for scan in scans:
+                    self.stdout.write(f'      {scan}')
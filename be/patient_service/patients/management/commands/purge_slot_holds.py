@@ -0,0 +1,17 @@
+"""
+Xóa các giữ chỗ slot đã hết hạn. Giữ chỗ hết hạn vốn không chặn ai (bị xóa ở lần giữ/đặt
+cùng slot tiếp theo), lệnh này chỉ để bảng slot hold không phình ra; chạy định kỳ (cron):
+
+    python manage.py purge_slot_holds
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from patients.models import SlotHold
+
+
+class Command(BaseCommand):
+    help = 'Xóa các giữ chỗ slot đã hết hạn.'
+
+    def handle(self, *args, **options):
+        deleted, _ = SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(f'Đã xóa {deleted} giữ chỗ hết hạn')
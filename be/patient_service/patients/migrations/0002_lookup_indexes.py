@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction,
+    # đổi lại bảng không bị khóa ghi trong lúc tạo index trên dữ liệu lớn.
+    atomic = False
+
+    dependencies = [
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['doctor_id', 'appointment_date'], name='appt_doctor_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'appointment_date'], name='appt_patient_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['-created_at', '-id'], name='appt_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['doctor_id', 'appointment_date'], name='appt_pending_doctor_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='patientprofile',
+            index=models.Index(fields=['-created_at', '-id'], name='patient_created_idx'),
+        ),
+    ]
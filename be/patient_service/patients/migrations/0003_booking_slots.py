@@ -0,0 +1,110 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:40
+
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations, models
+
+# Độ dài slot (phút) tại thời điểm tạo migration; migration không đọc settings để luôn cho cùng kết quả
+SLOT_MINUTES = 30
+# Đặt biến môi trường này thành 1 để migration tự hủy các lịch hẹn trùng slot (giữ lịch đặt sớm nhất)
+CANCEL_DUPLICATES_ENV = 'APPOINTMENT_SLOT_BACKFILL_CANCEL_DUPLICATES'
+
+
+def backfill_slot_start(apps, schema_editor):
+    # Tính slot_start cho lịch hẹn cũ. Nếu có lịch hẹn chưa hủy trùng slot (do đặt song song trước đây)
+    # thì mặc định dừng migration và liệt kê các ID; API chưa dùng được lúc này (model mới đọc cột
+    # slot_start chưa tồn tại), nên thông báo lỗi đưa câu SQL hủy các lịch thừa và cờ CANCEL_DUPLICATES_ENV
+    Appointment = apps.get_model('patients', 'Appointment')
+    seconds = SLOT_MINUTES * 60
+    taken = {}
+    duplicates = {}
+    batch = []
+    for appointment in Appointment.objects.order_by('created_at', 'id').iterator(chunk_size=2000):
+        timestamp = int(appointment.appointment_date.timestamp())
+        appointment.slot_start = datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+        if appointment.status in ('pending', 'confirmed'):
+            key = (appointment.doctor_id, appointment.slot_start)
+            if key in taken:
+                duplicates.setdefault(key, [taken[key]]).append(appointment.id)
+            else:
+                taken[key] = appointment.id
+        batch.append(appointment)
+        if len(batch) >= 2000:
+            Appointment.objects.bulk_update(batch, ['slot_start'])
+            batch = []
+    Appointment.objects.bulk_update(batch, ['slot_start'])
+    if not duplicates:
+        return
+    # Lịch đặt sớm nhất của mỗi slot được giữ, các lịch sau bị hủy
+    extra = sorted(appointment_id for ids in duplicates.values() for appointment_id in ids[1:])
+    if os.environ.get(CANCEL_DUPLICATES_ENV) == '1':
+        Appointment.objects.filter(id__in=extra).update(status='cancelled')
+        if schema_editor.connection.vendor == 'postgresql':
+            # Chạy ngay các kiểm tra khóa ngoại bị hoãn, để các bước ALTER TABLE sau trong cùng transaction chạy được
+            schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            schema_editor.execute('SET CONSTRAINTS ALL DEFERRED')
+        print(
+            f"\n  Cancelled {len(extra)} duplicate appointments: {extra}\n"
+            f"  Run 'python manage.py refresh_slots --reconcile' in doctor_service to release their slots."
+        )
+        return
+    groups = [
+        f"doctor {doctor_id} at {slot_start.isoformat()}: appointments {ids} (keeping {ids[0]})"
+        for (doctor_id, slot_start), ids in sorted(duplicates.items())
+    ]
+    shown = '\n  '.join(groups[:100])
+    more = f"\n  ... and {len(groups) - 100} more slots" if len(groups) > 100 else ''
+    raise RuntimeError(
+        f"{len(groups)} slots have more than one pending/confirmed appointment, so appt_active_slot_uniq "
+        f"cannot be created:\n  {shown}{more}\n"
+        f"Nothing was changed. Either re-run migrate with {CANCEL_DUPLICATES_ENV}=1 to cancel every appointment "
+        f"but the earliest booked one in each slot, or cancel the ones you choose yourself, e.g.\n"
+        f"  UPDATE patients_appointment SET status = 'cancelled' WHERE id IN "
+        f"({', '.join(map(str, extra[:1000]))});"
+        f"{f'  -- first 1000 of {len(extra)} ids' if len(extra) > 1000 else ''}\n"
+        f"and run migrate again. Then run 'python manage.py refresh_slots --reconcile' in doctor_service."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='slot_start',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_slot_start, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='slot_start',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=('doctor_id', 'slot_start'), name='appt_active_slot_uniq'),
+        ),
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doctor_id', models.IntegerField()),
+                ('slot_start', models.DateTimeField()),
+                ('user_id', models.IntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='hold_expires_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slothold',
+            constraint=models.UniqueConstraint(fields=('doctor_id', 'slot_start'), name='hold_slot_uniq'),
+        ),
+    ]
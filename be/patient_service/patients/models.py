@@ -1,4 +1,18 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+def slot_start_for(appointment_date):
+    """Đầu slot APPOINTMENT_SLOT_MINUTES phút chứa appointment_date (lưới tính theo UTC)."""
+    seconds = settings.APPOINTMENT_SLOT_MINUTES * 60
+    if timezone.is_naive(appointment_date):
+        appointment_date = timezone.make_aware(appointment_date)
+    timestamp = int(appointment_date.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
 
 class PatientProfile(models.Model):
     user_id = models.IntegerField(unique=True)  # Liên kết với User từ user_service
@@ -8,6 +22,12 @@ class PatientProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Phục vụ phân trang cursor (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='patient_created_idx'),
+        ]
+
     def __str__(self):
         return f"Patient {self.user_id}"
 
@@ -17,13 +37,71 @@ class Appointment(models.Model):
         ('confirmed', 'Confirmed'),
         ('cancelled', 'Cancelled'),
     )
+    # Lịch hẹn ở các trạng thái này đang chiếm slot
+    ACTIVE_STATUSES = ('pending', 'confirmed')
     patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='appointments')
     doctor_id = models.IntegerField()  
     appointment_date = models.DateTimeField()
+    # Slot chứa appointment_date, tính lại mỗi lần save(); khóa của ràng buộc chống đặt trùng
+    slot_start = models.DateTimeField(editable=False)
     reason = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # Mỗi slot của một bác sĩ chỉ có một lịch hẹn chưa hủy; hai request đặt cùng slot
+            # song song thì request sau nhận IntegrityError thay vì tạo bản ghi trùng
+            models.UniqueConstraint(
+                fields=['doctor_id', 'slot_start'],
+                name='appt_active_slot_uniq',
+                condition=models.Q(status__in=['pending', 'confirmed']),
+            ),
+        ]
+        indexes = [
+            # get_by_doctor_id: lọc theo doctor_id, sắp xếp theo ngày hẹn
+            models.Index(fields=['doctor_id', 'appointment_date'], name='appt_doctor_date_idx'),
+            # get_by_patient_id và list của bệnh nhân
+            models.Index(fields=['patient', 'appointment_date'], name='appt_patient_date_idx'),
+            models.Index(fields=['-created_at', '-id'], name='appt_created_idx'),
+            # Lịch hẹn chờ xác nhận của bác sĩ (chỉ index các dòng pending)
+            models.Index(
+                fields=['doctor_id', 'appointment_date'],
+                name='appt_pending_doctor_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        appointment_date = self._meta.get_field('appointment_date').to_python(self.appointment_date)
+        self.slot_start = slot_start_for(appointment_date)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'appointment_date' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'slot_start'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Appointment {self.id} for Patient {self.patient.user_id}"
+
+class SlotHold(models.Model):
+    # Giữ chỗ tạm thời một slot trong lúc bệnh nhân hoàn tất đặt lịch (xem patients/booking.py)
+    doctor_id = models.IntegerField()
+    slot_start = models.DateTimeField()
+    # user_id của bệnh nhân đang giữ chỗ
+    user_id = models.IntegerField()
+    # Hết hạn thì giữ chỗ không còn hiệu lực và bị xóa ở lần giữ/đặt slot tiếp theo
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor_id', 'slot_start'], name='hold_slot_uniq'),
+        ]
+        indexes = [
+            # Dọn các giữ chỗ đã hết hạn (lệnh purge_slot_holds)
+            models.Index(fields=['expires_at'], name='hold_expires_idx'),
+        ]
+
     def __str__(self):
-        return f"Appointment {self.id} for Patient {self.patient.user_id}"
\ No newline at end of file
+        return f"Hold of slot {self.slot_start} (Doctor {self.doctor_id}) by User {self.user_id}"
\ No newline at end of file
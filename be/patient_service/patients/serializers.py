@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import PatientProfile, Appointment
+from .models import PatientProfile, Appointment, SlotHold
 import requests
 from django.conf import settings
 import logging
@@ -31,4 +31,13 @@ class AppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = ['id', 'patient', 'doctor_id', 'appointment_date', 'reason', 'status', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'status', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'status', 'created_at', 'updated_at']
+
+class SlotHoldSerializer(serializers.ModelSerializer):
+    # Giờ hẹn muốn giữ; slot_start là đầu slot chứa giờ này
+    appointment_date = serializers.DateTimeField(write_only=True)
+
+    class Meta:
+        model = SlotHold
+        fields = ['id', 'doctor_id', 'appointment_date', 'slot_start', 'expires_at']
+        read_only_fields = ['id', 'slot_start', 'expires_at']
@@ -0,0 +1,54 @@
+# Báo cho doctor_service giữ/giải phóng slot khám mỗi khi lịch hẹn thay đổi
+import logging
+
+import requests
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .clients import doctor_client
+from .models import Appointment
+
+logger = logging.getLogger(__name__)
+
+
+def sync_doctor_slot(appointment_id, doctor_id, appointment_date, status):
+    """
+    Gửi trạng thái mới nhất của lịch hẹn sang PUT /api/doctors/slots/sync/.
+
+    Lời gọi idempotent nên được retry khi lỗi mạng; nếu vẫn lỗi thì chỉ ghi log, lịch hẹn
+    vẫn được lưu và lệnh refresh_slots --reconcile ở doctor_service sẽ sửa lại chỉ mục.
+    """
+    try:
+        response = doctor_client.put('doctors/slots/sync/', json={
+            'appointment_id': appointment_id,
+            'doctor_id': doctor_id,
+            'appointment_date': appointment_date if isinstance(appointment_date, str) else appointment_date.isoformat(),
+            'status': status,
+        })
+    except requests.RequestException as e:
+        logger.error(f"Failed to sync slot for appointment {appointment_id}: {str(e)}")
+        return None
+    if response.status_code != 200:
+        logger.error(f"Failed to sync slot for appointment {appointment_id}: {response.status_code}")
+        return None
+    return response.json().get('result')
+
+
+def schedule_slot_sync(appointment, status):
+    # Chỉ gửi sau khi transaction commit, tránh giữ slot cho lịch hẹn bị rollback
+    args = (appointment.pk, appointment.doctor_id, appointment.appointment_date, status)
+    transaction.on_commit(lambda: sync_doctor_slot(*args))
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_slot_sync(instance, instance.status)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    # Lịch hẹn bị xóa được báo như bị hủy để doctor_service trả slot lại
+    schedule_slot_sync(instance, 'cancelled')
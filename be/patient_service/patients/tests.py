@@ -1,7 +1,19 @@
-from django.test import TestCase
-from .models import PatientProfile, Appointment
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+import requests
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from .models import PatientProfile, Appointment, SlotHold
+from .booking import book_appointment
+from .serializers import AppointmentSerializer
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from patient_service.auth import CustomJWTAuthentication, TokenUser, claims_cache
 
 class PatientProfileTests(TestCase):
     def setUp(self):
@@ -17,4 +29,289 @@ class sokatTests(TestCase):
 
     def test_create_appointment(self):
         # Thêm test cases sau khi tích hợp xác thực
-        pass
\ No newline at end of file
+        pass
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for user_id in range(1, 6):
+            PatientProfile.objects.create(user_id=user_id, date_of_birth=date(1990, 1, 1), address='Hà Nội')
+
+    def test_list_is_bounded_and_ordered(self):
+        response = self.client.get('/api/patients/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['user_id'] for p in response.data], [5, 4])
+        self.assertIn('rel="next"', response['Link'])
+        self.assertNotIn('X-Total-Count', response)
+
+    def test_follow_cursor_to_next_page(self):
+        first = self.client.get('/api/patients/', {'page_size': 2})
+        next_url = first['Link'].split(';')[0].strip('<>')
+        second = self.client.get(next_url)
+        self.assertEqual([p['user_id'] for p in second.data], [3, 2])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api/patients/', {'page_size': 100000})
+        self.assertEqual(len(response.data), 5)
+        self.assertNotIn('Link', response)
+
+    def test_total_count_is_opt_in(self):
+        response = self.client.get('/api/patients/', {'page_size': 2, 'with_count': 'true'})
+        self.assertEqual(response['X-Total-Count'], '5')
+
+class AuthenticationCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        claims_cache.clear()
+        PatientProfile.objects.create(user_id=7, date_of_birth=date(1990, 1, 1), address='Hà Nội')
+
+    def make_token(self, lifetime=None, **claims):
+        token = AccessToken()
+        if lifetime is not None:
+            token.set_exp(lifetime=lifetime)
+        payload = {'id': 7, 'username': 'patient7', 'email': 'p7@example.com', 'role': 'patient', 'is_active': True}
+        payload.update(claims)
+        for key, value in payload.items():
+            token[key] = value
+        return str(token)
+
+    def test_signature_is_verified_once_per_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.make_token()}')
+        with mock.patch.object(
+            CustomJWTAuthentication, 'get_validated_token', wraps=CustomJWTAuthentication().get_validated_token
+        ) as validate:
+            for _ in range(3):
+                response = self.client.get('/api/patients/by_userId/7/')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(validate.call_count, 1)
+
+    def test_cached_user_is_reused(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.make_token()}')
+        first = self.client.get('/api/appointments/').wsgi_request.user
+        second = self.client.get('/api/appointments/').wsgi_request.user
+        self.assertIs(first, second)
+        self.assertEqual((first.id, first.role), (7, 'patient'))
+        self.assertFalse(hasattr(first, '__dict__'))
+
+    def test_expired_entry_is_not_served(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.make_token(lifetime=timedelta(seconds=30))}')
+        self.assertEqual(self.client.get('/api/appointments/').status_code, status.HTTP_200_OK)
+        raw_token = next(iter(claims_cache._entries.values()))[0]
+        self.assertIsNotNone(claims_cache.get(raw_token))
+        with mock.patch('patient_service.auth.time.time', return_value=time.time() + 60):
+            self.assertIsNone(claims_cache.get(raw_token))
+
+    def test_invalid_claims_are_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.make_token(is_active=False)}')
+        self.assertEqual(self.client.get('/api/appointments/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(claims_cache._entries), 0)
+
+class QueryCountTests(TestCase):
+    """Mỗi endpoint tra cứu theo ID chỉ được phép chạy đúng một truy vấn."""
+
+    def setUp(self):
+        self.client = APIClient()
+        patient = PatientProfile.objects.create(user_id=11, date_of_birth=date(1990, 1, 1), address='Hà Nội')
+        for day in range(1, 4):
+            Appointment.objects.create(
+                patient=patient, doctor_id=21, appointment_date=f'2025-06-0{day}T09:00:00Z', reason='Khám định kỳ'
+            )
+
+    def test_get_by_patient_id(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/by_patientId/11/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_get_by_patient_id_not_found(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/by_patientId/999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_by_doctor_id(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/by_doctorId/21/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_get_by_doctor_id_not_found(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/appointments/by_doctorId/999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SlotSyncTests(TestCase):
+    def setUp(self):
+        self.ok_response = mock.Mock(status_code=200, **{'json.return_value': {'result': 'booked'}})
+        self.patient = PatientProfile.objects.create(user_id=11, date_of_birth=date(1990, 1, 1), address='Hà Nội')
+
+    def create_appointment(self):
+        return Appointment.objects.create(
+            patient=self.patient, doctor_id=21, appointment_date='2025-06-02T02:00:00Z', reason='Khám định kỳ'
+        )
+
+    def test_slot_synced_after_commit(self):
+        with mock.patch('patients.signals.doctor_client.put', return_value=self.ok_response) as put:
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = self.create_appointment()
+                put.assert_not_called()
+        put.assert_called_once_with('doctors/slots/sync/', json={
+            'appointment_id': appointment.pk, 'doctor_id': 21,
+            'appointment_date': '2025-06-02T02:00:00Z', 'status': 'pending',
+        })
+
+    def test_cancel_and_delete_release_slot(self):
+        appointment = self.create_appointment()
+        with mock.patch('patients.signals.doctor_client.put', return_value=self.ok_response) as put:
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment.status = 'cancelled'
+                appointment.save()
+                appointment.delete()
+        self.assertEqual([call.kwargs['json']['status'] for call in put.call_args_list], ['cancelled', 'cancelled'])
+
+    def test_doctor_service_error_does_not_fail_request(self):
+        with mock.patch('patients.signals.doctor_client.put', side_effect=requests.ConnectionError):
+            with self.assertLogs('patients.signals', level='ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.create_appointment()
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+def patient_user(user_id):
+    return TokenUser(user_id, f'patient{user_id}', f'p{user_id}@example.com', 'patient', True)
+
+class BookingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for user_id in (11, 12):
+            PatientProfile.objects.create(user_id=user_id, date_of_birth=date(1990, 1, 1), address='Hà Nội')
+
+    def book(self, user_id, when='2025-06-02T02:00:00Z', doctor_id=21):
+        self.client.force_authenticate(patient_user(user_id))
+        return self.client.post('/api/appointments/', {
+            'patient': PatientProfile.objects.get(user_id=user_id).pk,
+            'doctor_id': doctor_id, 'appointment_date': when, 'reason': 'Khám định kỳ',
+        }, format='json')
+
+    def hold(self, user_id, method='post', when='2025-06-02T02:00:00Z', doctor_id=21):
+        self.client.force_authenticate(patient_user(user_id))
+        return getattr(self.client, method)('/api/appointments/hold/', {
+            'doctor_id': doctor_id, 'appointment_date': when,
+        }, format='json')
+
+    def test_same_slot_is_booked_once(self):
+        self.assertEqual(self.book(11).status_code, status.HTTP_201_CREATED)
+        # 02:10 nằm trong slot 02:00-02:30 đã được đặt
+        self.assertEqual(self.book(12, when='2025-06-02T02:10:00Z').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.book(12, doctor_id=22).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book(12, when='2025-06-02T02:30:00Z').status_code, status.HTTP_201_CREATED)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        appointment_id = self.book(11).data['id']
+        response = self.client.put(f'/api/appointments/{appointment_id}/update_status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.book(12).status_code, status.HTTP_201_CREATED)
+
+    def test_hold_reserves_slot_for_holder(self):
+        response = self.hold(12)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['slot_start'], '2025-06-02T02:00:00Z')
+        self.assertEqual(self.hold(11).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.book(11).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.book(12).status_code, status.HTTP_201_CREATED)
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertEqual(self.hold(11).status_code, status.HTTP_409_CONFLICT)
+
+    def test_expired_or_released_hold_does_not_block(self):
+        SlotHold.objects.create(doctor_id=21, slot_start='2025-06-02T02:00:00Z', user_id=12,
+                                expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.book(11).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.hold(12, when='2025-06-02T03:00:00Z').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.hold(11, 'delete', when='2025-06-02T03:00:00Z').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.hold(12, 'delete', when='2025-06-02T03:00:00Z').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.book(11, when='2025-06-02T03:00:00Z').status_code, status.HTTP_201_CREATED)
+
+    def test_reschedule_into_booked_slot_conflicts(self):
+        self.book(11)
+        appointment_id = self.book(12, when='2025-06-02T03:00:00Z').data['id']
+        response = self.client.patch(f'/api/appointments/{appointment_id}/', {'appointment_date': '2025-06-02T02:15:00Z'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.patch(f'/api/appointments/{appointment_id}/', {'appointment_date': '2025-06-02T04:00:00Z'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Appointment.objects.get(pk=appointment_id).slot_start.isoformat(), '2025-06-02T04:00:00+00:00')
+
+    def test_status_transitions_are_conditional(self):
+        appointment_id = self.book(11).data['id']
+        url = f'/api/appointments/{appointment_id}/update_status/'
+        self.assertEqual(self.client.put(url, {'status': 'confirmed'}, format='json').data['status'], 'confirmed')
+        # Client vẫn nghĩ lịch đang pending: request đến sau không được ghi đè
+        response = self.client.put(url, {'status': 'cancelled', 'expected_status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.put(url, {'status': 'pending'}, format='json').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.put(url, {'status': 'done'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Appointment.objects.get(pk=appointment_id).status, 'confirmed')
+
+@skipUnless(connection.vendor == 'postgresql', 'Cần PostgreSQL để chạy các transaction song song')
+class BookingConcurrencyTests(TransactionTestCase):
+    ATTEMPTS = 200
+    WORKERS = 50
+
+    def setUp(self):
+        # Không gọi doctor_service thật khi transaction commit
+        patcher = mock.patch('patients.signals.sync_doctor_slot')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        PatientProfile.objects.bulk_create([
+            PatientProfile(user_id=user_id, date_of_birth=date(1990, 1, 1), address='Hà Nội')
+            for user_id in range(1, self.ATTEMPTS + 1)
+        ])
+
+    def post_booking(self, user_id, doctor_id=21, when='2025-06-02T02:00:00Z'):
+        try:
+            client = APIClient()
+            client.force_authenticate(patient_user(user_id))
+            return client.post('/api/appointments/', {
+                'patient': PatientProfile.objects.get(user_id=user_id).pk,
+                'doctor_id': doctor_id, 'appointment_date': when, 'reason': 'Khám định kỳ',
+            }, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_have_exactly_one_winner(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            codes = list(executor.map(self.post_booking, range(1, self.ATTEMPTS + 1)))
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(codes.count(status.HTTP_409_CONFLICT), self.ATTEMPTS - 1)
+        self.assertEqual(Appointment.objects.filter(doctor_id=21).count(), 1)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_unrelated_doctors_are_not_serialized(self):
+        booked, release = threading.Event(), threading.Event()
+
+        def book_and_wait():
+            # Đặt slot của bác sĩ 21 nhưng chưa commit cho tới khi được báo
+            try:
+                with transaction.atomic():
+                    patient = PatientProfile.objects.get(user_id=1)
+                    serializer = AppointmentSerializer(data={
+                        'patient': patient.pk, 'doctor_id': 21, 'appointment_date': '2025-06-02T02:00:00Z', 'reason': 'Khám định kỳ',
+                    })
+                    serializer.is_valid(raise_exception=True)
+                    book_appointment(serializer, 1, patient=patient)
+                    booked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            holder = executor.submit(book_and_wait)
+            self.assertTrue(booked.wait(10))
+            # Cùng giờ nhưng bác sĩ khác: không phải chờ transaction đang mở
+            started = time.monotonic()
+            self.assertEqual(self.post_booking(2, doctor_id=22), status.HTTP_201_CREATED)
+            self.assertLess(time.monotonic() - started, 2)
+            # Cùng slot của bác sĩ 21: phải chờ transaction kia kết thúc rồi thua
+            contender = executor.submit(self.post_booking, 3)
+            time.sleep(0.5)
+            self.assertFalse(contender.done())
+            release.set()
+            holder.result()
+            self.assertEqual(contender.result(), status.HTTP_409_CONFLICT)
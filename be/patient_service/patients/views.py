@@ -3,7 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from .models import PatientProfile, Appointment
-from .serializers import PatientProfileSerializer, AppointmentSerializer
+from .serializers import PatientProfileSerializer, AppointmentSerializer, SlotHoldSerializer
+from .booking import book_appointment, change_status, hold_slot, release_hold
 import logging
 
 logger = logging.getLogger(__name__)
@@ -99,7 +100,36 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         patient = get_object_or_404(PatientProfile, user_id=self.request.user.id)
-        serializer.save(patient=patient)
+        # Giành slot và ghi lịch hẹn trong một transaction; slot đã bị đặt/giữ thì trả 409
+        book_appointment(serializer, self.request.user.id, patient=patient)
+
+    def perform_update(self, serializer):
+        data = serializer.validated_data
+        instance = serializer.instance
+        if data.get('doctor_id', instance.doctor_id) != instance.doctor_id or \
+                data.get('appointment_date', instance.appointment_date) != instance.appointment_date:
+            # Đổi giờ hoặc bác sĩ: đi qua cùng đường đặt lịch như khi tạo mới
+            book_appointment(serializer, self.request.user.id)
+        else:
+            serializer.save()
+
+    @action(detail=False, methods=['post', 'delete'])
+    def hold(self, request):
+        """
+        Giữ chỗ (POST) hoặc trả (DELETE) slot chứa appointment_date trong SLOT_HOLD_SECONDS giây.
+        URL: POST/DELETE /api/appointments/hold/
+        Body: {"doctor_id": 21, "appointment_date": "2025-06-02T02:00:00Z"}
+        Trong lúc giữ chỗ, chỉ người giữ đặt được lịch hẹn vào slot này.
+        """
+        serializer = SlotHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if request.method == 'DELETE':
+            if not release_hold(data['doctor_id'], data['appointment_date'], request.user.id):
+                return Response({"detail": "No hold found for this slot"}, status=404)
+            return Response(status=204)
+        hold = hold_slot(data['doctor_id'], data['appointment_date'], request.user.id)
+        return Response(SlotHoldSerializer(hold).data, status=201)
 
     @action(detail=False, methods=['get'], url_path='by_patientId/(?P<patient_id>\d+)')
     def get_by_patient_id(self, request, patient_id=None):
@@ -108,12 +138,13 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         URL: GET /api/appointments/by_patientId/{patientId}
         """
         logger.debug(f"Fetching appointments for patient_id: {patient_id}")
-        appointments = Appointment.objects.filter(patient__user_id=patient_id)
-        if not appointments.exists():
+        # Một truy vấn duy nhất: lấy dữ liệu rồi dựa vào kết quả để quyết định 404
+        appointments = list(Appointment.objects.filter(patient__user_id=patient_id))
+        if not appointments:
             logger.debug(f"No appointments found for patient_id: {patient_id}")
             return Response({"detail": f"No appointments found for patient_id {patient_id}"}, status=404)
         serializer = self.get_serializer(appointments, many=True)
-        logger.debug(f"Successfully fetched {appointments.count()} appointments for patient_id: {patient_id}")
+        logger.debug(f"Successfully fetched {len(appointments)} appointments for patient_id: {patient_id}")
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='by_doctorId/(?P<doctor_id>\d+)')
@@ -123,12 +154,13 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         URL: GET /api/appointments/by_doctorId/{doctorId}
         """
         logger.debug(f"Fetching appointments for doctor_id: {doctor_id}")
-        appointments = Appointment.objects.filter(doctor_id=doctor_id)
-        if not appointments.exists():
+        # Một truy vấn duy nhất: lấy dữ liệu rồi dựa vào kết quả để quyết định 404
+        appointments = list(Appointment.objects.filter(doctor_id=doctor_id))
+        if not appointments:
             logger.debug(f"No appointments found for doctor_id: {doctor_id}")
             return Response({"detail": f"No appointments found for doctor_id {doctor_id}"}, status=404)
         serializer = self.get_serializer(appointments, many=True)
-        logger.debug(f"Successfully fetched {appointments.count()} appointments for doctor_id: {doctor_id}")
+        logger.debug(f"Successfully fetched {len(appointments)} appointments for doctor_id: {doctor_id}")
         return Response(serializer.data)
 
     @action(detail=True, methods=['put'], url_path='update_status')
@@ -141,11 +173,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         logger.debug(f"Updating status for appointment id: {pk}")
         appointment = get_object_or_404(Appointment, pk=pk)
         status = request.data.get('status')
-        if status not in [choice[0] for choice in Appointment.STATUS_CHOICES]:
+        # Trạng thái client đã thấy (không bắt buộc), dùng cho kiểm tra lạc quan
+        expected_status = request.data.get('expected_status')
+        choices = [choice[0] for choice in Appointment.STATUS_CHOICES]
+        if status not in choices or (expected_status is not None and expected_status not in choices):
             logger.error(f"Invalid status: {status} for appointment id: {pk}")
-            return Response({"detail": f"Invalid status. Must be one of: {', '.join([choice[0] for choice in Appointment.STATUS_CHOICES])}"}, status=400)
-        appointment.status = status
-        appointment.save()
+            return Response({"detail": f"Invalid status. Must be one of: {', '.join(choices)}"}, status=400)
+        # UPDATE có điều kiện theo trạng thái cũ; request khác đổi trước thì trả 409
+        appointment = change_status(appointment, status, expected_status)
         serializer = self.get_serializer(appointment)
         logger.debug(f"Successfully updated status to {status} for appointment id: {pk}")
         return Response(serializer.data)
\ No newline at end of file
@@ -0,0 +1,42 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Phân trang keyset/cursor theo (created_at, id) cho các endpoint list.
+
+    - Thứ tự luôn ổn định: created_at giảm dần, id giảm dần để phá hòa.
+    - Kích thước trang bị chặn bởi max_page_size, dù client gửi page_size lớn hơn.
+    - Body vẫn là mảng JSON như trước; cursor trang sau/trước nằm trong header Link.
+    - Tổng số bản ghi chỉ được đếm khi client yêu cầu (?with_count=true),
+      trả về qua header X-Total-Count.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    count_query_param = 'with_count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total_count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            # COUNT(*) chỉ chạy khi được yêu cầu, tránh quét toàn bảng mỗi lần list
+            self.total_count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        links = []
+        next_link = self.get_next_link()
+        if next_link:
+            links.append(f'<{next_link}>; rel="next"')
+        previous_link = self.get_previous_link()
+        if previous_link:
+            links.append(f'<{previous_link}>; rel="prev"')
+
+        headers = {}
+        if links:
+            headers['Link'] = ', '.join(links)
+        if self.total_count is not None:
+            headers['X-Total-Count'] = str(self.total_count)
+        return Response(data, headers=headers)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,7 +26,22 @@ SECRET_KEY = 'django-insecure-jb4=gxh8^k5r+b#0%7*2v=v6kpb-lg2ic%qc0dr37#u!-r--!)
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
-ALLOWED_HOSTS = []
+USE_X_FORWARDED_HOST = True
+ALLOWED_HOSTS = ['localhost', 'payment_service', '*']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'INFO',
+    },
+}
 
 
 # Application definition
@@ -37,6 +53,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'payments',
+    'corsheaders',
 ]
 
 MIDDLEWARE = [
@@ -47,8 +67,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+]
+
+CORS_ALLOWED_ORIGINS = [
+    "http://localhost:3000",
 ]
 
+# Cho phép frontend đọc header phân trang và header của API charge idempotent
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count', 'Idempotent-Replayed']
+
 ROOT_URLCONF = 'payment_service.urls'
 
 TEMPLATES = [
@@ -75,8 +103,12 @@ WSGI_APPLICATION = 'payment_service.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'payment_db',
+        'USER': 'user',
+        'PASSWORD': 'password',
+        'HOST': 'postgres',
+        'PORT': '5432',
     }
 }
 
@@ -100,6 +132,30 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'payment_service.auth.CustomJWTAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.AllowAny',  # Cho phép tất cả yêu cầu mà không cần quyền
+    ],
+    # Phân trang cursor dùng chung cho mọi endpoint list
+    'DEFAULT_PAGINATION_CLASS': 'payment_service.pagination.KeysetCursorPagination',
+}
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'ROTATE_REFRESH_TOKENS': False,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
+# Cache claims của JWT đã xác thực (số token tối đa, thời gian sống tính bằng giây)
+JWT_CLAIMS_CACHE_SIZE = 1024
+JWT_CLAIMS_CACHE_TTL = 300
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -121,3 +177,13 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cổng thanh toán (class và tham số khởi tạo); FakeGateway chạy trong process, dùng cho dev/test/benchmark
+PAYMENT_GATEWAY = 'payments.gateway.FakeGateway'
+PAYMENT_GATEWAY_OPTIONS = {}
+# Số charge tối đa trong một request POST /api/charges/batch/ (một transaction cho mỗi pha)
+PAYMENT_BATCH_MAX_ITEMS = 500
+# Số lời gọi cổng thanh toán chạy song song trong một lô (pha 2)
+PAYMENT_GATEWAY_CONCURRENCY = 8
+# Charge nằm ở 'pending' lâu hơn số giây này được lệnh reconcile_charges đối soát với cổng thanh toán
+PAYMENT_RECONCILE_AFTER_SECONDS = 900
@@ -1,3 +1,47 @@
+# Cấu hình giao diện Django Admin cho các model
 from django.contrib import admin
+from .models import Account, Charge, Invoice, LedgerEntry, LedgerTransaction
 
-# Register your models here.
+@admin.register(Account)
+class AccountAdmin(admin.ModelAdmin):
+    list_display = ['id', 'code', 'kind', 'balance']  # Hiển thị các trường trong danh sách
+    search_fields = ['code']
+    list_filter = ['kind']
+    # Số dư chỉ thay đổi qua bút toán
+    readonly_fields = ['balance']
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ['id', 'patient_id', 'source_type', 'source_id', 'amount', 'amount_paid', 'status']
+    search_fields = ['patient_id']
+    list_filter = ['status', 'source_type']
+    readonly_fields = ['amount_paid', 'amount_reserved', 'status']
+
+@admin.register(Charge)
+class ChargeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'idempotency_key', 'invoice', 'amount', 'status', 'failure_code']
+    search_fields = ['idempotency_key', 'gateway_reference']
+    list_filter = ['status', 'failure_code']
+    raw_id_fields = ['invoice']
+
+class LedgerEntryInline(admin.TabularInline):
+    model = LedgerEntry
+    extra = 0
+    can_delete = False
+    readonly_fields = ['account', 'amount', 'created_at']
+
+@admin.register(LedgerTransaction)
+class LedgerTransactionAdmin(admin.ModelAdmin):
+    # Sổ cái chỉ thêm: không sửa/xóa bút toán qua admin
+    list_display = ['id', 'kind', 'invoice', 'charge', 'created_at']
+    list_filter = ['kind']
+    inlines = [LedgerEntryInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,322 @@
+# Lập hóa đơn và thu tiền idempotent theo lô; mọi thay đổi số dư đi qua ledger.post
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .gateway import GatewayError, get_gateway
+from .ledger import CASH, REVENUE, Posting, patient_accounts, post, system_accounts, update_rows
+from .models import Charge, Invoice
+
+logger = logging.getLogger(__name__)
+
+
+class DuplicateInvoice(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'An invoice for this source already exists.'
+    default_code = 'duplicate_invoice'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key was already used with a different payload.'
+    default_code = 'idempotency_key_reused'
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Too many items in one batch.'
+    default_code = 'payload_too_large'
+
+
+@transaction.atomic
+def issue_invoices(rows):
+    """
+    Tạo các hóa đơn và ghi bút toán Nợ công nợ bệnh nhân / Có doanh thu cho mỗi hóa đơn, trong một transaction.
+
+    Hóa đơn trùng (source_type, source_id) làm cả lô thất bại với IntegrityError.
+    """
+    invoices = Invoice.objects.bulk_create([Invoice(**row) for row in rows])
+    accounts = patient_accounts(invoice.patient_id for invoice in invoices)
+    revenue = system_accounts()[REVENUE]
+    post([
+        Posting('invoice', invoice.id, None, f'Invoice for {invoice.source_type} {invoice.source_id}',
+                [(accounts[invoice.patient_id], invoice.amount), (revenue, -invoice.amount)])
+        for invoice in invoices
+    ])
+    return invoices
+
+
+def request_hash(item):
+    # Chỉ các trường quyết định số tiền bị thu; idempotency_key không nằm trong hash
+    payload = json.dumps({'invoice': item['invoice'], 'amount': str(item['amount']),
+                          'payment_token': item['payment_token']}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def charge_status_code(charge):
+    # Mã HTTP của một charge, giống nhau giữa lần gửi đầu và các lần gửi lại
+    if charge.status == 'succeeded':
+        return status.HTTP_201_CREATED
+    if charge.status == 'pending':
+        # Chưa biết kết quả ở cổng thanh toán: lệnh reconcile_charges sẽ ghi kết quả sau
+        return status.HTTP_202_ACCEPTED
+    if charge.failure_code == 'exceeds_balance':
+        return status.HTTP_409_CONFLICT
+    return status.HTTP_402_PAYMENT_REQUIRED
+
+
+def _error(status_code, errors):
+    return {'status': status_code, 'errors': errors}
+
+
+@transaction.atomic
+def _reserve(items, results):
+    """
+    Pha 1 (một transaction): tra các khóa đã dùng, tạo charge 'pending' và giữ chỗ số tiền trên hóa đơn.
+
+    Các hóa đơn bị khóa (SELECT ... FOR UPDATE) trước khi kiểm tra amount_paid + amount_reserved + amount
+    <= hóa đơn.amount, nên hai charge song song không thể thu quá hóa đơn; không đủ chỗ thì charge thất bại
+    ngay (exceeds_balance) mà không gọi cổng thanh toán. Số truy vấn không phụ thuộc số charge trong lô.
+    Trả về các (charge, payment_token, patient_id) cần gọi cổng.
+    """
+    hashes = [request_hash(item) for item in items]
+    existing = Charge.objects.in_bulk([item['idempotency_key'] for item in items], field_name='idempotency_key')
+    seen = set()
+    new = []
+    for index, item in enumerate(items):
+        key = item['idempotency_key']
+        if key in seen:
+            results[index] = _error(status.HTTP_400_BAD_REQUEST, {'idempotency_key': ['Duplicate key in this batch.']})
+            continue
+        seen.add(key)
+        charge = existing.get(key)
+        if charge is None:
+            new.append(index)
+        elif charge.request_hash != hashes[index]:
+            results[index] = _error(status.HTTP_422_UNPROCESSABLE_ENTITY, {'detail': IdempotencyKeyReused.default_detail})
+        elif charge.status == 'pending':
+            results[index] = _error(status.HTTP_409_CONFLICT, {'detail': 'A charge with this key is in progress.'})
+        else:
+            results[index] = {'charge': charge, 'replayed': True}
+
+    # Khóa các hóa đơn theo thứ tự id (một truy vấn) để hai lô chạy song song không deadlock
+    invoices = {
+        invoice.pk: invoice
+        for invoice in Invoice.objects.select_for_update().filter(pk__in={items[index]['invoice'] for index in new}).order_by('pk')
+    }
+    charges = []
+    for index in new:
+        item = items[index]
+        if item['invoice'] not in invoices:
+            results[index] = _error(status.HTTP_400_BAD_REQUEST, {'invoice': [f"Invoice {item['invoice']} does not exist."]})
+            continue
+        charges.append((index, Charge(idempotency_key=item['idempotency_key'], request_hash=hashes[index],
+                                      invoice_id=item['invoice'], amount=item['amount'])))
+    try:
+        with transaction.atomic():
+            Charge.objects.bulk_create([charge for _, charge in charges])
+        created = charges
+    except IntegrityError:
+        # Một request khác vừa tạo charge với cùng khóa: tạo từng charge để chỉ các khóa đó bị từ chối
+        created = []
+        for index, charge in charges:
+            try:
+                with transaction.atomic():
+                    charge.save()
+                created.append((index, charge))
+            except IntegrityError:
+                results[index] = _error(status.HTTP_409_CONFLICT, {'detail': 'A charge with this key is in progress.'})
+
+    now = timezone.now()
+    reserved = {}
+    failed = []
+    # Charge tạo trước được giữ chỗ trước khi nhiều charge trong lô cùng trả một hóa đơn
+    for index, charge in sorted(created, key=lambda pair: pair[1].id):
+        invoice = invoices[charge.invoice_id]
+        if invoice.status == 'open' and invoice.amount_paid + invoice.amount_reserved + charge.amount <= invoice.amount:
+            invoice.amount_reserved += charge.amount
+            invoice.updated_at = now
+            reserved[invoice.pk] = invoice
+        else:
+            charge.status = 'failed'
+            charge.failure_code = 'exceeds_balance'
+            charge.failure_reason = 'Amount exceeds the outstanding balance of the invoice.'
+            charge.updated_at = now
+            failed.append(charge)
+        results[index] = {'charge': charge, 'replayed': False}
+    update_rows(Invoice, reserved.values(), ['amount_reserved', 'updated_at'])
+    update_rows(Charge, failed, ['status', 'failure_code', 'failure_reason', 'updated_at'])
+    return [
+        (charge, items[index]['payment_token'], invoices[charge.invoice_id].patient_id)
+        for index, charge in created
+        if charge.status == 'pending'
+    ]
+
+
+def _apply_result(charge, result):
+    if result.succeeded:
+        charge.status, charge.gateway_reference = 'succeeded', result.reference
+    else:
+        charge.status, charge.failure_code, charge.failure_reason = 'failed', 'declined', result.failure_reason
+    charge.updated_at = timezone.now()
+
+
+def _fail(charge, reason):
+    charge.status, charge.failure_code, charge.failure_reason = 'failed', 'gateway_error', reason[:255]
+    charge.updated_at = timezone.now()
+
+
+def _run_concurrently(function, pending):
+    # Các lời gọi cổng của một lô chạy song song (PAYMENT_GATEWAY_CONCURRENCY thread), nên thời gian
+    # của pha 2 là độ trễ của vài lời gọi chứ không phải tổng độ trễ của cả lô. Thread không chạm database
+    workers = min(settings.PAYMENT_GATEWAY_CONCURRENCY, len(pending))
+    if workers <= 1:
+        for entry in pending:
+            function(entry)
+        return
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(function, pending))
+
+
+def _call_gateway(pending, gateway):
+    # Pha 2: gọi cổng thanh toán ngoài transaction, không giữ khóa nào trong lúc chờ mạng
+    def call(entry):
+        charge, payment_token, _ = entry
+        try:
+            result = gateway.charge(charge.amount, payment_token, charge.idempotency_key)
+        except GatewayError as e:
+            # Cổng chắc chắn chưa nhận lần thu: charge thất bại và chỗ đã giữ được trả ở pha 3
+            logger.warning(f"Gateway error for charge {charge.idempotency_key}: {str(e)}")
+            _fail(charge, str(e))
+        except Exception:
+            # Lỗi khác (ví dụ timeout khi đọc response): cổng có thể đã thu tiền. Charge giữ nguyên 'pending'
+            # và chỗ đã giữ, để reconcile_charges tra lại ở cổng (gateway.lookup) rồi mới ghi kết quả
+            logger.exception(f"Unknown outcome calling the gateway for charge {charge.idempotency_key}")
+        else:
+            _apply_result(charge, result)
+
+    _run_concurrently(call, pending)
+
+
+@transaction.atomic
+def _settle(pending):
+    """
+    Pha 3 (một transaction): trả chỗ đã giữ, cộng số đã thu vào hóa đơn và ghi bút toán Nợ tiền mặt / Có công nợ.
+
+    Các hóa đơn được khóa và ghi bằng một câu UPDATE cho cả lô; bút toán của mọi charge thành công được ghi
+    bằng một lần ledger.post. Charge chưa có kết quả (vẫn 'pending') được bỏ qua và giữ nguyên chỗ đã giữ.
+    Các charge được khóa trước và chỉ charge còn 'pending' trong database mới được ghi, nên một charge
+    không bao giờ được ghi kết quả hai lần (request chậm và lệnh reconcile_charges cùng xử lý nó).
+    """
+    pending = [entry for entry in pending if entry[0].status != 'pending']
+    if not pending:
+        return
+    open_ids = set(
+        Charge.objects.select_for_update().filter(pk__in=[charge.pk for charge, _, _ in pending], status='pending')
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    pending = [entry for entry in pending if entry[0].pk in open_ids]
+    if not pending:
+        return
+    now = timezone.now()
+    released = defaultdict(int)
+    paid = defaultdict(int)
+    for charge, _, _ in pending:
+        released[charge.invoice_id] += charge.amount
+        if charge.status == 'succeeded':
+            paid[charge.invoice_id] += charge.amount
+    invoices = list(Invoice.objects.select_for_update().filter(pk__in=list(released)).order_by('pk'))
+    for invoice in invoices:
+        invoice.amount_reserved -= released[invoice.pk]
+        invoice.amount_paid += paid.get(invoice.pk, 0)
+        if invoice.status == 'open' and invoice.amount_paid >= invoice.amount:
+            invoice.status = 'paid'
+        invoice.updated_at = now
+    update_rows(Invoice, invoices, ['amount_reserved', 'amount_paid', 'status', 'updated_at'])
+    if paid:
+        succeeded = [(charge, patient_id) for charge, _, patient_id in pending if charge.status == 'succeeded']
+        accounts = patient_accounts(patient_id for _, patient_id in succeeded)
+        cash = system_accounts()[CASH]
+        post([
+            Posting('charge', charge.invoice_id, charge.id, f'Charge {charge.gateway_reference}',
+                    [(cash, charge.amount), (accounts[patient_id], -charge.amount)])
+            for charge, patient_id in succeeded
+        ])
+    update_rows(Charge, [charge for charge, _, _ in pending],
+                ['status', 'failure_code', 'failure_reason', 'gateway_reference', 'updated_at'])
+
+
+def process_charges(items, gateway=None):
+    """
+    Thu tiền cho một lô charge (mỗi item có idempotency_key, invoice, amount, payment_token).
+
+    Trả về kết quả theo đúng thứ tự items: {'charge': Charge, 'replayed': bool} hoặc
+    {'status': mã HTTP, 'errors': ...}. Gửi lại một khóa đã xong nhận lại đúng charge đó
+    (replayed) mà không thu tiền lần hai; cùng khóa nhưng payload khác bị từ chối (422).
+    Cả lô dùng hai transaction ngắn (giữ chỗ, ghi kết quả) bất kể số charge; cổng thanh toán
+    được gọi giữa hai transaction, song song. Pha 3 luôn chạy (kể cả khi pha 2 bị ngắt) cho các
+    charge đã có kết quả; charge chưa có kết quả (process bị ngắt, hoặc lời gọi cổng lỗi mà không phải
+    GatewayError, như timeout) nằm lại ở 'pending' cho lệnh reconcile_charges.
+    """
+    gateway = gateway or get_gateway()
+    results = [None] * len(items)
+    pending = _reserve(items, results)
+    try:
+        _call_gateway(pending, gateway)
+    finally:
+        _settle(pending)
+    return results
+
+
+def reconcile_pending(gateway=None, older_than=None):
+    """
+    Đối soát các charge nằm ở 'pending' lâu hơn older_than giây (mặc định PAYMENT_RECONCILE_AFTER_SECONDS).
+
+    Charge bị kẹt khi process dừng giữa pha 1 và pha 3, hoặc khi lời gọi cổng không rõ kết quả. Mỗi charge được tra lại ở cổng thanh toán theo
+    idempotency_key (gateway.lookup): cổng đã thu hoặc từ chối thì ghi đúng kết quả đó; cổng không có
+    lần thu nào với khóa đó thì charge thất bại (gateway_error) và chỗ đã giữ được trả lại; tra cứu lỗi
+    thì charge giữ nguyên cho lần chạy sau. Xử lý từng lô PAYMENT_BATCH_MAX_ITEMS charge qua _settle.
+    Trả về số charge theo trạng thái sau đối soát.
+    """
+    gateway = gateway or get_gateway()
+    if older_than is None:
+        older_than = settings.PAYMENT_RECONCILE_AFTER_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = (Charge.objects.filter(status='pending', updated_at__lt=cutoff)
+             .select_related('invoice').order_by('id'))
+    counts = {'succeeded': 0, 'failed': 0, 'pending': 0}
+
+    def lookup(entry):
+        charge = entry[0]
+        try:
+            result = gateway.lookup(charge.idempotency_key)
+        except Exception:
+            logger.exception(f"Could not look up charge {charge.idempotency_key} at the gateway")
+            return
+        if result is None:
+            _fail(charge, 'No charge with this key at the gateway; reservation released by reconciliation.')
+        else:
+            _apply_result(charge, result)
+
+    last_id = 0
+    while True:
+        batch = list(stale.filter(id__gt=last_id)[:settings.PAYMENT_BATCH_MAX_ITEMS])
+        if not batch:
+            return counts
+        last_id = batch[-1].id
+        pending = [(charge, None, charge.invoice.patient_id) for charge in batch]
+        try:
+            _run_concurrently(lookup, pending)
+        finally:
+            _settle(pending)
+        for charge in batch:
+            counts[charge.status] += 1
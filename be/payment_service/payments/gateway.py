@@ -0,0 +1,71 @@
+# Cổng thanh toán: giao diện tối thiểu mà pha thu tiền cần, và một cổng giả lập chạy trong process
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Kết quả cổng thanh toán trả về cho một lần thu tiền
+GatewayResult = namedtuple('GatewayResult', ['succeeded', 'reference', 'failure_reason'])
+
+
+class GatewayError(Exception):
+    """
+    Cổng thanh toán chắc chắn chưa thu tiền (không kết nối được, hoặc cổng từ chối request mà không phải từ chối thẻ).
+
+    Chỉ lỗi này làm charge thất bại; lỗi khác (ví dụ timeout khi chờ response) được coi là chưa rõ kết quả.
+    """
+
+
+class FakeGateway:
+    """
+    Cổng thanh toán giả lập cho dev, test và benchmark: không gọi mạng, kết quả chỉ phụ thuộc payment_token.
+
+    Cổng cần hai phương thức: charge(amount, payment_token, idempotency_key) trả về GatewayResult, báo
+    GatewayError khi chắc chắn chưa thu, hoặc lỗi khác khi không rõ kết quả; và lookup(idempotency_key) trả về GatewayResult của lần thu với khóa đó (None nếu
+    cổng chưa nhận lần thu nào), dùng để đối soát charge bị kẹt ở 'pending'.
+
+    - 'tok_declined' và 'tok_insufficient_funds': bị từ chối.
+    - 'tok_error': GatewayError.
+    - Token khác: thành công, mã giao dịch suy ra từ idempotency_key (gọi lại cùng khóa cho cùng mã,
+      như cổng thật khử trùng theo idempotency key).
+    latency (giây) giả lập thời gian chờ mạng của mỗi lần gọi.
+    """
+    DECLINED_TOKENS = {
+        'tok_declined': 'Card was declined',
+        'tok_insufficient_funds': 'Insufficient funds',
+    }
+
+    # Kết quả gần nhất theo idempotency_key, chung cho mọi instance trong process (lookup đọc lại)
+    _results = {}
+    _lock = threading.Lock()
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def charge(self, amount, payment_token, idempotency_key):
+        if self.latency:
+            time.sleep(self.latency)
+        if payment_token == 'tok_error':
+            raise GatewayError('Gateway unavailable')
+        if payment_token in self.DECLINED_TOKENS:
+            result = GatewayResult(False, '', self.DECLINED_TOKENS[payment_token])
+        else:
+            reference = 'fake_' + hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest()[:24]
+            result = GatewayResult(True, reference, '')
+        with self._lock:
+            self._results[idempotency_key] = result
+        return result
+
+    def lookup(self, idempotency_key):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            return self._results.get(idempotency_key)
+
+
+def get_gateway():
+    # Cổng được cấu hình bằng PAYMENT_GATEWAY / PAYMENT_GATEWAY_OPTIONS
+    return import_string(settings.PAYMENT_GATEWAY)(**settings.PAYMENT_GATEWAY_OPTIONS)
@@ -0,0 +1,85 @@
+"""
+Đo thông lượng thu tiền (charge/s) với nhiều writer song song rồi kiểm tra số dư không bị lệch.
+
+Lệnh tạo hóa đơn cho --patients bệnh nhân giả (source_id bắt đầu từ --source-offset), chia đều
+--charges charge cho --writers thread, mỗi thread gửi các lô --batch-size charge qua
+payments.billing.process_charges với FakeGateway (độ trễ --latency giây mỗi lần gọi). Dữ liệu
+benchmark được giữ lại (sổ cái chỉ thêm), vì vậy chỉ chạy trên database dev/staging:
+
+    python manage.py benchmark_charges --writers 8 --charges 20000 --batch-size 100
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Sum
+from payments.billing import issue_invoices, process_charges
+from payments.gateway import FakeGateway
+from payments.ledger import ledger_drift, patient_code
+from payments.models import Account, Invoice
+
+AMOUNT = Decimal('10.00')
+
+
+class Command(BaseCommand):
+    help = 'Đo số charge/s với nhiều writer song song và kiểm tra sổ cái không lệch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Số thread ghi song song')
+        parser.add_argument('--charges', type=int, default=10000, help='Tổng số charge')
+        parser.add_argument('--batch-size', type=int, default=100, help='Số charge mỗi lô (mỗi lần gọi process_charges)')
+        parser.add_argument('--patients', type=int, default=100, help='Số bệnh nhân giả (tài khoản công nợ bị ghi song song)')
+        parser.add_argument('--latency', type=float, default=0.0, help='Độ trễ giả lập của cổng thanh toán (giây)')
+        parser.add_argument('--source-offset', type=int, default=900_000_000, help='source_id của hóa đơn đầu tiên')
+
+    def handle(self, *args, **options):
+        writers, total, batch_size = max(1, options['writers']), options['charges'], max(1, options['batch_size'])
+        run = uuid.uuid4().hex[:8]
+        patients = list(range(options['source_offset'], options['source_offset'] + options['patients']))
+
+        # Mỗi charge trả hết một hóa đơn; hóa đơn của các bệnh nhân xen kẽ nhau để các writer tranh tài khoản
+        self.stdout.write(f'Tạo {total} hóa đơn...')
+        # Chạy lại lệnh thì tiếp tục sau source_id lớn nhất của lần trước
+        last = Invoice.objects.filter(source_type='appointment', source_id__gte=options['source_offset']).aggregate(
+            last=Max('source_id'))['last']
+        start = options['source_offset'] if last is None else last + 1
+        invoices = []
+        for first in range(0, total, 1000):
+            invoices += issue_invoices([
+                {'patient_id': patients[n % len(patients)], 'source_type': 'appointment',
+                 'source_id': start + n, 'description': f'benchmark {run}', 'amount': AMOUNT}
+                for n in range(first, min(first + 1000, total))
+            ])
+        batches = [
+            [{'idempotency_key': f'bench-{run}-{invoice.id}', 'invoice': invoice.id, 'amount': AMOUNT,
+              'payment_token': 'tok_visa'} for invoice in invoices[first:first + batch_size]]
+            for first in range(0, len(invoices), batch_size)
+        ]
+        gateway = FakeGateway(latency=options['latency'])
+
+        def write(worker_batches):
+            try:
+                for batch in worker_batches:
+                    process_charges(batch, gateway)
+            finally:
+                # Mỗi thread có kết nối database riêng
+                connection.close()
+
+        self.stdout.write(f'Gửi {total} charge bằng {writers} writer, lô {batch_size}...')
+        started = time.monotonic()
+        with ThreadPoolExecutor(writers) as executor:
+            list(executor.map(write, [batches[n::writers] for n in range(writers)]))
+        seconds = time.monotonic() - started
+
+        succeeded = Invoice.objects.filter(description=f'benchmark {run}', status='paid').count()
+        owed = Account.objects.filter(code__in=[patient_code(patient_id) for patient_id in patients]).aggregate(
+            total=Sum('balance'))['total']
+        accounts, unbalanced = ledger_drift()
+        self.stdout.write(f'{succeeded}/{total} hóa đơn đã thu trong {seconds:.2f}s: {succeeded / seconds:.0f} charge/s')
+        if succeeded != total or owed != 0 or accounts or unbalanced:
+            raise CommandError(f'Sổ cái lệch: công nợ còn lại {owed}, {len(accounts)} tài khoản lệch số dư, '
+                               f'{len(unbalanced)} bút toán không cân bằng')
+        self.stdout.write(self.style.SUCCESS('Số dư khớp với sổ cái, không có charge bị thu hai lần'))
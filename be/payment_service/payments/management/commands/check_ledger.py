@@ -0,0 +1,22 @@
+"""
+Kiểm tra sổ cái: số dư vật chất hóa của từng tài khoản (Account.balance) khớp với tổng bút toán,
+và mọi bút toán có tổng Nợ bằng tổng Có. Chỉ lệch khi số dư bị sửa ngoài payments.ledger; chạy định kỳ:
+
+    python manage.py check_ledger
+"""
+from django.core.management.base import BaseCommand, CommandError
+from payments.ledger import ledger_drift
+
+
+class Command(BaseCommand):
+    help = 'Kiểm tra số dư tài khoản khớp với sổ cái và mọi bút toán cân bằng.'
+
+    def handle(self, *args, **options):
+        accounts, unbalanced = ledger_drift()
+        for account_id, code, balance, total in accounts:
+            self.stdout.write(f'Tài khoản {account_id} ({code}): balance={balance}, sổ cái={total}')
+        for transaction_id, total in unbalanced:
+            self.stdout.write(f'Bút toán {transaction_id} lệch {total}')
+        if accounts or unbalanced:
+            raise CommandError(f'{len(accounts)} tài khoản lệch số dư, {len(unbalanced)} bút toán không cân bằng')
+        self.stdout.write('Số dư khớp với sổ cái')
@@ -0,0 +1,25 @@
+"""
+Đối soát các charge bị kẹt ở 'pending' (process dừng giữa lúc giữ chỗ và lúc ghi kết quả) với cổng
+thanh toán theo idempotency_key: ghi kết quả cổng đã trả, hoặc trả chỗ đã giữ nếu cổng không nhận
+lần thu nào. Chạy định kỳ:
+
+    python manage.py reconcile_charges --older-than 900
+"""
+from django.core.management.base import BaseCommand
+from payments.billing import reconcile_pending
+
+
+class Command(BaseCommand):
+    help = "Đối soát các charge nằm ở 'pending' quá lâu với cổng thanh toán."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None,
+                            help='Chỉ đối soát charge pending lâu hơn số giây này (mặc định PAYMENT_RECONCILE_AFTER_SECONDS)')
+
+    def handle(self, *args, **options):
+        counts = reconcile_pending(older_than=options['older_than'])
+        total = sum(counts.values())
+        self.stdout.write(
+            f"Đã đối soát {total} charge: {counts['succeeded']} thành công, {counts['failed']} thất bại, "
+            f"{counts['pending']} vẫn chờ (tra cứu cổng thanh toán lỗi)"
+        )
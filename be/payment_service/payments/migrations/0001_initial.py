@@ -0,0 +1,108 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Account',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('kind', models.CharField(choices=[('receivable', 'Receivable'), ('cash', 'Cash'), ('revenue', 'Revenue')], max_length=20)),
+                ('patient_id', models.IntegerField(blank=True, null=True)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Charge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255, unique=True)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('failure_code', models.CharField(blank=True, choices=[('declined', 'Declined'), ('exceeds_balance', 'Exceeds balance'), ('gateway_error', 'Gateway error')], max_length=20)),
+                ('failure_reason', models.CharField(blank=True, max_length=255)),
+                ('gateway_reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patient_id', models.IntegerField()),
+                ('source_type', models.CharField(choices=[('appointment', 'Appointment'), ('prescription', 'Prescription'), ('lab_request', 'Lab request')], max_length=20)),
+                ('source_id', models.IntegerField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('amount_reserved', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('paid', 'Paid')], default='open', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('invoice', 'Invoice'), ('charge', 'Charge')], max_length=20)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('charge', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_transaction', to='payments.charge')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_transactions', to='payments.invoice')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='payments.account')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='payments.ledgertransaction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['patient_id', 'created_at'], name='invoice_patient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-created_at', '-id'], name='invoice_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('source_type', 'source_id'), name='invoice_source_uniq'),
+        ),
+        migrations.AddField(
+            model_name='charge',
+            name='invoice',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='charges', to='payments.invoice'),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['-created_at', '-id'], name='account_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', '-created_at', '-id'], name='entry_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(fields=['-created_at', '-id'], name='charge_created_idx'),
+        ),
+    ]
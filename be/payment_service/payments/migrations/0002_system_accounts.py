@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def create_system_accounts(apps, schema_editor):
+    # Tài khoản tiền mặt và doanh thu dùng chung cho mọi bút toán
+    Account = apps.get_model('payments', 'Account')
+    for code in ('cash', 'revenue'):
+        Account.objects.get_or_create(code=code, defaults={'kind': code})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_system_accounts, migrations.RunPython.noop),
+    ]
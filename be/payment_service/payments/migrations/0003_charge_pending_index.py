@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_system_accounts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='charge',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['updated_at'], name='charge_pending_idx'),
+        ),
+    ]
@@ -1,3 +1,133 @@
+# Định nghĩa các model cho payment_service
 from django.db import models
 
-# Create your models here.
+class Account(models.Model):
+    # Loại tài khoản trong sổ cái
+    KIND_CHOICES = (
+        ('receivable', 'Receivable'),  # Công nợ của một bệnh nhân
+        ('cash', 'Cash'),  # Tiền đã thu qua cổng thanh toán
+        ('revenue', 'Revenue'),  # Doanh thu từ hóa đơn
+    )
+    # Mã tài khoản: 'cash', 'revenue' hoặc 'patient:<patient_id>'
+    code = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # ID bệnh nhân của tài khoản công nợ (lưu trực tiếp, không kiểm tra)
+    patient_id = models.IntegerField(null=True, blank=True)
+    # Số dư vật chất hóa: luôn bằng tổng amount các LedgerEntry của tài khoản (Nợ dương, Có âm),
+    # được cập nhật (sau khi khóa dòng) trong cùng transaction với các bút toán
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='account_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.code
+
+class Invoice(models.Model):
+    # Trạng thái hóa đơn
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('paid', 'Paid'),
+    )
+    # Loại dịch vụ được lập hóa đơn (ID lưu trực tiếp, không kiểm tra với service khác)
+    SOURCE_CHOICES = (
+        ('appointment', 'Appointment'),
+        ('prescription', 'Prescription'),
+        ('lab_request', 'Lab request'),
+    )
+    patient_id = models.IntegerField()
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.IntegerField()
+    description = models.CharField(max_length=255, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Số tiền đã thu và số tiền đang được charge (đã giữ chỗ, chờ cổng thanh toán trả lời);
+    # amount_paid + amount_reserved không bao giờ vượt amount
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount_reserved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Mỗi lịch hẹn/đơn thuốc/yêu cầu xét nghiệm chỉ có một hóa đơn
+            models.UniqueConstraint(fields=['source_type', 'source_id'], name='invoice_source_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['patient_id', 'created_at'], name='invoice_patient_idx'),
+            models.Index(fields=['-created_at', '-id'], name='invoice_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Invoice {self.id} for {self.source_type} {self.source_id}"
+
+class Charge(models.Model):
+    # Trạng thái của một lần thu tiền
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    FAILURE_CHOICES = (
+        ('declined', 'Declined'),
+        ('exceeds_balance', 'Exceeds balance'),
+        ('gateway_error', 'Gateway error'),
+    )
+    # Khóa idempotency do client gửi; gửi lại cùng khóa nhận lại đúng kết quả, không thu tiền lần hai
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    # sha256 của (invoice, amount, payment_token) để phát hiện khóa bị dùng lại với payload khác
+    request_hash = models.CharField(max_length=64)
+    invoice = models.ForeignKey(Invoice, on_delete=models.PROTECT, related_name='charges')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    failure_code = models.CharField(max_length=20, choices=FAILURE_CHOICES, blank=True)
+    failure_reason = models.CharField(max_length=255, blank=True)
+    # Mã giao dịch do cổng thanh toán trả về
+    gateway_reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='charge_created_idx'),
+            # Tìm charge bị kẹt ở 'pending' để đối soát (lệnh reconcile_charges)
+            models.Index(fields=['updated_at'], condition=models.Q(status='pending'), name='charge_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"Charge {self.idempotency_key} ({self.status})"
+
+class LedgerTransaction(models.Model):
+    # Một bút toán kép: tổng amount các LedgerEntry của nó luôn bằng 0. Chỉ thêm, không sửa/xóa
+    KIND_CHOICES = (
+        ('invoice', 'Invoice'),  # Nợ công nợ bệnh nhân, Có doanh thu
+        ('charge', 'Charge'),  # Nợ tiền mặt, Có công nợ bệnh nhân
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    invoice = models.ForeignKey(Invoice, on_delete=models.PROTECT, related_name='ledger_transactions')
+    charge = models.OneToOneField(Charge, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_transaction')
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} transaction {self.id}"
+
+class LedgerEntry(models.Model):
+    # Một dòng của bút toán: amount dương là ghi Nợ, âm là ghi Có. Chỉ thêm, không sửa/xóa
+    transaction = models.ForeignKey(LedgerTransaction, on_delete=models.PROTECT, related_name='entries')
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='entries')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Sao kê của một tài khoản (GET /api/accounts/{id}/entries/)
+            models.Index(fields=['account', '-created_at', '-id'], name='entry_account_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} on {self.account_id}"
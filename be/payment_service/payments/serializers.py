@@ -0,0 +1,56 @@
+# Định nghĩa serializers để xử lý dữ liệu API
+from rest_framework import serializers
+from .models import Account, Charge, Invoice, LedgerEntry
+
+class InvoiceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Invoice
+        fields = ['id', 'patient_id', 'source_type', 'source_id', 'description', 'amount', 'amount_paid',
+                  'amount_reserved', 'status', 'created_at', 'updated_at']
+        # Số tiền đã thu/đang thu và trạng thái chỉ thay đổi qua charge
+        read_only_fields = ['id', 'amount_paid', 'amount_reserved', 'status', 'created_at', 'updated_at']
+        # invoice_source_uniq được kiểm tra bằng constraint của database (409), không truy vấn trước
+        validators = []
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Must be positive.")
+        return value
+
+class ChargeSerializer(serializers.ModelSerializer):
+    class Meta:
+        # Charge chỉ đọc qua API; tạo charge dùng ChargeRequestSerializer
+        model = Charge
+        fields = ['id', 'idempotency_key', 'invoice', 'amount', 'status', 'failure_code', 'failure_reason',
+                  'gateway_reference', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class ChargeRequestSerializer(serializers.Serializer):
+    # Body của POST /api/charges/ (idempotency key nằm trong header) và mỗi item của POST /api/charges/batch/
+    idempotency_key = serializers.CharField(max_length=255, required=False)
+    invoice = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    # Token thẻ/ví do cổng thanh toán cấp cho client; không lưu lại
+    payment_token = serializers.CharField(max_length=255)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Must be positive.")
+        return value
+
+class AccountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Account
+        fields = ['id', 'code', 'kind', 'patient_id', 'balance', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    # Loại bút toán và hóa đơn đọc từ transaction đã được select_related
+    kind = serializers.CharField(source='transaction.kind', read_only=True)
+    invoice = serializers.IntegerField(source='transaction.invoice_id', read_only=True)
+    charge = serializers.IntegerField(source='transaction.charge_id', read_only=True)
+
+    class Meta:
+        model = LedgerEntry
+        fields = ['id', 'transaction', 'kind', 'invoice', 'charge', 'account', 'amount', 'created_at']
+        read_only_fields = fields
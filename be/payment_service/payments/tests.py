@@ -1,3 +1,230 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from .billing import _reserve, _settle, issue_invoices, process_charges, reconcile_pending
+from .gateway import FakeGateway
+from .ledger import ledger_drift
+from .models import Account, Charge, LedgerEntry
 
 # Create your tests here.
+
+
+def balances():
+    return dict(Account.objects.values_list('code', 'balance'))
+
+
+class InvoiceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_invoice_posts_balanced_entries(self):
+        body = {'patient_id': 101, 'source_type': 'prescription', 'source_id': 7, 'amount': '250.00'}
+        response = self.client.post('/api/invoices/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['status'], response.data['amount_paid']), ('open', '0.00'))
+        self.assertEqual(balances(), {'cash': Decimal('0'), 'revenue': Decimal('-250.00'), 'patient:101': Decimal('250.00')})
+        # Mỗi nguồn chỉ có một hóa đơn
+        self.assertEqual(self.client.post('/api/invoices/', body, format='json').status_code, 409)
+        self.assertEqual(self.client.post('/api/invoices/', {**body, 'source_id': 8, 'amount': '0'}, format='json').status_code, 400)
+        self.assertEqual(ledger_drift(), ([], []))
+
+
+class ChargeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.invoice, self.other = issue_invoices([
+            {'patient_id': 101, 'source_type': 'appointment', 'source_id': 1, 'amount': Decimal('100.00')},
+            {'patient_id': 102, 'source_type': 'lab_request', 'source_id': 1, 'amount': Decimal('40.00')},
+        ])
+
+    def charge(self, key, amount='100.00', token='tok_visa', invoice=None):
+        body = {'invoice': (invoice or self.invoice).id, 'amount': amount, 'payment_token': token}
+        return self.client.post('/api/charges/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_charge_pays_invoice_and_replays(self):
+        response = self.charge('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'succeeded')
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.amount_paid, self.invoice.amount_reserved),
+                         ('paid', Decimal('100.00'), Decimal('0.00')))
+        self.assertEqual(balances()['cash'], Decimal('100.00'))
+        self.assertEqual(balances()['patient:101'], Decimal('0.00'))
+        entries = LedgerEntry.objects.count()
+        # Gửi lại cùng khóa: cùng kết quả, không thu lần hai
+        replay = self.charge('key-1')
+        self.assertEqual((replay.status_code, replay['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(replay.data['id'], response.data['id'])
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+        self.assertEqual(self.charge('key-1', amount='50.00').status_code, 422)
+        self.assertEqual(self.client.post('/api/charges/', {}, format='json').status_code, 400)
+        self.assertEqual(ledger_drift(), ([], []))
+
+    def test_declined_and_overpaid_charges_release_reservation(self):
+        declined = self.charge('key-1', token='tok_declined')
+        self.assertEqual(declined.status_code, 402)
+        self.assertEqual(declined.data['failure_code'], 'declined')
+        self.assertEqual(self.charge('key-2', amount='60.00').status_code, 201)
+        overpaid = self.charge('key-3', amount='60.00')
+        self.assertEqual((overpaid.status_code, overpaid.data['failure_code']), (409, 'exceeds_balance'))
+        self.assertEqual(self.charge('key-4', token='tok_error', amount='40.00').data['failure_code'], 'gateway_error')
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.amount_paid, self.invoice.amount_reserved),
+                         ('open', Decimal('60.00'), Decimal('0.00')))
+        self.assertEqual(balances()['patient:101'], Decimal('40.00'))
+        out = StringIO()
+        call_command('check_ledger', stdout=out)
+        self.assertIn('Số dư khớp với sổ cái', out.getvalue())
+
+    def test_batch_reports_each_item(self):
+        items = [
+            {'idempotency_key': 'b-1', 'invoice': self.invoice.id, 'amount': '100.00', 'payment_token': 'tok_visa'},
+            {'idempotency_key': 'b-2', 'invoice': self.other.id, 'amount': '40.00', 'payment_token': 'tok_declined'},
+            {'idempotency_key': 'b-1', 'invoice': self.invoice.id, 'amount': '100.00', 'payment_token': 'tok_visa'},
+            {'idempotency_key': 'b-3', 'invoice': 999, 'amount': '1.00', 'payment_token': 'tok_visa'},
+            {'invoice': self.other.id, 'amount': '1.00', 'payment_token': 'tok_visa'},
+        ]
+        response = self.client.post('/api/charges/batch/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (1, 4))
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 1])
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3, 4])
+        # Gửi lại cả lô: các charge đã xong được trả lại, không thu thêm
+        replay = self.client.post('/api/charges/batch/', items[:2], format='json')
+        self.assertTrue(all(result['replayed'] for result in replay.data['results']))
+        self.assertEqual(Charge.objects.count(), 2)
+
+    def test_batch_query_count_does_not_grow_per_account(self):
+        invoices = issue_invoices([
+            {'patient_id': 200 + n % 3, 'source_type': 'appointment', 'source_id': 100 + n, 'amount': Decimal('5.00')}
+            for n in range(30)
+        ])
+        items = [{'idempotency_key': f'q-{invoice.id}', 'invoice': invoice.id, 'amount': Decimal('5.00'),
+                  'payment_token': 'tok_visa'} for invoice in invoices]
+        # Số truy vấn không phụ thuộc số charge/hóa đơn/tài khoản trong lô.
+        # Pha 1 (savepoint): khóa đã dùng, khóa hóa đơn, insert charge (savepoint), giữ chỗ.
+        # Pha 3 (savepoint): khóa charge, khóa hóa đơn, ghi hóa đơn, tài khoản (2), tài khoản hệ thống,
+        # ledger.post (savepoint, transaction, entry, khóa và ghi tài khoản), ghi charge
+        with self.assertNumQueries((2 + 2 + 3 + 1) + (2 + 1 + 2 + 2 + 1 + 6 + 1)):
+            results = process_charges(items, FakeGateway())
+        self.assertTrue(all(result['charge'].status == 'succeeded' for result in results))
+
+    def test_gateway_calls_of_a_batch_run_concurrently(self):
+        invoices = issue_invoices([
+            {'patient_id': 300, 'source_type': 'appointment', 'source_id': 200 + n, 'amount': Decimal('5.00')}
+            for n in range(8)
+        ])
+        threads = set()
+
+        class RecordingGateway(FakeGateway):
+            def charge(self, amount, payment_token, idempotency_key):
+                threads.add(threading.get_ident())
+                return super().charge(amount, payment_token, idempotency_key)
+
+        items = [{'idempotency_key': f'c-{invoice.id}', 'invoice': invoice.id, 'amount': Decimal('5.00'),
+                  'payment_token': 'tok_visa'} for invoice in invoices]
+        results = process_charges(items, RecordingGateway(latency=0.05))
+        self.assertTrue(all(result['charge'].status == 'succeeded' for result in results))
+        self.assertGreater(len(threads), 1)
+
+    def test_unknown_gateway_outcome_stays_pending_until_reconciled(self):
+        class TimingOutGateway(FakeGateway):
+            # Cổng đã thu tiền nhưng response không về kịp
+            def charge(self, amount, payment_token, idempotency_key):
+                super().charge(amount, payment_token, idempotency_key)
+                raise TimeoutError('read timed out')
+
+        with self.assertLogs('payments.billing', level='ERROR'):
+            result, = process_charges([{'idempotency_key': 'timeout-1', 'invoice': self.invoice.id,
+                                        'amount': Decimal('100.00'), 'payment_token': 'tok_visa'}], TimingOutGateway())
+        charge = Charge.objects.get(pk=result['charge'].pk)
+        self.assertEqual((charge.status, charge.failure_code), ('pending', ''))
+        # Chỗ vẫn được giữ: không thể thu lại hóa đơn bằng khóa khác, gửi lại cùng khóa nhận 409
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.amount_paid, self.invoice.amount_reserved),
+                         ('open', Decimal('0.00'), Decimal('100.00')))
+        self.assertEqual(self.charge('timeout-2').status_code, 409)
+        self.assertEqual(self.charge('timeout-1').status_code, 409)
+        self.assertEqual(LedgerEntry.objects.filter(transaction__charge=charge.pk).count(), 0)
+
+        self.assertEqual(reconcile_pending(FakeGateway(), older_than=0), {'succeeded': 1, 'failed': 0, 'pending': 0})
+        charge.refresh_from_db()
+        self.assertEqual(charge.status, 'succeeded')
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.amount_paid, self.invoice.amount_reserved),
+                         ('paid', Decimal('100.00'), Decimal('0.00')))
+        self.assertEqual(balances()['cash'], Decimal('100.00'))
+        self.assertEqual(self.charge('timeout-1').status_code, 201)
+        self.assertEqual(ledger_drift(), ([], []))
+
+    def test_reconcile_settles_or_releases_stranded_charges(self):
+        # Process dừng sau pha 1: charge nằm lại ở pending, số tiền vẫn bị giữ
+        items = [
+            {'idempotency_key': 'stuck-paid', 'invoice': self.invoice.id, 'amount': Decimal('100.00'), 'payment_token': 'tok_visa'},
+            {'idempotency_key': 'stuck-unsent', 'invoice': self.other.id, 'amount': Decimal('40.00'), 'payment_token': 'tok_visa'},
+        ]
+        stranded = _reserve(items, [None] * len(items))
+        # Cổng đã thu charge đầu trước khi process dừng; charge thứ hai chưa được gửi
+        FakeGateway().charge(Decimal('100.00'), 'tok_visa', 'stuck-paid')
+        self.assertEqual(reconcile_pending(FakeGateway()), {'succeeded': 0, 'failed': 0, 'pending': 0})
+        self.assertEqual(self.charge('stuck-paid').status_code, 409)
+
+        out = StringIO()
+        call_command('reconcile_charges', '--older-than', '0', stdout=out)
+        self.assertIn('Đã đối soát 2 charge: 1 thành công, 1 thất bại', out.getvalue())
+        statuses = dict(Charge.objects.values_list('idempotency_key', 'status'))
+        self.assertEqual(statuses, {'stuck-paid': 'succeeded', 'stuck-unsent': 'failed'})
+        self.invoice.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.invoice.status, self.invoice.amount_paid, self.invoice.amount_reserved),
+                         ('paid', Decimal('100.00'), Decimal('0.00')))
+        self.assertEqual((self.other.amount_paid, self.other.amount_reserved), (Decimal('0.00'), Decimal('0.00')))
+        self.assertEqual(balances()['cash'], Decimal('100.00'))
+        # Gửi lại khóa đã đối soát nhận kết quả đã ghi; chạy lại lệnh không làm gì
+        self.assertEqual(self.charge('stuck-paid').status_code, 201)
+        self.assertEqual(reconcile_pending(FakeGateway(), older_than=0), {'succeeded': 0, 'failed': 0, 'pending': 0})
+        # Request gốc (chậm) ghi kết quả sau lệnh đối soát: charge đã ghi rồi nên không ghi lần hai
+        stranded[0][0].status = 'succeeded'
+        _settle(stranded[:1])
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.amount_paid, self.invoice.amount_reserved), (Decimal('100.00'), Decimal('0.00')))
+        self.assertEqual(ledger_drift(), ([], []))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Cần PostgreSQL để chạy nhiều writer song song')
+class ChargeConcurrencyTests(TransactionTestCase):
+    # Khôi phục tài khoản cash/revenue do migration tạo sau mỗi lần flush
+    serialized_rollback = True
+
+    def test_concurrent_charges_never_overpay(self):
+        invoice, = issue_invoices([{'patient_id': 1, 'source_type': 'appointment', 'source_id': 1, 'amount': Decimal('100.00')}])
+
+        def charge(n):
+            try:
+                item = {'idempotency_key': f'race-{n}', 'invoice': invoice.id, 'amount': Decimal('30.00'),
+                        'payment_token': 'tok_visa'}
+                return process_charges([item], FakeGateway(latency=0.01))[0]['charge'].status
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(8) as executor:
+            statuses = list(executor.map(charge, range(8)))
+        self.assertEqual(statuses.count('succeeded'), 3)
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.amount_paid, invoice.amount_reserved), (Decimal('90.00'), Decimal('0.00')))
+        self.assertEqual(ledger_drift(), ([], []))
+
+    def test_benchmark_has_no_drift(self):
+        out = StringIO()
+        call_command('benchmark_charges', '--writers', '4', '--charges', '400', '--batch-size', '25',
+                     '--patients', '5', stdout=out)
+        self.assertIn('400/400 hóa đơn đã thu', out.getvalue())
+        self.assertIn('charge/s', out.getvalue())
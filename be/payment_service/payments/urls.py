@@ -0,0 +1,14 @@
+# Định tuyến URL cho ứng dụng payments
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import AccountViewSet, ChargeViewSet, InvoiceViewSet
+
+# Tạo router để tự động sinh URL
+router = DefaultRouter()
+router.register(r'invoices', InvoiceViewSet)
+router.register(r'charges', ChargeViewSet)
+router.register(r'accounts', AccountViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
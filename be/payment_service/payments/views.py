@@ -1,3 +1,125 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db import IntegrityError
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .billing import (
+    DuplicateInvoice, IdempotencyKeyReused, PayloadTooLarge, charge_status_code, issue_invoices, process_charges,
+)
+from .models import Account, Charge, Invoice
+from .serializers import (
+    AccountSerializer, ChargeRequestSerializer, ChargeSerializer, InvoiceSerializer, LedgerEntrySerializer,
+)
 
-# Create your views here.
+class InvoiceViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    # Hóa đơn không sửa/xóa được: số dư chỉ thay đổi qua bút toán
+    queryset = Invoice.objects.all()
+    serializer_class = InvoiceSerializer
+
+    def get_queryset(self):
+        # Lọc theo bệnh nhân nếu có ?patient_id=
+        queryset = super().get_queryset()
+        patient_id = self.request.query_params.get('patient_id')
+        if patient_id:
+            queryset = queryset.filter(patient_id=patient_id)
+        return queryset
+
+    def perform_create(self, serializer):
+        # Tạo hóa đơn và ghi bút toán công nợ/doanh thu trong cùng một transaction
+        try:
+            serializer.instance = issue_invoices([serializer.validated_data])[0]
+        except IntegrityError:
+            raise DuplicateInvoice()
+
+class ChargeViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    queryset = Charge.objects.all()
+    serializer_class = ChargeSerializer
+
+    @staticmethod
+    def result_response(result):
+        # Response cho kết quả của một charge; lần gửi lại kèm header Idempotent-Replayed
+        if 'errors' in result:
+            if result['status'] == status.HTTP_422_UNPROCESSABLE_ENTITY:
+                raise IdempotencyKeyReused()
+            return Response(result['errors'], status=result['status'])
+        charge = result['charge']
+        response = Response(ChargeSerializer(charge).data, status=charge_status_code(charge))
+        if result['replayed']:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def create(self, request, *args, **kwargs):
+        """
+        Thu tiền cho một hóa đơn. Bắt buộc header Idempotency-Key.
+
+        URL: POST /api/charges/  body: {"invoice", "amount", "payment_token"}
+        """
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if not key:
+            return Response({"detail": "Idempotency-Key header is required"}, status=400)
+        serializer = ChargeRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = process_charges([{**serializer.validated_data, 'idempotency_key': key}])[0]
+        return self.result_response(result)
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        Thu tiền cho nhiều hóa đơn trong một request; mỗi item có idempotency_key riêng.
+
+        URL: POST /api/charges/batch/  body: [{"idempotency_key", "invoice", "amount", "payment_token"}, ...]
+        hoặc {"items": [...]}.
+        """
+        items = request.data
+        if isinstance(items, dict) and 'items' in items:
+            items = items['items']
+        if not isinstance(items, list):
+            raise serializers.ValidationError({'detail': 'Expected a JSON array of charges.'})
+        if len(items) > settings.PAYMENT_BATCH_MAX_ITEMS:
+            raise PayloadTooLarge(f'At most {settings.PAYMENT_BATCH_MAX_ITEMS} charges are allowed per batch.')
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            serializer = ChargeRequestSerializer(data=item if isinstance(item, dict) else {})
+            if serializer.is_valid() and serializer.validated_data.get('idempotency_key'):
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors or {'idempotency_key': ['This field is required.']}})
+        results = []
+        for (index, _), result in zip(valid, process_charges([data for _, data in valid])):
+            if 'errors' in result:
+                errors.append({'index': index, 'status': result['status'], 'errors': result['errors']})
+            else:
+                results.append({'index': index, 'replayed': result['replayed'], 'charge': ChargeSerializer(result['charge']).data})
+        errors.sort(key=lambda error: error['index'])
+        succeeded = sum(1 for result in results if result['charge']['status'] == 'succeeded')
+        failed = len(items) - succeeded
+        # Mọi charge thành công: 201; một phần: 207 Multi-Status; không charge nào thành công: 400
+        if not failed:
+            status_code = status.HTTP_201_CREATED
+        else:
+            status_code = status.HTTP_207_MULTI_STATUS if succeeded else status.HTTP_400_BAD_REQUEST
+        body = {'succeeded': succeeded, 'failed': failed, 'results': results, 'errors': errors}
+        return Response(body, status=status_code)
+
+class AccountViewSet(viewsets.ReadOnlyModelViewSet):
+    # Tài khoản sổ cái và số dư vật chất hóa (chỉ đọc)
+    queryset = Account.objects.all()
+    serializer_class = AccountSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        patient_id = self.request.query_params.get('patient_id')
+        if patient_id:
+            queryset = queryset.filter(patient_id=patient_id)
+        return queryset
+
+    @action(detail=True, methods=['get'], url_path='entries')
+    def entries(self, request, pk=None):
+        """
+        Sao kê của tài khoản, mới nhất trước.
+
+        URL: GET /api/accounts/{id}/entries/
+        """
+        account = self.get_object()
+        page = self.paginate_queryset(account.entries.select_related('transaction'))
+        return self.get_paginated_response(LedgerEntrySerializer(page, many=True).data)
@@ -1,9 +1,15 @@
 # Cấu hình giao diện Django Admin cho các model
 from django.contrib import admin
-from .models import Prescription, Medicine
+from .models import Prescription, PrescriptionItem, Medicine, StockMovement
+
+class PrescriptionItemInline(admin.TabularInline):
+    model = PrescriptionItem  # Các dòng thuốc hiển thị ngay trong trang đơn thuốc
+    raw_id_fields = ['medicine']
+    extra = 0
 
 @admin.register(Prescription)
 class PrescriptionAdmin(admin.ModelAdmin):
+    inlines = [PrescriptionItemInline]
     list_display = ['id', 'patient_id', 'doctor_id', 'status']  # Hiển thị các trường trong danh sách
     search_fields = ['patient_id', 'doctor_id']  # Cho phép tìm kiếm theo patient_id, doctor_id
     list_filter = ['status']  # Lọc theo trạng thái
@@ -11,4 +17,16 @@ class PrescriptionAdmin(admin.ModelAdmin):
 @admin.register(Medicine)
 class MedicineAdmin(admin.ModelAdmin):
     list_display = ['name', 'quantity', 'price']  # Hiển thị các trường trong danh sách
-    search_fields = ['name']  # Cho phép tìm kiếm theo tên thuốc
\ No newline at end of file
+    search_fields = ['name']  # Cho phép tìm kiếm theo tên thuốc
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['medicine', 'delta', 'balance_after', 'reason', 'prescription', 'created_at']  # Hiển thị các trường trong danh sách
+    list_filter = ['reason']  # Lọc theo loại nhập-xuất
+
+    # Sổ kho chỉ ghi thêm qua API, không sửa/xóa trong admin
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,27 @@
+"""
+So sánh tồn kho của từng thuốc (Medicine.quantity) với tổng delta trong sổ kho (StockMovement).
+Hai giá trị chỉ lệch khi quantity bị sửa ngoài pharmacy.stock (SQL tay, admin); chạy định kỳ:
+
+    python manage.py check_stock_ledger
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from pharmacy.models import Medicine
+
+
+class Command(BaseCommand):
+    help = 'Kiểm tra tồn kho của thuốc khớp với sổ nhập-xuất kho.'
+
+    def handle(self, *args, **options):
+        mismatches = [
+            (medicine_id, name, quantity, ledger)
+            for medicine_id, name, quantity, ledger in Medicine.objects.annotate(
+                ledger=Coalesce(Sum('movements__delta'), 0)).values_list('id', 'name', 'quantity', 'ledger').iterator()
+            if quantity != ledger
+        ]
+        for medicine_id, name, quantity, ledger in mismatches:
+            self.stdout.write(f'Thuốc {medicine_id} ({name}): quantity={quantity}, sổ kho={ledger}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} thuốc có tồn kho lệch với sổ kho')
+        self.stdout.write('Tồn kho khớp với sổ kho')
@@ -0,0 +1,92 @@
+"""
+Seed dữ liệu lớn rồi so sánh query plan của các truy vấn tra cứu khi có và không có index.
+
+Mọi thao tác (seed, ANALYZE, DROP INDEX) chạy trong một transaction và bị rollback ở cuối,
+nên database không bị thay đổi. DROP INDEX giữ khóa độc quyền trên bảng cho tới khi rollback,
+vì vậy chỉ chạy trên database dev/staging:
+
+    python manage.py explain_indexes --rows 1000000
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from pharmacy.models import Prescription
+
+
+class Command(BaseCommand):
+    help = 'So sánh query plan của các truy vấn đơn thuốc trước/sau khi có index (PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Số đơn thuốc được seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('explain_indexes chỉ hỗ trợ PostgreSQL.')
+        rows = options['rows']
+
+        with transaction.atomic():
+            self.seed(rows)
+            cases = self.cases()
+            self.report('Có index', cases)
+            with connection.cursor() as cursor:
+                for index_name in {name for _, _, names in cases for name in names}:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(index_name)}')
+            self.report('Không có index', cases)
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        self.stdout.write(f'Seed {rows} đơn thuốc...')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Prescription._meta.db_table}
+                    (patient_id, doctor_id, diagnosis_id, details, status, created_at, updated_at)
+                SELECT g %% 100000,
+                       g %% 1000,
+                       g / 2,
+                       '',
+                       (ARRAY['pending', 'dispensed', 'dispensed', 'dispensed', 'cancelled'])[1 + g %% 5],
+                       now() - g * interval '1 second',
+                       now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [rows],
+            )
+            cursor.execute(f'ANALYZE {Prescription._meta.db_table}')
+
+    def cases(self):
+        # (tên truy vấn, queryset giống endpoint, các index phục vụ truy vấn đó)
+        return [
+            (
+                'get_by_diagnosis_id',
+                Prescription.objects.filter(diagnosis_id=4242),
+                ['presc_diagnosis_idx'],
+            ),
+            (
+                'theo patient_id',
+                Prescription.objects.filter(patient_id=4242).order_by('created_at'),
+                ['presc_patient_idx'],
+            ),
+            (
+                'pending (cũ nhất trước)',
+                Prescription.objects.filter(status='pending').order_by('created_at')[:50],
+                ['presc_pending_idx'],
+            ),
+            (
+                'list (trang đầu)',
+                Prescription.objects.order_by('-created_at', '-id')[:51],
+                ['presc_created_idx'],
+            ),
+        ]
+
+    def report(self, title, cases):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        with connection.cursor() as cursor:
+            for label, queryset, _ in cases:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+                plan = [line for (line,) in cursor.fetchall()]
+                scans = [line.strip().lstrip('-> ').split('  (')[0] for line in plan if 'Scan' in line]
+                timing = next((line for line in plan if line.startswith('Execution Time')), '')
+                self.stdout.write(f'  {label}: {timing}')
+                for scan in scans:
+                    self.stdout.write(f'      {scan}')
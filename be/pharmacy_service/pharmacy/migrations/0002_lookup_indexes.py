@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction,
+    # đổi lại bảng không bị khóa ghi trong lúc tạo index trên dữ liệu lớn.
+    atomic = False
+
+    dependencies = [
+        ('pharmacy', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='medicine',
+            index=models.Index(fields=['-created_at', '-id'], name='medicine_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['diagnosis_id', 'created_at'], name='presc_diagnosis_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['patient_id', 'created_at'], name='presc_patient_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(fields=['-created_at', '-id'], name='presc_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='presc_pending_idx'),
+        ),
+    ]
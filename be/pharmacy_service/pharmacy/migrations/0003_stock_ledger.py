@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def opening_balances(apps, schema_editor):
+    # Số dư đầu kỳ: mỗi thuốc đang có một dòng điều chỉnh bằng tồn kho hiện tại,
+    # để tổng delta của sổ kho luôn bằng Medicine.quantity
+    Medicine = apps.get_model('pharmacy', 'Medicine')
+    StockMovement = apps.get_model('pharmacy', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(medicine_id=medicine_id, delta=quantity, balance_after=quantity,
+                          reason='adjustment', note='Opening balance')
+            for medicine_id, quantity in Medicine.objects.filter(quantity__gt=0).values_list('id', 'quantity').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0002_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('reason', models.CharField(choices=[('receipt', 'Receipt'), ('dispense', 'Dispense'), ('return', 'Return'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='pharmacy.medicine')),
+                ('prescription', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='pharmacy.prescription')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['medicine', '-created_at', '-id'], name='stockmove_medicine_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0003_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dose', models.CharField(blank=True, max_length=255)),
+                ('quantity', models.PositiveIntegerField()),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='prescription_items', to='pharmacy.medicine')),
+                ('prescription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='pharmacy.prescription')),
+            ],
+        ),
+    ]
@@ -21,6 +21,20 @@ class Prescription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # get_by_diagnosis_id: lọc theo diagnosis_id
+            models.Index(fields=['diagnosis_id', 'created_at'], name='presc_diagnosis_idx'),
+            models.Index(fields=['patient_id', 'created_at'], name='presc_patient_idx'),
+            models.Index(fields=['-created_at', '-id'], name='presc_created_idx'),
+            # Hàng đợi đơn thuốc chờ cấp phát (chỉ index các dòng pending)
+            models.Index(
+                fields=['created_at'],
+                name='presc_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
     def __str__(self):
         # Chuỗi đại diện cho đơn thuốc
         return f"Prescription {self.id} for Patient {self.patient_id}"
@@ -38,6 +52,63 @@ class Medicine(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Phục vụ phân trang cursor (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='medicine_created_idx'),
+        ]
+
     def __str__(self):
         # Chuỗi đại diện cho thuốc
-        return f"Medicine {self.name}"
\ No newline at end of file
+        return f"Medicine {self.name}"
+
+class PrescriptionItem(models.Model):
+    # Một dòng thuốc của đơn thuốc, liên kết trực tiếp với Medicine để kiểm tra giá và tồn kho
+    prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE, related_name='items')
+    # Không xóa được thuốc còn nằm trong đơn
+    medicine = models.ForeignKey(Medicine, on_delete=models.PROTECT, related_name='prescription_items')
+    # Liều dùng (ví dụ: "500mg, 2 viên/ngày")
+    dose = models.CharField(max_length=255, blank=True)
+    # Số lượng cần cấp phát
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        # Chuỗi đại diện cho dòng thuốc
+        return f"{self.quantity} x {self.medicine_id} for Prescription {self.prescription_id}"
+
+class StockMovement(models.Model):
+    # Sổ nhập-xuất kho chỉ ghi thêm: mỗi thay đổi của Medicine.quantity là một dòng
+    REASON_CHOICES = (
+        ('receipt', 'Receipt'),  # Nhập kho
+        ('dispense', 'Dispense'),  # Cấp phát theo đơn thuốc
+        ('return', 'Return'),  # Hoàn kho khi đơn đã cấp bị hủy/đưa về chờ
+        ('adjustment', 'Adjustment'),  # Điều chỉnh sau kiểm kê, số dư đầu kỳ
+    )
+    # Thuốc bị thay đổi số lượng; không xóa được thuốc còn lịch sử kho
+    medicine = models.ForeignKey(Medicine, on_delete=models.PROTECT, related_name='movements')
+    # Số lượng thay đổi: dương là nhập, âm là xuất
+    delta = models.IntegerField()
+    # Tồn kho của thuốc ngay sau thay đổi này
+    balance_after = models.PositiveIntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # Đơn thuốc gây ra thay đổi (cấp phát/hoàn kho)
+    prescription = models.ForeignKey(
+        Prescription, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Lịch sử kho của một thuốc (GET /api/medicines/{id}/movements/)
+            models.Index(fields=['medicine', '-created_at', '-id'], name='stockmove_medicine_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Sổ kho không được sửa; sai thì ghi thêm một dòng điều chỉnh
+        if self.pk is not None:
+            raise ValueError("Stock movements are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        # Chuỗi đại diện cho dòng nhập-xuất kho
+        return f"{self.reason} {self.delta:+d} {self.medicine_id}"
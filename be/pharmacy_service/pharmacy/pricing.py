@@ -0,0 +1,55 @@
+# Kiểm tra giá và tồn kho của đơn thuốc theo lô, số truy vấn không phụ thuộc số đơn hay số dòng thuốc
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Prefetch
+
+from .models import Prescription, PrescriptionItem
+
+# Dòng thuốc kèm Medicine trong cùng một truy vấn (JOIN), dùng cho mọi chỗ trả về items
+ITEMS_PREFETCH = Prefetch('items', queryset=PrescriptionItem.objects.select_related('medicine').order_by('id'))
+
+
+def check_prescription(prescription):
+    """Giá và tồn kho của một đơn thuốc đã prefetch ITEMS_PREFETCH."""
+    items = list(prescription.items.all())
+    # Cùng một thuốc có thể nằm ở nhiều dòng: so tồn kho với tổng số lượng của đơn
+    requested = defaultdict(int)
+    for item in items:
+        requested[item.medicine_id] += item.quantity
+    lines, total = [], Decimal('0.00')
+    for item in items:
+        medicine = item.medicine
+        line_total = medicine.price * item.quantity
+        total += line_total
+        lines.append({
+            'item': item.id,
+            'medicine': medicine.id,
+            'medicine_name': medicine.name,
+            'dose': item.dose,
+            'quantity': item.quantity,
+            'unit_price': str(medicine.price),
+            'line_total': str(line_total),
+            'in_stock': medicine.quantity,
+            'available': medicine.quantity >= requested[medicine.id],
+        })
+    return {
+        'prescription': prescription.id,
+        'status': prescription.status,
+        'items': lines,
+        'total': str(total),
+        'available': all(line['available'] for line in lines),
+    }
+
+
+def check_prescriptions(prescription_ids):
+    """
+    Giá và tồn kho của nhiều đơn thuốc trong hai truy vấn: đơn thuốc, rồi các dòng thuốc JOIN Medicine.
+
+    Mỗi đơn được kiểm tra độc lập với tồn kho hiện tại (không trừ dần giữa các đơn trong lô).
+    Trả về (kết quả theo thứ tự prescription_ids, các ID không tồn tại).
+    """
+    prescriptions = Prescription.objects.filter(pk__in=prescription_ids).prefetch_related(ITEMS_PREFETCH).in_bulk()
+    results = [check_prescription(prescriptions[pk]) for pk in prescription_ids if pk in prescriptions]
+    not_found = [pk for pk in prescription_ids if pk not in prescriptions]
+    return results, not_found
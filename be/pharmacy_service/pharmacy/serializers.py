@@ -1,24 +1,72 @@
 from rest_framework import serializers
-from .models import Prescription, Medicine
+from .models import Prescription, PrescriptionItem, Medicine, StockMovement
+from .pricing import ITEMS_PREFETCH
+from .stock import set_quantity
 import requests
 from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 import logging
 
 # Khởi tạo logger để ghi log cho serializer
 logger = logging.getLogger(__name__)
 
+class PrescriptionItemSerializer(serializers.ModelSerializer):
+    # Nhận ID thuốc; sự tồn tại của mọi thuốc trong đơn được kiểm tra một lần ở PrescriptionSerializer
+    medicine = serializers.IntegerField(source='medicine_id')
+    # Tên và đơn giá đọc từ medicine đã được select_related, không truy vấn thêm cho từng dòng
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+    unit_price = serializers.DecimalField(source='medicine.price', max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        # Chỉ định model PrescriptionItem để serialize
+        model = PrescriptionItem
+        # Liệt kê các trường sẽ được serialize
+        fields = ['id', 'medicine', 'medicine_name', 'unit_price', 'dose', 'quantity']
+        read_only_fields = ['id']
+
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Must be at least 1.")
+        return value
+
 class PrescriptionSerializer(serializers.ModelSerializer):
+    # Các dòng thuốc có cấu trúc, gửi kèm khi tạo đơn (details vẫn giữ dạng text)
+    items = PrescriptionItemSerializer(many=True, required=False)
+
     class Meta:
         # Chỉ định model Prescription để serialize
         model = Prescription
         # Liệt kê các trường sẽ được serialize
-        fields = ['id', 'patient_id', 'doctor_id', 'diagnosis_id', 'details', 'status', 'created_at', 'updated_at']
+        fields = ['id', 'patient_id', 'doctor_id', 'diagnosis_id', 'details', 'status', 'items', 'created_at', 'updated_at']
         # Các trường chỉ đọc, không cho phép cập nhật qua API
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate_items(self, items):
+        # Kiểm tra mọi thuốc được tham chiếu bằng một truy vấn thay vì một truy vấn cho mỗi dòng
+        medicine_ids = {item['medicine_id'] for item in items}
+        missing = medicine_ids - set(Medicine.objects.filter(pk__in=medicine_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(f"Medicines not found: {sorted(missing)}")
+        return items
+
     def validate(self, data):
         return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        items = validated_data.pop('items', [])
+        prescription = super().create(validated_data)
+        PrescriptionItem.objects.bulk_create([PrescriptionItem(prescription=prescription, **item) for item in items])
+        # Nạp lại items kèm medicine trong một truy vấn để trả response
+        prefetch_related_objects([prescription], ITEMS_PREFETCH)
+        return prescription
+
+class PrescriptionSummarySerializer(PrescriptionSerializer):
+    class Meta(PrescriptionSerializer.Meta):
+        # Không kèm items: dùng cho các endpoint tra cứu chỉ chạy một truy vấn
+        fields = ['id', 'patient_id', 'doctor_id', 'diagnosis_id', 'details', 'status', 'created_at', 'updated_at']
+
 class MedicineSerializer(serializers.ModelSerializer):
     class Meta:
         # Chỉ định model Medicine để serialize
@@ -26,4 +74,64 @@ class MedicineSerializer(serializers.ModelSerializer):
         # Liệt kê các trường sẽ được serialize
         fields = ['id', 'name', 'description', 'quantity', 'price', 'created_at', 'updated_at']
         # Các trường chỉ đọc, không cho phép cập nhật qua API
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    @transaction.atomic
+    def create(self, validated_data):
+        medicine = super().create(validated_data)
+        # Tồn kho ban đầu là một dòng nhập kho để sổ kho khớp với quantity
+        if medicine.quantity:
+            StockMovement.objects.create(medicine=medicine, delta=medicine.quantity, balance_after=medicine.quantity,
+                                         reason='receipt', note='Initial stock')
+        return medicine
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        quantity = validated_data.pop('quantity', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Chỉ lưu các trường được gửi lên: save() đầy đủ sẽ ghi đè quantity bằng giá trị đã đọc (có thể đã cũ)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if quantity is not None:
+            # Sửa quantity trực tiếp được coi là kiểm kê: ghi phần chênh lệch vào sổ kho
+            set_quantity(instance, quantity, note='Stock count')
+        return instance
+
+class DispenseItemSerializer(serializers.Serializer):
+    # Một dòng thuốc khi cấp phát đơn: {"medicine": <id>, "quantity": <số lượng>}
+    medicine = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class StockChangeSerializer(serializers.Serializer):
+    # Body của POST /api/medicines/{id}/stock/: nhập kho hoặc điều chỉnh (delta âm là xuất)
+    delta = serializers.IntegerField()
+    reason = serializers.ChoiceField(choices=['receipt', 'adjustment'], default='receipt')
+    note = serializers.CharField(max_length=255, required=False, default='')
+
+    def validate_delta(self, value):
+        if value == 0:
+            raise serializers.ValidationError("Must not be zero.")
+        return value
+
+    def validate(self, data):
+        if data['reason'] == 'receipt' and data['delta'] < 0:
+            raise serializers.ValidationError({'delta': 'Receipts must be positive.'})
+        return data
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        # Sổ kho chỉ đọc qua API
+        model = StockMovement
+        fields = ['id', 'medicine', 'delta', 'balance_after', 'reason', 'prescription', 'note', 'created_at']
+        read_only_fields = fields
+
+
+class PrescriptionCheckSerializer(serializers.Serializer):
+    # Body của POST /api/prescriptions/check/
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        if len(value) > settings.PRESCRIPTION_CHECK_MAX_IDS:
+            raise serializers.ValidationError(f"At most {settings.PRESCRIPTION_CHECK_MAX_IDS} prescriptions per request.")
+        # Bỏ trùng nhưng giữ thứ tự
+        return list(dict.fromkeys(value))
@@ -0,0 +1,104 @@
+# Sổ kho thuốc: mọi thay đổi tồn kho đi qua đây, cập nhật bằng F() và ghi kèm một dòng StockMovement
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Medicine, Prescription, StockMovement
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough stock.'
+    default_code = 'insufficient_stock'
+
+
+class StatusConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Prescription status was changed by another request.'
+    default_code = 'status_conflict'
+
+
+@transaction.atomic
+def move_stock(lines, reason, prescription=None, note=''):
+    """
+    Cộng delta vào tồn kho của từng thuốc và ghi sổ; lines là các cặp (medicine_id, delta).
+
+    Mỗi thuốc là một UPDATE quantity = quantity + delta có điều kiện quantity >= -delta, nên
+    không có đọc-sửa-ghi và không bao giờ xuất quá tồn kho; chỉ dòng của các thuốc liên quan bị
+    khóa tới cuối transaction. Các thuốc được cập nhật theo thứ tự id để hai lần xuất nhiều
+    thuốc chạy song song không deadlock. Thiếu hàng thì báo InsufficientStock và không ghi gì.
+    """
+    deltas = defaultdict(int)
+    for medicine_id, delta in lines:
+        deltas[medicine_id] += delta
+    now = timezone.now()
+    for medicine_id in sorted(deltas):
+        delta = deltas[medicine_id]
+        if delta == 0:
+            continue
+        medicine = Medicine.objects.filter(pk=medicine_id)
+        if delta < 0:
+            medicine = medicine.filter(quantity__gte=-delta)
+        if not medicine.update(quantity=F('quantity') + delta, updated_at=now):
+            raise InsufficientStock(f"Not enough stock for medicine {medicine_id} (requested {-delta}).")
+    # Các dòng này đang bị transaction hiện tại khóa nên số dư đọc lại là chính xác
+    balances = dict(Medicine.objects.filter(pk__in=list(deltas)).values_list('id', 'quantity'))
+    return StockMovement.objects.bulk_create([
+        StockMovement(medicine_id=medicine_id, delta=delta, balance_after=balances[medicine_id],
+                      reason=reason, prescription=prescription, note=note)
+        for medicine_id, delta in sorted(deltas.items())
+        if delta != 0
+    ])
+
+
+@transaction.atomic
+def set_quantity(medicine, quantity, note=''):
+    """Đặt tồn kho về quantity (kiểm kê), ghi phần chênh lệch thành một dòng điều chỉnh."""
+    current = Medicine.objects.select_for_update().values_list('quantity', flat=True).get(pk=medicine.pk)
+    movements = move_stock([(medicine.pk, quantity - current)], 'adjustment', note=note)
+    medicine.quantity = quantity
+    return movements
+
+
+def dispensed_quantities(prescription):
+    # Số lượng đang xuất (chưa hoàn) của đơn thuốc theo từng thuốc
+    rows = (StockMovement.objects.filter(prescription=prescription, reason__in=('dispense', 'return'))
+            .values('medicine_id').annotate(total=Sum('delta')))
+    return {row['medicine_id']: -row['total'] for row in rows if row['total']}
+
+
+@transaction.atomic
+def change_status(prescription, new_status, lines=()):
+    """
+    Đổi trạng thái đơn thuốc và cập nhật kho trong cùng một transaction.
+
+    - Sang 'dispensed': xuất kho theo lines (các cặp (medicine_id, quantity)).
+    - Rời 'dispensed': hoàn kho đúng số lượng đã xuất cho đơn.
+    Trạng thái được đổi bằng UPDATE ... WHERE status = <trạng thái vừa đọc>: hai request cấp
+    phát cùng một đơn thì chỉ một request xuất kho, request kia nhận StatusConflict (409).
+    """
+    old_status = prescription.status
+    if new_status == old_status:
+        return prescription
+    now = timezone.now()
+    updated = Prescription.objects.filter(pk=prescription.pk, status=old_status).update(
+        status=new_status, updated_at=now)
+    if not updated:
+        raise StatusConflict()
+    if new_status == 'dispensed':
+        if not lines:
+            logger.warning(f"Prescription {prescription.id} dispensed without items, stock not changed")
+        move_stock([(medicine_id, -quantity) for medicine_id, quantity in lines], 'dispense', prescription)
+    elif old_status == 'dispensed':
+        returned = dispensed_quantities(prescription)
+        move_stock(returned.items(), 'return', prescription)
+    prescription.status = new_status
+    prescription.updated_at = now
+    return prescription
@@ -1,6 +1,17 @@
 # Tệp kiểm thử cho ứng dụng pharmacy
-from django.test import TestCase
+import random
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APIClient
+from rest_framework import status
+from .models import Prescription, Medicine, StockMovement
+from .stock import InsufficientStock, StatusConflict, change_status, move_stock
 
 class PrescriptionTests(TestCase):
     def setUp(self):
@@ -17,4 +28,239 @@ class MedicineTests(TestCase):
 
     def test_create_medicine(self):
         # Viết test cases sau
-        pass
\ No newline at end of file
+        pass
+
+class PrescriptionQueryCountTests(TestCase):
+    # Mỗi endpoint tra cứu theo ID chỉ được phép chạy đúng một truy vấn
+    def setUp(self):
+        self.client = APIClient()
+        for _ in range(3):
+            Prescription.objects.create(patient_id=11, doctor_id=21, diagnosis_id=31, details='Paracetamol 500mg')
+
+    def test_get_by_diagnosis_id(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/prescriptions/by_diagnosisId/31/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_get_by_diagnosis_id_not_found(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/prescriptions/by_diagnosisId/999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.paracetamol = self.create_medicine('Paracetamol', 100)
+        self.amoxicillin = self.create_medicine('Amoxicillin', 5)
+        self.prescription = Prescription.objects.create(patient_id=11, doctor_id=21, diagnosis_id=31, details='...')
+
+    def create_medicine(self, name, quantity):
+        response = self.client.post('/api/medicines/', {'name': name, 'quantity': quantity, 'price': '1.50'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Medicine.objects.get(pk=response.data['id'])
+
+    def set_status(self, new_status, items=None):
+        return self.client.put(f'/api/prescriptions/{self.prescription.id}/', {'status': new_status, 'items': items or []}, format='json')
+
+    def assertLedgerMatches(self):
+        for medicine in Medicine.objects.all():
+            self.assertEqual(medicine.movements.aggregate(total=Sum('delta'))['total'], medicine.quantity)
+
+    def test_dispensing_decrements_stock_and_records_movements(self):
+        response = self.set_status('dispensed', [
+            {'medicine': self.paracetamol.id, 'quantity': 20}, {'medicine': self.amoxicillin.id, 'quantity': 5}])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.quantity, 80)
+        movement = self.paracetamol.movements.get(reason='dispense')
+        self.assertEqual((movement.delta, movement.balance_after, movement.prescription_id), (-20, 80, self.prescription.id))
+        self.assertLedgerMatches()
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        response = self.set_status('dispensed', [
+            {'medicine': self.paracetamol.id, 'quantity': 20}, {'medicine': self.amoxicillin.id, 'quantity': 6}])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.paracetamol.refresh_from_db()
+        self.prescription.refresh_from_db()
+        self.assertEqual((self.paracetamol.quantity, self.prescription.status), (100, 'pending'))
+        self.assertFalse(StockMovement.objects.filter(reason='dispense').exists())
+
+    def test_unknown_medicine_is_rejected(self):
+        response = self.set_status('dispensed', [{'medicine': 999999, 'quantity': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cancelling_dispensed_prescription_returns_stock(self):
+        self.set_status('dispensed', [{'medicine': self.paracetamol.id, 'quantity': 30}])
+        self.assertEqual(self.set_status('cancelled').status_code, status.HTTP_200_OK)
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.quantity, 100)
+        self.assertEqual(self.paracetamol.movements.get(reason='return').delta, 30)
+        self.assertLedgerMatches()
+
+    def test_dispensing_twice_from_stale_read_conflicts(self):
+        stale = Prescription.objects.get(pk=self.prescription.pk)
+        change_status(self.prescription, 'dispensed', [(self.paracetamol.id, 10)])
+        with self.assertRaises(StatusConflict):
+            change_status(stale, 'dispensed', [(self.paracetamol.id, 10)])
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.quantity, 90)
+
+    def test_receipts_and_stock_counts_go_through_ledger(self):
+        url = f'/api/medicines/{self.paracetamol.id}/'
+        response = self.client.post(url + 'stock/', {'delta': 50, 'note': 'PO-17'}, format='json')
+        self.assertEqual((response.status_code, response.data['balance_after']), (status.HTTP_201_CREATED, 150))
+        self.assertEqual(self.client.post(url + 'stock/', {'delta': -5}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        # Sửa quantity trực tiếp là kiểm kê; sửa trường khác không ghi đè tồn kho
+        response = self.client.patch(url, {'quantity': 140}, format='json')
+        self.assertEqual(response.data['quantity'], 140)
+        Medicine.objects.filter(pk=self.paracetamol.pk).update(quantity=120)
+        self.client.patch(url, {'price': '2.00'}, format='json')
+        self.paracetamol.refresh_from_db()
+        self.assertEqual(self.paracetamol.quantity, 120)
+
+        response = self.client.get(url + 'movements/')
+        self.assertEqual([movement['delta'] for movement in response.data], [-10, 50, 100])
+        with self.assertRaises(CommandError):
+            call_command('check_stock_ledger', stdout=StringIO())
+
+    def test_medicine_with_stock_history_cannot_be_deleted(self):
+        response = self.client.delete(f'/api/medicines/{self.paracetamol.id}/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(Medicine.objects.filter(pk=self.paracetamol.pk).exists())
+        # Thuốc chưa có lịch sử kho vẫn xóa được
+        unused = Medicine.objects.create(name='Vitamin C', quantity=0, price='1.00')
+        self.assertEqual(self.client.delete(f'/api/medicines/{unused.id}/').status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_movements_are_append_only(self):
+        movement = StockMovement.objects.first()
+        movement.delta = 1
+        with self.assertRaises(ValueError):
+            movement.save()
+
+    def test_move_stock_never_goes_negative(self):
+        with self.assertRaises(InsufficientStock):
+            move_stock([(self.amoxicillin.id, -6)], 'adjustment')
+        move_stock([(self.amoxicillin.id, -5)], 'adjustment')
+        self.amoxicillin.refresh_from_db()
+        self.assertEqual(self.amoxicillin.quantity, 0)
+        call_command('check_stock_ledger', stdout=StringIO())
+
+class PrescriptionItemTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.medicines = [
+            Medicine.objects.create(name=f'Medicine {n}', quantity=10, price='2.50') for n in range(5)
+        ]
+
+    def create_prescription(self, items):
+        return self.client.post('/api/prescriptions/', {
+            'patient_id': 11, 'doctor_id': 21, 'diagnosis_id': 31, 'details': 'Theo đơn',
+            'items': items,
+        }, format='json')
+
+    def test_create_with_items_checks_medicines_in_one_query(self):
+        items = [{'medicine': medicine.id, 'dose': '1 viên/ngày', 'quantity': 2} for medicine in self.medicines]
+        # Kiểm tra thuốc, tạo đơn, bulk_create items, nạp lại items kèm medicine (cộng savepoint của transaction)
+        with self.assertNumQueries(6):
+            response = self.create_prescription(items)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['items'][0]['medicine_name'], 'Medicine 0')
+        self.assertEqual(response.data['items'][0]['unit_price'], '2.50')
+
+        response = self.create_prescription([{'medicine': 999999, 'quantity': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.create_prescription([{'medicine': self.medicines[0].id, 'quantity': 0}]).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_list_loads_items_with_constant_queries(self):
+        for _ in range(10):
+            self.create_prescription([{'medicine': medicine.id, 'quantity': 1} for medicine in self.medicines])
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/prescriptions/')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(len(response.data[0]['items']), 5)
+
+    def test_check_prices_and_availability(self):
+        prescription_id = self.create_prescription([
+            {'medicine': self.medicines[0].id, 'quantity': 6},
+            {'medicine': self.medicines[0].id, 'quantity': 6},
+            {'medicine': self.medicines[1].id, 'quantity': 3},
+        ]).data['id']
+        response = self.client.get(f'/api/prescriptions/{prescription_id}/check/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], '37.50')
+        # Tổng hai dòng cùng thuốc vượt tồn kho
+        self.assertEqual([line['available'] for line in response.data['items']], [False, False, True])
+        self.assertFalse(response.data['available'])
+        self.assertEqual(self.client.get('/api/prescriptions/999999/check/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_check_uses_constant_queries(self):
+        ids = [
+            self.create_prescription([{'medicine': medicine.id, 'quantity': 1} for medicine in self.medicines]).data['id']
+            for _ in range(20)
+        ]
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/prescriptions/check/', {'ids': ids + [999999]}, format='json')
+        self.assertEqual([result['prescription'] for result in response.data['results']], ids)
+        self.assertEqual(response.data['not_found'], [999999])
+        self.assertTrue(all(result['available'] for result in response.data['results']))
+        self.assertEqual(response.data['results'][0]['total'], '12.50')
+
+    def test_medicine_in_a_prescription_cannot_be_deleted(self):
+        self.assertEqual(self.create_prescription([{'medicine': self.medicines[0].id, 'quantity': 1}]).status_code,
+                         status.HTTP_201_CREATED)
+        # Thuốc tạo bằng ORM chưa có lịch sử kho: chỉ dòng đơn thuốc chặn việc xóa
+        self.assertFalse(StockMovement.objects.filter(medicine=self.medicines[0]).exists())
+        response = self.client.delete(f'/api/medicines/{self.medicines[0].id}/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(Medicine.objects.filter(pk=self.medicines[0].pk).exists())
+        self.assertEqual(self.client.delete(f'/api/medicines/{self.medicines[1].id}/').status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_dispense_uses_stored_items(self):
+        prescription_id = self.create_prescription([{'medicine': self.medicines[0].id, 'quantity': 4}]).data['id']
+        response = self.client.patch(f'/api/prescriptions/{prescription_id}/', {'status': 'dispensed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.medicines[0].refresh_from_db()
+        self.assertEqual(self.medicines[0].quantity, 6)
+
+@skipUnless(connection.vendor == 'postgresql', 'Cần PostgreSQL để chạy các transaction song song')
+class StockConcurrencyTests(TransactionTestCase):
+    WORKERS = 20
+
+    def setUp(self):
+        self.first = Medicine.objects.create(name='Paracetamol', quantity=50, price='1.00')
+        self.second = Medicine.objects.create(name='Amoxicillin', quantity=50, price='2.00')
+        StockMovement.objects.bulk_create([
+            StockMovement(medicine=medicine, delta=50, balance_after=50, reason='receipt')
+            for medicine in (self.first, self.second)
+        ])
+
+    def dispense(self, lines):
+        try:
+            prescription = Prescription.objects.create(patient_id=11, doctor_id=21, diagnosis_id=31, details='...')
+            try:
+                change_status(prescription, 'dispensed', lines)
+                return True
+            except InsufficientStock:
+                return False
+        finally:
+            connection.close()
+
+    def test_parallel_dispensing_never_oversells(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            results = list(executor.map(self.dispense, [[(self.first.id, 1)]] * 200))
+        self.assertEqual(results.count(True), 50)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.quantity, 0)
+        self.assertEqual(StockMovement.objects.filter(medicine=self.first, reason='dispense').count(), 50)
+
+    def test_opposite_line_order_does_not_deadlock(self):
+        # Nửa số đơn liệt kê thuốc theo thứ tự ngược lại; deadlock sẽ làm một worker lỗi
+        orders = [[(self.first.id, 1), (self.second.id, 1)], [(self.second.id, 1), (self.first.id, 1)]]
+        jobs = [random.choice(orders) for _ in range(120)]
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            results = list(executor.map(self.dispense, jobs))
+        self.assertEqual(results.count(True), 50)
+        for medicine in Medicine.objects.all():
+            self.assertEqual(medicine.quantity, 0)
+            self.assertEqual(medicine.movements.aggregate(total=Sum('delta'))['total'], 0)
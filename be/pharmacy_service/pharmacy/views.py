@@ -1,23 +1,30 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.db.models import ProtectedError
 from django.shortcuts import get_object_or_404
 from .models import Prescription, Medicine
-from .serializers import PrescriptionSerializer, MedicineSerializer
+from .serializers import (
+    PrescriptionSerializer, PrescriptionSummarySerializer, PrescriptionCheckSerializer, MedicineSerializer,
+    DispenseItemSerializer, StockChangeSerializer, StockMovementSerializer,
+)
+from .pricing import ITEMS_PREFETCH, check_prescriptions
+from .stock import change_status, move_stock
 import logging
 
 # Khởi tạo logger để ghi log cho ứng dụng
 logger = logging.getLogger(__name__)
 
 class PrescriptionViewSet(viewsets.ModelViewSet):
-    # Định nghĩa queryset mặc định để lấy tất cả đơn thuốc
-    queryset = Prescription.objects.all()
+    # Định nghĩa queryset mặc định để lấy tất cả đơn thuốc, kèm các dòng thuốc và Medicine (thêm đúng một truy vấn)
+    queryset = Prescription.objects.prefetch_related(ITEMS_PREFETCH)
     # Chỉ định serializer để xử lý dữ liệu Prescription
     serializer_class = PrescriptionSerializer
 
     def update(self, request, *args, **kwargs):
         """
         Cập nhật trạng thái đơn thuốc (pending, dispensed, cancelled).
+        Cấp phát thì xuất kho theo "items"; đơn đã cấp bị hủy/đưa về chờ thì hoàn kho.
         """
         # Lấy instance của đơn thuốc từ database
         instance = self.get_object()
@@ -27,9 +34,20 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         if status not in ['pending', 'dispensed', 'cancelled']:
             logger.error(f"Invalid status {status} for prescription {instance.id}")
             return Response({"detail": "Invalid status"}, status=400)
-        # Cập nhật status và lưu vào database
-        instance.status = status
-        instance.save()
+        # Khi cấp phát: các dòng thuốc cần xuất kho, ví dụ "items": [{"medicine": 1, "quantity": 10}]
+        items = DispenseItemSerializer(data=request.data.get('items') or [], many=True)
+        items.is_valid(raise_exception=True)
+        lines = [(item['medicine'], item['quantity']) for item in items.validated_data]
+        if lines:
+            medicine_ids = {medicine_id for medicine_id, _ in lines}
+            missing = medicine_ids - set(Medicine.objects.filter(pk__in=medicine_ids).values_list('id', flat=True))
+            if missing:
+                return Response({"detail": f"Medicines not found: {sorted(missing)}"}, status=400)
+        elif status == 'dispensed':
+            # Không gửi items thì cấp phát đúng các dòng thuốc của đơn (đã prefetch)
+            lines = [(item.medicine_id, item.quantity) for item in instance.items.all()]
+        # Cập nhật status có điều kiện, xuất/hoàn kho trong cùng transaction
+        instance = change_status(instance, status, lines)
         # Serialize và trả về dữ liệu đã cập nhật
         serializer = self.get_serializer(instance)
         logger.debug(f"Updated status of prescription {instance.id} to {status}")
@@ -42,19 +60,76 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         URL: GET /api/prescriptions/by_diagnosisId/{diagnosis_id}/
         """
         logger.debug(f"Fetching prescriptions for diagnosis_id: {diagnosis_id}")
-        # Lọc các đơn thuốc theo diagnosis_id
-        prescriptions = Prescription.objects.filter(diagnosis_id=diagnosis_id)
-        if not prescriptions.exists():
+        # Lọc các đơn thuốc theo diagnosis_id trong một truy vấn duy nhất,
+        # dùng luôn kết quả để quyết định 404 thay vì gọi thêm exists()/count()
+        prescriptions = list(Prescription.objects.filter(diagnosis_id=diagnosis_id))
+        if not prescriptions:
             # Nếu không tìm thấy đơn thuốc, trả về lỗi 404
             logger.debug(f"No prescriptions found for diagnosis_id: {diagnosis_id}")
             return Response({"detail": f"No prescriptions found for diagnosis_id {diagnosis_id}"}, status=404)
-        # Serialize danh sách đơn thuốc và trả về
-        serializer = self.get_serializer(prescriptions, many=True)
-        logger.debug(f"Successfully fetched {prescriptions.count()} prescriptions for diagnosis_id: {diagnosis_id}")
+        # Serialize danh sách đơn thuốc và trả về (không kèm items để giữ một truy vấn)
+        serializer = PrescriptionSummarySerializer(prescriptions, many=True)
+        logger.debug(f"Successfully fetched {len(prescriptions)} prescriptions for diagnosis_id: {diagnosis_id}")
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'], url_path='check')
+    def check(self, request, pk=None):
+        """
+        Giá và tồn kho của từng dòng thuốc trong đơn.
+        URL: GET /api/prescriptions/{id}/check/
+        """
+        results, _ = check_prescriptions([int(pk)]) if pk.isdigit() else ([], [pk])
+        if not results:
+            return Response({"detail": "Not found."}, status=404)
+        return Response(results[0])
+
+    @action(detail=False, methods=['post'], url_path='check')
+    def check_batch(self, request):
+        """
+        Giá và tồn kho của nhiều đơn thuốc trong một request, số truy vấn cố định: {"ids": [1, 2, 3]}.
+        URL: POST /api/prescriptions/check/
+        """
+        serializer = PrescriptionCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, not_found = check_prescriptions(serializer.validated_data['ids'])
+        logger.debug(f"Checked {len(results)} prescriptions, {len(not_found)} not found")
+        return Response({'results': results, 'not_found': not_found})
+
 class MedicineViewSet(viewsets.ModelViewSet):
     # Định nghĩa queryset mặc định để lấy tất cả thuốc trong kho
     queryset = Medicine.objects.all()
     # Chỉ định serializer để xử lý dữ liệu Medicine
-    serializer_class = MedicineSerializer
\ No newline at end of file
+    serializer_class = MedicineSerializer
+
+    def destroy(self, request, *args, **kwargs):
+        # Thuốc đã có lịch sử kho hoặc còn nằm trong đơn thuốc (StockMovement, PrescriptionItem đều
+        # on_delete=PROTECT) không xóa được: trả 409 thay vì lỗi 500
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"detail": "Medicine has stock movements or prescription items and cannot be deleted."}, status=409)
+
+    @action(detail=True, methods=['post'], url_path='stock')
+    def stock(self, request, pk=None):
+        """
+        Nhập kho hoặc điều chỉnh tồn kho: {"delta": 100, "reason": "receipt", "note": "..."}.
+        URL: POST /api/medicines/{id}/stock/
+        """
+        medicine = self.get_object()
+        serializer = StockChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        movements = move_stock([(medicine.pk, data['delta'])], data['reason'], note=data['note'])
+        logger.debug(f"Stock of medicine {medicine.id} changed by {data['delta']}")
+        return Response(StockMovementSerializer(movements[0]).data, status=201)
+
+    @action(detail=True, methods=['get'], url_path='movements')
+    def movements(self, request, pk=None):
+        """
+        Lịch sử nhập-xuất kho của thuốc, mới nhất trước (phân trang cursor).
+        URL: GET /api/medicines/{id}/movements/
+        """
+        medicine = self.get_object()
+        page = self.paginate_queryset(medicine.movements.all())
+        return self.get_paginated_response(StockMovementSerializer(page, many=True).data)
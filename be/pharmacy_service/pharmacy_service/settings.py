@@ -82,6 +82,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Cho phép frontend đọc header phân trang
+CORS_EXPOSE_HEADERS = ['Link', 'X-Total-Count']
+
 ROOT_URLCONF = 'pharmacy_service.urls'
 
 TEMPLATES = [
@@ -137,10 +140,14 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],  # Bỏ tất cả lớp xác thực
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'pharmacy_service.auth.CustomJWTAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Cho phép tất cả yêu cầu mà không cần quyền
     ],
+    # Phân trang cursor dùng chung cho mọi endpoint list
+    'DEFAULT_PAGINATION_CLASS': 'pharmacy_service.pagination.KeysetCursorPagination',
 }
 
 SIMPLE_JWT = {
@@ -151,6 +158,13 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Cache claims của JWT đã xác thực (số token tối đa, thời gian sống tính bằng giây)
+JWT_CLAIMS_CACHE_SIZE = 1024
+JWT_CLAIMS_CACHE_TTL = 300
+# Token hết hạn/không hợp lệ được coi như không có token thay vì trả về 401,
+# giữ hành vi trước khi service bật xác thực JWT (mọi endpoint đều AllowAny)
+JWT_INVALID_TOKEN_AS_ANONYMOUS = True
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -178,3 +192,6 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # URL của các dịch vụ khác để gọi API
 PATIENT_SERVICE_URL = 'http://patient_service:8000/api/'
 DOCTOR_SERVICE_URL = 'http://doctor_service:8000/api/'
+
+# Số đơn thuốc tối đa trong một lần kiểm tra giá và tồn kho (POST /api/prescriptions/check/)
+PRESCRIPTION_CHECK_MAX_IDS = 200
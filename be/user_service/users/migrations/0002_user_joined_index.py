@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+        ),
+    ]
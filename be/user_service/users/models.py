@@ -14,5 +14,11 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     email = models.EmailField(unique=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Phục vụ phân trang cursor (date_joined, id)
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+        ]
+
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -19,12 +19,13 @@ class UserViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         """
-        Lấy danh sách tất cả user.
-        URL: GET /api/users/
+        Lấy danh sách user theo trang (cursor trong header Link).
+        URL: GET /api/users/?page_size=50&with_count=true
         """
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class RolePermission(permissions.BasePermission):
     def has_permission(self, request, view):
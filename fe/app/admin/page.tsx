@@ -1,6 +1,7 @@
 "use client";
 
 import React, { useEffect, useState } from "react";
+import { fetchAllPages } from "@/lib/api";
 
 type Patient = {
   user_id: number;
@@ -94,9 +95,10 @@ export default function AdminPage() {
   // Fetch patients
   const loadPatients = async () => {
     setLoadingPatients(true);
-    const res = await fetch(API_BASE_PATIENT);
-    if (res.ok) {
-      setPatients(await res.json());
+    try {
+      setPatients(await fetchAllPages<Patient>(API_BASE_PATIENT));
+    } catch {
+      // keep the current list
     }
     setLoadingPatients(false);
   };
@@ -104,9 +106,10 @@ export default function AdminPage() {
   // Fetch doctors
   const loadDoctors = async () => {
     setLoadingDoctors(true);
-    const res = await fetch(API_BASE_DOCTOR);
-    if (res.ok) {
-      setDoctors(await res.json());
+    try {
+      setDoctors(await fetchAllPages<Doctor>(API_BASE_DOCTOR));
+    } catch {
+      // keep the current list
     }
     setLoadingDoctors(false);
   };
@@ -2,6 +2,7 @@
 
 import React, { useState, useRef, useEffect } from "react";
 import Cookies from "js-cookie";
+import { fetchAllPages } from "@/lib/api";
 
 type Message = {
   sender: "user" | "bot";
@@ -33,19 +34,12 @@ const PATIENT_API = "http://localhost:8080/api/patients/";
 
 const BOT_AVATAR = "https://cdn-icons-png.flaticon.com/512/4712/4712035.png";
 const USER_AVATAR = "https://cdn-icons-png.flaticon.com/512/149/149071.png";
-const fetchAllDoctors = async () => {
-  const res = await fetch(DOCTOR_API);
-  if (!res.ok) throw new Error("Failed to fetch users");
-  return res.json() as Promise<Doctor[]>;
-};
+const fetchAllDoctors = async () => fetchAllPages<Doctor>(DOCTOR_API);
 
-const fetchAllPatients = async (token: string) => {
-  const res = await fetch(PATIENT_API, {
+const fetchAllPatients = async (token: string) =>
+  fetchAllPages<Patient>(PATIENT_API, {
     headers: { Authorization: `Bearer ${token}` },
   });
-  if (!res.ok) throw new Error("Failed to fetch users");
-  return res.json() as Promise<Patient[]>;
-};
 
 // (Removed all top-level useState, useEffect, and related variables. Move them inside the component.)
 
@@ -85,11 +79,10 @@ export default function ChatbotPage() {
     const fetchPatient = async () => {
       if (!token || !userId) return;
       try {
-        const res = await fetch(PATIENT_API, {
+        const allPatients = await fetchAllPages<Patient>(PATIENT_API, {
           headers: { Authorization: `Bearer ${token}` },
-        });
-        if (!res.ok) return;
-        const allPatients: Patient[] = await res.json();
+        }).catch(() => null);
+        if (!allPatients) return;
         const foundPatient = allPatients.find((p) => p.user_id === userId);
         setPatient(foundPatient || null);
         console.log("Patient info:", foundPatient);
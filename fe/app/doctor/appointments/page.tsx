@@ -53,15 +53,17 @@ export default function DoctorAppointmentsPage() {
       setLoading(true);
       setError(null);
       try {
-        const res = await fetch("http://localhost:8080/api/doctors/");
-        const doctors: Doctor[] = await res.json();
         const userId = getCookie("user_id");
         if (!userId) {
           setError("Không tìm thấy thông tin đăng nhập.");
           setLoading(false);
           return;
         }
-        const found = doctors.find((d) => String(d.user_id) === userId);
+        // Look the doctor up by user_id instead of scanning the paginated doctor list
+        const res = await fetch(
+          `http://localhost:8080/api/doctors/user/${userId}/`
+        );
+        const found: Doctor | null = res.ok ? await res.json() : null;
         if (!found) {
           setError("Không tìm thấy thông tin bác sĩ.");
           setLoading(false);
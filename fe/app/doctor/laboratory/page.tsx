@@ -2,6 +2,7 @@
 
 import React, { useEffect, useState } from "react";
 import Cookies from "js-cookie";
+import { fetchAllPages } from "@/lib/api";
 
 type Doctor = {
   id: number;
@@ -77,29 +78,24 @@ export default function LaboratoryPage() {
   // Fetch doctor info based on user_id in cookies
   useEffect(() => {
     if (!userId) return;
-    fetch("http://localhost:8080/api/doctors/")
-      .then((res) => res.json())
-      .then((data: Doctor[]) => {
-        const found = data.find((d) => d.user_id === Number(userId));
-        setDoctor(found || null);
-      });
+    fetch(`http://localhost:8080/api/doctors/user/${userId}/`)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data: Doctor | null) => setDoctor(data));
   }, []);
 
   // Fetch patients
   useEffect(() => {
-    fetch("http://localhost:8080/api/patients/")
-      .then((res) => res.json())
-      .then((data: Patient[]) => setPatients(data));
+    fetchAllPages<Patient>("http://localhost:8080/api/patients/").then(
+      (data) => setPatients(data)
+    );
   }, []);
 
   const accessToken = Cookies.get("access");
 
   useEffect(() => {
-    fetch("http://localhost:8080/api/users/", {
+    fetchAllPages<User>("http://localhost:8080/api/users/", {
       headers: { Authorization: `Bearer ${accessToken}` },
-    })
-      .then((res) => res.json())
-      .then((data: User[]) => setUsers(data));
+    }).then((data) => setUsers(data));
   }, []);
 
   // Fetch lab requests for this doctor
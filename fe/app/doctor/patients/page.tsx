@@ -2,6 +2,7 @@
 
 import React, { useEffect, useState } from "react";
 import Cookies from "js-cookie";
+import { fetchAllPages } from "@/lib/api";
 
 interface Patient {
   id: number;
@@ -100,12 +101,12 @@ export default function DoctorPatientsPage() {
   useEffect(() => {
     setLoading(true);
     Promise.all([
-      fetch("http://localhost:8080/api/patients/", {
+      fetchAllPages<Patient>("http://localhost:8080/api/patients/", {
         headers: { Authorization: `Bearer ${token}` },
-      }).then((r) => r.json()),
-      fetch("http://localhost:8080/api/doctors/").then((r) => r.json()),
-      fetch("http://localhost:8080/api/diagnoses/").then((r) => r.json()),
-      fetch("http://localhost:8080/api/users/").then((r) => r.json()),
+      }),
+      fetchAllPages<Doctor>("http://localhost:8080/api/doctors/"),
+      fetchAllPages<Diagnosis>("http://localhost:8080/api/diagnoses/"),
+      fetchAllPages<User>("http://localhost:8080/api/users/"),
     ])
       .then(([patientsData, doctorsData, diagnosesData, usersData]) => {
         setPatients(patientsData);
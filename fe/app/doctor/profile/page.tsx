@@ -37,13 +37,16 @@ const DoctorProfilePage = () => {
     const fetchDoctor = async () => {
       setLoading(true);
       try {
-        const res = await fetch("http://localhost:8080/api/doctors/", {
-          headers: {
-            Authorization: `Bearer ${accessToken}`,
-          },
-        });
-        const data: Doctor[] = await res.json();
-        const found = data.find((d) => d.user_id === userId);
+        // Look the profile up by user_id instead of scanning the paginated doctor list
+        const res = await fetch(
+          `http://localhost:8080/api/doctors/user/${userId}/`,
+          {
+            headers: {
+              Authorization: `Bearer ${accessToken}`,
+            },
+          }
+        );
+        const found: Doctor | null = res.ok ? await res.json() : null;
         if (found) {
           setDoctor(found);
           setForm({
@@ -1,6 +1,7 @@
 "use client";
 
 import React, { useEffect, useState } from "react";
+import { fetchAllPages } from "@/lib/api";
 
 type Patient = {
   id: number;
@@ -76,9 +77,8 @@ export default function InsurancePage() {
       setMessage("Bạn chưa đăng nhập.");
       return;
     }
-    fetch(`${API_BASE}/patients/`)
-      .then((res) => res.json())
-      .then((data: Patient[]) => {
+    fetchAllPages<Patient>(`${API_BASE}/patients/`)
+      .then((data) => {
         const found = data.find((p) => String(p.user_id) === String(userId));
         if (found) setPatient(found);
         else setMessage("Không tìm thấy thông tin bệnh nhân.");
@@ -95,9 +95,8 @@ export default function InsurancePage() {
       .then((res) => (res.ok ? res.json() : []))
       .then((data: InsuranceContract[]) => setContracts(data))
       .catch(() => setContracts([]));
-    fetch(`${API_BASE}/claims/`)
-      .then((res) => (res.ok ? res.json() : []))
-      .then((data: InsuranceClaim[]) =>
+    fetchAllPages<InsuranceClaim>(`${API_BASE}/claims/`)
+      .then((data) =>
         setClaims(
           data.filter((c: InsuranceClaim) =>
             contracts.some((contract) => contract.id === c.contract)
@@ -115,9 +114,8 @@ export default function InsurancePage() {
       setClaims([]);
       return;
     }
-    fetch(`${API_BASE}/claims/`)
-      .then((res) => (res.ok ? res.json() : []))
-      .then((data: InsuranceClaim[]) =>
+    fetchAllPages<InsuranceClaim>(`${API_BASE}/claims/`)
+      .then((data) =>
         setClaims(
           data.filter((c: InsuranceClaim) =>
             contracts.some((contract) => contract.id === c.contract)
@@ -239,9 +237,8 @@ export default function InsurancePage() {
         status: "pending",
       });
       // Refresh claims
-      fetch(`${API_BASE}/claims/`)
-        .then((res) => res.json())
-        .then((data: InsuranceClaim[]) =>
+      fetchAllPages<InsuranceClaim>(`${API_BASE}/claims/`)
+        .then((data) =>
           setClaims(
             data.filter((c: InsuranceClaim) =>
               contracts.some((contract) => contract.id === c.contract)
@@ -278,9 +275,8 @@ export default function InsurancePage() {
     });
     if (res.ok) {
       setMessage("Cập nhật trạng thái thành công!");
-      fetch(`${API_BASE}/claims/`)
-        .then((res) => res.json())
-        .then((data: InsuranceClaim[]) =>
+      fetchAllPages<InsuranceClaim>(`${API_BASE}/claims/`)
+        .then((data) =>
           setClaims(
             data.filter((c: InsuranceClaim) =>
               contracts.some((contract) => contract.id === c.contract)
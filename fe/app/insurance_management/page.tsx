@@ -1,6 +1,7 @@
 "use client";
 
 import React, { useEffect, useState } from "react";
+import { fetchAllPages } from "@/lib/api";
 
 type InsuranceContract = {
   id: number;
@@ -59,9 +60,7 @@ export default function InsuranceManagementPage() {
   const fetchContracts = async () => {
     setLoading(true);
     try {
-      const res = await fetch(`${API_BASE_CONTRACT}/`);
-      const data = await res.json();
-      setContracts(data);
+      setContracts(await fetchAllPages<InsuranceContract>(`${API_BASE_CONTRACT}/`));
     } catch {
       setMessage("Lỗi khi tải hợp đồng bảo hiểm.");
     }
@@ -72,9 +71,7 @@ export default function InsuranceManagementPage() {
   const fetchClaims = async () => {
     setLoading(true);
     try {
-      const res = await fetch(`${API_BASE_CLAIM}/`);
-      const data = await res.json();
-      setClaims(data);
+      setClaims(await fetchAllPages<InsuranceClaim>(`${API_BASE_CLAIM}/`));
     } catch {
       setMessage("Lỗi khi tải yêu cầu bồi thường.");
     }
@@ -2,6 +2,7 @@
 
 import React, { useEffect, useState } from "react";
 import Cookies from "js-cookie";
+import { fetchAllPages } from "@/lib/api";
 
 interface Appointment {
   id: number;
@@ -48,13 +49,10 @@ const USERS_API = "http://localhost:8080/api/users/";
 const DOCTOR_API = "http://localhost:8003/api/doctors/";
 const PATIENT_API = "http://localhost:8080/api/patients/";
 
-const fetchAppointments = async (token: string) => {
-  const res = await fetch(API_BASE, {
+const fetchAppointments = async (token: string) =>
+  fetchAllPages<Appointment>(API_BASE, {
     headers: { Authorization: `Bearer ${token}` },
   });
-  if (!res.ok) throw new Error("Failed to fetch appointments");
-  return res.json() as Promise<Appointment[]>;
-};
 
 const fetchUser = async (token: string) => {
   const res = await fetch(USER_API, {
@@ -64,27 +62,17 @@ const fetchUser = async (token: string) => {
   return res.json() as Promise<User>;
 };
 
-const fetchAllUsers = async (token: string) => {
-  const res = await fetch(USERS_API, {
+const fetchAllUsers = async (token: string) =>
+  fetchAllPages<User>(USERS_API, {
     headers: { Authorization: `Bearer ${token}` },
   });
-  if (!res.ok) throw new Error("Failed to fetch users");
-  return res.json() as Promise<User[]>;
-};
 
-const fetchAllDoctors = async () => {
-  const res = await fetch(DOCTOR_API);
-  if (!res.ok) throw new Error("Failed to fetch users");
-  return res.json() as Promise<Doctor[]>;
-};
+const fetchAllDoctors = async () => fetchAllPages<Doctor>(DOCTOR_API);
 
-const fetchAllPatients = async (token: string) => {
-  const res = await fetch(PATIENT_API, {
+const fetchAllPatients = async (token: string) =>
+  fetchAllPages<Patient>(PATIENT_API, {
     headers: { Authorization: `Bearer ${token}` },
   });
-  if (!res.ok) throw new Error("Failed to fetch users");
-  return res.json() as Promise<Patient[]>;
-};
 
 const deleteAppointment = async (id: number, token: string) => {
   const res = await fetch(`${API_BASE}${id}/`, {
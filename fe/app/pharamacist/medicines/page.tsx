@@ -1,6 +1,7 @@
 "use client";
 
 import React, { useEffect, useState } from "react";
+import { fetchAllPages } from "@/lib/api";
 
 type Medicine = {
   id: number;
@@ -295,13 +296,10 @@ const ConfirmModal: React.FC<{
   );
 };
 
-const fetchMedicines = async (): Promise<Medicine[]> => {
-  const res = await fetch("http://localhost:8080/api/medicines/", {
+const fetchMedicines = async (): Promise<Medicine[]> =>
+  fetchAllPages<Medicine>("http://localhost:8080/api/medicines/", {
     cache: "no-store",
   });
-  if (!res.ok) throw new Error("Lỗi khi lấy danh sách thuốc");
-  return res.json();
-};
 
 const createMedicine = async (
   data: Omit<Medicine, "id" | "created_at" | "updated_at">
@@ -1,6 +1,7 @@
 "use client";
 
 import React, { useEffect, useState } from "react";
+import { fetchAllPages } from "@/lib/api";
 
 type Medicine = {
   id: number;
@@ -24,8 +25,7 @@ export default function PharmacyPage() {
   // Fetch all medicines
   useEffect(() => {
     setLoading(true);
-    fetch("http://localhost:8080/api/medicines/")
-      .then((res) => res.json())
+    fetchAllPages<Medicine>("http://localhost:8080/api/medicines/")
       .then((data) => setMedicines(data))
       .finally(() => setLoading(false));
   }, []);
@@ -79,9 +79,9 @@ export default function PharmacyPage() {
       setMessage("Mua thành công!");
       setCart({});
       // Refresh medicines
-      fetch("http://localhost:8080/api/medicines/")
-        .then((res) => res.json())
-        .then((data) => setMedicines(data));
+      fetchAllPages<Medicine>("http://localhost:8080/api/medicines/").then(
+        (data) => setMedicines(data)
+      );
     }
     setBuying(false);
     setTimeout(() => setMessage(null), 2000);
@@ -1,6 +1,7 @@
 "use client";
 
 import React, { useEffect, useState } from "react";
+import { fetchAllPages } from "@/lib/api";
 
 type Patient = {
   id: number;
@@ -56,8 +57,9 @@ const TestResultsPage: React.FC = () => {
           return;
         }
         const user_id = parseInt(userIdStr, 10);
-        const res = await fetch("http://localhost:8080/api/patients/");
-        const patients: Patient[] = await res.json();
+        const patients = await fetchAllPages<Patient>(
+          "http://localhost:8080/api/patients/"
+        );
         const found = patients.find((p) => p.user_id === user_id);
         if (found) setPatient(found);
       } catch (e) {
@@ -83,8 +85,9 @@ const TestResultsPage: React.FC = () => {
         setLabRequests(requests);
 
         // Get all lab results
-        const resRes = await fetch("http://localhost:8080/api/lab_results/");
-        const results: LabResult[] = await resRes.json();
+        const results = await fetchAllPages<LabResult>(
+          "http://localhost:8080/api/lab_results/"
+        );
         setLabResults(results);
       } catch (e) {
         // handle error
@@ -0,0 +1,25 @@
+// List endpoints are cursor-paginated (50 rows per page by default); the next page is
+// announced in the `Link: <...>; rel="next"` response header.
+const NEXT_LINK = /<([^>]+)>;\s*rel="next"/;
+
+function nextPageUrl(linkHeader: string | null, requestUrl: string): string | null {
+  const match = linkHeader?.match(NEXT_LINK);
+  if (!match) return null;
+  // Behind the API gateway the upstream builds links with its internal host, so only
+  // the path and cursor are kept and resolved against the URL the client called
+  const next = new URL(match[1], requestUrl);
+  return new URL(next.pathname + next.search, requestUrl).toString();
+}
+
+// Load every page of a list endpoint, for pages that search or filter the full list client-side
+export async function fetchAllPages<T>(url: string, init?: RequestInit): Promise<T[]> {
+  const items: T[] = [];
+  let next: string | null = url;
+  while (next) {
+    const res: Response = await fetch(next, init);
+    if (!res.ok) throw new Error(`Failed to fetch ${url}: ${res.status}`);
+    items.push(...((await res.json()) as T[]));
+    next = nextPageUrl(res.headers.get("Link"), next);
+  }
+  return items;
+}